@@ -96,6 +96,13 @@ def create_app():
 
             engine._yard_sql_metrics_registered = True
 
+    # =========================================================
+    # Datos derivados mantenidos al escribir
+    # =========================================================
+    from app.services.write_hooks import init_write_hooks
+
+    init_write_hooks()
+
     # =========================================================
     # Timezone / Date formatting
     # =========================================================
@@ -373,6 +380,14 @@ def create_app():
     app.register_blueprint(tica_bp)
     app.register_blueprint(transport_bp)
 
+    # =========================================================
+    # Trabajos periódicos (después de registrar los blueprints, que
+    # importan los módulos donde se declaran)
+    # =========================================================
+    from app.services.scheduler import init_scheduler
+
+    init_scheduler(app)
+
     # =========================================================
     # Healthcheck
     # =========================================================
@@ -37,7 +37,10 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, legal, landscape
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from app.services.bulk_import import execute, stage_rows
+from app.services.export_jobs import ExportFile, export_response, register_export
 from app.services.notifications import create_notifications_for_roles, notification_url
+from app.services.pdf_cache import cached_pdf
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.worksheet.datavalidation import DataValidation
@@ -1513,11 +1516,12 @@ def reschedule_assignment(assignment_id: int):
     flash("Asignación reagendada correctamente.", "success")
     return redirect(url_for("dispatch.assigned_requests"))
 
-@dispatch_bp.get("/prelist/pdf")
-@login_required
-def prelist_pdf():
-    site_id = _ensure_active_site()
+# Subir al cambiar el dibujo de la prelista (invalida la caché)
+PRELIST_PDF_VERSION = 1
+
 
+@register_export("PRELIST_PDF", label="Prelista operativa (PDF)")
+def build_prelist_pdf(site_id, params) -> ExportFile:
     import pytz
 
     cr_tz = pytz.timezone("America/Costa_Rica")
@@ -1527,21 +1531,13 @@ def prelist_pdf():
     tomorrow = today + timedelta(days=1)
     current_time = now_cr.time()
 
-    active_site = getattr(
-        g,
-        "active_site",
-        None,
+    # Dentro de una petición el predio ya está en el identity map
+    # (cargado en before_request); en el worker se consulta.
+    active_site = db.session.get(
+        Site,
+        site_id,
     )
 
-    if (
-        active_site is None
-        or int(active_site.id) != int(site_id)
-    ):
-        active_site = db.session.get(
-            Site,
-            site_id,
-        )
-
     site_name = (
         active_site.name
         if active_site
@@ -1872,106 +1868,125 @@ def prelist_pdf():
             "—",
         ])
 
-    bio = BytesIO()
-
-    doc = SimpleDocTemplate(
-        bio,
-        pagesize=landscape(legal),
-        rightMargin=4,
-        leftMargin=4,
-        topMargin=6,
-        bottomMargin=6,
-    )
-
-    styles = getSampleStyleSheet()
-
-    title_style = styles["Normal"]
-    title_style.fontName = "Helvetica-Bold"
-    title_style.fontSize = 12
-    title_style.leading = 13
-
-    small_style = styles["Normal"]
-    small_style.fontSize = 8
-    small_style.leading = 9
-
-    elements = []
-
-    printed_at = now_cr.strftime("%d/%m/%Y %I:%M %p")
-
-    elements.append(Paragraph("<b>PRELISTA OPERATIVA</b>", title_style))
-    elements.append(Paragraph(f"Impreso: {printed_at}", small_style))
-    elements.append(Spacer(1, 4))
-
-    table = Table(
-        data,
-        repeatRows=1,
-        colWidths=[
-            44,   # Predio
-            45,   # Naviera
-            72,   # Contenedor
-            64,   # Chasis
-            40,   # Tipo
-            44,   # Formato
-            38,   # Fecha
-            52,   # Hora
-            55,   # GPS
-            116,  # Cliente / Planta
-            112,  # Producto
-            112,  # Destino
-            130,  # Comentario
-            58,   # Detalles
-        ],
-    )
+    # Mismas filas y resaltados → mismo PDF: se sirve desde la caché
+    # sin volver a dibujarlo (app/services/pdf_cache.py).
+    def render() -> bytes:
+        bio = BytesIO()
+
+        doc = SimpleDocTemplate(
+            bio,
+            pagesize=landscape(legal),
+            rightMargin=4,
+            leftMargin=4,
+            topMargin=6,
+            bottomMargin=6,
+        )
+
+        styles = getSampleStyleSheet()
+
+        title_style = styles["Normal"]
+        title_style.fontName = "Helvetica-Bold"
+        title_style.fontSize = 12
+        title_style.leading = 13
+
+        small_style = styles["Normal"]
+        small_style.fontSize = 8
+        small_style.leading = 9
+
+        elements = []
+
+        printed_at = now_cr.strftime("%d/%m/%Y %I:%M %p")
+
+        elements.append(Paragraph("<b>PRELISTA OPERATIVA</b>", title_style))
+        elements.append(Paragraph(f"Impreso: {printed_at}", small_style))
+        elements.append(Spacer(1, 4))
+
+        table = Table(
+            data,
+            repeatRows=1,
+            colWidths=[
+                44,   # Predio
+                45,   # Naviera
+                72,   # Contenedor
+                64,   # Chasis
+                40,   # Tipo
+                44,   # Formato
+                38,   # Fecha
+                52,   # Hora
+                55,   # GPS
+                116,  # Cliente / Planta
+                112,  # Producto
+                112,  # Destino
+                130,  # Comentario
+                58,   # Detalles
+            ],
+        )
+
+        table_style = [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.black),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 7.3),
+
+            ("FONTSIZE", (0, 1), (-1, -1), 6.8),
+            ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
+
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.black),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("ALIGN", (9, 1), (12, -1), "LEFT"),
+
+            ("LEFTPADDING", (0, 0), (-1, -1), 1.5),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 1.5),
+            ("TOPPADDING", (0, 0), (-1, -1), 4),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [
+                colors.white,
+                colors.HexColor("#F3F4F6"),
+            ]),
+        ]
 
-    table_style = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.black),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, 0), 7.3),
-
-        ("FONTSIZE", (0, 1), (-1, -1), 6.8),
-        ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
-
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.black),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("ALIGN", (9, 1), (12, -1), "LEFT"),
-
-        ("LEFTPADDING", (0, 0), (-1, -1), 1.5),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 1.5),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-
-        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [
-            colors.white,
-            colors.HexColor("#F3F4F6"),
-        ]),
-    ]
+        for row_idx in tomorrow_after_11_rows:
+            table_style.extend([
+                ("BACKGROUND", (0, row_idx), (-1, row_idx), colors.black),
+                ("TEXTCOLOR", (0, row_idx), (-1, row_idx), colors.white),
+                ("FONTNAME", (0, row_idx), (-1, row_idx), "Helvetica-Bold"),
+            ])
 
-    for row_idx in tomorrow_after_11_rows:
-        table_style.extend([
-            ("BACKGROUND", (0, row_idx), (-1, row_idx), colors.black),
-            ("TEXTCOLOR", (0, row_idx), (-1, row_idx), colors.white),
-            ("FONTNAME", (0, row_idx), (-1, row_idx), "Helvetica-Bold"),
-        ])
+        table.setStyle(TableStyle(table_style))
 
-    table.setStyle(TableStyle(table_style))
+        elements.append(table)
+        doc.build(elements)
 
-    elements.append(table)
-    doc.build(elements)
+        return bio.getvalue()
 
-    bio.seek(0)
+    pdf_bytes = cached_pdf(
+        "PRELIST",
+        PRELIST_PDF_VERSION,
+        {
+            "site_id": site_id,
+            "rows": data,
+            "highlighted_rows": tomorrow_after_11_rows,
+        },
+        render,
+    )
 
-    response = send_file(
-        bio,
-        as_attachment=False,
-        download_name="prelista_operativa.pdf",
+    return ExportFile(
+        filename="prelista_operativa.pdf",
         mimetype="application/pdf",
+        data=BytesIO(pdf_bytes),
+        rows=len(data) - 1,
+        inline=True,
     )
 
-    response.headers["Content-Disposition"] = "inline; filename=prelista_operativa.pdf"
 
-    return response
+@dispatch_bp.get("/prelist/pdf")
+@login_required
+def prelist_pdf():
+    site_id = _ensure_active_site()
+
+    return export_response("PRELIST_PDF", site_id=site_id)
 
 @dispatch_bp.get("/gps")
 @login_required
@@ -2103,6 +2118,80 @@ def gps_inventory_template():
     )
 
 
+_GPS_IMPORT_COLUMNS = [
+    ("gps_number", "text NOT NULL"),
+    ("current_location", "text"),
+    ("battery_range", "text"),
+    ("status", "text"),
+    ("is_active", "boolean"),
+    ("notes", "text"),
+]
+
+# GPS asignados no pueden pasar a mantenimiento o fuera de servicio.
+_GPS_IMPORT_ASSIGNED_CONFLICTS_SQL = """
+    SELECT s.row_no, s.gps_number
+    FROM stg_gps_import s
+    JOIN yard_gate_alamo.gps_devices g
+      ON g.site_id = :site_id
+     AND g.gps_number = s.gps_number
+    WHERE s.status IS NOT NULL
+      AND s.status <> 'DISPONIBLE'
+      AND EXISTS (
+          SELECT 1
+          FROM yard_gate_alamo.gps_assignments a
+          WHERE a.gps_device_id = g.id
+            AND a.status = 'ASIGNADO'
+      )
+    ORDER BY s.row_no
+"""
+
+_GPS_IMPORT_UPDATE_SQL = """
+    UPDATE yard_gate_alamo.gps_devices g
+    SET status = COALESCE(s.status, g.status),
+        current_location = CASE
+            WHEN s.current_location IS NULL THEN g.current_location
+            ELSE NULLIF(s.current_location, '')
+        END,
+        battery_range = CASE
+            WHEN s.battery_range IS NULL THEN g.battery_range
+            ELSE NULLIF(s.battery_range, '')
+        END,
+        notes = CASE
+            WHEN s.notes IS NULL THEN g.notes
+            ELSE NULLIF(s.notes, '')
+        END,
+        is_active = COALESCE(s.is_active, g.is_active),
+        updated_at = :now
+    FROM stg_gps_import s
+    WHERE g.site_id = :site_id
+      AND g.gps_number = s.gps_number
+"""
+
+_GPS_IMPORT_INSERT_SQL = """
+    INSERT INTO yard_gate_alamo.gps_devices (
+        site_id, gps_number, current_location, status,
+        battery_range, notes, is_active, created_at, updated_at
+    )
+    SELECT
+        :site_id,
+        s.gps_number,
+        NULLIF(s.current_location, ''),
+        COALESCE(s.status, 'DISPONIBLE'),
+        NULLIF(s.battery_range, ''),
+        NULLIF(s.notes, ''),
+        COALESCE(s.is_active, TRUE),
+        :now,
+        :now
+    FROM stg_gps_import s
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM yard_gate_alamo.gps_devices g
+        WHERE g.site_id = :site_id
+          AND g.gps_number = s.gps_number
+    )
+"""
+
+
 @dispatch_bp.post("/gps/inventory/bulk-upload")
 @login_required
 def gps_inventory_bulk_upload():
@@ -2249,99 +2338,40 @@ def gps_inventory_bulk_upload():
 
         return redirect(url_for("dispatch.gps_inventory"))
 
-    gps_numbers = [row["gps_number"] for row in rows_to_process]
-
-    existing_gps_rows = []
-
-    if gps_numbers:
-        existing_gps_rows = (
-            GpsDevice.query
-            .filter(
-                GpsDevice.site_id == site_id,
-                GpsDevice.gps_number.in_(gps_numbers),
-            )
-            .all()
-        )
-
-    gps_by_number = {
-        gps.gps_number: gps
-        for gps in existing_gps_rows
-    }
-
-    existing_gps_ids = [
-        gps.id
-        for gps in existing_gps_rows
-    ]
-
-    assigned_gps_ids = set()
-
-    if existing_gps_ids:
-        assigned_gps_ids = {
-            int(gps_device_id)
-            for gps_device_id, in (
-                db.session.query(
-                    GpsAssignment.gps_device_id
-                )
-                .filter(
-                    GpsAssignment.gps_device_id.in_(
-                        existing_gps_ids
-                    ),
-                    GpsAssignment.status == "ASIGNADO",
-                )
-                .distinct()
-                .all()
-            )
-            if gps_device_id is not None
+    # Staging + SQL por conjuntos (app/services/bulk_import.py).
+    # En las columnas opcionales NULL = no cambiar y '' = limpiar.
+    staged = [
+        {
+            "row_no": row["row_idx"],
+            "gps_number": row["gps_number"],
+            "current_location": (
+                row["current_location"].upper()
+                if row["current_location"] is not None
+                else None
+            ),
+            "battery_range": row["battery_range"],
+            "status": row["status"] or None,
+            "is_active": row["is_active"],
+            "notes": row["notes"].upper() if row["notes"] is not None else None,
         }
-
-    created_count = 0
-    updated_count = 0
+        for row in rows_to_process
+    ]
 
     try:
-        for row in rows_to_process:
-            gps_number = row["gps_number"]
-            gps = gps_by_number.get(gps_number)
-
-            if gps:
-                if row["status"]:
-                    if gps.id in assigned_gps_ids and row["status"] != "DISPONIBLE":
-                        errors.append(
-                            f"Fila {row['row_idx']}: GPS {gps_number} está asignado. "
-                            "No se puede cambiar a mantenimiento o fuera de servicio."
-                        )
-                        continue
-
-                    gps.status = row["status"]
-
-                if row["current_location"] is not None:
-                    gps.current_location = row["current_location"].upper() or None
-
-                if row["battery_range"] is not None:
-                    gps.battery_range = row["battery_range"] or None
-
-                if row["notes"] is not None:
-                    gps.notes = row["notes"].upper() or None
+        if staged:
+            stage_rows("stg_gps_import", _GPS_IMPORT_COLUMNS, staged)
 
-                if row["is_active"] is not None:
-                    gps.is_active = row["is_active"]
+        params = {"site_id": site_id, "now": datetime.utcnow()}
 
-                gps.updated_at = datetime.utcnow()
-                updated_count += 1
-
-            else:
-                gps = GpsDevice(
-                    site_id=site_id,
-                    gps_number=gps_number,
-                    current_location=(row["current_location"].upper() if row["current_location"] else None),
-                    status=row["status"] or "DISPONIBLE",
-                    battery_range=row["battery_range"] or None,
-                    notes=(row["notes"].upper() if row["notes"] else None),
-                    is_active=True if row["is_active"] is None else row["is_active"],
-                )
-
-                db.session.add(gps)
-                gps_by_number[gps_number] = gps
-                created_count += 1
+        for row_idx, gps_number in (
+            execute(_GPS_IMPORT_ASSIGNED_CONFLICTS_SQL, params).all()
+            if staged
+            else []
+        ):
+            errors.append(
+                f"Fila {row_idx}: GPS {gps_number} está asignado. "
+                "No se puede cambiar a mantenimiento o fuera de servicio."
+            )
 
         if errors:
             db.session.rollback()
@@ -2360,6 +2390,13 @@ def gps_inventory_bulk_upload():
 
             return redirect(url_for("dispatch.gps_inventory"))
 
+        updated_count = 0
+        created_count = 0
+
+        if staged:
+            updated_count = execute(_GPS_IMPORT_UPDATE_SQL, params).rowcount
+            created_count = execute(_GPS_IMPORT_INSERT_SQL, params).rowcount
+
         db.session.commit()
 
     except Exception as e:
@@ -0,0 +1,166 @@
+# app/blueprints/inventory/filters.py
+"""
+Filtro declarativo del inventario.
+
+Un solo objeto describe lo que el usuario pidió en pantalla y se
+compila a condiciones SQL. Lo usan la pantalla de inventario, su
+exportación a Excel, la lista de evacuación y su PDF, así las cuatro
+muestran exactamente las mismas filas y ninguna filtra en Python
+después de leer todo el predio.
+
+Las condiciones asumen una consulta sobre Container con
+container_current_state unido por outerjoin (naviera y clasificación
+actuales).
+"""
+
+from dataclasses import dataclass
+
+from app.extensions import db
+from app.models.container import Container
+from app.models.container_state import ContainerCurrentState
+from app.services.search import normalize_search_key, search_condition
+
+# Estados que forman la lista de evacuación
+EVACUATION_STATUSES = (
+    "PARA_EVACUAR",
+    "EVACUAR_SOLICITADO",
+    "EVACUACION_MONTADA",
+)
+
+
+def _clean(value) -> str:
+    return (value or "").strip().upper()
+
+
+def normalized_upper(column, default: str = ""):
+    """
+    Misma normalización que se hacía en Python: strip + upper, con
+    default si es NULL.
+    """
+    return db.func.upper(db.func.trim(db.func.coalesce(column, default)))
+
+
+@dataclass(frozen=True)
+class InventoryFilter:
+    """
+    Filtros del inventario, ya normalizados (mayúsculas, sin espacios).
+
+    in_yard: "1" en patio, "0" fuera del patio, cualquier otro valor
+    todos. Un campo vacío no filtra.
+    """
+
+    in_yard: str = "1"
+    q: str = ""
+    shipping_line: str = ""
+    origin: str = ""
+    size: str = ""
+    classification: str = ""
+    dispatch_status: str = ""
+    destination: str = ""
+    evacuation_type: str = ""
+
+    # Fijo por pantalla (no viene del usuario): p. ej. evacuación
+    dispatch_statuses: tuple[str, ...] = ()
+
+    # -----------------------------------------------------
+    # Construcción
+    # -----------------------------------------------------
+    @classmethod
+    def from_params(cls, params) -> "InventoryFilter":
+        """
+        Desde request.args o los params guardados de una exportación.
+        """
+        return cls(
+            in_yard=(params.get("in_yard") or "1").strip(),
+            q=_clean(params.get("q")),
+            shipping_line=_clean(params.get("shipping_line")),
+            origin=_clean(params.get("origin")),
+            size=_clean(params.get("size")),
+            classification=_clean(params.get("classification")),
+            dispatch_status=_clean(params.get("dispatch_status")),
+            destination=_clean(params.get("destination")),
+            evacuation_type=_clean(params.get("evacuation_type")),
+        )
+
+    @classmethod
+    def for_evacuation(cls, params=None) -> "InventoryFilter":
+        """
+        Lista de evacuación: contenedores en patio marcados para
+        evacuar, con los filtros propios de esa pantalla.
+        """
+        params = params or {}
+
+        return cls(
+            in_yard="1",
+            q=_clean(params.get("q")),
+            shipping_line=_clean(params.get("shipping_line")),
+            size=_clean(params.get("size")),
+            destination=_clean(params.get("destination")),
+            evacuation_type=_clean(params.get("evacuation_type")),
+            dispatch_statuses=EVACUATION_STATUSES,
+        )
+
+    # -----------------------------------------------------
+    # SQL
+    # -----------------------------------------------------
+    def conditions(self) -> list:
+        """
+        Condiciones SQL equivalentes al filtro.
+        """
+        conds = []
+
+        if self.in_yard == "1":
+            conds.append(Container.is_in_yard == True)  # noqa: E712
+        elif self.in_yard == "0":
+            conds.append(Container.is_in_yard == False)  # noqa: E712
+
+        # Código: clave normalizada con índice trigram
+        term = normalize_search_key(self.q)
+        if term:
+            conds.append(search_condition([Container.code_key], term))
+
+        if self.origin:
+            conds.append(normalized_upper(Container.gate_in_origin_port) == self.origin)
+
+        if self.size:
+            conds.append(normalized_upper(Container.size) == self.size)
+
+        # Naviera y clasificación ya se guardan en mayúsculas
+        if self.shipping_line:
+            conds.append(ContainerCurrentState.shipping_line == self.shipping_line)
+
+        if self.classification:
+            conds.append(ContainerCurrentState.final_classification == self.classification)
+
+        if self.dispatch_status:
+            conds.append(normalized_upper(Container.dispatch_status, "NORMAL") == self.dispatch_status)
+
+        if self.dispatch_statuses:
+            conds.append(
+                db.func.coalesce(Container.dispatch_status, "NORMAL").in_(self.dispatch_statuses)
+            )
+
+        if self.destination:
+            conds.append(normalized_upper(Container.evacuation_destination) == self.destination)
+
+        if self.evacuation_type:
+            conds.append(normalized_upper(Container.evacuation_type) == self.evacuation_type)
+
+        return conds
+
+    def apply(self, query):
+        return query.filter(*self.conditions())
+
+
+# Orden de la lista de evacuación (pantalla y PDF): naviera, destino,
+# tamaño y código; los vacíos al final.
+def evacuation_order() -> list:
+    def last_if_empty(expr):
+        return db.func.coalesce(db.func.nullif(expr, ""), "ZZZ")
+
+    return [
+        last_if_empty(ContainerCurrentState.shipping_line),
+        last_if_empty(normalized_upper(Container.evacuation_destination)),
+        last_if_empty(normalized_upper(Container.size)),
+        db.func.upper(db.func.coalesce(Container.code, "")),
+    ]
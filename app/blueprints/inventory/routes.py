@@ -1,13 +1,15 @@
 # app/blueprints/inventory/routes.py
 
 import os
+from dataclasses import asdict
+from functools import partial
 from io import BytesIO
 from flask_login import login_required, current_user
 import openpyxl
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment
 
-from sqlalchemy import text, bindparam
+from sqlalchemy import text
 
 from app.extensions import db
 from app.blueprints.inventory import inventory_bp
@@ -15,12 +17,24 @@ from app.models.container import Container, ContainerPosition
 from app.models.yard import YardBay
 from app.models.movement import Movement, MovementPhoto
 from app.models.site import Site, UserSite
-from flask import render_template, request, send_file, session, abort, redirect, url_for, flash
+from flask import current_app, render_template, request, send_file, session, abort, redirect, url_for, flash
 from datetime import datetime, date
+import pytz
 from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.styles import PatternFill
 from app.models.container_classification import ContainerClassification
+from app.models.container_state import ContainerCurrentState
+from app.blueprints.inventory.filters import InventoryFilter, evacuation_order, normalized_upper
 from app.services.audit import audit_log
+from app.services.bulk_import import execute, stage_rows
+from app.services.excel_ingest import iter_sheet_rows, map_rows, open_workbook, sheet_row_estimate
+from app.services.photo_uploads import PHOTO_STATUS_UPLOADED
+from app.services.keyset import keyset_paginate
+from app.services.write_hooks import mark_containers_touched, mark_movements_touched
+from app.services.pdf_cache import cached_pdf
+from app.services.export_jobs import ExportFile, export_response, register_export
+from app.services.import_sessions import ImportAbort, build_preview, create_import_session, register_import
+from app.services.xlsx_export import EXPORT_BATCH_SIZE, XLSX_MIMETYPE, XlsxStreamWriter
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.lib.styles import getSampleStyleSheet
@@ -98,75 +112,25 @@ def _ensure_active_site():
 # Query principal de inventario
 # =========================================================
 
-def _inventory_query(
-    site_id: int,
-    in_yard: str | None,
-    qtext: str,
-    shipping_line: str = "",
-    origin: str = "",
-    size: str = "",
-    classification: str = "",
-    dispatch_status: str = "",
-):
-    """
-    Construye la consulta principal del inventario.
+# Orden del inventario (pantalla, keyset y exportación)
+INVENTORY_ORDER = [
+    (Container.updated_at, "desc"),
+    (Container.id, "desc"),
+]
 
-    Los filtros se aplican directamente en PostgreSQL antes de paginar.
 
-    La naviera y clasificación se toman únicamente del registro de
-    clasificación más reciente de cada contenedor, evitando que una
-    clasificación histórica provoque resultados incorrectos.
+def _inventory_query(site_id: int, flt: InventoryFilter):
     """
+    Construye la consulta principal del inventario.
 
-    in_yard = (in_yard or "1").strip()
-    qtext = (qtext or "").strip().upper()
-    shipping_line = (shipping_line or "").strip().upper()
-    origin = (origin or "").strip().upper()
-    size = (size or "").strip().upper()
-    classification = (classification or "").strip().upper()
-    dispatch_status = (dispatch_status or "").strip().upper()
-
-    # -----------------------------------------------------
-    # Última clasificación registrada por contenedor
-    # -----------------------------------------------------
-    classification_ranked = (
-        db.session.query(
-            ContainerClassification.container_id.label("container_id"),
-            ContainerClassification.shipping_line.label("shipping_line"),
-            ContainerClassification.final_classification.label(
-                "final_classification"
-            ),
-            db.func.row_number()
-            .over(
-                partition_by=ContainerClassification.container_id,
-                order_by=(
-                    ContainerClassification.classified_at.desc(),
-                    ContainerClassification.id.desc(),
-                ),
-            )
-            .label("row_number"),
-        )
-        .filter(
-            ContainerClassification.site_id == site_id,
-        )
-        .subquery("inventory_classification_ranked")
-    )
-
-    latest_classification = (
-        db.session.query(
-            classification_ranked.c.container_id,
-            classification_ranked.c.shipping_line,
-            classification_ranked.c.final_classification,
-        )
-        .filter(
-            classification_ranked.c.row_number == 1,
-        )
-        .subquery("inventory_latest_classification")
-    )
+    Todos los filtros de flt se aplican en PostgreSQL antes de paginar
+    o exportar (ver filters.py).
 
-    # -----------------------------------------------------
-    # Consulta base
-    # -----------------------------------------------------
+    La naviera y clasificación se toman de container_current_state
+    (última clasificación de cada contenedor, mantenida al escribir),
+    evitando que una clasificación histórica provoque resultados
+    incorrectos.
+    """
     query = (
         db.session.query(
             Container,
@@ -182,103 +146,15 @@ def _inventory_query(
             YardBay.id == ContainerPosition.bay_id,
         )
         .outerjoin(
-            latest_classification,
-            latest_classification.c.container_id == Container.id,
+            ContainerCurrentState,
+            ContainerCurrentState.container_id == Container.id,
         )
         .filter(
             Container.site_id == site_id,
         )
     )
 
-    # -----------------------------------------------------
-    # Estado dentro o fuera del patio
-    # -----------------------------------------------------
-    if in_yard == "1":
-        query = query.filter(
-            Container.is_in_yard == True  # noqa: E712
-        )
-
-    elif in_yard == "0":
-        query = query.filter(
-            Container.is_in_yard == False  # noqa: E712
-        )
-
-    # -----------------------------------------------------
-    # Código del contenedor
-    # -----------------------------------------------------
-    if qtext:
-        query = query.filter(
-            db.func.upper(
-                db.func.coalesce(Container.code, "")
-            ).like(f"%{qtext}%")
-        )
-
-    # -----------------------------------------------------
-    # Origen
-    # -----------------------------------------------------
-    if origin:
-        query = query.filter(
-            db.func.upper(
-                db.func.coalesce(
-                    Container.gate_in_origin_port,
-                    "",
-                )
-            ) == origin
-        )
-
-    # -----------------------------------------------------
-    # Tamaño
-    # -----------------------------------------------------
-    if size:
-        query = query.filter(
-            db.func.upper(
-                db.func.coalesce(Container.size, "")
-            ) == size
-        )
-
-    # -----------------------------------------------------
-    # Naviera actual
-    # -----------------------------------------------------
-    if shipping_line:
-        query = query.filter(
-            db.func.upper(
-                db.func.coalesce(
-                    latest_classification.c.shipping_line,
-                    "",
-                )
-            ) == shipping_line
-        )
-
-    # -----------------------------------------------------
-    # Clasificación actual
-    # -----------------------------------------------------
-    if classification:
-        query = query.filter(
-            db.func.upper(
-                db.func.coalesce(
-                    latest_classification.c.final_classification,
-                    "",
-                )
-            ) == classification
-        )
-
-    # -----------------------------------------------------
-    # Estado operativo actual
-    # -----------------------------------------------------
-    if dispatch_status:
-        query = query.filter(
-            db.func.upper(
-                db.func.coalesce(
-                    Container.dispatch_status,
-                    "NORMAL",
-                )
-            ) == dispatch_status
-        )
-
-    return query.order_by(
-        Container.updated_at.desc(),
-        Container.id.desc(),
-    )
+    return flt.apply(query)
 
 
 # =========================================================
@@ -290,32 +166,28 @@ def _last_classification_by_container_ids(container_ids: list[int]) -> dict[int,
     if not container_ids:
         return {}
 
-    sql = (
-        text(
-            """
-            SELECT DISTINCT ON (container_id)
-                container_id,
-                shipping_line,
-                max_gross_kg,
-                manufacture_year,
-                summary_text,
-                final_classification,
-                classified_at
-            FROM yard_gate_alamo.container_classifications
-            WHERE container_id IN :ids
-            ORDER BY container_id, classified_at DESC, id DESC
-            """
+    rows = (
+        db.session.query(
+            ContainerCurrentState.container_id,
+            ContainerCurrentState.shipping_line,
+            ContainerCurrentState.max_gross_kg,
+            ContainerCurrentState.manufacture_year,
+            ContainerCurrentState.summary_text,
+            ContainerCurrentState.final_classification,
+            ContainerCurrentState.classified_at,
+        )
+        .filter(
+            ContainerCurrentState.container_id.in_(container_ids),
+            ContainerCurrentState.classification_id.isnot(None),
         )
-        .bindparams(bindparam("ids", expanding=True))
+        .all()
     )
 
-    rows = db.session.execute(sql, {"ids": container_ids}).mappings().all()
-
-    return {int(r["container_id"]): dict(r) for r in rows}
+    return {int(r.container_id): dict(r._mapping) for r in rows}
 
 
 # =========================================================
-# Último EIR por contenedor
+# Último Gate In por contenedor
 # =========================================================
 
 def _last_gate_in_by_container_ids(container_ids: list[int]) -> dict[int, dict]:
@@ -323,25 +195,19 @@ def _last_gate_in_by_container_ids(container_ids: list[int]) -> dict[int, dict]:
     if not container_ids:
         return {}
 
-    sql = (
-        text(
-            """
-            SELECT DISTINCT ON (container_id)
-                container_id,
-                occurred_at AS gate_in_at
-            FROM yard_gate_alamo.movements
-            WHERE container_id IN :ids
-              AND movement_type = 'GATE_IN'
-              AND occurred_at IS NOT NULL
-            ORDER BY container_id, occurred_at DESC, id DESC
-            """
+    rows = (
+        db.session.query(
+            ContainerCurrentState.container_id,
+            ContainerCurrentState.last_gate_in_at.label("gate_in_at"),
         )
-        .bindparams(bindparam("ids", expanding=True))
+        .filter(
+            ContainerCurrentState.container_id.in_(container_ids),
+            ContainerCurrentState.last_gate_in_at.isnot(None),
+        )
+        .all()
     )
 
-    rows = db.session.execute(sql, {"ids": container_ids}).mappings().all()
-
-    return {int(r["container_id"]): dict(r) for r in rows}
+    return {int(r.container_id): dict(r._mapping) for r in rows}
 
 
 # =========================================================
@@ -353,61 +219,21 @@ def _last_gate_in_by_container_ids(container_ids: list[int]) -> dict[int, dict]:
 def inventory_index():
     site_id = _ensure_active_site()
 
-    in_yard = (
-        request.args.get("in_yard") or "1"
-    ).strip()
-
-    qtext = (
-        request.args.get("q") or ""
-    ).strip().upper()
-
-    shipping_line = (
-        request.args.get("shipping_line") or ""
-    ).strip().upper()
-
-    origin = (
-        request.args.get("origin") or ""
-    ).strip().upper()
-
-    size = (
-        request.args.get("size") or ""
-    ).strip().upper()
-
-    classification = (
-        request.args.get("classification") or ""
-    ).strip().upper()
-
-    dispatch_status = (
-        request.args.get("dispatch_status") or ""
-    ).strip().upper()
-
-    page = request.args.get(
-        "page",
-        1,
-        type=int,
-    )
-
-    if page < 1:
-        page = 1
+    flt = InventoryFilter.from_params(request.args)
 
     # -----------------------------------------------------
     # Consulta ya filtrada antes de paginar
     # -----------------------------------------------------
-    query = _inventory_query(
-        site_id=site_id,
-        in_yard=in_yard,
-        qtext=qtext,
-        shipping_line=shipping_line,
-        origin=origin,
-        size=size,
-        classification=classification,
-        dispatch_status=dispatch_status,
-    )
-
-    pagination = query.paginate(
-        page=page,
+    query = _inventory_query(site_id, flt)
+
+    # Keyset sobre (updated_at, id): las páginas profundas cuestan
+    # lo mismo que la primera.
+    pagination = keyset_paginate(
+        query,
+        INVENTORY_ORDER,
+        key=lambda row: (row[0].updated_at, row[0].id),
+        cursor=request.args.get("cursor"),
         per_page=50,
-        error_out=False,
     )
 
     rows = pagination.items
@@ -516,17 +342,18 @@ def inventory_index():
     shipping_lines = [
         row[0]
         for row in (
+            # Navieras actuales (ix_container_state_site_line), no
+            # todo el historial de clasificaciones.
             db.session.query(
-                ContainerClassification.shipping_line
+                ContainerCurrentState.shipping_line
             )
             .filter(
-                ContainerClassification.site_id == site_id,
-                ContainerClassification.shipping_line.isnot(None),
-                ContainerClassification.shipping_line != "",
+                ContainerCurrentState.site_id == site_id,
+                ContainerCurrentState.shipping_line != "",
             )
             .distinct()
             .order_by(
-                ContainerClassification.shipping_line.asc()
+                ContainerCurrentState.shipping_line.asc()
             )
             .all()
         )
@@ -579,18 +406,18 @@ def inventory_index():
         "inventory/index.html",
         items=items,
         pagination=pagination,
-        in_yard=in_yard,
+        in_yard=flt.in_yard,
         shipping_lines=shipping_lines,
-        shipping_line=shipping_line,
+        shipping_line=flt.shipping_line,
         origin_options=origin_options,
         size_options=size_options,
         classification_options=classification_options,
         status_options=status_options,
-        origin=origin,
-        size=size,
-        classification=classification,
-        dispatch_status=dispatch_status,
-        q=qtext,
+        origin=flt.origin,
+        size=flt.size,
+        classification=flt.classification,
+        dispatch_status=flt.dispatch_status,
+        q=flt.q,
     )
 
 
@@ -598,36 +425,20 @@ def inventory_index():
 # Exportar inventario
 # =========================================================
 
-@inventory_bp.get("/inventory/export")
-@login_required
-def inventory_export():
-    site_id = _ensure_active_site()
+INVENTORY_EXPORT_ARGS = (
+    "in_yard",
+    "q",
+    "shipping_line",
+    "origin",
+    "size",
+    "classification",
+    "dispatch_status",
+)
 
-    in_yard = (request.args.get("in_yard") or "1").strip()
-    qtext = (request.args.get("q") or "").strip().upper()
-    shipping_line = (request.args.get("shipping_line") or "").strip().upper()
-    origin = (request.args.get("origin") or "").strip().upper()
-    size = (request.args.get("size") or "").strip().upper()
-    classification_filter = (request.args.get("classification") or "").strip().upper()
-    dispatch_status_filter = (request.args.get("dispatch_status") or "").strip().upper()
-
-    rows = _inventory_query(
-        site_id,
-        in_yard,
-        qtext,
-        shipping_line,
-        origin,
-        size,
-    ).all()
 
-    container_ids = [c.id for c, _, _ in rows]
-
-    cls_by_container = _last_classification_by_container_ids(container_ids)
-    gate_in_by_container = _last_gate_in_by_container_ids(container_ids)
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Inventario"
+@register_export("INVENTORY_XLSX", label="Inventario (Excel)")
+def build_inventory_export(site_id, params) -> ExportFile:
+    flt = InventoryFilter.from_params(params)
 
     headers = [
         "ID",
@@ -647,85 +458,105 @@ def inventory_export():
         "NOTAS",
     ]
 
-    ws.append(headers)
-
-    for col_idx in range(1, len(headers) + 1):
-        cell = ws.cell(row=1, column=col_idx)
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal="center")
-
-    for c, pos, bay in rows:
-        cls = cls_by_container.get(c.id)
-        gate_in = gate_in_by_container.get(c.id)
-        gate_in_at = gate_in.get("gate_in_at") if gate_in else None
-
-        classification = ((cls.get("final_classification") if cls else "") or "").strip().upper()
-        dispatch_status = (c.dispatch_status or "NORMAL").strip().upper()
-
-        if classification_filter and classification != classification_filter:
-            continue
-
-        if dispatch_status_filter and dispatch_status != dispatch_status_filter:
-            continue
-
-        gate_in_date_str = gate_in_at.strftime("%Y-%m-%d") if gate_in_at else ""
-
-        days_in_yard = ""
-        if gate_in_at:
-            days_in_yard = (datetime.utcnow().date() - gate_in_at.date()).days
-
-        naviera = (cls.get("shipping_line") if cls else "") or ""
-        year = (cls.get("manufacture_year") if cls else c.year) or ""
-        max_gross = (cls.get("max_gross_kg") if cls else "") or ""
-        notes = (cls.get("summary_text") if cls else (c.status_notes or "")) or ""
+    writer = XlsxStreamWriter("Inventario", headers, max_width=45, bold_header=True)
+    today = datetime.utcnow().date()
+
+    def write_batch(batch):
+        container_ids = [c.id for c, _, _ in batch]
+
+        cls_by_container = _last_classification_by_container_ids(container_ids)
+        gate_in_by_container = _last_gate_in_by_container_ids(container_ids)
+
+        for c, pos, bay in batch:
+            cls = cls_by_container.get(c.id)
+            gate_in = gate_in_by_container.get(c.id)
+            gate_in_at = gate_in.get("gate_in_at") if gate_in else None
+
+            classification = ((cls.get("final_classification") if cls else "") or "").strip().upper()
+            dispatch_status = (c.dispatch_status or "NORMAL").strip().upper()
+
+            gate_in_date_str = gate_in_at.strftime("%Y-%m-%d") if gate_in_at else ""
+
+            days_in_yard = ""
+            if gate_in_at:
+                days_in_yard = (today - gate_in_at.date()).days
+
+            naviera = (cls.get("shipping_line") if cls else "") or ""
+            year = (cls.get("manufacture_year") if cls else c.year) or ""
+            max_gross = (cls.get("max_gross_kg") if cls else "") or ""
+            notes = (cls.get("summary_text") if cls else (c.status_notes or "")) or ""
+
+            writer.append([
+                c.id,
+                c.code or "",
+                c.gate_in_origin_port or "",
+                c.size or "",
+                naviera,
+                year,
+                max_gross,
+                classification,
+                gate_in_date_str,
+                days_in_yard,
+                dispatch_status,
+                (bay.code if (pos and bay) else "") or "",
+                (pos.depth_row if pos else "") or "",
+                (pos.tier if pos else "") or "",
+                notes,
+            ])
+
+    # Mismos filtros que la pantalla, en SQL: solo se leen las filas
+    # que van al archivo.
+    query = _inventory_query(site_id, flt).order_by(
+        *[
+            column.desc() if direction == "desc" else column.asc()
+            for column, direction in INVENTORY_ORDER
+        ]
+    )
 
-        ws.append([
-            c.id,
-            c.code or "",
-            c.gate_in_origin_port or "",
-            c.size or "",
-            naviera,
-            year,
-            max_gross,
-            classification,
-            gate_in_date_str,
-            days_in_yard,
-            dispatch_status,
-            (bay.code if (pos and bay) else "") or "",
-            (pos.depth_row if pos else "") or "",
-            (pos.tier if pos else "") or "",
-            notes,
-        ])
+    # Por bloques: la clasificación y el último Gate In se consultan
+    # solo para los contenedores del bloque actual.
+    try:
+        batch = []
 
-    for col_idx in range(1, len(headers) + 1):
-        col_letter = get_column_letter(col_idx)
-        max_len = 0
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            batch.append(row)
 
-        for cell in ws[col_letter]:
-            v = "" if cell.value is None else str(cell.value)
-            if len(v) > max_len:
-                max_len = len(v)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                write_batch(batch)
+                batch = []
 
-        ws.column_dimensions[col_letter].width = min(max_len + 2, 45)
+        if batch:
+            write_batch(batch)
 
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+        path = writer.close()
+    except Exception:
+        writer.discard()
+        raise
 
     tag = "ALL"
 
-    if in_yard == "1":
+    if flt.in_yard == "1":
         tag = "EN_PATIO"
-    elif in_yard == "0":
+    elif flt.in_yard == "0":
         tag = "FUERA_PATIO"
 
-    fname = f"inventario_{tag}.xlsx"
+    return ExportFile(
+        filename=f"inventario_{tag}.xlsx",
+        mimetype=XLSX_MIMETYPE,
+        path=path,
+        rows=writer.row_count,
+    )
+
 
-    return send_file(
-        bio,
-        as_attachment=True,
-        download_name=fname,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+@inventory_bp.get("/inventory/export")
+@login_required
+def inventory_export():
+    site_id = _ensure_active_site()
+
+    return export_response(
+        "INVENTORY_XLSX",
+        site_id=site_id,
+        params={key: request.args.get(key) or "" for key in INVENTORY_EXPORT_ARGS},
     )
 
 
@@ -812,9 +643,14 @@ def inventory_detail(container_id: int):
         )
 
         for ph in photos:
+            # UPLOAD_ERROR: filas históricas previas a la subida en segundo plano.
             if (ph.photo_type or "").upper() == "UPLOAD_ERROR":
                 continue
 
+            # PENDING / UPLOADING / RETRY / FAILED no tienen URL pública.
+            if (ph.status or PHOTO_STATUS_UPLOADED) != PHOTO_STATUS_UPLOADED:
+                continue
+
             url_ok = _normalize_public_url(ph.url)
 
             if not url_ok:
@@ -823,6 +659,12 @@ def inventory_detail(container_id: int):
             photos_by_mv.setdefault(ph.movement_id, []).append({
                 "photo_type": ph.photo_type,
                 "url": url_ok,
+                # La grilla usa la miniatura; el original se abre al hacer clic.
+                "thumb_url": (
+                    _normalize_public_url(ph.thumb_url)
+                    or _normalize_public_url(ph.web_url)
+                    or url_ok
+                ),
                 "uploaded_at": ph.uploaded_at,
             })
 
@@ -1200,35 +1042,62 @@ def unmark_container_evacuation(container_id: int):
     flash(f"Contenedor {c.code} volvió a Disponible.", "success")
     return redirect(url_for("inventory.inventory_index"))
 
-@inventory_bp.get("/inventory/evacuation-list")
-@login_required
-def evacuation_list():
-    site_id = _ensure_active_site()
+def _evacuation_query(site_id: int, flt: InventoryFilter):
+    """
+    Lista de evacuación (pantalla y PDF): filtrada y ordenada en SQL.
+    """
+    query = (
+        db.session.query(Container, ContainerPosition, YardBay)
+        .outerjoin(ContainerPosition, ContainerPosition.container_id == Container.id)
+        .outerjoin(YardBay, YardBay.id == ContainerPosition.bay_id)
+        .outerjoin(ContainerCurrentState, ContainerCurrentState.container_id == Container.id)
+        .filter(Container.site_id == site_id)
+    )
 
-    qtext = (request.args.get("q") or "").strip().upper()
-    size_filter = (request.args.get("size") or "").strip().upper()
-    shipping_line_filter = (request.args.get("shipping_line") or "").strip().upper()
-    destination_filter = (request.args.get("destination") or "").strip().upper()
-    type_filter = (request.args.get("evacuation_type") or "").strip().upper()
+    return flt.apply(query).order_by(*evacuation_order())
 
-    evacuation_statuses = [
-        "PARA_EVACUAR",
-        "EVACUAR_SOLICITADO",
-        "EVACUACION_MONTADA",
-    ]
+
+def _evacuation_filter_options(site_id: int) -> dict[str, list[str]]:
+    """
+    Opciones de los filtros: valores presentes en toda la lista de
+    evacuación (sin los filtros del usuario), en una sola consulta.
+    """
+    size = normalized_upper(Container.size)
+    destination = normalized_upper(Container.evacuation_destination)
+    evacuation_type = normalized_upper(Container.evacuation_type)
+    shipping_line = db.func.coalesce(ContainerCurrentState.shipping_line, "")
 
     rows = (
-        db.session.query(Container, ContainerPosition, YardBay)
-        .outerjoin(ContainerPosition, ContainerPosition.container_id == Container.id)
-        .outerjoin(YardBay, YardBay.id == ContainerPosition.bay_id)
-        .filter(
-            Container.site_id == site_id,
-            Container.is_in_yard == True,  # noqa: E712
-            db.func.coalesce(Container.dispatch_status, "NORMAL").in_(evacuation_statuses),
+        InventoryFilter.for_evacuation()
+        .apply(
+            db.session.query(size, shipping_line, destination, evacuation_type)
+            .select_from(Container)
+            .outerjoin(ContainerCurrentState, ContainerCurrentState.container_id == Container.id)
+            .filter(Container.site_id == site_id)
         )
+        .distinct()
         .all()
     )
 
+    options = {"size": set(), "shipping_line": set(), "destination": set(), "evacuation_type": set()}
+
+    for row in rows:
+        for name, value in zip(options, row):
+            if value:
+                options[name].add(value)
+
+    return {name: sorted(values) for name, values in options.items()}
+
+
+@inventory_bp.get("/inventory/evacuation-list")
+@login_required
+def evacuation_list():
+    site_id = _ensure_active_site()
+
+    flt = InventoryFilter.for_evacuation(request.args)
+
+    rows = _evacuation_query(site_id, flt).all()
+
     container_ids = [c.id for c, _, _ in rows]
     cls_by_container = _last_classification_by_container_ids(container_ids)
 
@@ -1237,28 +1106,9 @@ def evacuation_list():
     for c, pos, bay in rows:
         cls = cls_by_container.get(c.id)
 
-        code = (c.code or "").strip().upper()
         shipping_line = ((cls.get("shipping_line") if cls else "") or "").strip().upper()
-        destination = (c.evacuation_destination or "").strip().upper()
-        evacuation_type = (c.evacuation_type or "").strip().upper()
         dispatch_status = (c.dispatch_status or "NORMAL").strip().upper()
         origin = (c.gate_in_origin_port or "").strip().upper()
-        size = (c.size or "").strip().upper()
-
-        if qtext and qtext not in code:
-            continue
-
-        if size_filter and size != size_filter:
-            continue
-
-        if shipping_line_filter and shipping_line != shipping_line_filter:
-            continue
-
-        if destination_filter and destination != destination_filter:
-            continue
-
-        if type_filter and evacuation_type != type_filter:
-            continue
 
         items.append({
             "id": c.id,
@@ -1278,48 +1128,20 @@ def evacuation_list():
             },
         })
 
-    items = sorted(
-        items,
-        key=lambda x: (
-            (x.get("shipping_line") or "ZZZ").upper(),
-            (x.get("evacuation_destination") or "ZZZ").upper(),
-            (x.get("size") or "ZZZ").upper(),
-            (x.get("code") or "").upper(),
-        )
-    )
-
-    size_options = sorted({(c.size or "").strip().upper() for c, _, _ in rows if c.size})
-
-    shipping_line_options = sorted({
-        ((cls_by_container.get(c.id) or {}).get("shipping_line") or "").strip().upper()
-        for c, _, _ in rows
-        if ((cls_by_container.get(c.id) or {}).get("shipping_line") or "").strip()
-    })
-
-    destination_options = sorted({
-        (c.evacuation_destination or "").strip().upper()
-        for c, _, _ in rows
-        if (c.evacuation_destination or "").strip()
-    })
-
-    type_options = sorted({
-        (c.evacuation_type or "").strip().upper()
-        for c, _, _ in rows
-        if (c.evacuation_type or "").strip()
-    })
+    options = _evacuation_filter_options(site_id)
 
     return render_template(
         "inventory/evacuation_list.html",
         items=items,
-        q=qtext,
-        size_options=size_options,
-        shipping_line_options=shipping_line_options,
-        destination_options=destination_options,
-        type_options=type_options,
-        size_filter=size_filter,
-        shipping_line_filter=shipping_line_filter,
-        destination_filter=destination_filter,
-        type_filter=type_filter,
+        q=flt.q,
+        size_options=options["size"],
+        shipping_line_options=options["shipping_line"],
+        destination_options=options["destination"],
+        type_options=options["evacuation_type"],
+        size_filter=flt.size,
+        shipping_line_filter=flt.shipping_line,
+        destination_filter=flt.destination,
+        type_filter=flt.evacuation_type,
     )
 
 @inventory_bp.post("/inventory/<int:container_id>/evacuation-notes")
@@ -1442,6 +1264,8 @@ BULK_VALID_EVAC_TYPES = {
     "EVACUACION",
 }
 
+BULK_ENTRY_TZ = pytz.timezone("America/Costa_Rica")
+
 BULK_VALID_CLASSIFICATIONS = {
     "A+",
     "A-",
@@ -1494,6 +1318,20 @@ def _bulk_date(value):
     except Exception:
         return "INVALID"
 
+def _bulk_entry_at_utc(entry_date):
+    """
+    FECHA_INGRESO es un día de Costa Rica: se guarda como las 00:00 CR
+    en UTC naive, igual que occurred_at de los movimientos.
+    """
+    if entry_date is None:
+        return None
+
+    return (
+        BULK_ENTRY_TZ.localize(entry_date)
+        .astimezone(pytz.utc)
+        .replace(tzinfo=None)
+    )
+
 def _bulk_normalize_container_code(value):
     raw = _bulk_upper(value)
     raw = raw.replace(" ", "").replace("\t", "")
@@ -1514,7 +1352,9 @@ def _bulk_normalize_container_code(value):
 def _bulk_headers_from_sheet(ws):
     headers = {}
 
-    for idx, cell in enumerate(ws[1], start=1):
+    first_row = next(ws.iter_rows(min_row=1, max_row=1), ())
+
+    for idx, cell in enumerate(first_row, start=1):
         name = _bulk_upper(cell.value)
         if name:
             headers[name] = idx
@@ -1522,16 +1362,66 @@ def _bulk_headers_from_sheet(ws):
     return headers
 
 
-def _bulk_get(row, headers, name):
+def _bulk_get(values, headers, name):
     idx = headers.get(name)
-    if not idx:
+    # En read_only las filas pueden venir sin las celdas vacías finales.
+    if not idx or idx > len(values):
         return ""
-    return _bulk_clean(row[idx - 1].value)
+    return _bulk_clean(values[idx - 1])
+
+
+def _bulk_position_context(*, site_id: int, bay_codes) -> dict:
+    """
+    Precarga, en dos consultas, las estibas activas mencionadas en el
+    Excel y las posiciones ocupadas en ellas, para validar todas las
+    filas en memoria.
+    """
+    bay_codes = sorted({code for code in bay_codes if code})
+
+    bays_by_code = {}
+    occupied_by_bay = {}
+
+    if not bay_codes:
+        return {"bays_by_code": bays_by_code, "occupied_by_bay": occupied_by_bay}
+
+    bays = (
+        YardBay.query
+        .filter(
+            YardBay.site_id == site_id,
+            YardBay.code.in_(bay_codes),
+            YardBay.is_active.is_(True),
+        )
+        .all()
+    )
+    bays_by_code = {bay.code: bay for bay in bays}
+
+    if bays_by_code:
+        rows = db.session.execute(
+            text("""
+                SELECT p.bay_id, p.depth_row, p.tier, c.code
+                FROM yard_gate_alamo.container_positions p
+                JOIN yard_gate_alamo.containers c
+                  ON c.id = p.container_id
+                WHERE c.site_id = :site_id
+                  AND c.is_in_yard = TRUE
+                  AND p.bay_id = ANY(:bay_ids)
+                ORDER BY p.bay_id, p.depth_row, p.tier
+            """),
+            {
+                "site_id": site_id,
+                "bay_ids": [bay.id for bay in bays_by_code.values()],
+            },
+        ).all()
+
+        for bay_id, depth_row, tier, code in rows:
+            occupied_by_bay.setdefault(bay_id, {})[(depth_row, tier)] = code
+
+    return {"bays_by_code": bays_by_code, "occupied_by_bay": occupied_by_bay}
 
 
 def _bulk_validate_position(
     *,
-    site_id: int,
+    context: dict,
     container_size: str,
     bay_code: str,
     depth_row,
@@ -1554,11 +1444,7 @@ def _bulk_validate_position(
             "message": "Si se indica ubicación, ESTIBA, FILA y NIVEL deben venir completos.",
         }
 
-    bay = YardBay.query.filter_by(
-        site_id=site_id,
-        code=bay_code,
-        is_active=True,
-    ).first()
+    bay = context["bays_by_code"].get(bay_code)
 
     if not bay:
         return {
@@ -1602,65 +1488,29 @@ def _bulk_validate_position(
             "message": f"La estiba {bay.code} solo acepta contenedores de 40/45 pies.",
         }
 
-    occupied = (
-        db.session.query(Container, ContainerPosition)
-        .join(ContainerPosition, ContainerPosition.container_id == Container.id)
-        .filter(
-            Container.site_id == site_id,
-            Container.is_in_yard == True,  # noqa: E712
-            ContainerPosition.bay_id == bay.id,
-            ContainerPosition.depth_row == depth_row,
-            ContainerPosition.tier == tier,
-        )
-        .first()
-    )
+    occupied = context["occupied_by_bay"].get(bay.id, {})
+
+    occupant = occupied.get((depth_row, tier))
 
-    if occupied:
-        c, _ = occupied
+    if occupant:
         return {
             "ok": False,
-            "message": f"La posición {bay.code} F{depth_row:02d} N{tier} ya está ocupada por {c.code}.",
+            "message": f"La posición {bay.code} F{depth_row:02d} N{tier} ya está ocupada por {occupant}.",
         }
 
-    if tier > 1:
-        support = (
-            db.session.query(ContainerPosition)
-            .join(Container, Container.id == ContainerPosition.container_id)
-            .filter(
-                Container.site_id == site_id,
-                Container.is_in_yard == True,  # noqa: E712
-                ContainerPosition.bay_id == bay.id,
-                ContainerPosition.depth_row == depth_row,
-                ContainerPosition.tier == tier - 1,
-            )
-            .first()
-        )
+    if tier > 1 and (depth_row, tier - 1) not in occupied:
+        return {
+            "ok": False,
+            "message": f"No se puede colocar en N{tier} sin soporte debajo en N{tier - 1}.",
+        }
 
-        if not support:
+    for (other_row, other_tier), code in occupied.items():
+        if other_row > depth_row:
             return {
                 "ok": False,
-                "message": f"No se puede colocar en N{tier} sin soporte debajo en N{tier - 1}.",
+                "message": f"La sidepick no puede acceder a F{depth_row:02d}; bloquea {code} en F{other_row:02d} N{other_tier}.",
             }
 
-    access_blocker = (
-        db.session.query(Container, ContainerPosition)
-        .join(ContainerPosition, ContainerPosition.container_id == Container.id)
-        .filter(
-            Container.site_id == site_id,
-            Container.is_in_yard == True,  # noqa: E712
-            ContainerPosition.bay_id == bay.id,
-            ContainerPosition.depth_row > depth_row,
-        )
-        .first()
-    )
-
-    if access_blocker:
-        c, p = access_blocker
-        return {
-            "ok": False,
-            "message": f"La sidepick no puede acceder a F{depth_row:02d}; bloquea {c.code} en F{p.depth_row:02d} N{p.tier}.",
-        }
-
     return {
         "ok": True,
         "has_position": True,
@@ -1670,6 +1520,123 @@ def _bulk_validate_position(
     }
 
 
+# =========================================================
+# Carga masiva: SQL por conjuntos
+# =========================================================
+#
+# Las filas validadas se cargan con COPY en una tabla temporal
+# (app/services/bulk_import.py) y cada tabla destino recibe un solo
+# INSERT ... SELECT.
+#
+_BULK_IMPORT_COLUMNS = [
+    ("code", "text NOT NULL"),
+    ("size", "text NOT NULL"),
+    ("year", "integer"),
+    ("status_notes", "text"),
+    ("origin", "text"),
+    ("dispatch_status", "text NOT NULL"),
+    ("entry_at", "timestamp NOT NULL"),
+    ("shipping_line", "text"),
+    ("max_gross_kg", "integer"),
+    ("tare_kg", "integer"),
+    ("final_classification", "text"),
+    ("notes", "text"),
+    ("evac_destination", "text"),
+    ("evac_type", "text"),
+    ("evac_notes", "text"),
+    ("is_mounted", "boolean NOT NULL"),
+    ("bay_id", "integer"),
+    ("bay_code", "text"),
+    ("depth_row", "integer"),
+    ("tier", "integer"),
+    ("move_notes", "text NOT NULL"),
+]
+
+_BULK_INSERT_CONTAINERS_SQL = """
+    INSERT INTO yard_gate_alamo.containers (
+        site_id, code, size, year, status_notes, gate_in_origin_port,
+        is_in_yard, dispatch_status,
+        dispatch_marked_at, dispatch_marked_by_user_id,
+        evacuation_destination, evacuation_type, evacuation_notes,
+        mounted_at, mounted_by_user_id,
+        is_fils, created_at, updated_at
+    )
+    SELECT
+        :site_id, s.code, s.size, s.year, s.status_notes, s.origin,
+        TRUE, s.dispatch_status,
+        CASE WHEN s.dispatch_status = 'PARA_EVACUAR' THEN s.entry_at END,
+        CASE WHEN s.dispatch_status = 'PARA_EVACUAR' THEN :user_id END,
+        CASE WHEN s.dispatch_status = 'PARA_EVACUAR' THEN s.evac_destination END,
+        CASE WHEN s.dispatch_status = 'PARA_EVACUAR' THEN s.evac_type END,
+        CASE WHEN s.dispatch_status = 'PARA_EVACUAR' THEN s.evac_notes END,
+        CASE WHEN s.is_mounted THEN s.entry_at END,
+        CASE WHEN s.is_mounted THEN :user_id END,
+        FALSE, :now, :now
+    FROM stg_inventory_import s
+    ORDER BY s.row_no
+    RETURNING id
+"""
+
+# Las demás tablas encuentran el contenedor por (predio, código).
+_BULK_JOIN_CONTAINERS = """
+    FROM stg_inventory_import s
+    JOIN yard_gate_alamo.containers c
+      ON c.site_id = :site_id
+     AND c.code = s.code
+"""
+
+_BULK_INSERT_CLASSIFICATIONS_SQL = """
+    INSERT INTO yard_gate_alamo.container_classifications (
+        site_id, container_id, classified_at, classified_by_user_id,
+        shipping_line, max_gross_kg, tare_kg, manufacture_year,
+        needs_workshop, final_classification, summary_text, notes
+    )
+    SELECT
+        :site_id, c.id, s.entry_at, :user_id,
+        s.shipping_line, s.max_gross_kg, s.tare_kg, s.year,
+        FALSE, s.final_classification, s.notes, s.notes
+""" + _BULK_JOIN_CONTAINERS
+
+_BULK_INSERT_GATE_INS_SQL = """
+    INSERT INTO yard_gate_alamo.movements (
+        site_id, container_id, movement_type, occurred_at,
+        created_by_user_id, notes, created_at
+    )
+    SELECT
+        :site_id, c.id, 'GATE_IN', s.entry_at,
+        :user_id, 'BULK_IMPORT_GATE_IN', :now
+""" + _BULK_JOIN_CONTAINERS + """
+    ORDER BY s.row_no
+    RETURNING id
+"""
+
+_BULK_INSERT_MOVES_SQL = """
+    INSERT INTO yard_gate_alamo.movements (
+        site_id, container_id, movement_type, occurred_at,
+        bay_code, depth_row, tier,
+        created_by_user_id, notes, created_at
+    )
+    SELECT
+        :site_id, c.id, 'MOVE', s.entry_at,
+        s.bay_code, s.depth_row, s.tier,
+        :user_id, s.move_notes, :now
+""" + _BULK_JOIN_CONTAINERS + """
+    ORDER BY s.row_no
+"""
+
+_BULK_INSERT_POSITIONS_SQL = """
+    INSERT INTO yard_gate_alamo.container_positions (
+        container_id, bay_id, depth_row, tier,
+        placed_at, placed_by_user_id
+    )
+    SELECT
+        c.id, s.bay_id, s.depth_row, s.tier,
+        s.entry_at, :user_id
+""" + _BULK_JOIN_CONTAINERS + """
+    WHERE s.bay_id IS NOT NULL
+"""
+
+
 @inventory_bp.get("/inventory/bulk-upload/template")
 @login_required
 def inventory_bulk_upload_template():
@@ -1824,143 +1791,196 @@ def inventory_bulk_upload_view():
     )
 
 
-@inventory_bp.post("/inventory/bulk-upload")
-@login_required
-def inventory_bulk_upload_post():
-    site_id = _ensure_active_site()
+def _bulk_normalize_row(row_number: int, values: tuple, headers: dict) -> dict:
+    """
+    Normaliza y valida una fila sin base de datos. De nivel de módulo:
+    en archivos grandes corre en el pool de app/services/excel_ingest.py.
+    Los duplicados dentro del Excel se revisan al juntar las filas.
+    """
+    code = _bulk_normalize_container_code(_bulk_get(values, headers, "CONTENEDOR"))
+    size = _bulk_upper(_bulk_get(values, headers, "TAMAÑO"))
+    shipping_line = _bulk_upper(_bulk_get(values, headers, "NAVIERA"))
+    status_excel = _bulk_upper(_bulk_get(values, headers, "ESTADO"))
+    final_classification = _bulk_upper(_bulk_get(values, headers, "CLASIFICACION"))
+    entry_date = _bulk_date(_bulk_get(values, headers, "FECHA_INGRESO"))
 
-    file = request.files.get("file")
+    year = _bulk_int(_bulk_get(values, headers, "AÑO"))
+    max_gross_kg = _bulk_int(_bulk_get(values, headers, "MAX_GROSS"))
+    tare_kg = _bulk_int(_bulk_get(values, headers, "TARA"))
+    notes = _bulk_clean(_bulk_get(values, headers, "NOTAS"))
+    origin = _bulk_upper(_bulk_get(values, headers, "ORIGEN"))
 
-    if not file or not file.filename:
-        flash("Debe seleccionar un archivo Excel.", "warning")
-        return redirect(url_for("inventory.inventory_bulk_upload_view"))
+    bay_code = _bulk_upper(_bulk_get(values, headers, "ESTIBA"))
+    depth_row = _bulk_int(_bulk_get(values, headers, "FILA"))
+    tier = _bulk_int(_bulk_get(values, headers, "NIVEL"))
 
-    if not file.filename.lower().endswith((".xlsx", ".xlsm")):
-        flash("El archivo debe ser .xlsx o .xlsm.", "danger")
-        return redirect(url_for("inventory.inventory_bulk_upload_view"))
+    evac_destination = _bulk_upper(_bulk_get(values, headers, "DESTINO_EVACUACION"))
+    evac_type = _bulk_upper(_bulk_get(values, headers, "TIPO_EVACUACION"))
+    evac_notes = _bulk_clean(_bulk_get(values, headers, "OBS_EVACUACION"))
 
-    try:
-        wb = openpyxl.load_workbook(file, data_only=True)
-    except Exception:
-        flash("No se pudo leer el archivo Excel.", "danger")
-        return redirect(url_for("inventory.inventory_bulk_upload_view"))
+    row_errors = []
 
-    ws = wb["DATOS"] if "DATOS" in wb.sheetnames else wb.active
+    if not code:
+        row_errors.append("CONTENEDOR es obligatorio.")
 
-    headers = _bulk_headers_from_sheet(ws)
-    missing = sorted(BULK_REQUIRED_HEADERS - set(headers.keys()))
+    if not size:
+        row_errors.append("TAMAÑO es obligatorio.")
+    elif size not in BULK_VALID_SIZES:
+        row_errors.append(f"Tamaño inválido: {size}.")
 
-    if missing:
-        return render_template(
-            "inventory/bulk_upload.html",
-            result=None,
-            errors=[
-                {
-                    "row": 1,
-                    "container": "—",
-                    "message": f"Faltan columnas obligatorias: {', '.join(missing)}",
-                }
-            ],
+    if not shipping_line:
+        row_errors.append("NAVIERA es obligatoria.")
+
+    if not status_excel:
+        row_errors.append("ESTADO es obligatorio.")
+
+    dispatch_status = BULK_STATUS_MAP.get(status_excel)
+
+    if not dispatch_status:
+        row_errors.append(f"Estado inválido: {status_excel}.")
+
+    if final_classification and final_classification not in BULK_VALID_CLASSIFICATIONS:
+        row_errors.append(
+            f"CLASIFICACION inválida: {final_classification}. "
+            "Valores permitidos: A+, A-, B+, B-, C, A2, B2, CHATARRA."
         )
 
-    errors = []
-    parsed_rows = []
-    seen_codes = set()
+    if entry_date == "INVALID":
+        row_errors.append(
+            "FECHA_INGRESO inválida. Use formato YYYY-MM-DD, ejemplo: 2026-06-29."
+        )
 
-    for row_number, row in enumerate(ws.iter_rows(min_row=2), start=2):
-        raw_values = [cell.value for cell in row]
+    if year is not None and (year < 1980 or year > 2100):
+        row_errors.append(f"Año inválido: {year}.")
 
-        if all(v is None or str(v).strip() == "" for v in raw_values):
-            continue
+    if max_gross_kg is not None and max_gross_kg <= 0:
+        row_errors.append("MAX_GROSS debe ser mayor a 0.")
 
-        code = _bulk_normalize_container_code(_bulk_get(row, headers, "CONTENEDOR"))
-        size = _bulk_upper(_bulk_get(row, headers, "TAMAÑO"))
-        shipping_line = _bulk_upper(_bulk_get(row, headers, "NAVIERA"))
-        status_excel = _bulk_upper(_bulk_get(row, headers, "ESTADO"))
-        final_classification = _bulk_upper(_bulk_get(row, headers, "CLASIFICACION"))
-        entry_date = _bulk_date(_bulk_get(row, headers, "FECHA_INGRESO"))
+    if tare_kg is not None and tare_kg <= 0:
+        row_errors.append("TARA debe ser mayor a 0.")
 
-        year = _bulk_int(_bulk_get(row, headers, "AÑO"))
-        max_gross_kg = _bulk_int(_bulk_get(row, headers, "MAX_GROSS"))
-        tare_kg = _bulk_int(_bulk_get(row, headers, "TARA"))
-        notes = _bulk_clean(_bulk_get(row, headers, "NOTAS"))
-        origin = _bulk_upper(_bulk_get(row, headers, "ORIGEN"))
+    if origin and origin not in {"LIMON", "CALDERA"}:
+        row_errors.append(f"ORIGEN inválido: {origin}. Debe ser LIMON, CALDERA o vacío.")
 
-        bay_code = _bulk_upper(_bulk_get(row, headers, "ESTIBA"))
-        depth_row = _bulk_int(_bulk_get(row, headers, "FILA"))
-        tier = _bulk_int(_bulk_get(row, headers, "NIVEL"))
+    if evac_type and evac_type not in BULK_VALID_EVAC_TYPES:
+        row_errors.append(f"TIPO_EVACUACION inválido: {evac_type}.")
 
-        evac_destination = _bulk_upper(_bulk_get(row, headers, "DESTINO_EVACUACION"))
-        evac_type = _bulk_upper(_bulk_get(row, headers, "TIPO_EVACUACION"))
-        evac_notes = _bulk_clean(_bulk_get(row, headers, "OBS_EVACUACION"))
+    return {
+        "row_number": row_number,
+        "row_errors": row_errors,
+        "code": code,
+        "size": size,
+        "shipping_line": shipping_line,
+        "dispatch_status": dispatch_status,
+        "year": year,
+        "max_gross_kg": max_gross_kg,
+        "tare_kg": tare_kg,
+        "notes": notes,
+        "origin": origin,
+        "final_classification": final_classification,
+        "entry_date": entry_date,
+        "bay_code": bay_code,
+        "depth_row": depth_row,
+        "tier": tier,
+        "evac_destination": evac_destination,
+        "evac_type": evac_type,
+        "evac_notes": evac_notes,
+        "is_mounted_status": dispatch_status in {
+            "DESPACHO_MONTADO",
+            "EVACUACION_MONTADA",
+        },
+    }
 
-        row_errors = []
 
-        if not code:
-            row_errors.append("CONTENEDOR es obligatorio.")
+def _bulk_parse_workbook(file_stream, progress=None) -> dict:
+    """
+    Lee el Excel de inventario (streaming) y valida lo que no necesita
+    la base de datos. Devuelve {"candidates": [...]}, serializable a
+    JSON para la sesión de carga (app/services/import_sessions.py).
+    """
+    try:
+        wb = open_workbook(file_stream)
+    except Exception as exc:
+        raise ImportAbort("No se pudo leer el archivo Excel.") from exc
 
-        if not size:
-            row_errors.append("TAMAÑO es obligatorio.")
-        elif size not in BULK_VALID_SIZES:
-            row_errors.append(f"Tamaño inválido: {size}.")
+    try:
+        ws = wb["DATOS"] if "DATOS" in wb.sheetnames else wb.active
 
-        if not shipping_line:
-            row_errors.append("NAVIERA es obligatoria.")
+        headers = _bulk_headers_from_sheet(ws)
+        missing = sorted(BULK_REQUIRED_HEADERS - set(headers.keys()))
 
-        if not status_excel:
-            row_errors.append("ESTADO es obligatorio.")
+        if missing:
+            raise ImportAbort(f"Faltan columnas obligatorias: {', '.join(missing)}")
 
-        dispatch_status = BULK_STATUS_MAP.get(status_excel)
+        candidates = []
+        seen_codes = set()
 
-        if not dispatch_status:
-            row_errors.append(f"Estado inválido: {status_excel}.")
+        for _, candidate in map_rows(
+            partial(_bulk_normalize_row, headers=headers),
+            iter_sheet_rows(ws),
+            total=sheet_row_estimate(ws),
+            progress=progress,
+        ):
+            code = candidate["code"]
 
-        if final_classification and final_classification not in BULK_VALID_CLASSIFICATIONS:
-            row_errors.append(
-                f"CLASIFICACION inválida: {final_classification}. "
-                "Valores permitidos: A+, A-, B+, B-, C, A2, B2, CHATARRA."
-            )
+            if code in seen_codes:
+                candidate["row_errors"].append(f"El contenedor {code} está duplicado dentro del Excel.")
 
-        if entry_date == "INVALID":
-            row_errors.append(
-                "FECHA_INGRESO inválida. Use formato YYYY-MM-DD, ejemplo: 2026-06-29."
-            )
+            if code:
+                seen_codes.add(code)
 
-        if code in seen_codes:
-            row_errors.append(f"El contenedor {code} está duplicado dentro del Excel.")
+            candidates.append(candidate)
 
-        if code:
-            seen_codes.add(code)
+    finally:
+        wb.close()
 
-            exists = Container.query.filter_by(
-                site_id=site_id,
-                code=code,
-            ).first()
+    return {"candidates": candidates}
 
-            if exists:
-                row_errors.append(f"El contenedor {code} ya existe en este predio.")
 
-        if year is not None and (year < 1980 or year > 2100):
-            row_errors.append(f"Año inválido: {year}.")
+def _bulk_validate_candidates(*, site_id: int, candidates: list[dict]) -> dict:
+    """
+    Valida contra la base de datos con consultas por conjunto (códigos
+    existentes, estibas, ocupación) y arma las filas de staging.
 
-        if max_gross_kg is not None and max_gross_kg <= 0:
-            row_errors.append("MAX_GROSS debe ser mayor a 0.")
+    Devuelve {"errors", "staged", "positioned", "pending_location",
+    "mounted"}; con errores no se debe cargar nada.
+    """
+    codes = sorted({item["code"] for item in candidates if item["code"]})
+    existing_codes = set()
+
+    if codes:
+        existing_codes = set(
+            db.session.execute(
+                text("""
+                    SELECT code
+                    FROM yard_gate_alamo.containers
+                    WHERE site_id = :site_id
+                      AND code = ANY(:codes)
+                """),
+                {"site_id": site_id, "codes": codes},
+            ).scalars()
+        )
 
-        if tare_kg is not None and tare_kg <= 0:
-            row_errors.append("TARA debe ser mayor a 0.")
+    position_context = _bulk_position_context(
+        site_id=site_id,
+        bay_codes=[
+            item["bay_code"]
+            for item in candidates
+            if not item["is_mounted_status"]
+        ],
+    )
 
-        if origin and origin not in {"LIMON", "CALDERA"}:
-            row_errors.append(f"ORIGEN inválido: {origin}. Debe ser LIMON, CALDERA o vacío.")
+    errors = []
+    staged = []
+    counts = {"positioned": 0, "pending_location": 0, "mounted": 0}
 
-        if evac_type and evac_type not in BULK_VALID_EVAC_TYPES:
-            row_errors.append(f"TIPO_EVACUACION inválido: {evac_type}.")
+    for item in candidates:
+        row_errors = list(item["row_errors"])
 
-        is_mounted_status = dispatch_status in {
-            "DESPACHO_MONTADO",
-            "EVACUACION_MONTADA",
-        }
+        if item["code"] in existing_codes:
+            row_errors.append(f"El contenedor {item['code']} ya existe en este predio.")
 
-        position_result = {
+        position = {
             "ok": True,
             "has_position": False,
             "bay": None,
@@ -1968,237 +1988,253 @@ def inventory_bulk_upload_post():
             "tier": None,
         }
 
-        if not is_mounted_status:
-            position_result = _bulk_validate_position(
-                site_id=site_id,
-                container_size=size,
-                bay_code=bay_code,
-                depth_row=depth_row,
-                tier=tier,
+        if not item["is_mounted_status"]:
+            position = _bulk_validate_position(
+                context=position_context,
+                container_size=item["size"],
+                bay_code=item["bay_code"],
+                depth_row=item["depth_row"],
+                tier=item["tier"],
             )
 
-            if not position_result.get("ok"):
-                row_errors.append(position_result.get("message") or "Ubicación inválida.")
+            if not position.get("ok"):
+                row_errors.append(position.get("message") or "Ubicación inválida.")
 
         if row_errors:
             for msg in row_errors:
                 errors.append({
-                    "row": row_number,
-                    "container": code or "—",
+                    "row": item["row_number"],
+                    "container": item["code"] or "—",
                     "message": msg,
                 })
             continue
 
-        parsed_rows.append({
-            "row_number": row_number,
-            "code": code,
-            "size": size,
-            "shipping_line": shipping_line,
-            "dispatch_status": dispatch_status,
-            "year": year,
-            "max_gross_kg": max_gross_kg,
-            "tare_kg": tare_kg,
-            "notes": notes,
-            "origin": origin,
-            "final_classification": final_classification,
-            "entry_date": entry_date,
-            "position": position_result,
-            "evac_destination": evac_destination,
-            "evac_type": evac_type,
-            "evac_notes": evac_notes,
-            "is_mounted_status": is_mounted_status,
+        has_position = bool(position.get("has_position"))
+        bay = position.get("bay")
+
+        if item["is_mounted_status"]:
+            move_notes = f"BULK_IMPORT_{item['dispatch_status']}_WITHOUT_POSITION"
+            counts["mounted"] += 1
+        elif has_position:
+            move_notes = "BULK_IMPORT_PLACED_WITH_POSITION"
+            counts["positioned"] += 1
+        else:
+            move_notes = "BULK_IMPORT_PENDING_LOCATION"
+            counts["pending_location"] += 1
+
+        staged.append({
+            "row_no": item["row_number"],
+            "code": item["code"],
+            "size": item["size"],
+            "year": item["year"],
+            "status_notes": None if has_position else "PENDIENTE_UBICAR_EN_PATIO",
+            "origin": item["origin"] or None,
+            "dispatch_status": item["dispatch_status"],
+            "entry_at": _bulk_entry_at_utc(item["entry_date"]),
+            "shipping_line": item["shipping_line"],
+            "max_gross_kg": item["max_gross_kg"],
+            "tare_kg": item["tare_kg"],
+            "final_classification": item["final_classification"] or None,
+            "notes": item["notes"] or None,
+            "evac_destination": item["evac_destination"] or None,
+            "evac_type": item["evac_type"] or None,
+            "evac_notes": item["evac_notes"] or None,
+            "is_mounted": item["is_mounted_status"],
+            "bay_id": bay.id if has_position else None,
+            "bay_code": bay.code if has_position else None,
+            "depth_row": position["depth_row"] if has_position else None,
+            "tier": position["tier"] if has_position else None,
+            "move_notes": move_notes,
         })
 
-    if errors:
-        db.session.rollback()
+    return {"errors": errors, "staged": staged, **counts}
 
-        return render_template(
-            "inventory/bulk_upload.html",
-            result={
-                "ok": False,
-                "created": 0,
-                "validated": len(parsed_rows),
-                "errors_count": len(errors),
-            },
-            errors=errors,
-        )
 
-    created_count = 0
-    positioned_count = 0
-    pending_location_count = 0
-    mounted_count = 0
-    BATCH_SIZE = 50
+def _bulk_apply(*, staged: list[dict], site_id: int, user_id: int) -> int:
+    """
+    Staging + INSERT por conjuntos. No hace COMMIT. Devuelve los
+    contenedores creados.
+    """
+    if not staged:
+        return 0
 
-    try:
-        for item in parsed_rows:
-            position = item["position"]
-            has_position = bool(position.get("has_position"))
-            entry_at = item["entry_date"] or datetime.utcnow()
-
-            status_notes = None
-
-            if not has_position:
-                status_notes = "PENDIENTE_UBICAR_EN_PATIO"
-
-            c = Container(
-                site_id=site_id,
-                code=item["code"],
-                size=item["size"],
-                year=item["year"],
-                status_notes=status_notes,
-                gate_in_origin_port=item["origin"] or None,
-                is_in_yard=True,
-                dispatch_status=item["dispatch_status"],
-            )
+    now = datetime.utcnow()
 
-            if item["dispatch_status"] == "PARA_EVACUAR":
-                c.dispatch_marked_at = entry_at
-                c.dispatch_marked_by_user_id = current_user.id
-                c.evacuation_destination = item["evac_destination"] or None
-                c.evacuation_type = item["evac_type"] or None
-                c.evacuation_notes = item["evac_notes"] or None
+    for row in staged:
+        row["entry_at"] = row["entry_at"] or now
 
-            if item["dispatch_status"] in {"DESPACHO_MONTADO", "EVACUACION_MONTADA"}:
-                c.mounted_at = entry_at
-                c.mounted_by_user_id = current_user.id
+    stage_rows("stg_inventory_import", _BULK_IMPORT_COLUMNS, staged)
 
-            db.session.add(c)
-            db.session.flush([c])
+    params = {
+        "site_id": site_id,
+        "user_id": user_id,
+        "now": now,
+    }
 
-            db.session.add(
-                ContainerClassification(
-                    site_id=site_id,
-                    container_id=c.id,
-                    classified_at=entry_at,
-                    classified_by_user_id=current_user.id,
-                    shipping_line=item["shipping_line"],
-                    max_gross_kg=item["max_gross_kg"],
-                    tare_kg=item["tare_kg"],
-                    manufacture_year=item["year"],
-                    needs_workshop=False,
-                    final_classification=item["final_classification"] or None,
-                    summary_text=item["notes"] or None,
-                    notes=item["notes"] or None,
-                )
-            )
+    container_ids = execute(_BULK_INSERT_CONTAINERS_SQL, params).scalars().all()
 
-            db.session.add(
-                Movement(
-                    site_id=site_id,
-                    container_id=c.id,
-                    movement_type="GATE_IN",
-                    occurred_at=entry_at,
-                    bay_code=None,
-                    depth_row=None,
-                    tier=None,
-                    created_by_user_id=current_user.id,
-                    notes="BULK_IMPORT_GATE_IN",
-                )
-            )
+    execute(_BULK_INSERT_CLASSIFICATIONS_SQL, params)
+    gate_in_ids = execute(_BULK_INSERT_GATE_INS_SQL, params).scalars().all()
+    execute(_BULK_INSERT_MOVES_SQL, params)
+    execute(_BULK_INSERT_POSITIONS_SQL, params)
 
-            if item["is_mounted_status"]:
-                mounted_count += 1
-
-                db.session.add(
-                    Movement(
-                        site_id=site_id,
-                        container_id=c.id,
-                        movement_type="MOVE",
-                        occurred_at=entry_at,
-                        bay_code=None,
-                        depth_row=None,
-                        tier=None,
-                        created_by_user_id=current_user.id,
-                        notes=f"BULK_IMPORT_{item['dispatch_status']}_WITHOUT_POSITION",
-                    )
-                )
+    # SQL directo: los derivados (estado actual, enlaces,
+    # movement_facts) se refrescan en el COMMIT.
+    mark_containers_touched(container_ids)
+    mark_movements_touched(gate_in_ids)
 
-            elif has_position:
-                bay = position["bay"]
-                depth_row = position["depth_row"]
-                tier = position["tier"]
-
-                db.session.add(
-                    ContainerPosition(
-                        container_id=c.id,
-                        bay_id=bay.id,
-                        depth_row=depth_row,
-                        tier=tier,
-                        placed_at=entry_at,
-                        placed_by_user_id=current_user.id,
-                    )
-                )
+    return len(container_ids)
 
-                db.session.add(
-                    Movement(
-                        site_id=site_id,
-                        container_id=c.id,
-                        movement_type="MOVE",
-                        occurred_at=entry_at,
-                        bay_code=bay.code,
-                        depth_row=depth_row,
-                        tier=tier,
-                        created_by_user_id=current_user.id,
-                        notes="BULK_IMPORT_PLACED_WITH_POSITION",
-                    )
-                )
 
-                positioned_count += 1
+def _bulk_preview(payload: dict, ctx) -> dict:
+    """
+    Simulación de la carga de inventario. Todo o nada: con un solo
+    error no se puede confirmar.
+    """
+    candidates = payload["candidates"]
 
-            else:
-                db.session.add(
-                    Movement(
-                        site_id=site_id,
-                        container_id=c.id,
-                        movement_type="MOVE",
-                        occurred_at=entry_at,
-                        bay_code=None,
-                        depth_row=None,
-                        tier=None,
-                        created_by_user_id=current_user.id,
-                        notes="BULK_IMPORT_PENDING_LOCATION",
-                    )
-                )
+    ctx.progress("Validando", 0, len(candidates), force=True)
 
-                pending_location_count += 1
+    checked = _bulk_validate_candidates(site_id=ctx.site_id, candidates=candidates)
+    errors = checked["errors"]
+    rows_with_errors = {error["row"] for error in errors}
+    staged_by_row = {row["row_no"]: row for row in checked["staged"]}
 
-            created_count += 1
+    rows = []
 
-            if created_count % BATCH_SIZE == 0:
-                db.session.commit()
+    for item in candidates:
+        row_number = item["row_number"]
 
-        db.session.commit()
+        if row_number in rows_with_errors:
+            rows.append({
+                "row": row_number,
+                "action": "ERROR",
+                "key": item["code"] or "—",
+                "detail": "; ".join(
+                    error["message"] for error in errors if error["row"] == row_number
+                ),
+            })
+            continue
 
-    except Exception as exc:
-        db.session.rollback()
+        staged = staged_by_row[row_number]
 
-        return render_template(
-            "inventory/bulk_upload.html",
-            result=None,
-            errors=[
-                {
-                    "row": "—",
-                    "container": "—",
-                    "message": f"Error general importando archivo: {str(exc)}",
-                }
-            ],
-        )
+        if staged["is_mounted"]:
+            detail = f"Ingresa {item['dispatch_status']} sin ubicación"
+        elif staged["bay_code"]:
+            detail = f"Ingresa en {staged['bay_code']} F{staged['depth_row']:02d} N{staged['tier']}"
+        else:
+            detail = "Ingresa pendiente de ubicar"
 
-    flash(f"Carga masiva completada. {created_count} contenedores creados.", "success")
+        rows.append({
+            "row": row_number,
+            "action": "CREATE",
+            "key": item["code"],
+            "detail": detail,
+        })
 
-    return render_template(
-        "inventory/bulk_upload.html",
-        result={
-            "ok": True,
-            "created": created_count,
-            "positioned": positioned_count,
-            "pending_location": pending_location_count,
-            "mounted": mounted_count,
-            "errors_count": 0,
+    created = 0
+
+    if not errors and checked["staged"]:
+        # Mismo SQL que la carga real; la sesión hace ROLLBACK.
+        ctx.progress("Simulando carga", 0, len(checked["staged"]), force=True)
+        created = _bulk_apply(staged=checked["staged"], site_id=ctx.site_id, user_id=ctx.user_id)
+
+    return build_preview(
+        summary={
+            "created": created,
+            "validated": len(checked["staged"]),
+            "positioned": checked["positioned"],
+            "pending_location": checked["pending_location"],
+            "mounted": checked["mounted"],
         },
-        errors=[],
+        rows=rows,
+        errors=[
+            {"row": error["row"], "message": f"{error['container']}: {error['message']}"}
+            for error in errors
+        ],
+        total_rows=len(candidates),
+        can_commit=not errors and bool(checked["staged"]),
     )
 
+
+def _bulk_commit(payload: dict, ctx) -> dict:
+    """
+    Vuelve a validar (el patio pudo cambiar desde la simulación) y
+    aplica. No hace COMMIT.
+    """
+    candidates = payload["candidates"]
+
+    ctx.progress("Validando", 0, len(candidates), force=True)
+
+    checked = _bulk_validate_candidates(site_id=ctx.site_id, candidates=candidates)
+
+    if checked["errors"]:
+        first = checked["errors"][0]
+        raise ImportAbort(
+            "El inventario cambió desde la simulación; no se cargó nada. "
+            f"Fila {first['row']} ({first['container']}): {first['message']} "
+            f"Total de errores: {len(checked['errors'])}."
+        )
+
+    ctx.progress("Cargando contenedores", 0, len(checked["staged"]), force=True)
+
+    created = _bulk_apply(staged=checked["staged"], site_id=ctx.site_id, user_id=ctx.user_id)
+
+    return {
+        "ok": True,
+        "created": created,
+        "positioned": checked["positioned"],
+        "pending_location": checked["pending_location"],
+        "mounted": checked["mounted"],
+        "errors_count": 0,
+    }
+
+
+register_import(
+    "INVENTORY",
+    label="Carga masiva de inventario",
+    parse=lambda stream, ctx: _bulk_parse_workbook(stream, ctx.progress),
+    preview=_bulk_preview,
+    commit=_bulk_commit,
+    upload_endpoint="inventory.inventory_bulk_upload_view",
+)
+
+
+@inventory_bp.post("/inventory/bulk-upload")
+@login_required
+def inventory_bulk_upload_post():
+    """
+    Recibe el Excel y abre una sesión de carga: la simulación (qué
+    contenedores ingresan y errores por fila) y la carga confirmada
+    corren en segundo plano.
+    """
+    site_id = _ensure_active_site()
+
+    file = request.files.get("file")
+
+    if not file or not file.filename:
+        flash("Debe seleccionar un archivo Excel.", "warning")
+        return redirect(url_for("inventory.inventory_bulk_upload_view"))
+
+    if not file.filename.lower().endswith((".xlsx", ".xlsm")):
+        flash("El archivo debe ser .xlsx o .xlsm.", "danger")
+        return redirect(url_for("inventory.inventory_bulk_upload_view"))
+
+    try:
+        import_session = create_import_session(
+            "INVENTORY",
+            file_storage=file,
+            site_id=site_id,
+            user_id=current_user.id,
+        )
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("INVENTORY_BULK_UPLOAD_FAILED")
+        flash("No se pudo recibir el archivo Excel.", "danger")
+        return redirect(url_for("inventory.inventory_bulk_upload_view"))
+
+    return redirect(url_for("yard.import_session_view", session_id=import_session.id))
+
 @inventory_bp.post("/inventory/<int:container_id>/update-gate-in-origin")
 @login_required
 def update_gate_in_origin(container_id: int):
@@ -2233,34 +2269,17 @@ def update_gate_in_origin(container_id: int):
     flash("Origen de ingreso actualizado.", "success")
     return redirect(url_for("inventory.inventory_detail", container_id=c.id))
 
-@inventory_bp.get("/inventory/evacuation-list/pdf")
-@login_required
-def evacuation_list_pdf():
-    site_id = _ensure_active_site()
+EVACUATION_LIST_ARGS = ("q", "size", "shipping_line", "destination", "evacuation_type")
 
-    qtext = (request.args.get("q") or "").strip().upper()
-    size_filter = (request.args.get("size") or "").strip().upper()
-    shipping_line_filter = (request.args.get("shipping_line") or "").strip().upper()
-    destination_filter = (request.args.get("destination") or "").strip().upper()
-    type_filter = (request.args.get("evacuation_type") or "").strip().upper()
+# Subir al cambiar el dibujo del PDF (invalida la caché)
+EVACUATION_PDF_VERSION = 1
 
-    evacuation_statuses = [
-        "PARA_EVACUAR",
-        "EVACUAR_SOLICITADO",
-        "EVACUACION_MONTADA",
-    ]
 
-    rows = (
-        db.session.query(Container, ContainerPosition, YardBay)
-        .outerjoin(ContainerPosition, ContainerPosition.container_id == Container.id)
-        .outerjoin(YardBay, YardBay.id == ContainerPosition.bay_id)
-        .filter(
-            Container.site_id == site_id,
-            Container.is_in_yard == True,  # noqa: E712
-            db.func.coalesce(Container.dispatch_status, "NORMAL").in_(evacuation_statuses),
-        )
-        .all()
-    )
+@register_export("EVACUATION_PDF", label="Lista de vacíos / evacuación (PDF)")
+def build_evacuation_list_pdf(site_id, params) -> ExportFile:
+    flt = InventoryFilter.for_evacuation(params)
+
+    rows = _evacuation_query(site_id, flt).all()
 
     container_ids = [c.id for c, _, _ in rows]
     cls_by_container = _last_classification_by_container_ids(container_ids)
@@ -2270,7 +2289,6 @@ def evacuation_list_pdf():
     for c, pos, bay in rows:
         cls = cls_by_container.get(c.id)
 
-        code = (c.code or "").strip().upper()
         shipping_line = ((cls.get("shipping_line") if cls else "") or "").strip().upper()
         destination = (c.evacuation_destination or "").strip().upper()
         evacuation_type = (c.evacuation_type or "").strip().upper()
@@ -2278,21 +2296,6 @@ def evacuation_list_pdf():
         origin = (c.gate_in_origin_port or "").strip().upper()
         size = (c.size or "").strip().upper()
 
-        if qtext and qtext not in code:
-            continue
-
-        if size_filter and size != size_filter:
-            continue
-
-        if shipping_line_filter and shipping_line != shipping_line_filter:
-            continue
-
-        if destination_filter and destination != destination_filter:
-            continue
-
-        if type_filter and evacuation_type != type_filter:
-            continue
-
         position_txt = "—"
         if pos:
             position_txt = f"{bay.code if bay else ''} F{int(pos.depth_row):02d} N{pos.tier}"
@@ -2320,108 +2323,120 @@ def evacuation_list_pdf():
             c.evacuation_notes or "",
         ])
 
-    items = sorted(
-        items,
-        key=lambda x: (
-            (x[3] or "ZZZ").upper(),  # Naviera
-            (x[4] or "ZZZ").upper(),  # Destino
-            (x[2] or "ZZZ").upper(),  # Tamaño
-            (x[0] or "").upper(),     # Contenedor
+    # Mismas filas y filtros → mismo PDF (app/services/pdf_cache.py)
+    def render() -> bytes:
+        bio = BytesIO()
+
+        doc = SimpleDocTemplate(
+            bio,
+            pagesize=landscape(letter),
+            rightMargin=12,
+            leftMargin=12,
+            topMargin=14,
+            bottomMargin=14,
         )
-    )
 
-    bio = BytesIO()
+        styles = getSampleStyleSheet()
+        elements = []
 
-    doc = SimpleDocTemplate(
-        bio,
-        pagesize=landscape(letter),
-        rightMargin=12,
-        leftMargin=12,
-        topMargin=14,
-        bottomMargin=14,
-    )
+        title = Paragraph("<b>Lista de Vacíos / Evacuación</b>", styles["Title"])
+        elements.append(title)
 
-    styles = getSampleStyleSheet()
-    elements = []
+        printed_at = datetime.now().strftime("%d/%m/%Y %I:%M:%S %p")
 
-    title = Paragraph("<b>Lista de Vacíos / Evacuación</b>", styles["Title"])
-    elements.append(title)
+        elements.append(
+            Paragraph(
+                f'<para alignment="right"><font size="8"><b>Impreso:</b> {printed_at}</font></para>',
+                styles["Normal"],
+            )
+        )
 
-    printed_at = datetime.now().strftime("%d/%m/%Y %I:%M:%S %p")
+        filters_txt = (
+            f"Buscar: {flt.q or 'Todos'} | "
+            f"Tamaño: {flt.size or 'Todos'} | "
+            f"Naviera: {flt.shipping_line or 'Todas'} | "
+            f"Destino: {flt.destination or 'Todos'} | "
+            f"Tipo: {flt.evacuation_type or 'Todos'}"
+        )
 
-    elements.append(
-        Paragraph(
-            f'<para alignment="right"><font size="8"><b>Impreso:</b> {printed_at}</font></para>',
-            styles["Normal"],
+        elements.append(Paragraph(filters_txt, styles["Normal"]))
+        elements.append(Spacer(1, 8))
+
+        table_data = [[
+            "Contenedor",
+            "Origen",
+            "Tamaño",
+            "Naviera",
+            "Destino",
+            "Tipo",
+            "Estado",
+            "Posición",
+            "Marcado",
+            "Notas",
+        ]]
+
+        table_data.extend(items)
+
+        if len(table_data) == 1:
+            table_data.append(["—", "—", "—", "—", "—", "—", "—", "—", "—", "Sin registros"])
+
+        table = Table(
+            table_data,
+            repeatRows=1,
+            colWidths=[78, 52, 48, 55, 82, 44, 60, 62, 92, 180],
         )
-    )
 
-    filters_txt = (
-        f"Buscar: {qtext or 'Todos'} | "
-        f"Tamaño: {size_filter or 'Todos'} | "
-        f"Naviera: {shipping_line_filter or 'Todas'} | "
-        f"Destino: {destination_filter or 'Todos'} | "
-        f"Tipo: {type_filter or 'Todos'}"
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#0F3B63")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 7),
+            ("FONTSIZE", (0, 1), (-1, -1), 6.4),
+            ("GRID", (0, 0), (-1, -1), 0.35, colors.HexColor("#CBD5E1")),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#F8FAFC")]),
+            ("LEFTPADDING", (0, 0), (-1, -1), 3),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 3),
+            ("TOPPADDING", (0, 0), (-1, -1), 4),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+        ]))
+
+        elements.append(table)
+        doc.build(elements)
+
+        return bio.getvalue()
+
+    pdf_bytes = cached_pdf(
+        "EVACUATION",
+        EVACUATION_PDF_VERSION,
+        {
+            "site_id": site_id,
+            "filters": asdict(flt),
+            "rows": items,
+        },
+        render,
     )
 
-    elements.append(Paragraph(filters_txt, styles["Normal"]))
-    elements.append(Spacer(1, 8))
-
-    table_data = [[
-        "Contenedor",
-        "Origen",
-        "Tamaño",
-        "Naviera",
-        "Destino",
-        "Tipo",
-        "Estado",
-        "Posición",
-        "Marcado",
-        "Notas",
-    ]]
-
-    table_data.extend(items)
-
-    if len(table_data) == 1:
-        table_data.append(["—", "—", "—", "—", "—", "—", "—", "—", "—", "Sin registros"])
-
-    table = Table(
-        table_data,
-        repeatRows=1,
-        colWidths=[78, 52, 48, 55, 82, 44, 60, 62, 92, 180],
+    return ExportFile(
+        filename="lista_vacios_evacuacion.pdf",
+        mimetype="application/pdf",
+        data=BytesIO(pdf_bytes),
+        rows=len(items),
+        inline=True,
     )
 
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#0F3B63")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, 0), 7),
-        ("FONTSIZE", (0, 1), (-1, -1), 6.4),
-        ("GRID", (0, 0), (-1, -1), 0.35, colors.HexColor("#CBD5E1")),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#F8FAFC")]),
-        ("LEFTPADDING", (0, 0), (-1, -1), 3),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 3),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
 
-    bio.seek(0)
+@inventory_bp.get("/inventory/evacuation-list/pdf")
+@login_required
+def evacuation_list_pdf():
+    site_id = _ensure_active_site()
 
-    response = send_file(
-        bio,
-        as_attachment=False,
-        download_name="lista_vacios_evacuacion.pdf",
-        mimetype="application/pdf",
+    return export_response(
+        "EVACUATION_PDF",
+        site_id=site_id,
+        params={key: request.args.get(key) or "" for key in EVACUATION_LIST_ARGS},
     )
 
-    response.headers["Content-Disposition"] = "inline; filename=lista_vacios_evacuacion.pdf"
-
-    return response
-
 
 @inventory_bp.post("/inventory/<int:container_id>/mark-no-use")
 @login_required
@@ -1,7 +1,5 @@
 # app/blueprints/print_api/routes.py
 
-import threading
-import time
 from datetime import datetime, timezone, timedelta
 
 from flask import Blueprint, request, jsonify, current_app
@@ -9,6 +7,7 @@ from sqlalchemy.exc import ProgrammingError, OperationalError
 
 from app.extensions import db
 from app.models.print_job import PrintJob
+from app.services.scheduler import scheduled_job
 
 
 bp = Blueprint(
@@ -18,20 +17,6 @@ bp = Blueprint(
 )
 
 
-# =========================================================
-# Control local del barrido de trabajos vencidos
-# =========================================================
-#
-# Evita ejecutar UPDATE + COMMIT en cada consulta del agente.
-#
-# Cada proceso Gunicorn mantiene su propio control. Esto es correcto:
-# aunque dos workers ejecuten ocasionalmente el barrido, será mucho
-# menos costoso que hacerlo en cada solicitud.
-#
-_stale_sweep_lock = threading.Lock()
-_last_stale_sweep_monotonic = 0.0
-
-
 # =========================================================
 # Seguridad del agente
 # =========================================================
@@ -69,59 +54,9 @@ def _print_queue_enabled() -> bool:
 
 
 # =========================================================
-# Barrido controlado de trabajos CLAIMED vencidos
+# Mantenimiento (scheduler del clúster)
 # =========================================================
 
-def _should_run_stale_sweep() -> bool:
-    """
-    Decide si corresponde revisar trabajos CLAIMED vencidos.
-
-    El intervalo se controla con:
-
-        PRINT_JOB_STALE_SWEEP_SECONDS
-
-    Por defecto se revisa una vez cada 60 segundos por proceso
-    Gunicorn, en lugar de hacerlo en cada solicitud del agente.
-    """
-    global _last_stale_sweep_monotonic
-
-    try:
-        sweep_seconds = int(
-            current_app.config.get(
-                "PRINT_JOB_STALE_SWEEP_SECONDS",
-                60,
-            )
-        )
-    except (TypeError, ValueError):
-        sweep_seconds = 60
-
-    # Evita configuraciones excesivamente agresivas.
-    sweep_seconds = max(sweep_seconds, 15)
-
-    now_monotonic = time.monotonic()
-
-    if (
-        now_monotonic - _last_stale_sweep_monotonic
-        < sweep_seconds
-    ):
-        return False
-
-    with _stale_sweep_lock:
-        now_monotonic = time.monotonic()
-
-        if (
-            now_monotonic - _last_stale_sweep_monotonic
-            < sweep_seconds
-        ):
-            return False
-
-        # Se marca antes de ejecutar para impedir que varios threads
-        # entren simultáneamente al mismo barrido.
-        _last_stale_sweep_monotonic = now_monotonic
-
-        return True
-
-
 def _requeue_stale_claimed_jobs(now: datetime) -> int:
     """
     Devuelve a PENDING los trabajos CLAIMED que excedieron
@@ -169,6 +104,48 @@ def _requeue_stale_claimed_jobs(now: datetime) -> int:
     return updated_count
 
 
+@scheduled_job(
+    "print_jobs_stale_claims",
+    every_seconds=60,
+    config_key="PRINT_JOB_STALE_SWEEP_SECONDS",
+)
+def sweep_stale_print_jobs() -> int:
+    """
+    Barrido de CLAIMED vencidos. Lo ejecuta el scheduler en un solo
+    proceso del clúster, ya no el polling del agente.
+    """
+    if not _print_queue_enabled():
+        return 0
+
+    return _requeue_stale_claimed_jobs(datetime.now(timezone.utc))
+
+
+@scheduled_job("print_jobs_retention", every_seconds=86400)
+def purge_finished_print_jobs() -> int:
+    """
+    Elimina trabajos DONE / FAILED más viejos que
+    PRINT_JOB_RETENTION_DAYS.
+    """
+    try:
+        days = max(int(current_app.config.get("PRINT_JOB_RETENTION_DAYS", 30)), 1)
+    except (TypeError, ValueError):
+        days = 30
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+
+    deleted = (
+        db.session.query(PrintJob)
+        .filter(
+            PrintJob.status.in_(("DONE", "FAILED")),
+            PrintJob.created_at < cutoff,
+        )
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return deleted
+
+
 # =========================================================
 # Crear trabajo de impresión
 # =========================================================
@@ -246,7 +223,6 @@ def claim_next_job():
     - valida la clave del agente;
     - responde inmediatamente;
     - no consulta PostgreSQL;
-    - no ejecuta el barrido de CLAIMED vencidos;
     - no abre transacciones.
 
     Cuando PRINT_QUEUE_ENABLED=True:
@@ -274,10 +250,6 @@ def claim_next_job():
     now = datetime.now(timezone.utc)
 
     try:
-        # No se ejecuta en cada polling.
-        if _should_run_stale_sweep():
-            _requeue_stale_claimed_jobs(now)
-
         job = (
             db.session.query(PrintJob)
             .filter(PrintJob.status == "PENDING")
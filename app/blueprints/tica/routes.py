@@ -33,6 +33,7 @@ from app.models.tica import (
 from app.models.user import User
 from app.models.site import Site
 from app.services.audit import audit_log
+from app.services.keyset import keyset_paginate
 
 from app.blueprints.tica.services import (
     CR_TIMEZONE,
@@ -820,12 +821,6 @@ def history():
     No necesita cargar las relaciones completas de transportista,
     chofer y destino porque la tabla conserva snapshots.
     """
-    page = request.args.get(
-        "page",
-        1,
-        type=int,
-    )
-
     q = (
         request.args.get("q")
         or ""
@@ -882,17 +877,16 @@ def history():
             == movement_type
         )
 
-    pagination = (
-        query
-        .order_by(
-            TicaGeneratedFile.created_at.desc(),
-            TicaGeneratedFile.id.desc(),
-        )
-        .paginate(
-            page=page,
-            per_page=HISTORY_PAGE_SIZE,
-            error_out=False,
-        )
+    # Keyset sobre (created_at, id): páginas profundas sin OFFSET.
+    pagination = keyset_paginate(
+        query,
+        [
+            (TicaGeneratedFile.created_at, "desc"),
+            (TicaGeneratedFile.id, "desc"),
+        ],
+        key=lambda row: (row[0].created_at, row[0].id),
+        cursor=request.args.get("cursor"),
+        per_page=HISTORY_PAGE_SIZE,
     )
 
     items = [
@@ -5,16 +5,19 @@ from __future__ import annotations
 import io
 import re
 from dataclasses import dataclass
+from functools import partial
 from datetime import date, datetime
 from zoneinfo import ZoneInfo
 from decimal import Decimal, InvalidOperation
 from typing import Any, BinaryIO, Iterable
 from xml.sax.saxutils import escape as xml_escape
 
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from sqlalchemy import func, or_
 
 from app.extensions import db
+from app.services.bulk_import import execute, stage_rows, upsert_counts
+from app.services.excel_ingest import iter_sheet_rows, map_rows, open_workbook, sheet_row_estimate
 from app.models.tica import (
     TicaDestination,
     TicaDriver,
@@ -1389,20 +1392,8 @@ def _open_excel_workbook(
     file_source: BinaryIO | bytes,
 ):
     try:
-        if isinstance(file_source, bytes):
-            stream = io.BytesIO(file_source)
-        else:
-            stream = file_source
-
-            try:
-                stream.seek(0)
-            except (AttributeError, OSError):
-                pass
-
-        return load_workbook(
-            filename=stream,
-            read_only=True,
-            data_only=True,
+        return open_workbook(
+            file_source
         )
     except Exception as exc:
         raise TicaImportError(
@@ -1423,15 +1414,49 @@ def _normalize_header(value: Any) -> str:
     )
 
 
+def _excel_row_data(
+    excel_row_number: int,
+    raw_row: tuple,
+    *,
+    headers: list[str],
+    normalize,
+):
+    """
+    Fila del Excel -> dict por encabezado -> normalize(dict).
+
+    None si la fila no tiene valores en las columnas con encabezado.
+    De nivel de módulo: corre en el pool de excel_ingest.
+    """
+    row_data = {
+        headers[index]: raw_row[index]
+        if index < len(raw_row)
+        else None
+        for index in range(len(headers))
+        if headers[index]
+    }
+
+    if not any(
+        value not in (None, "")
+        for value in row_data.values()
+    ):
+        return None
+
+    return normalize(row_data)
+
+
 def _read_excel_rows(
     file_source: BinaryIO | bytes,
     *,
     required_headers: Iterable[str],
-) -> list[dict[str, Any]]:
+    normalize,
+) -> list[tuple[int, Any]]:
     """
-    Lee un Excel en modo read_only.
+    Lee un Excel en modo read_only (streaming) y normaliza cada fila
+    con normalize(dict por encabezado), en un pool de procesos si el
+    archivo es grande (app/services/excel_ingest.py).
 
-    Devuelve solo filas con al menos un valor.
+    Devuelve [(fila del Excel, resultado)] en el orden del archivo,
+    solo de filas con al menos un valor.
     """
     workbook = _open_excel_workbook(
         file_source
@@ -1440,7 +1465,8 @@ def _read_excel_rows(
     try:
         worksheet = workbook.active
         row_iterator = worksheet.iter_rows(
-            values_only=True
+            max_row=1,
+            values_only=True,
         )
 
         try:
@@ -1475,30 +1501,19 @@ def _read_excel_rows(
                 code="EXCEL_HEADERS_MISSING",
             )
 
-        rows: list[dict[str, Any]] = []
-
-        for excel_row_number, raw_row in enumerate(
-            row_iterator,
-            start=2,
-        ):
-            row_data = {
-                headers[index]: raw_row[index]
-                if index < len(raw_row)
-                else None
-                for index in range(len(headers))
-                if headers[index]
-            }
-
-            if not any(
-                value not in (None, "")
-                for value in row_data.values()
-            ):
-                continue
-
-            row_data["_excel_row"] = excel_row_number
-            rows.append(row_data)
-
-        return rows
+        return [
+            (excel_row_number, result)
+            for excel_row_number, result in map_rows(
+                partial(
+                    _excel_row_data,
+                    headers=headers,
+                    normalize=normalize,
+                ),
+                iter_sheet_rows(worksheet),
+                total=sheet_row_estimate(worksheet),
+            )
+            if result is not None
+        ]
 
     finally:
         workbook.close()
@@ -1519,10 +1534,143 @@ def _append_import_error(
         })
 
 
+# =========================================================
+# Carga masiva: SQL por conjuntos
+# =========================================================
+#
+# Las filas validadas se cargan con COPY en una tabla temporal
+# (app/services/bulk_import.py) y se aplican con un solo
+# INSERT ... ON CONFLICT por catálogo.
+#
+_TRANSPORTERS_IMPORT_COLUMNS = [
+    ("name", "text NOT NULL"),
+    ("identification", "text NOT NULL"),
+    ("is_active", "boolean NOT NULL"),
+]
+
+_TRANSPORTERS_IMPORT_SQL = """
+    INSERT INTO yard_gate_alamo.tica_transporters AS t (
+        name, identification_number, is_active,
+        created_by_user_id, updated_by_user_id,
+        created_at, updated_at
+    )
+    SELECT
+        s.name, s.identification, s.is_active,
+        :user_id, :user_id,
+        :now, :now
+    FROM stg_tica_transporters s
+    ON CONFLICT (identification_number) DO UPDATE SET
+        name = EXCLUDED.name,
+        is_active = EXCLUDED.is_active,
+        updated_by_user_id = EXCLUDED.updated_by_user_id,
+        updated_at = EXCLUDED.updated_at
+    RETURNING (xmax = 0) AS inserted
+"""
+
+_DRIVERS_IMPORT_COLUMNS = [
+    ("name", "text NOT NULL"),
+    ("identification", "text NOT NULL"),
+    ("plate", "text NOT NULL"),
+    ("transporter_identification", "text NOT NULL"),
+    ("is_active", "boolean NOT NULL"),
+]
+
+_DRIVERS_IMPORT_MISSING_TRANSPORTERS_SQL = """
+    SELECT s.row_no, s.transporter_identification
+    FROM stg_tica_drivers s
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM yard_gate_alamo.tica_transporters t
+        WHERE t.identification_number = s.transporter_identification
+    )
+    ORDER BY s.row_no
+"""
+
+_DRIVERS_IMPORT_SQL = """
+    INSERT INTO yard_gate_alamo.tica_drivers AS d (
+        transporter_id, name, identification_number, plate, is_active,
+        created_by_user_id, updated_by_user_id,
+        created_at, updated_at
+    )
+    SELECT
+        t.id, s.name, s.identification, s.plate, s.is_active,
+        :user_id, :user_id,
+        :now, :now
+    FROM stg_tica_drivers s
+    JOIN yard_gate_alamo.tica_transporters t
+      ON t.identification_number = s.transporter_identification
+    ON CONFLICT (identification_number) DO UPDATE SET
+        transporter_id = EXCLUDED.transporter_id,
+        name = EXCLUDED.name,
+        plate = EXCLUDED.plate,
+        is_active = EXCLUDED.is_active,
+        updated_by_user_id = EXCLUDED.updated_by_user_id,
+        updated_at = EXCLUDED.updated_at
+    RETURNING (xmax = 0) AS inserted
+"""
+
+_DESTINATIONS_IMPORT_COLUMNS = [
+    ("name", "text NOT NULL"),
+    ("code", "text NOT NULL"),
+    ("is_active", "boolean NOT NULL"),
+]
+
+_DESTINATIONS_IMPORT_SQL = """
+    INSERT INTO yard_gate_alamo.tica_destinations AS d (
+        name, code, is_active,
+        created_by_user_id, updated_by_user_id,
+        created_at, updated_at
+    )
+    SELECT
+        s.name, s.code, s.is_active,
+        :user_id, :user_id,
+        :now, :now
+    FROM stg_tica_destinations s
+    ON CONFLICT (code) DO UPDATE SET
+        name = EXCLUDED.name,
+        is_active = EXCLUDED.is_active,
+        updated_by_user_id = EXCLUDED.updated_by_user_id,
+        updated_at = EXCLUDED.updated_at
+    RETURNING (xmax = 0) AS inserted
+"""
+
+
 # =========================================================
 # Carga masiva: transportistas
 # =========================================================
 
+def _normalize_transporter_row(
+    row: dict[str, Any],
+) -> dict[str, Any] | str:
+    """
+    Fila normalizada o mensaje de error.
+    """
+    name = normalize_text(
+        row.get("transportista_nombre"),
+        uppercase=True,
+        max_length=180,
+    )
+
+    identification = normalize_identification(
+        row.get("transportista_cedula")
+    )
+
+    if not name or not identification:
+        return (
+            "Nombre y cédula del transportista "
+            "son obligatorios."
+        )
+
+    return {
+        "name": name,
+        "identification": identification,
+        "is_active": normalize_boolean(
+            row.get("activo"),
+            default=True,
+        ),
+    }
+
+
 def import_transporters_from_excel(
     file_source: BinaryIO | bytes,
     *,
@@ -1534,6 +1682,7 @@ def import_transporters_from_excel(
             "transportista_nombre",
             "transportista_cedula",
         },
+        normalize=_normalize_transporter_row,
     )
 
     summary = ImportSummary(
@@ -1543,110 +1692,106 @@ def import_transporters_from_excel(
     normalized_rows: list[dict[str, Any]] = []
     identifications: set[str] = set()
 
-    for row in rows:
-        row_number = int(row["_excel_row"])
-
-        name = normalize_text(
-            row.get("transportista_nombre"),
-            uppercase=True,
-            max_length=180,
-        )
-
-        identification = normalize_identification(
-            row.get("transportista_cedula")
-        )
-
-        if not name or not identification:
+    for row_number, row in rows:
+        if isinstance(row, str):
             _append_import_error(
                 summary,
                 row_number=row_number,
-                message=(
-                    "Nombre y cédula del transportista "
-                    "son obligatorios."
-                ),
+                message=row,
             )
             continue
 
-        normalized_rows.append({
-            "row_number": row_number,
-            "name": name,
-            "identification": identification,
-            "is_active": normalize_boolean(
-                row.get("activo"),
-                default=True,
-            ),
-        })
+        # En el archivo gana la primera fila de cada cédula.
+        if row["identification"] in identifications:
+            summary.skipped_rows += 1
+            continue
 
         identifications.add(
-            identification
+            row["identification"]
         )
 
-    existing_by_identification = {}
+        normalized_rows.append({
+            "row_no": row_number,
+            **row,
+        })
 
-    if identifications:
-        existing_rows = (
-            TicaTransporter.query
-            .filter(
-                TicaTransporter.identification_number.in_(
-                    identifications
-                )
-            )
-            .all()
+    if normalized_rows:
+        stage_rows(
+            "stg_tica_transporters",
+            _TRANSPORTERS_IMPORT_COLUMNS,
+            normalized_rows,
         )
 
-        existing_by_identification = {
-            item.identification_number: item
-            for item in existing_rows
-        }
-
-    seen_in_file: set[str] = set()
-
-    for row in normalized_rows:
-        identification = row["identification"]
+        (
+            summary.created_rows,
+            summary.updated_rows,
+        ) = upsert_counts(
+            execute(
+                _TRANSPORTERS_IMPORT_SQL,
+                {
+                    "user_id": user_id,
+                    "now": datetime.utcnow(),
+                },
+            )
+        )
 
-        if identification in seen_in_file:
-            summary.skipped_rows += 1
-            continue
+    return summary
 
-        seen_in_file.add(
-            identification
-        )
 
-        transporter = existing_by_identification.get(
-            identification
-        )
+# =========================================================
+# Carga masiva: choferes
+# =========================================================
 
-        if transporter is None:
-            transporter = TicaTransporter(
-                name=row["name"],
-                identification_number=identification,
-                is_active=row["is_active"],
-                created_by_user_id=user_id,
-                updated_by_user_id=user_id,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
-            )
+def _normalize_driver_row(
+    row: dict[str, Any],
+) -> dict[str, Any] | str:
+    """
+    Fila normalizada o mensaje de error.
+    """
+    driver_name = normalize_text(
+        row.get("chofer_nombre"),
+        uppercase=True,
+        max_length=180,
+    )
 
-            db.session.add(transporter)
-            existing_by_identification[
-                identification
-            ] = transporter
+    driver_identification = normalize_identification(
+        row.get("chofer_cedula")
+    )
 
-            summary.created_rows += 1
-        else:
-            transporter.name = row["name"]
-            transporter.is_active = row["is_active"]
-            transporter.updated_by_user_id = user_id
-            transporter.updated_at = datetime.utcnow()
+    plate = normalize_plate(
+        row.get("placa")
+    )
 
-            summary.updated_rows += 1
+    transporter_identification = (
+        normalize_identification(
+            row.get("transportista_cedula")
+        )
+    )
 
-    return summary
+    if not all([
+        driver_name,
+        driver_identification,
+        plate,
+        transporter_identification,
+    ]):
+        return (
+            "Nombre, cédula del chofer, placa y "
+            "cédula del transportista son obligatorios."
+        )
 
+    return {
+        "name": driver_name,
+        "identification": driver_identification,
+        "plate": plate,
+        "transporter_identification": (
+            transporter_identification
+        ),
+        "is_active": normalize_boolean(
+            row.get("activo"),
+            default=True,
+        ),
+    }
 
-# =========================================================
-# Carga masiva: choferes
-# =========================================================
 
 def import_drivers_from_excel(
     file_source: BinaryIO | bytes,
@@ -1661,6 +1806,7 @@ def import_drivers_from_excel(
             "placa",
             "transportista_cedula",
         },
+        normalize=_normalize_driver_row,
     )
 
     summary = ImportSummary(
@@ -1669,173 +1815,100 @@ def import_drivers_from_excel(
 
     normalized_rows: list[dict[str, Any]] = []
     driver_identifications: set[str] = set()
-    transporter_identifications: set[str] = set()
-
-    for row in rows:
-        row_number = int(row["_excel_row"])
 
-        driver_name = normalize_text(
-            row.get("chofer_nombre"),
-            uppercase=True,
-            max_length=180,
-        )
-
-        driver_identification = normalize_identification(
-            row.get("chofer_cedula")
-        )
-
-        plate = normalize_plate(
-            row.get("placa")
-        )
-
-        transporter_identification = (
-            normalize_identification(
-                row.get("transportista_cedula")
-            )
-        )
-
-        if not all([
-            driver_name,
-            driver_identification,
-            plate,
-            transporter_identification,
-        ]):
+    for row_number, row in rows:
+        if isinstance(row, str):
             _append_import_error(
                 summary,
                 row_number=row_number,
-                message=(
-                    "Nombre, cédula del chofer, placa y "
-                    "cédula del transportista son obligatorios."
-                ),
+                message=row,
             )
             continue
 
-        normalized_rows.append({
-            "row_number": row_number,
-            "name": driver_name,
-            "identification": driver_identification,
-            "plate": plate,
-            "transporter_identification": (
-                transporter_identification
-            ),
-            "is_active": normalize_boolean(
-                row.get("activo"),
-                default=True,
-            ),
-        })
-
-        driver_identifications.add(
-            driver_identification
-        )
-
-        transporter_identifications.add(
-            transporter_identification
-        )
-
-    transporters_by_identification = {}
-
-    if transporter_identifications:
-        transporter_rows = (
-            TicaTransporter.query
-            .filter(
-                TicaTransporter.identification_number.in_(
-                    transporter_identifications
-                )
-            )
-            .all()
-        )
-
-        transporters_by_identification = {
-            item.identification_number: item
-            for item in transporter_rows
-        }
-
-    existing_drivers_by_identification = {}
-
-    if driver_identifications:
-        existing_driver_rows = (
-            TicaDriver.query
-            .filter(
-                TicaDriver.identification_number.in_(
-                    driver_identifications
-                )
-            )
-            .all()
-        )
-
-        existing_drivers_by_identification = {
-            item.identification_number: item
-            for item in existing_driver_rows
-        }
-
-    seen_in_file: set[str] = set()
-
-    for row in normalized_rows:
-        identification = row["identification"]
-
-        if identification in seen_in_file:
+        # En el archivo gana la primera fila de cada cédula.
+        if row["identification"] in driver_identifications:
             summary.skipped_rows += 1
             continue
 
-        seen_in_file.add(
-            identification
+        driver_identifications.add(
+            row["identification"]
         )
 
-        transporter = transporters_by_identification.get(
-            row["transporter_identification"]
+        normalized_rows.append({
+            "row_no": row_number,
+            **row,
+        })
+
+    if normalized_rows:
+        stage_rows(
+            "stg_tica_drivers",
+            _DRIVERS_IMPORT_COLUMNS,
+            normalized_rows,
         )
 
-        if transporter is None:
+        for row_number, transporter_identification in execute(
+            _DRIVERS_IMPORT_MISSING_TRANSPORTERS_SQL
+        ):
             _append_import_error(
                 summary,
-                row_number=row["row_number"],
+                row_number=row_number,
                 message=(
                     "No existe el transportista con cédula "
-                    f"{row['transporter_identification']}."
+                    f"{transporter_identification}."
                 ),
             )
-            continue
 
-        driver = existing_drivers_by_identification.get(
-            identification
+        (
+            summary.created_rows,
+            summary.updated_rows,
+        ) = upsert_counts(
+            execute(
+                _DRIVERS_IMPORT_SQL,
+                {
+                    "user_id": user_id,
+                    "now": datetime.utcnow(),
+                },
+            )
         )
 
-        if driver is None:
-            driver = TicaDriver(
-                transporter_id=transporter.id,
-                name=row["name"],
-                identification_number=identification,
-                plate=row["plate"],
-                is_active=row["is_active"],
-                created_by_user_id=user_id,
-                updated_by_user_id=user_id,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
-            )
+    return summary
 
-            db.session.add(driver)
 
-            existing_drivers_by_identification[
-                identification
-            ] = driver
+# =========================================================
+# Carga masiva: destinos
+# =========================================================
 
-            summary.created_rows += 1
-        else:
-            driver.transporter_id = transporter.id
-            driver.name = row["name"]
-            driver.plate = row["plate"]
-            driver.is_active = row["is_active"]
-            driver.updated_by_user_id = user_id
-            driver.updated_at = datetime.utcnow()
+def _normalize_destination_row(
+    row: dict[str, Any],
+) -> dict[str, Any] | str:
+    """
+    Fila normalizada o mensaje de error.
+    """
+    name = normalize_text(
+        row.get("ubicacion_nombre"),
+        uppercase=True,
+        max_length=180,
+    )
 
-            summary.updated_rows += 1
+    code = normalize_destination_code(
+        row.get("ubicacion_codigo")
+    )
 
-    return summary
+    if not name or not code:
+        return (
+            "Nombre y código de la ubicación "
+            "son obligatorios."
+        )
 
+    return {
+        "name": name,
+        "code": code,
+        "is_active": normalize_boolean(
+            row.get("activo"),
+            default=True,
+        ),
+    }
 
-# =========================================================
-# Carga masiva: destinos
-# =========================================================
 
 def import_destinations_from_excel(
     file_source: BinaryIO | bytes,
@@ -1848,6 +1921,7 @@ def import_destinations_from_excel(
             "ubicacion_nombre",
             "ubicacion_codigo",
         },
+        normalize=_normalize_destination_row,
     )
 
     summary = ImportSummary(
@@ -1857,95 +1931,46 @@ def import_destinations_from_excel(
     normalized_rows: list[dict[str, Any]] = []
     codes: set[str] = set()
 
-    for row in rows:
-        row_number = int(row["_excel_row"])
-
-        name = normalize_text(
-            row.get("ubicacion_nombre"),
-            uppercase=True,
-            max_length=180,
-        )
-
-        code = normalize_destination_code(
-            row.get("ubicacion_codigo")
-        )
-
-        if not name or not code:
+    for row_number, row in rows:
+        if isinstance(row, str):
             _append_import_error(
                 summary,
                 row_number=row_number,
-                message=(
-                    "Nombre y código de la ubicación "
-                    "son obligatorios."
-                ),
+                message=row,
             )
             continue
 
-        normalized_rows.append({
-            "row_number": row_number,
-            "name": name,
-            "code": code,
-            "is_active": normalize_boolean(
-                row.get("activo"),
-                default=True,
-            ),
-        })
-
-        codes.add(code)
-
-    existing_by_code = {}
-
-    if codes:
-        existing_rows = (
-            TicaDestination.query
-            .filter(
-                TicaDestination.code.in_(codes)
-            )
-            .all()
-        )
-
-        existing_by_code = {
-            item.code: item
-            for item in existing_rows
-        }
-
-    seen_in_file: set[str] = set()
-
-    for row in normalized_rows:
-        code = row["code"]
-
-        if code in seen_in_file:
+        # En el archivo gana la primera fila de cada código.
+        if row["code"] in codes:
             summary.skipped_rows += 1
             continue
 
-        seen_in_file.add(code)
+        codes.add(row["code"])
+
+        normalized_rows.append({
+            "row_no": row_number,
+            **row,
+        })
 
-        destination = existing_by_code.get(
-            code
+    if normalized_rows:
+        stage_rows(
+            "stg_tica_destinations",
+            _DESTINATIONS_IMPORT_COLUMNS,
+            normalized_rows,
         )
 
-        if destination is None:
-            destination = TicaDestination(
-                name=row["name"],
-                code=code,
-                is_active=row["is_active"],
-                created_by_user_id=user_id,
-                updated_by_user_id=user_id,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
+        (
+            summary.created_rows,
+            summary.updated_rows,
+        ) = upsert_counts(
+            execute(
+                _DESTINATIONS_IMPORT_SQL,
+                {
+                    "user_id": user_id,
+                    "now": datetime.utcnow(),
+                },
             )
-
-            db.session.add(destination)
-            existing_by_code[code] = destination
-
-            summary.created_rows += 1
-        else:
-            destination.name = row["name"]
-            destination.is_active = row["is_active"]
-            destination.updated_by_user_id = user_id
-            destination.updated_at = datetime.utcnow()
-
-            summary.updated_rows += 1
+        )
 
     return summary
 
@@ -9,10 +9,10 @@ from flask import (
     current_app,
     flash,
     g,
+    jsonify,
     redirect,
     render_template,
     request,
-    send_file,
     url_for,
 )
 
@@ -27,6 +27,7 @@ from sqlalchemy.orm import (
 
 from app.blueprints.transport import transport_bp
 from app.blueprints.transport.services import (
+    ATTACHMENT_MIME_PREFIXES,
     DOCUMENT_STATUSES,
     DRIVER_DOCUMENT_TYPES,
     DRIVER_STATUSES,
@@ -64,11 +65,47 @@ from app.blueprints.transport.services import (
     upsert_driver_document,
     upsert_truck_document,
     update_driver_complete_row,
-    bulk_import_transport_excel,
-    build_transport_bulk_template,
+    register_transport_attachment,
+    validate_attachment_target,
 )
 from app.extensions import db
 from app.models.site import Site
+from app.services.content_index import (
+    find_stored_object,
+    hash_storage_object,
+    register_stored_object,
+)
+from app.services.export_jobs import export_response
+from app.services.import_sessions import create_import_session
+from app.services.keyset import keyset_paginate
+from app.services.search import normalize_search_key, search_condition
+from app.services.transport_compliance import (
+    COMPLIANCE_DOCUMENT_LABELS,
+    COMPLIANCE_FILTERS,
+    compliance_condition,
+    compliance_filter,
+    compliance_summary,
+    expiring_days_default,
+)
+from app.services.transport_counters import (
+    OPEN_INCIDENT_STATUSES,
+    transport_counters,
+)
+from app.services.transport_detail import (
+    detail_json,
+    get_driver_detail,
+    get_truck_detail,
+)
+from app.services.transport_incident_archive import (
+    TIMELINE_LIMIT,
+    get_archived_incident,
+    incident_timeline,
+)
+from app.services.storage import (
+    attachment_key_prefix,
+    build_attachment_key,
+    get_storage,
+)
 from app.models.transport import (
     Driver,
     DriverApmRecord,
@@ -82,7 +119,8 @@ from app.models.transport import (
     TruckDocument,
     TruckOwner,
 )
-from app.utils.permissions import require_permission
+from app.models.transport_compliance import TransportCompliance
+from app.utils.permissions import require_permission, user_has_permission
 
 
 # =========================================================
@@ -91,6 +129,9 @@ from app.utils.permissions import require_permission
 DEFAULT_PER_PAGE = 25
 MAX_PER_PAGE = 100
 
+# Filas por tabla en el panel de vencimientos.
+EXPIRING_DASHBOARD_LIMIT = 200
+
 
 # =========================================================
 # HELPERS GENERALES
@@ -134,6 +175,30 @@ def _clean_arg(
     return value.upper() if upper else value
 
 
+def _compliance_args() -> tuple[str | None, int]:
+    """
+    Filtro de documentos (?compliance=) y ventana de "por vencer"
+    (?expiring_days=) de las listas de choferes y cabezales.
+    """
+    compliance = _clean_arg(
+        "compliance",
+        upper=True,
+    )
+
+    if compliance not in COMPLIANCE_FILTERS:
+        compliance = None
+
+    expiring_days = request.args.get(
+        "expiring_days",
+        type=int,
+    )
+
+    if not expiring_days or expiring_days < 1:
+        expiring_days = expiring_days_default()
+
+    return compliance, min(expiring_days, 365)
+
+
 def _form_to_dict() -> dict:
     """
     Convierte ImmutableMultiDict a dict normal.
@@ -186,62 +251,26 @@ def _get_sites() -> list[Site]:
     )
 
 
-def _get_active_assignment_for_driver_detail(
-    driver_id: int,
-) -> DriverTruckAssignment | None:
-    stmt = (
-        select(DriverTruckAssignment)
-        .options(
-            joinedload(
-                DriverTruckAssignment.truck
-            ).joinedload(Truck.owner),
-            joinedload(
-                DriverTruckAssignment.created_by
-            ),
-            joinedload(
-                DriverTruckAssignment.ended_by
-            ),
-        )
-        .where(
-            DriverTruckAssignment.driver_id
-            == driver_id,
-            DriverTruckAssignment.status
-            == "ACTIVE",
-        )
-        .limit(1)
-    )
+# Secciones de la ficha 360° que requieren drivers.history.view.
+_DETAIL_HISTORY_SECTIONS = (
+    "exit_permissions",
+    "incidents",
+    "attachments",
+    "document_changes",
+)
 
-    return db.session.scalar(stmt)
 
+def _detail_json_for_user(detail: dict) -> dict:
+    data = detail_json(detail)
 
-def _get_active_assignment_for_truck_detail(
-    truck_id: int,
-) -> DriverTruckAssignment | None:
-    stmt = (
-        select(DriverTruckAssignment)
-        .options(
-            joinedload(
-                DriverTruckAssignment.driver
-            ).joinedload(
-                Driver.habitual_site
-            ),
-            joinedload(
-                DriverTruckAssignment.created_by
-            ),
-            joinedload(
-                DriverTruckAssignment.ended_by
-            ),
-        )
-        .where(
-            DriverTruckAssignment.truck_id
-            == truck_id,
-            DriverTruckAssignment.status
-            == "ACTIVE",
-        )
-        .limit(1)
-    )
+    if not user_has_permission(
+        current_user,
+        "drivers.history.view",
+    ):
+        for section in _DETAIL_HISTORY_SECTIONS:
+            data.pop(section, None)
 
-    return db.session.scalar(stmt)
+    return data
 
 
 # =========================================================
@@ -252,11 +281,32 @@ def _get_active_assignment_for_truck_detail(
 @require_permission("drivers.view")
 def index():
     """
-    La entrada principal del módulo Transportes lleva directamente
-    a la matriz operativa de choferes/cabezales.
+    Resumen del módulo Transportes.
+
+    Los totales salen de transport_counters (una consulta sobre una
+    tabla de pocas filas), no de COUNT(*) sobre cada tabla.
     """
-    return redirect(
-        url_for("transport.drivers_list")
+    counters = transport_counters()
+
+    def total(counter_key: str, *statuses: str) -> int:
+        values = counters.get(counter_key, {})
+
+        if not statuses:
+            return sum(values.values())
+
+        return sum(values.get(status, 0) for status in statuses)
+
+    return render_template(
+        "transport/index.html",
+        driver_total=total("drivers"),
+        active_driver_total=total("drivers", "ACTIVE"),
+        truck_total=total("trucks"),
+        active_truck_total=total("trucks", "ACTIVE"),
+        active_assignment_total=total("assignments", "ACTIVE"),
+        active_exit_total=total("exit_permissions", "AUTHORIZED"),
+        open_incident_total=total("incidents", *OPEN_INCIDENT_STATUSES),
+        expired_driver_documents=total("driver_documents", "EXPIRED"),
+        expired_truck_documents=total("truck_documents", "EXPIRED"),
     )
 
 
@@ -287,7 +337,6 @@ def drivers_list():
     # =====================================================
     # 1. PAGINACIÓN Y FILTROS
     # =====================================================
-    page = _safe_page()
     per_page = _safe_per_page()
 
     search = _clean_arg("q")
@@ -302,6 +351,8 @@ def drivers_list():
         type=int,
     )
 
+    compliance, expiring_days = _compliance_args()
+
     # =====================================================
     # 2. ALIASES
     # =====================================================
@@ -340,9 +391,9 @@ def drivers_list():
     # Solo hacemos estos JOIN cuando realmente son necesarios
     # para buscar por placa o propietario.
     # =====================================================
-    if search:
-        like_value = f"%{search}%"
+    search_term = normalize_search_key(search)
 
+    if search_term:
         page_stmt = (
             page_stmt
             .outerjoin(
@@ -367,34 +418,16 @@ def drivers_list():
                 == assigned_truck.owner_id,
             )
             .where(
-                or_(
-                    Driver.name.ilike(
-                        like_value
-                    ),
-
-                    Driver.identification.ilike(
-                        like_value
-                    ),
-
-                    Driver.residence.ilike(
-                        like_value
-                    ),
-
-                    Driver.phone_1.ilike(
-                        like_value
-                    ),
-
-                    Driver.phone_2.ilike(
-                        like_value
-                    ),
-
-                    assigned_truck.plate.ilike(
-                        like_value
-                    ),
-
-                    assigned_owner.name.ilike(
-                        like_value
-                    ),
+                # Claves normalizadas con índice trigram
+                # (app/services/search.py).
+                search_condition(
+                    [
+                        Driver.search_key,
+                        assigned_truck.plate_key,
+                        assigned_owner.name_key,
+                    ],
+                    search_term,
+                    multi_field=[Driver.search_key],
                 )
             )
         )
@@ -419,6 +452,25 @@ def drivers_list():
             == habitual_site_id
         )
 
+    # =====================================================
+    # 6.1 FILTRO DE DOCUMENTOS
+    #
+    # Se resuelve con el índice transport_compliance,
+    # sin recorrer documentos ni APM.
+    # =====================================================
+    compliance_where = compliance_filter(
+        "DRIVER",
+        Driver.id,
+        compliance,
+        today=date.today(),
+        days=expiring_days,
+    )
+
+    if compliance_where is not None:
+        page_stmt = page_stmt.where(
+            compliance_where
+        )
+
     # =====================================================
     # 7. ORDEN Y DISTINCT
     #
@@ -435,25 +487,26 @@ def drivers_list():
     )
 
     # =====================================================
-    # 8. PAGINACIÓN
-    #
-    # Flask-SQLAlchemy usa .scalars(), por lo tanto,
-    # aunque SELECT tenga:
+    # 8. PAGINACIÓN (keyset sobre name, id)
     #
-    #   Driver.id, Driver.name
-    #
-    # pagination.items contendrá solamente Driver.id.
+    # Cada fila es (Driver.id, Driver.name); el cursor
+    # guarda el nombre e id de la última fila visible.
     # =====================================================
-    pagination = db.paginate(
+    pagination = keyset_paginate(
         page_stmt,
-        page=page,
+        [
+            (Driver.name, "asc"),
+            (Driver.id, "asc"),
+        ],
+        key=lambda row: (row.name, row.id),
+        cursor=request.args.get("cursor"),
         per_page=per_page,
-        error_out=False,
     )
 
-    driver_ids = list(
-        pagination.items
-    )
+    driver_ids = [
+        row.id
+        for row in pagination.items
+    ]
 
     # =====================================================
     # 9. SI NO HAY RESULTADOS
@@ -473,9 +526,15 @@ def drivers_list():
                 "habitual_site_id": (
                     habitual_site_id
                 ),
+                "compliance": compliance,
+                "expiring_days": expiring_days,
                 "per_page": per_page,
             },
 
+            compliance_filters=(
+                COMPLIANCE_FILTERS
+            ),
+
             driver_statuses=(
                 DRIVER_STATUSES
             ),
@@ -1169,9 +1228,17 @@ def drivers_list():
                 habitual_site_id
             ),
 
+            "compliance": compliance,
+
+            "expiring_days": expiring_days,
+
             "per_page": per_page,
         },
 
+        compliance_filters=(
+            COMPLIANCE_FILTERS
+        ),
+
         driver_statuses=(
             DRIVER_STATUSES
         ),
@@ -1303,147 +1370,21 @@ def driver_create():
 @login_required
 @require_permission("drivers.view")
 def driver_detail(driver_id: int):
-    stmt = (
-        select(Driver)
-        .options(
-            joinedload(
-                Driver.habitual_site
-            ),
-            joinedload(
-                Driver.created_by
-            ),
-            joinedload(
-                Driver.updated_by
-            ),
-            selectinload(
-                Driver.documents
-            ),
-            selectinload(
-                Driver.apm_record
-            ),
-            noload(
-                Driver.assignments
-            ),
-            noload(
-                Driver.exit_permissions
-            ),
-            noload(
-                Driver.incidents
-            ),
-        )
-        .where(
-            Driver.id == driver_id
-        )
-    )
+    # Ficha 360° con cantidad fija de consultas y caché por versión
+    # (app/services/transport_detail.py).
+    detail = get_driver_detail(driver_id)
 
-    driver = db.session.scalar(stmt)
-
-    if driver is None:
+    if detail is None:
         abort(404)
 
-    active_assignment = (
-        _get_active_assignment_for_driver_detail(
-            driver.id
-        )
-    )
-
-    assignment_stmt = (
-        select(DriverTruckAssignment)
-        .options(
-            joinedload(
-                DriverTruckAssignment.truck
-            ).joinedload(Truck.owner),
-            joinedload(
-                DriverTruckAssignment.created_by
-            ),
-            joinedload(
-                DriverTruckAssignment.ended_by
-            ),
-        )
-        .where(
-            DriverTruckAssignment.driver_id
-            == driver.id
-        )
-        .order_by(
-            DriverTruckAssignment.started_at.desc(),
-            DriverTruckAssignment.id.desc(),
-        )
-        .limit(20)
-    )
-
-    assignments = list(
-        db.session.scalars(
-            assignment_stmt
-        ).unique().all()
-    )
-
-    incident_stmt = (
-        select(TransportIncident)
-        .options(
-            joinedload(
-                TransportIncident.truck
-            ),
-            joinedload(
-                TransportIncident.reported_by
-            ),
-            noload(
-                TransportIncident.follow_ups
-            ),
-        )
-        .where(
-            TransportIncident.driver_id
-            == driver.id
-        )
-        .order_by(
-            TransportIncident.occurred_at.desc(),
-            TransportIncident.id.desc(),
-        )
-        .limit(10)
-    )
-
-    incidents = list(
-        db.session.scalars(
-            incident_stmt
-        ).unique().all()
-    )
-
-    permission_stmt = (
-        select(DriverExitPermission)
-        .options(
-            joinedload(
-                DriverExitPermission.truck
-            ),
-            joinedload(
-                DriverExitPermission.authorized_by
-            ),
-            joinedload(
-                DriverExitPermission.returned_by
-            ),
-        )
-        .where(
-            DriverExitPermission.driver_id
-            == driver.id
-        )
-        .order_by(
-            DriverExitPermission.departure_at.desc(),
-            DriverExitPermission.id.desc(),
-        )
-        .limit(10)
-    )
-
-    exit_permissions = list(
-        db.session.scalars(
-            permission_stmt
-        ).unique().all()
-    )
-
     return render_template(
         "transport/driver_detail.html",
-        driver=driver,
-        active_assignment=active_assignment,
-        assignments=assignments,
-        incidents=incidents,
-        exit_permissions=exit_permissions,
+        driver=detail["driver"],
+        detail=detail,
+        active_assignment=detail["active_assignment"],
+        assignments=detail["assignments"],
+        incidents=detail["incidents"],
+        exit_permissions=detail["exit_permissions"],
         driver_document_types=(
             DRIVER_DOCUMENT_TYPES
         ),
@@ -1451,6 +1392,23 @@ def driver_detail(driver_id: int):
     )
 
 
+@transport_bp.get(
+    "/api/drivers/<int:driver_id>/detail"
+)
+@login_required
+@require_permission("drivers.view")
+def api_driver_detail(driver_id: int):
+    detail = get_driver_detail(driver_id)
+
+    if detail is None:
+        abort(404)
+
+    return jsonify({
+        "ok": True,
+        **_detail_json_for_user(detail),
+    })
+
+
 @transport_bp.route(
     "/drivers/<int:driver_id>/edit",
     methods=["GET", "POST"],
@@ -1630,24 +1588,12 @@ def drivers_bulk_template():
     de choferes y cabezales.
 
     No consulta PostgreSQL.
-    El Excel se genera directamente en memoria.
+    Con EXPORT_ASYNC se genera en export_worker.py.
     """
 
-    template_file = (
-        build_transport_bulk_template()
-    )
-
-    return send_file(
-        template_file,
-        as_attachment=True,
-        download_name=(
-            "plantilla_carga_masiva_choferes.xlsx"
-        ),
-        mimetype=(
-            "application/"
-            "vnd.openxmlformats-officedocument."
-            "spreadsheetml.sheet"
-        ),
+    return export_response(
+        "TRANSPORT_TEMPLATE",
+        site_id=getattr(g, "active_site_id", None),
     )
 
 @transport_bp.get("/drivers/bulk-upload")
@@ -1770,52 +1716,25 @@ def drivers_bulk_upload_post():
         )
 
     # =====================================================
-    # 5. PROCESAR
+    # 5. SESIÓN DE CARGA
+    #
+    # El Excel se procesa en segundo plano: primero una
+    # simulación (qué se crea / actualiza y errores) y, al
+    # confirmarla, la carga real con las mismas filas.
     # =====================================================
     try:
-        result = (
-            bulk_import_transport_excel(
-                file.stream,
-                user_id=current_user.id,
-
+        import_session = create_import_session(
+            "TRANSPORT_DRIVERS",
+            file_storage=file,
+            site_id=registered_site_id,
+            user_id=current_user.id,
+            params={
                 # Predio técnico del Truck.
-                registered_site_id=(
-                    registered_site_id
-                ),
+                "registered_site_id": registered_site_id,
 
                 # Solo distintivo patiero.
-                habitual_site_id=(
-                    habitual_site_id
-                ),
-            )
-        )
-
-    except TransportValidationError as exc:
-        db.session.rollback()
-
-        flash(
-            str(exc),
-            "warning",
-        )
-
-        return render_template(
-            "transport/drivers_bulk_upload.html",
-            result=None,
-            sites=_get_sites(),
-        )
-
-    except TransportServiceError as exc:
-        db.session.rollback()
-
-        flash(
-            str(exc),
-            "danger",
-        )
-
-        return render_template(
-            "transport/drivers_bulk_upload.html",
-            result=None,
-            sites=_get_sites(),
+                "habitual_site_id": habitual_site_id,
+            },
         )
 
     except Exception:
@@ -1828,8 +1747,8 @@ def drivers_bulk_upload_post():
 
         flash(
             (
-                "Ocurrió un error inesperado durante "
-                "la carga masiva."
+                "No fue posible recibir el archivo "
+                "de la carga masiva."
             ),
             "danger",
         )
@@ -1840,40 +1759,11 @@ def drivers_bulk_upload_post():
             sites=_get_sites(),
         )
 
-    # =====================================================
-    # 6. MENSAJE FINAL
-    # =====================================================
-    if result.get(
-        "error_count",
-        0,
-    ):
-        flash(
-            (
-                "Carga completada con observaciones. "
-                f"Procesadas: {result.get('processed', 0)}. "
-                f"Omitidas: {result.get('skipped', 0)}. "
-                f"Observaciones: {result.get('error_count', 0)}."
-            ),
-            "warning",
-        )
-
-    else:
-        flash(
-            (
-                "Carga masiva completada correctamente. "
-                f"Se procesaron "
-                f"{result.get('processed', 0)} fila(s)."
-            ),
-            "success",
+    return redirect(
+        url_for(
+            "yard.import_session_view",
+            session_id=import_session.id,
         )
-
-    # =====================================================
-    # 7. MOSTRAR RESULTADO
-    # =====================================================
-    return render_template(
-        "transport/drivers_bulk_upload.html",
-        result=result,
-        sites=_get_sites(),
     )
 
 # =========================================================
@@ -1883,7 +1773,6 @@ def drivers_bulk_upload_post():
 @login_required
 @require_permission("drivers.view")
 def trucks_list():
-    page = _safe_page()
     per_page = _safe_per_page()
 
     search = _clean_arg("q")
@@ -1901,6 +1790,8 @@ def trucks_list():
         type=int,
     )
 
+    compliance, expiring_days = _compliance_args()
+
     active_assignment = aliased(
         DriverTruckAssignment
     )
@@ -2008,11 +1899,31 @@ def trucks_list():
             == registered_site_id
         )
 
-    pagination = db.paginate(
+    # Vencidos / por vencer desde transport_compliance.
+    compliance_where = compliance_filter(
+        "TRUCK",
+        Truck.id,
+        compliance,
+        today=date.today(),
+        days=expiring_days,
+    )
+
+    if compliance_where is not None:
+        stmt = stmt.where(
+            compliance_where
+        )
+
+    # Keyset sobre (plate, id). Cada item es la fila completa
+    # (Truck, asignación, chofer), como la usa la plantilla.
+    pagination = keyset_paginate(
         stmt,
-        page=page,
+        [
+            (Truck.plate, "asc"),
+            (Truck.id, "asc"),
+        ],
+        key=lambda row: (row[0].plate, row[0].id),
+        cursor=request.args.get("cursor"),
         per_page=per_page,
-        error_out=False,
     )
 
     return render_template(
@@ -2031,8 +1942,13 @@ def trucks_list():
             "registered_site_id": (
                 registered_site_id
             ),
+            "compliance": compliance,
+            "expiring_days": expiring_days,
             "per_page": per_page,
         },
+        compliance_filters=(
+            COMPLIANCE_FILTERS
+        ),
     )
 
 
@@ -2088,120 +2004,38 @@ def truck_create():
 @login_required
 @require_permission("drivers.view")
 def truck_detail(truck_id: int):
-    stmt = (
-        select(Truck)
-        .options(
-            joinedload(
-                Truck.registered_site
-            ),
-            joinedload(
-                Truck.owner
-            ),
-            joinedload(
-                Truck.created_by
-            ),
-            joinedload(
-                Truck.updated_by
-            ),
-            selectinload(
-                Truck.documents
-            ),
-            noload(
-                Truck.assignments
-            ),
-            noload(
-                Truck.exit_permissions
-            ),
-            noload(
-                Truck.incidents
-            ),
-        )
-        .where(
-            Truck.id == truck_id
-        )
-    )
+    detail = get_truck_detail(truck_id)
 
-    truck = db.session.scalar(stmt)
-
-    if truck is None:
+    if detail is None:
         abort(404)
 
-    active_assignment = (
-        _get_active_assignment_for_truck_detail(
-            truck.id
-        )
-    )
-
-    assignment_stmt = (
-        select(DriverTruckAssignment)
-        .options(
-            joinedload(
-                DriverTruckAssignment.driver
-            ).joinedload(
-                Driver.habitual_site
-            ),
-            joinedload(
-                DriverTruckAssignment.created_by
-            ),
-            joinedload(
-                DriverTruckAssignment.ended_by
-            ),
-        )
-        .where(
-            DriverTruckAssignment.truck_id
-            == truck.id
-        )
-        .order_by(
-            DriverTruckAssignment.started_at.desc(),
-            DriverTruckAssignment.id.desc(),
-        )
-        .limit(20)
+    return render_template(
+        "transport/truck_detail.html",
+        truck=detail["truck"],
+        detail=detail,
+        active_assignment=detail["active_assignment"],
+        assignments=detail["assignments"],
+        incidents=detail["incidents"],
+        exit_permissions=detail["exit_permissions"],
+        document_statuses=DOCUMENT_STATUSES,
     )
 
-    assignments = list(
-        db.session.scalars(
-            assignment_stmt
-        ).unique().all()
-    )
 
-    incident_stmt = (
-        select(TransportIncident)
-        .options(
-            joinedload(
-                TransportIncident.driver
-            ),
-            joinedload(
-                TransportIncident.reported_by
-            ),
-            noload(
-                TransportIncident.follow_ups
-            ),
-        )
-        .where(
-            TransportIncident.truck_id
-            == truck.id
-        )
-        .order_by(
-            TransportIncident.occurred_at.desc(),
-            TransportIncident.id.desc(),
-        )
-        .limit(10)
-    )
+@transport_bp.get(
+    "/api/trucks/<int:truck_id>/detail"
+)
+@login_required
+@require_permission("drivers.view")
+def api_truck_detail(truck_id: int):
+    detail = get_truck_detail(truck_id)
 
-    incidents = list(
-        db.session.scalars(
-            incident_stmt
-        ).unique().all()
-    )
+    if detail is None:
+        abort(404)
 
-    return render_template(
-        "transport/truck_detail.html",
-        truck=truck,
-        active_assignment=active_assignment,
-        assignments=assignments,
-        incidents=incidents,
-        document_statuses=DOCUMENT_STATUSES,
-    )
+    return jsonify({
+        "ok": True,
+        **_detail_json_for_user(detail),
+    })
 
 
 @transport_bp.route(
@@ -2467,6 +2301,63 @@ def assignment_create():
     )
 
 
+@transport_bp.get("/api/available-drivers")
+@login_required
+@require_permission("drivers.actions")
+def api_available_drivers():
+    """
+    Selector de choferes del formulario de asignación (búsqueda
+    mientras se escribe).
+    """
+    drivers = get_available_drivers(
+        search=request.args.get("q"),
+        limit=request.args.get(
+            "limit",
+            default=50,
+            type=int,
+        ),
+    )
+
+    return jsonify({
+        "ok": True,
+        "items": [
+            {
+                "id": driver.id,
+                "label": (
+                    f"{driver.name} · "
+                    f"{driver.identification}"
+                ),
+            }
+            for driver in drivers
+        ],
+    })
+
+
+@transport_bp.get("/api/available-trucks")
+@login_required
+@require_permission("drivers.actions")
+def api_available_trucks():
+    trucks = get_available_trucks(
+        search=request.args.get("q"),
+        limit=request.args.get(
+            "limit",
+            default=50,
+            type=int,
+        ),
+    )
+
+    return jsonify({
+        "ok": True,
+        "items": [
+            {
+                "id": truck.id,
+                "label": truck.plate,
+            }
+            for truck in trucks
+        ],
+    })
+
+
 @transport_bp.post(
     "/assignments/<int:assignment_id>/end"
 )
@@ -2629,17 +2520,23 @@ def exit_permissions_list():
             == status
         )
 
+    # Sin COUNT(*) por visita: los totales por estado salen de
+    # transport_counters.
     pagination = db.paginate(
         stmt,
         page=page,
         per_page=per_page,
         error_out=False,
+        count=False,
     )
 
     return render_template(
         "transport/exit_permissions_list.html",
         pagination=pagination,
         permissions=pagination.items,
+        status_counts=transport_counters(
+            "exit_permissions"
+        )["exit_permissions"],
         filters={
             "q": search,
             "status": status,
@@ -2870,7 +2767,6 @@ def exit_permission_cancel(permission_id: int):
 @login_required
 @require_permission("drivers.history.view")
 def incidents_list():
-    page = _safe_page()
     per_page = _safe_per_page()
 
     search = _clean_arg("q")
@@ -2950,17 +2846,30 @@ def incidents_list():
             == incident_type
         )
 
-    pagination = db.paginate(
+    # Keyset sobre (occurred_at, id): cada página baja por
+    # ix_transport_incidents_occurred (o _status_occurred con filtro de
+    # estado) sin recorrer las anteriores. Los totales por estado salen
+    # de transport_counters.
+    pagination = keyset_paginate(
         stmt,
-        page=page,
+        [
+            (TransportIncident.occurred_at, "desc"),
+            (TransportIncident.id, "desc"),
+        ],
+        key=lambda incident: (incident.occurred_at, incident.id),
+        cursor=request.args.get("cursor"),
         per_page=per_page,
-        error_out=False,
+        scalars=True,
+        with_total=False,
     )
 
     return render_template(
         "transport/incidents_list.html",
         pagination=pagination,
         incidents=pagination.items,
+        status_counts=transport_counters(
+            "incidents"
+        )["incidents"],
         incident_statuses=INCIDENT_STATUSES,
         incident_types=INCIDENT_TYPES,
         filters={
@@ -3133,7 +3042,21 @@ def incident_detail(incident_id: int):
     incident = db.session.scalar(stmt)
 
     if incident is None:
-        abort(404)
+        # Cerrado hace tiempo: se muestra desde el archivo, sin acciones.
+        archived = get_archived_incident(incident_id)
+
+        if archived is None:
+            abort(404)
+
+        archived_incident, follow_ups = archived
+
+        return render_template(
+            "transport/incident_archived.html",
+            incident=archived_incident,
+            follow_ups=follow_ups,
+            driver=db.session.get(Driver, archived_incident.driver_id) if archived_incident.driver_id else None,
+            truck=db.session.get(Truck, archived_incident.truck_id),
+        )
 
     return render_template(
         "transport/incident_detail.html",
@@ -3143,6 +3066,57 @@ def incident_detail(incident_id: int):
     )
 
 
+@transport_bp.get("/api/incidents/timeline")
+@login_required
+@require_permission("drivers.history.view")
+def api_incident_timeline():
+    """
+    Línea de tiempo de incidentes (reporte, seguimientos y cierre).
+
+    ?from=AAAA-MM-DD&to=AAAA-MM-DD (por defecto los últimos 90 días),
+    opcional driver_id / truck_id. Los meses archivados solo se leen
+    si el rango llega a ellos.
+    """
+    try:
+        until = date.fromisoformat(
+            request.args.get("to") or date.today().isoformat()
+        )
+        since = date.fromisoformat(
+            request.args.get("from")
+            or (until - timedelta(days=90)).isoformat()
+        )
+
+    except ValueError:
+        return jsonify({
+            "ok": False,
+            "error": "Fechas inválidas (use AAAA-MM-DD).",
+        }), 400
+
+    try:
+        timeline = incident_timeline(
+            since=since,
+            until=until,
+            driver_id=request.args.get("driver_id", type=int),
+            truck_id=request.args.get("truck_id", type=int),
+            limit=request.args.get(
+                "limit",
+                TIMELINE_LIMIT,
+                type=int,
+            ),
+        )
+
+    except ValueError as exc:
+        return jsonify({
+            "ok": False,
+            "error": str(exc),
+        }), 400
+
+    return jsonify({
+        "ok": True,
+        **detail_json(timeline),
+    })
+
+
 @transport_bp.post(
     "/incidents/<int:incident_id>/follow-up"
 )
@@ -3277,6 +3251,144 @@ def incident_cancel(incident_id: int):
     )
 
 
+# =========================================================
+# VENCIMIENTOS
+# =========================================================
+def _expiring_rows(
+    entity_type: str,
+    filter_key: str,
+    *,
+    today: date,
+    days: int,
+) -> list[dict]:
+    """
+    Choferes activos o cabezales en uso que cumplen el filtro, desde
+    transport_compliance (no recorre tablas de documentos).
+    """
+    condition = compliance_condition(
+        filter_key,
+        today=today,
+        days=days,
+    )
+
+    if entity_type == "DRIVER":
+        stmt = (
+            select(
+                TransportCompliance,
+                Driver.id.label("entity_id"),
+                Driver.name.label("label"),
+                Driver.identification.label("detail"),
+            )
+            .join(
+                Driver,
+                Driver.id == TransportCompliance.entity_id,
+            )
+            .where(
+                Driver.status == "ACTIVE"
+            )
+        )
+        label_column = Driver.name
+
+    else:
+        stmt = (
+            select(
+                TransportCompliance,
+                Truck.id.label("entity_id"),
+                Truck.plate.label("label"),
+                Truck.status.label("detail"),
+            )
+            .join(
+                Truck,
+                Truck.id == TransportCompliance.entity_id,
+            )
+            .where(
+                Truck.status != "INACTIVE"
+            )
+        )
+        label_column = Truck.plate
+
+    stmt = (
+        stmt
+        .where(
+            TransportCompliance.entity_type
+            == entity_type,
+            condition,
+        )
+        .order_by(
+            TransportCompliance.next_expiry_date.asc().nulls_last(),
+            label_column.asc(),
+        )
+        .limit(EXPIRING_DASHBOARD_LIMIT)
+    )
+
+    return [
+        {
+            "id": row.entity_id,
+            "label": row.label,
+            "detail": row.detail,
+            "next_expiry_date": (
+                row[0].next_expiry_date
+            ),
+            "days_left": (
+                (row[0].next_expiry_date - today).days
+                if row[0].next_expiry_date
+                else None
+            ),
+            "blocking": [
+                {
+                    **document,
+                    "label": COMPLIANCE_DOCUMENT_LABELS.get(
+                        document.get("document"),
+                        document.get("document"),
+                    ),
+                }
+                for document in (
+                    row[0].blocking_documents or []
+                )
+            ],
+        }
+        for row in db.session.execute(stmt)
+    ]
+
+
+@transport_bp.get("/expiring")
+@login_required
+@require_permission("drivers.view")
+def expiring_dashboard():
+    """
+    Panel de vencimientos: quién vence en los próximos días y quién
+    ya tiene documentos vencidos, para choferes y cabezales.
+    """
+    _, expiring_days = _compliance_args()
+    today = date.today()
+
+    sections = {
+        entity_type: {
+            filter_key: _expiring_rows(
+                entity_type,
+                filter_key,
+                today=today,
+                days=expiring_days,
+            )
+            for filter_key in ("EXPIRING", "EXPIRED")
+        }
+        for entity_type in ("DRIVER", "TRUCK")
+    }
+
+    return render_template(
+        "transport/expiring.html",
+        summary=compliance_summary(
+            today=today,
+            days=expiring_days,
+        ),
+        sections=sections,
+        compliance_filters=COMPLIANCE_FILTERS,
+        expiring_days=expiring_days,
+        limit=EXPIRING_DASHBOARD_LIMIT,
+        today=today,
+    )
+
+
 # =========================================================
 # HISTORIAL DOCUMENTAL
 # =========================================================
@@ -3284,7 +3396,6 @@ def incident_cancel(incident_id: int):
 @login_required
 @require_permission("drivers.history.view")
 def history():
-    page = _safe_page()
     per_page = _safe_per_page()
 
     entity_type = _clean_arg(
@@ -3337,11 +3448,18 @@ def history():
             == document_type
         )
 
-    pagination = db.paginate(
+    # Keyset sobre (changed_at, id). Con entidad indicada usa el
+    # índice (entity_type, entity_id, changed_at, id).
+    pagination = keyset_paginate(
         stmt,
-        page=page,
+        [
+            (TransportDocumentChange.changed_at, "desc"),
+            (TransportDocumentChange.id, "desc"),
+        ],
+        key=lambda change: (change.changed_at, change.id),
+        cursor=request.args.get("cursor"),
         per_page=per_page,
-        error_out=False,
+        scalars=True,
     )
 
     return render_template(
@@ -3354,4 +3472,167 @@ def history():
             "document_type": document_type,
             "per_page": per_page,
         },
-    )
\ No newline at end of file
+    )
+
+
+# =========================================================
+# ADJUNTOS: SUBIDA DIRECTA A R2
+# =========================================================
+@transport_bp.post("/api/attachments/presign")
+@login_required
+@require_permission("drivers.operations")
+def attachment_presign():
+    """
+    Entrega una URL PUT prefirmada para que el navegador suba el
+    adjunto directo a R2. El registro se crea en attachment_confirm.
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        target_type, target_id = validate_attachment_target(
+            data.get("target_type"),
+            data.get("target_id"),
+        )
+    except TransportServiceError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    content_type = (
+        data.get("content_type") or ""
+    ).strip().lower()
+
+    if not content_type.startswith(ATTACHMENT_MIME_PREFIXES):
+        return jsonify({
+            "ok": False,
+            "error": "Solo se permiten imágenes o archivos PDF.",
+        }), 400
+
+    key = build_attachment_key(
+        target_type,
+        target_id,
+        data.get("filename") or "",
+    )
+
+    upload = get_storage().presign_upload(
+        key,
+        content_type=content_type,
+        expires_in=int(
+            current_app.config.get(
+                "DIRECT_UPLOAD_EXPIRES_SECONDS",
+                900,
+            )
+        ),
+    )
+
+    return jsonify({"ok": True, **upload})
+
+
+@transport_bp.post("/api/attachments/confirm")
+@login_required
+@require_permission("drivers.operations")
+def attachment_confirm():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        target_type, target_id = validate_attachment_target(
+            data.get("target_type"),
+            data.get("target_id"),
+        )
+    except TransportServiceError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    key = (data.get("key") or "").strip()
+
+    if (
+        not key.startswith(
+            attachment_key_prefix(
+                target_type,
+                target_id,
+            )
+        )
+        or ".." in key
+    ):
+        return jsonify({"ok": False, "error": "INVALID_KEY"}), 400
+
+    storage = get_storage()
+    head = storage.head_object(key)
+
+    if head is None:
+        return jsonify({"ok": False, "error": "OBJECT_NOT_FOUND"}), 400
+
+    size_bytes = int(head.get("ContentLength") or 0)
+    max_bytes = int(
+        current_app.config.get(
+            "DIRECT_UPLOAD_MAX_BYTES",
+        )
+        or 0
+    )
+
+    if max_bytes and size_bytes > max_bytes:
+        storage.delete_object(key)
+
+        return jsonify({"ok": False, "error": "FILE_TOO_LARGE"}), 400
+
+    # La descarga para el hash puede tardar: se cierra la transacción
+    # de lectura para no dejar la conexión ociosa durante la
+    # transferencia y el destino se valida de nuevo después.
+    db.session.commit()
+
+    # Deduplicación con el hash calculado por el servidor sobre el
+    # objeto subido (p. ej. la cédula ya subida en Gate Out): el
+    # adjunto apunta al objeto existente y se borra la copia.
+    content_sha256, size_bytes = hash_storage_object(storage, key)
+
+    try:
+        validate_attachment_target(target_type, target_id)
+    except TransportServiceError as exc:
+        storage.delete_object(key)
+
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    stored = find_stored_object(content_sha256)
+
+    storage_key = key
+    url = storage.public_url(key)
+
+    if stored is not None and stored.storage_key != key:
+        storage_key = stored.storage_key
+        url = stored.url
+    else:
+        register_stored_object(
+            content_sha256=content_sha256,
+            storage_key=key,
+            url=url,
+            size_bytes=size_bytes,
+            content_type=head.get("ContentType"),
+        )
+
+    try:
+        attachment = register_transport_attachment(
+            target_type=target_type,
+            target_id=target_id,
+            storage_key=storage_key,
+            original_filename=(
+                data.get("filename")
+                or key.rsplit("/", 1)[-1]
+            ),
+            mime_type=head.get("ContentType"),
+            size_bytes=size_bytes,
+            description=data.get("description"),
+            content_sha256=content_sha256,
+            user_id=current_user.id,
+        )
+    except TransportServiceError as exc:
+        db.session.rollback()
+        storage.delete_object(key)
+
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    if storage_key != key:
+        storage.delete_object(key)
+
+    return jsonify({
+        "ok": True,
+        "attachment_id": attachment.id,
+        "url": url,
+        "duplicate": storage_key != key,
+    })
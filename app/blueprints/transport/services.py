@@ -2,26 +2,41 @@
 
 from __future__ import annotations
 
+from functools import partial
 from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
 from typing import Any, Iterable
 
-from sqlalchemy import exists, func, or_, select
+from sqlalchemy import exists, func, insert, select, update
 from sqlalchemy.exc import IntegrityError
 from io import BytesIO
 from datetime import date, datetime, timedelta
-from sqlalchemy.orm import joinedload
-from openpyxl import Workbook, load_workbook
+from sqlalchemy.orm import joinedload, noload
+from openpyxl import Workbook
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.datavalidation import DataValidation
 from app.extensions import db
+from app.services.bulk_import import execute, stage_rows, upsert_counts
+from app.services.excel_ingest import iter_sheet_rows, map_rows, open_workbook, sheet_row_estimate
+from app.services.export_jobs import ExportFile, register_export
+from app.services.import_sessions import build_preview, register_import
+from app.services.scheduler import scheduled_job
+from app.services.search import normalize_search_key, search_condition, search_rank
+from app.services.transport_compliance import refresh_stale_transport_compliance
+from app.services.write_hooks import (
+    mark_transport_compliance_touched,
+    mark_transport_counters_stale,
+    mark_transport_detail_touched,
+)
+from app.services.xlsx_export import XLSX_MIMETYPE
 from app.models.transport import (
     Driver,
     DriverApmRecord,
     DriverDocument,
     DriverExitPermission,
     DriverTruckAssignment,
+    TransportAttachment,
     TransportDocumentChange,
     TransportIncident,
     TransportIncidentFollowUp,
@@ -532,62 +547,131 @@ def get_incident_or_404(
 # =========================================================
 # HISTORIAL DOCUMENTAL
 # =========================================================
-def register_document_change(
-    *,
-    entity_type: str,
-    entity_id: int,
-    document_type: str,
-    field_name: str,
-    old_value: Any,
-    new_value: Any,
-    changed_by_user_id: int,
-    notes: str | None = None,
-) -> TransportDocumentChange | None:
+DOCUMENT_CHANGE_ENTITY_TYPES = {
+    "DRIVER",
+    "TRUCK",
+    "APM",
+}
+
+
+class DocumentChangeSet:
     """
-    Registra únicamente cambios reales.
+    Cambios documentales de una operación.
 
-    No ejecuta commit por sí solo para permitir que forme parte de
-    la misma transacción del registro principal.
+    diff() compara la foto anterior y la nueva de un registro en una
+    sola pasada y acumula únicamente los cambios reales; write() los
+    guarda con un solo INSERT de varias filas. No ejecuta commit:
+    forma parte de la misma transacción del registro principal.
+
+    Una edición que toca varios registros (p. ej. la fila completa de
+    la matriz de choferes) comparte un mismo DocumentChangeSet.
     """
-    entity_type = _validate_choice(
-        entity_type,
-        "tipo de entidad",
-        {
-            "DRIVER",
-            "TRUCK",
-            "APM",
-        },
-    )
 
-    if not _different(
-        old_value,
-        new_value,
+    def __init__(
+        self,
+        *,
+        changed_by_user_id: int,
+        notes: Any = None,
     ):
-        return None
+        self.changed_by_user_id = changed_by_user_id
+        self.notes = _clean_text(notes)
+        self.changed_at = datetime.utcnow()
+        self.rows: list[dict[str, Any]] = []
+
+    def diff(
+        self,
+        *,
+        entity_type: str,
+        entity_id: int,
+        document_type: str,
+        old_values: dict[str, Any],
+        new_values: dict[str, Any],
+    ) -> int:
+        if entity_type not in DOCUMENT_CHANGE_ENTITY_TYPES:
+            raise TransportValidationError(
+                "El tipo de entidad del historial no es válido."
+            )
 
-    change = TransportDocumentChange(
-        entity_type=entity_type,
-        entity_id=entity_id,
-        document_type=_required_text(
+        document_type = _required_text(
             document_type,
             "tipo de documento",
             upper=True,
             max_length=50,
-        ),
-        field_name=_required_text(
-            field_name,
-            "campo modificado",
-            max_length=80,
-        ),
-        old_value=_display_value(old_value),
-        new_value=_display_value(new_value),
-        changed_by_user_id=changed_by_user_id,
-        notes=_clean_text(notes),
-    )
+        )
+
+        before = len(self.rows)
+
+        for field_name, old_value in old_values.items():
+            new_value = new_values.get(field_name)
+
+            if not _different(
+                old_value,
+                new_value,
+            ):
+                continue
+
+            self.rows.append({
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "document_type": document_type,
+                "field_name": field_name,
+                "old_value": _display_value(old_value),
+                "new_value": _display_value(new_value),
+                "changed_by_user_id": self.changed_by_user_id,
+                "changed_at": self.changed_at,
+                "notes": self.notes,
+            })
+
+        return len(self.rows) - before
+
+    def write(self) -> int:
+        """
+        Inserta los cambios acumulados y vacía el conjunto.
+        """
+        rows, self.rows = self.rows, []
 
-    db.session.add(change)
+        if rows:
+            db.session.execute(
+                insert(TransportDocumentChange.__table__).values(rows)
+            )
+
+            # Core no pasa por after_flush: la ficha 360° se invalida
+            # al hacer COMMIT.
+            mark_transport_detail_touched(
+                driver_ids=[
+                    row["entity_id"]
+                    for row in rows
+                    if row["entity_type"] in {"DRIVER", "APM"}
+                ],
+                truck_ids=[
+                    row["entity_id"]
+                    for row in rows
+                    if row["entity_type"] == "TRUCK"
+                ],
+            )
+
+        return len(rows)
+
+
+def _record_changes(
+    changes: DocumentChangeSet | None,
+    *,
+    user_id: int,
+    **diff_kwargs: Any,
+) -> None:
+    """
+    Con changes de quien llama solo acumula (él hace write()); sin
+    él, compara y guarda de inmediato.
+    """
+    if changes is not None:
+        changes.diff(**diff_kwargs)
+        return
 
-    return change
+    own_changes = DocumentChangeSet(
+        changed_by_user_id=user_id,
+    )
+    own_changes.diff(**diff_kwargs)
+    own_changes.write()
 
 
 # =========================================================
@@ -914,6 +998,7 @@ def upsert_driver_document(
     *,
     user_id: int,
     commit: bool = True,
+    changes: DocumentChangeSet | None = None,
 ) -> DriverDocument:
     normalized_type = _validate_choice(
         document_type,
@@ -998,16 +1083,15 @@ def upsert_driver_document(
         "notes": document.notes,
     }
 
-    for field_name, old_value in old_values.items():
-        register_document_change(
-            entity_type="DRIVER",
-            entity_id=driver.id,
-            document_type=normalized_type,
-            field_name=field_name,
-            old_value=old_value,
-            new_value=new_values[field_name],
-            changed_by_user_id=user_id,
-        )
+    _record_changes(
+        changes,
+        user_id=user_id,
+        entity_type="DRIVER",
+        entity_id=driver.id,
+        document_type=normalized_type,
+        old_values=old_values,
+        new_values=new_values,
+    )
 
     if commit:
         _commit_or_raise(
@@ -1072,6 +1156,7 @@ def upsert_driver_apm_record(
     *,
     user_id: int,
     commit: bool = True,
+    changes: DocumentChangeSet | None = None,
 ) -> DriverApmRecord:
     record = db.session.scalar(
         select(DriverApmRecord)
@@ -1168,16 +1253,15 @@ def upsert_driver_apm_record(
         "notes": record.notes,
     }
 
-    for field_name, old_value in old_values.items():
-        register_document_change(
-            entity_type="APM",
-            entity_id=driver.id,
-            document_type="APM",
-            field_name=field_name,
-            old_value=old_value,
-            new_value=new_values[field_name],
-            changed_by_user_id=user_id,
-        )
+    _record_changes(
+        changes,
+        user_id=user_id,
+        entity_type="APM",
+        entity_id=driver.id,
+        document_type="APM",
+        old_values=old_values,
+        new_values=new_values,
+    )
 
     if commit:
         _commit_or_raise(
@@ -1334,6 +1418,7 @@ def update_truck(
     *,
     user_id: int,
     commit: bool = True,
+    changes: DocumentChangeSet | None = None,
 ) -> Truck:
     plate = _normalize_plate(
         data.get(
@@ -1554,16 +1639,15 @@ def update_truck(
         "bonded_status": truck.bonded_status,
     }
 
-    for field_name, old_value in old_values.items():
-        register_document_change(
-            entity_type="TRUCK",
-            entity_id=truck.id,
-            document_type="TRUCK",
-            field_name=field_name,
-            old_value=old_value,
-            new_value=new_values[field_name],
-            changed_by_user_id=user_id,
-        )
+    _record_changes(
+        changes,
+        user_id=user_id,
+        entity_type="TRUCK",
+        entity_id=truck.id,
+        document_type="TRUCK",
+        old_values=old_values,
+        new_values=new_values,
+    )
 
     if commit:
         _commit_or_raise(
@@ -1619,6 +1703,7 @@ def upsert_truck_document(
     *,
     user_id: int,
     commit: bool = True,
+    changes: DocumentChangeSet | None = None,
 ) -> TruckDocument:
     normalized_type = _required_text(
         document_type,
@@ -1704,16 +1789,15 @@ def upsert_truck_document(
         "notes": document.notes,
     }
 
-    for field_name, old_value in old_values.items():
-        register_document_change(
-            entity_type="TRUCK",
-            entity_id=truck.id,
-            document_type=normalized_type,
-            field_name=field_name,
-            old_value=old_value,
-            new_value=new_values[field_name],
-            changed_by_user_id=user_id,
-        )
+    _record_changes(
+        changes,
+        user_id=user_id,
+        entity_type="TRUCK",
+        entity_id=truck.id,
+        document_type=normalized_type,
+        old_values=old_values,
+        new_values=new_values,
+    )
 
     if commit:
         _commit_or_raise(
@@ -1761,7 +1845,12 @@ def update_driver_complete_row(
     - Solo procesa el chofer recibido.
     - No guarda la tabla completa.
     - Todo queda dentro de una única transacción.
+    - El historial documental de toda la fila se guarda con un
+      solo INSERT (DocumentChangeSet).
     """
+    changes = DocumentChangeSet(
+        changed_by_user_id=user_id,
+    )
 
     # =====================================================
     # 1. DATOS GENERALES DEL CHOFER
@@ -1864,6 +1953,7 @@ def update_driver_complete_row(
             document_data,
             user_id=user_id,
             commit=False,
+            changes=changes,
         )
 
     # =====================================================
@@ -1908,6 +1998,7 @@ def update_driver_complete_row(
             apm_data,
             user_id=user_id,
             commit=False,
+            changes=changes,
         )
 
     # =====================================================
@@ -2238,11 +2329,14 @@ def update_driver_complete_row(
             truck_data,
             user_id=user_id,
             commit=False,
+            changes=changes,
         )
 
     # =====================================================
     # 7. GUARDADO ÚNICO
     # =====================================================
+    changes.write()
+
     if commit:
         _commit_or_raise(
             "No fue posible guardar la fila del chofer. "
@@ -2252,1777 +2346,1224 @@ def update_driver_complete_row(
 
     return driver
 
-def bulk_import_transport_excel(
-    file_stream,
-    *,
-    user_id: int,
-    registered_site_id: int,
-    habitual_site_id: int | None = None,
-) -> dict[str, Any]:
-    """
-    Importa choferes/cabezales desde la plantilla Excel.
 
-    Diseño optimizado para Render + PostgreSQL:
+# =========================================================
+# CARGA MASIVA: SQL POR CONJUNTOS
+#
+# Las filas del Excel se cargan con COPY en tablas temporales
+# (app/services/bulk_import.py) y se aplican con estas sentencias.
+# Si un chofer o una placa se repite en el archivo, gana la última
+# fila, igual que cuando se procesaba fila por fila.
+# =========================================================
+_TRANSPORT_IMPORT_ROW_COLUMNS = [
+    ("name", "text NOT NULL"),
+    ("residence", "text"),
+    ("identification", "text NOT NULL"),
+    ("phone", "text"),
+    ("plate", "text"),
+    ("registration_date", "date"),
+    ("owner_name", "text"),
+    ("owner_phone", "text"),
+    ("truck_dock_expiry", "date"),
+    ("circulation_card", "text"),
+    ("rtv_month", "smallint"),
+    ("rtv_year", "smallint"),
+    ("insurance_name", "text"),
+    ("rt_expiry", "date"),
+    ("rt_name", "text"),
+    ("weights_dimensions", "numeric(12, 2)"),
+    ("policy_number", "text"),
+    ("bonded_status", "text"),
+    ("has_apm", "boolean NOT NULL"),
+    ("apm_training_status", "text"),
+    ("apm_card_status", "text"),
+    ("apm_card_number", "text"),
+    ("apm_expiry_mode", "text"),
+    ("apm_expiry_date", "date"),
+]
+
+_TRANSPORT_IMPORT_DOCUMENT_COLUMNS = [
+    ("identification", "text NOT NULL"),
+    ("document_type", "text NOT NULL"),
+    ("document_number", "text"),
+    ("expiry_date", "date"),
+    ("status", "text NOT NULL"),
+    ("has_value", "boolean NOT NULL"),
+]
+
+_TRANSPORT_IMPORT_DRIVERS_SQL = """
+    INSERT INTO yard_gate_alamo.drivers AS d (
+        name, residence, identification, phone_1,
+        habitual_site_id, status,
+        created_by_user_id, updated_by_user_id,
+        created_at, updated_at
+    )
+    SELECT DISTINCT ON (s.identification)
+        s.name, s.residence, s.identification, s.phone,
+        CAST(:habitual_site_id AS integer), 'ACTIVE',
+        :user_id, :user_id,
+        :now, :now
+    FROM stg_transport_rows s
+    ORDER BY s.identification, s.row_no DESC
+
+    -- Nombre siempre; el resto solo si viene en el Excel.
+    -- habitual_site_id NULL = no cambiar la condición de patiero.
+    ON CONFLICT (identification) DO UPDATE SET
+        name = EXCLUDED.name,
+        residence = COALESCE(EXCLUDED.residence, d.residence),
+        phone_1 = COALESCE(EXCLUDED.phone_1, d.phone_1),
+        habitual_site_id = COALESCE(EXCLUDED.habitual_site_id, d.habitual_site_id),
+        updated_by_user_id = EXCLUDED.updated_by_user_id,
+        updated_at = EXCLUDED.updated_at
+
+    RETURNING (xmax = 0) AS inserted
+"""
+
+# Propietarios: la llave real es (nombre, teléfono).
+_TRANSPORT_IMPORT_OWNER_MATCH = """
+    upper(trim(o.name)) = s.owner_name
+    AND COALESCE(o.phone, '') = COALESCE(s.owner_phone, '')
+"""
+
+_TRANSPORT_IMPORT_OWNERS_SQL = f"""
+    WITH incoming AS (
+        SELECT DISTINCT s.owner_name, s.owner_phone
+        FROM stg_transport_rows s
+        WHERE s.plate IS NOT NULL
+          AND s.owner_name IS NOT NULL
+    ),
+    reactivated AS (
+        UPDATE yard_gate_alamo.truck_owners o
+        SET is_active = TRUE,
+            updated_at = :now
+        FROM incoming s
+        WHERE {_TRANSPORT_IMPORT_OWNER_MATCH}
+        RETURNING o.id
+    )
+    INSERT INTO yard_gate_alamo.truck_owners (
+        name, phone, is_active, created_at, updated_at
+    )
+    SELECT s.owner_name, s.owner_phone, TRUE, :now, :now
+    FROM incoming s
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM yard_gate_alamo.truck_owners o
+        WHERE {_TRANSPORT_IMPORT_OWNER_MATCH}
+    )
+"""
+
+_TRANSPORT_IMPORT_TRUCKS_CTE = """
+    WITH latest AS (
+        SELECT DISTINCT ON (s.plate) s.*
+        FROM stg_transport_rows s
+        WHERE s.plate IS NOT NULL
+        ORDER BY s.plate, s.row_no DESC
+    ),
+    incoming AS (
+        SELECT l.*, owner_match.id AS owner_id
+        FROM latest l
+        LEFT JOIN LATERAL (
+            SELECT o.id
+            FROM yard_gate_alamo.truck_owners o
+            WHERE upper(trim(o.name)) = l.owner_name
+              AND COALESCE(o.phone, '') = COALESCE(l.owner_phone, '')
+            ORDER BY o.id
+            LIMIT 1
+        ) owner_match ON l.owner_name IS NOT NULL
+    )
+"""
+
+# Cabezales existentes: solo se reemplaza lo que trae el Excel.
+_TRANSPORT_IMPORT_UPDATE_TRUCKS_SQL = _TRANSPORT_IMPORT_TRUCKS_CTE + """
+    UPDATE yard_gate_alamo.trucks t
+    SET registration_date = COALESCE(i.registration_date, t.registration_date),
+        owner_id = COALESCE(i.owner_id, t.owner_id),
+        dock_permit_expiry_date = COALESCE(i.truck_dock_expiry, t.dock_permit_expiry_date),
+        circulation_card = COALESCE(i.circulation_card, t.circulation_card),
+        dekra_month = COALESCE(i.rtv_month, t.dekra_month),
+        dekra_year = COALESCE(i.rtv_year, t.dekra_year),
+        insurance_name = COALESCE(i.insurance_name, t.insurance_name),
+        rt_expiry_date = COALESCE(i.rt_expiry, t.rt_expiry_date),
+        rt_name = COALESCE(i.rt_name, t.rt_name),
+        weights_dimensions = COALESCE(i.weights_dimensions, t.weights_dimensions),
+        policy_number = COALESCE(i.policy_number, t.policy_number),
+        bonded_status = COALESCE(i.bonded_status, t.bonded_status),
+        updated_by_user_id = :user_id,
+        updated_at = :now
+    FROM incoming i
+    WHERE t.plate = i.plate
+"""
+
+_TRANSPORT_IMPORT_INSERT_TRUCKS_SQL = _TRANSPORT_IMPORT_TRUCKS_CTE + """
+    INSERT INTO yard_gate_alamo.trucks (
+        plate, registration_date, registered_site_id, owner_id,
+        status, bonded_status,
+        dock_permit_expiry_date, circulation_card,
+        dekra_month, dekra_year,
+        insurance_name, rt_expiry_date, rt_name,
+        weights_dimensions, policy_number, is_payroll,
+        created_by_user_id, updated_by_user_id,
+        created_at, updated_at
+    )
+    SELECT
+        i.plate,
+        COALESCE(i.registration_date, :today),
+        :registered_site_id,
+        i.owner_id,
+        'ACTIVE',
+        COALESCE(i.bonded_status, 'PENDING'),
+        i.truck_dock_expiry, i.circulation_card,
+        i.rtv_month, i.rtv_year,
+        i.insurance_name, i.rt_expiry, i.rt_name,
+        i.weights_dimensions, i.policy_number, FALSE,
+        :user_id, :user_id,
+        :now, :now
+    FROM incoming i
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM yard_gate_alamo.trucks t
+        WHERE t.plate = i.plate
+    )
+    ON CONFLICT (plate) DO NOTHING
+"""
+
+# Documentos del chofer + historial documental en una sentencia.
+# Un documento nuevo completamente vacío no se crea; uno existente
+# se reemplaza con lo que trae el Excel.
+_TRANSPORT_IMPORT_DOCUMENTS_SQL = """
+    WITH incoming AS (
+        SELECT DISTINCT ON (dr.id, sd.document_type)
+            dr.id AS driver_id,
+            sd.document_type,
+            sd.document_number,
+            sd.expiry_date,
+            sd.status,
+            sd.has_value
+        FROM stg_transport_documents sd
+        JOIN yard_gate_alamo.drivers dr
+          ON dr.identification = sd.identification
+        ORDER BY dr.id, sd.document_type, sd.row_no DESC
+    ),
+    previous AS (
+        SELECT
+            dd.driver_id, dd.document_type, dd.document_number,
+            dd.status, dd.issue_date, dd.expiry_date,
+            dd.no_expiry, dd.notes
+        FROM yard_gate_alamo.driver_documents dd
+        JOIN incoming i
+          ON i.driver_id = dd.driver_id
+         AND i.document_type = dd.document_type
+    ),
+    upserted AS (
+        INSERT INTO yard_gate_alamo.driver_documents AS dd (
+            driver_id, document_type, document_number,
+            status, issue_date, expiry_date, no_expiry, notes,
+            updated_by_user_id, created_at, updated_at
+        )
+        SELECT
+            i.driver_id, i.document_type, i.document_number,
+            i.status, NULL, i.expiry_date, FALSE, NULL,
+            :user_id, :now, :now
+        FROM incoming i
+        WHERE i.has_value
+           OR EXISTS (
+                SELECT 1
+                FROM previous p
+                WHERE p.driver_id = i.driver_id
+                  AND p.document_type = i.document_type
+           )
+        ON CONFLICT (driver_id, document_type) DO UPDATE SET
+            document_number = EXCLUDED.document_number,
+            status = EXCLUDED.status,
+            issue_date = EXCLUDED.issue_date,
+            expiry_date = EXCLUDED.expiry_date,
+            no_expiry = EXCLUDED.no_expiry,
+            notes = EXCLUDED.notes,
+            updated_by_user_id = EXCLUDED.updated_by_user_id,
+            updated_at = EXCLUDED.updated_at
+        RETURNING
+            dd.driver_id, dd.document_type, dd.document_number,
+            dd.status, dd.issue_date, dd.expiry_date,
+            dd.no_expiry, dd.notes
+    ),
+    changes AS (
+        INSERT INTO yard_gate_alamo.transport_document_changes (
+            entity_type, entity_id, document_type, field_name,
+            old_value, new_value, changed_by_user_id, changed_at, notes
+        )
+        SELECT
+            'DRIVER', u.driver_id, u.document_type, f.field_name,
+            f.old_value, f.new_value, :user_id, :now, :notes
+        FROM upserted u
+        LEFT JOIN previous p
+          ON p.driver_id = u.driver_id
+         AND p.document_type = u.document_type
+        CROSS JOIN LATERAL (
+            VALUES
+                ('document_number', p.document_number, u.document_number),
+                ('status', p.status, u.status),
+                ('issue_date', p.issue_date::text, u.issue_date::text),
+                ('expiry_date', p.expiry_date::text, u.expiry_date::text),
+                (
+                    'no_expiry',
+                    CASE WHEN p.no_expiry THEN 'SI' WHEN NOT p.no_expiry THEN 'NO' END,
+                    CASE WHEN u.no_expiry THEN 'SI' ELSE 'NO' END
+                ),
+                ('notes', p.notes, u.notes)
+        ) AS f(field_name, old_value, new_value)
+        WHERE f.old_value IS DISTINCT FROM f.new_value
+        RETURNING 1
+    )
+    SELECT
+        (
+            SELECT count(*)
+            FROM upserted
+            WHERE document_number IS NOT NULL
+               OR expiry_date IS NOT NULL
+        ) AS documents,
+        (SELECT count(*) FROM changes) AS changes
+"""
+
+_TRANSPORT_IMPORT_APM_SQL = """
+    WITH incoming AS (
+        SELECT DISTINCT ON (dr.id)
+            dr.id AS driver_id,
+            s.apm_training_status,
+            s.apm_card_status,
+            s.apm_card_number,
+            s.apm_expiry_mode,
+            s.apm_expiry_date
+        FROM stg_transport_rows s
+        JOIN yard_gate_alamo.drivers dr
+          ON dr.identification = s.identification
+        WHERE s.has_apm
+        ORDER BY dr.id, s.row_no DESC
+    ),
+    previous AS (
+        SELECT
+            a.driver_id, a.training_status, a.card_status,
+            a.card_number, a.expiry_mode, a.expiry_date
+        FROM yard_gate_alamo.driver_apm_records a
+        JOIN incoming i
+          ON i.driver_id = a.driver_id
+    ),
+    upserted AS (
+        INSERT INTO yard_gate_alamo.driver_apm_records AS a (
+            driver_id, training_status, card_status, card_number,
+            expiry_mode, expiry_date,
+            updated_by_user_id, created_at, updated_at
+        )
+        SELECT
+            i.driver_id, i.apm_training_status, i.apm_card_status,
+            i.apm_card_number, i.apm_expiry_mode, i.apm_expiry_date,
+            :user_id, :now, :now
+        FROM incoming i
+        ON CONFLICT (driver_id) DO UPDATE SET
+            training_status = EXCLUDED.training_status,
+            card_status = EXCLUDED.card_status,
+            card_number = EXCLUDED.card_number,
+            expiry_mode = EXCLUDED.expiry_mode,
+            expiry_date = EXCLUDED.expiry_date,
+            updated_by_user_id = EXCLUDED.updated_by_user_id,
+            updated_at = EXCLUDED.updated_at
+        RETURNING
+            a.driver_id, a.training_status, a.card_status,
+            a.card_number, a.expiry_mode, a.expiry_date
+    ),
+    changes AS (
+        INSERT INTO yard_gate_alamo.transport_document_changes (
+            entity_type, entity_id, document_type, field_name,
+            old_value, new_value, changed_by_user_id, changed_at, notes
+        )
+        SELECT
+            'APM', u.driver_id, 'APM', f.field_name,
+            f.old_value, f.new_value, :user_id, :now, :notes
+        FROM upserted u
+        LEFT JOIN previous p
+          ON p.driver_id = u.driver_id
+        CROSS JOIN LATERAL (
+            VALUES
+                ('training_status', p.training_status, u.training_status),
+                ('card_status', p.card_status, u.card_status),
+                ('card_number', p.card_number, u.card_number),
+                ('expiry_mode', p.expiry_mode, u.expiry_mode),
+                ('expiry_date', p.expiry_date::text, u.expiry_date::text)
+        ) AS f(field_name, old_value, new_value)
+        WHERE f.old_value IS DISTINCT FROM f.new_value
+        RETURNING 1
+    )
+    SELECT
+        (SELECT count(*) FROM upserted) AS records,
+        (SELECT count(*) FROM changes) AS changes
+"""
+
+# Asignación inicial solo si ni el chofer ni el cabezal tienen una
+# activa. Dentro del archivo gana la primera fila de cada uno.
+_TRANSPORT_IMPORT_ASSIGNMENTS_SQL = """
+    WITH pairs AS (
+        SELECT DISTINCT ON (dr.id)
+            s.row_no,
+            dr.id AS driver_id,
+            t.id AS truck_id,
+            s.registration_date
+        FROM stg_transport_rows s
+        JOIN yard_gate_alamo.drivers dr
+          ON dr.identification = s.identification
+        JOIN yard_gate_alamo.trucks t
+          ON t.plate = s.plate
+        ORDER BY dr.id, s.row_no
+    ),
+    free AS (
+        SELECT DISTINCT ON (p.truck_id) p.*
+        FROM pairs p
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM yard_gate_alamo.driver_truck_assignments a
+            WHERE a.status = 'ACTIVE'
+              AND (a.driver_id = p.driver_id OR a.truck_id = p.truck_id)
+        )
+        ORDER BY p.truck_id, p.row_no
+    ),
+    inserted AS (
+        INSERT INTO yard_gate_alamo.driver_truck_assignments (
+            driver_id, truck_id, status, started_at, notes,
+            created_by_user_id, created_at
+        )
+        SELECT
+            f.driver_id,
+            f.truck_id,
+            'ACTIVE',
+            CAST(COALESCE(f.registration_date, :today) AS timestamp),
+            'Carga masiva inicial',
+            :user_id,
+            :now
+        FROM free f
+        RETURNING driver_id, truck_id
+    ),
+    -- Punteros de disponibilidad (drivers.current_truck_id /
+    -- trucks.current_driver_id), igual que assign_driver_to_truck().
+    driver_pointers AS (
+        UPDATE yard_gate_alamo.drivers dr
+        SET current_truck_id = i.truck_id
+        FROM inserted i
+        WHERE dr.id = i.driver_id
+        RETURNING 1
+    ),
+    truck_pointers AS (
+        UPDATE yard_gate_alamo.trucks t
+        SET current_driver_id = i.driver_id
+        FROM inserted i
+        WHERE t.id = i.truck_id
+        RETURNING 1
+    )
+    SELECT count(*) FROM inserted
+"""
+
+# Filas cuyo chofer o cabezal quedó con otra asignación activa.
+_TRANSPORT_IMPORT_ASSIGNMENT_CONFLICTS_SQL = """
+    SELECT s.row_no, s.name, s.plate
+    FROM stg_transport_rows s
+    JOIN yard_gate_alamo.drivers dr
+      ON dr.identification = s.identification
+    JOIN yard_gate_alamo.trucks t
+      ON t.plate = s.plate
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM yard_gate_alamo.driver_truck_assignments a
+        WHERE a.status = 'ACTIVE'
+          AND a.driver_id = dr.id
+          AND a.truck_id = t.id
+    )
+    ORDER BY s.row_no
+"""
+
+
+# Choferes y cabezales del archivo, para el índice de cumplimiento.
+_TRANSPORT_IMPORT_TOUCHED_DRIVERS_SQL = """
+    SELECT DISTINCT dr.id
+    FROM stg_transport_rows s
+    JOIN yard_gate_alamo.drivers dr
+      ON dr.identification = s.identification
+"""
+
+_TRANSPORT_IMPORT_TOUCHED_TRUCKS_SQL = """
+    SELECT DISTINCT t.id
+    FROM stg_transport_rows s
+    JOIN yard_gate_alamo.trucks t
+      ON t.plate = s.plate
+"""
 
-    - Excel en read_only=True.
-    - No precarga tablas completas.
-    - Procesa en bloques pequeños.
-    - No usa SAVEPOINT por fila.
-    - No hace flush por cada objeto.
-    - Consulta únicamente cédulas, placas y propietarios
-      presentes en cada bloque.
-    - 1 flush principal por bloque.
-    - 1 commit por bloque.
-    - Documentos/APM/asignaciones se crean después de
-      obtener los IDs del bloque.
 
-    Conceptos:
+# =========================================================
+# CARGA MASIVA: LECTURA DEL EXCEL
+#
+# Funciones de nivel de módulo: en archivos grandes la normalización
+# de filas corre en el pool de procesos de
+# app/services/excel_ingest.py.
+# =========================================================
+def _import_clean(value) -> str:
+    if value is None:
+        return ""
 
-    registered_site_id
-        Dato técnico obligatorio para cabezales nuevos.
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
 
-    habitual_site_id
-        Únicamente distintivo de patiero.
-        None = chofer normal.
-    """
+    return str(value).strip()
 
-    # =====================================================
-    # CONFIGURACIÓN
-    # =====================================================
-    BATCH_SIZE = 20
 
-    if not registered_site_id:
-        raise TransportValidationError(
-            "No fue posible determinar el predio técnico "
-            "para registrar los cabezales."
-        )
+def _import_clean_upper(value) -> str:
+    return _import_clean(value).upper()
 
-    # =====================================================
-    # HELPERS LOCALES
-    # =====================================================
-    def clean(value) -> str:
-        if value is None:
-            return ""
 
-        if isinstance(value, float) and value.is_integer():
-            value = int(value)
+def _import_fit(value: str, max_length: int) -> str | None:
+    """
+    Texto opcional recortado al largo de la columna; vacío = None.
+    """
+    return value[:max_length] or None
 
-        return str(value).strip()
 
-    def clean_upper(value) -> str:
-        return clean(value).upper()
+def _import_identification(value) -> str:
+    return (
+        _import_clean(value)
+        .replace(" ", "")
+        .replace("-", "")
+        .replace(".", "")
+    )
 
-    def normalize_identification(value) -> str:
-        value = clean(value)
 
-        if not value:
-            return ""
+def _import_plate(value) -> str:
+    return (
+        _import_clean_upper(value)
+        .replace(" ", "")
+        .replace("-", "")
+        .replace(".", "")
+    )
 
-        return (
-            value
-            .replace(" ", "")
-            .replace("-", "")
-            .replace(".", "")
-        )
 
-    def normalize_plate(value) -> str:
-        value = clean_upper(value)
+def _import_excel_date(value):
+    if value in (None, ""):
+        return None
 
-        if not value:
-            return ""
+    if isinstance(value, datetime):
+        return value.date()
 
-        return (
-            value
-            .replace(" ", "")
-            .replace("-", "")
-            .replace(".", "")
-        )
+    if isinstance(value, date):
+        return value
 
-    def excel_date(value):
-        if value in (None, ""):
+    if isinstance(value, (int, float)):
+        try:
+            return (
+                datetime(1899, 12, 30)
+                + timedelta(days=float(value))
+            ).date()
+        except Exception:
             return None
 
-        if isinstance(value, datetime):
-            return value.date()
+    raw = _import_clean(value)
 
-        if isinstance(value, date):
-            return value
+    if not raw:
+        return None
 
-        if isinstance(value, (int, float)):
-            try:
-                return (
-                    datetime(1899, 12, 30)
-                    + timedelta(
-                        days=float(value)
-                    )
-                ).date()
+    for fmt in (
+        "%Y-%m-%d",
+        "%d/%m/%Y",
+        "%d-%m-%Y",
+    ):
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
 
-            except Exception:
-                return None
+    return None
 
-        raw = clean(value)
 
-        if not raw:
-            return None
+def _import_yes_pending(value) -> str:
+    raw = _import_clean_upper(value)
 
-        for fmt in (
-            "%Y-%m-%d",
-            "%d/%m/%Y",
-            "%d-%m-%Y",
-        ):
-            try:
-                return datetime.strptime(
-                    raw,
-                    fmt,
-                ).date()
+    if raw in {
+        "SI",
+        "SÍ",
+        "YES",
+        "OK",
+        "VALIDO",
+        "VÁLIDO",
+        "VALID",
+    }:
+        return "YES"
 
-            except ValueError:
-                continue
+    return "PENDING"
 
-        return None
 
-    def yes_pending(value) -> str:
-        raw = clean_upper(value)
+def _import_document_status(expiry_date, today) -> str:
+    if expiry_date is None:
+        return "PENDING"
 
-        if raw in {
-            "SI",
-            "SÍ",
-            "YES",
-            "OK",
-            "VALIDO",
-            "VÁLIDO",
-            "VALID",
-        }:
-            return "YES"
+    if expiry_date < today:
+        return "EXPIRED"
 
-        return "PENDING"
+    return "VALID"
 
-    def document_payload(
-        *,
-        number=None,
-        expiry=None,
-        no_expiry=False,
-    ) -> dict[str, Any]:
-        expiry_date = excel_date(
-            expiry
-        )
 
-        if no_expiry:
-            status = "VALID"
+def _import_apm_values(values, today) -> dict[str, Any]:
+    """
+    Estado APM con las mismas reglas de la edición manual.
+    """
+    card = _import_clean(values[16])
+    card_upper = card.upper()
 
-        elif expiry_date is None:
-            status = "PENDING"
+    if card_upper in {"", "PENDIENTE"}:
+        card_status, card_number = "PENDING", None
+    elif "VENC" in card_upper:
+        card_status, card_number = "EXPIRED", None
+    else:
+        card_status, card_number = "YES", _import_fit(card, 100)
 
-        elif expiry_date < date.today():
-            status = "EXPIRED"
+    expiry_text = _import_clean_upper(values[17])
+    expiry_date = None
 
-        else:
-            status = "VALID"
+    if "SIN VENCIMIENTO" in expiry_text:
+        expiry_mode = "NO_EXPIRY"
+    elif "PENDIENTE" in expiry_text:
+        expiry_mode = "PENDING"
+    elif "VENCIDO" in expiry_text:
+        expiry_mode = "EXPIRED"
+        card_status = "EXPIRED"
+    else:
+        expiry_date = _import_excel_date(values[17])
 
-        return {
-            "document_number": (
-                clean_upper(number)
-                or None
-            ),
-            "issue_date": None,
-            "expiry_date": expiry_date,
-            "no_expiry": bool(
-                no_expiry
-            ),
-            "status": status,
-            "notes": None,
-        }
+        if expiry_date is None:
+            expiry_mode = "PENDING"
+        elif expiry_date < today:
+            expiry_mode = "EXPIRED"
+            card_status = "EXPIRED"
+        else:
+            expiry_mode = "DATE"
 
-    # =====================================================
-    # RESULTADO GLOBAL
-    # =====================================================
-    result = {
-        "processed": 0,
-        "created_drivers": 0,
-        "updated_drivers": 0,
-        "created_trucks": 0,
-        "updated_trucks": 0,
-        "created_assignments": 0,
-        "updated_documents": 0,
-        "updated_apm": 0,
-        "skipped": 0,
-        "errors": [],
+    return {
+        "has_apm": bool(
+            _import_clean_upper(values[15])
+            or card
+            or values[17] not in (None, "")
+        ),
+        "apm_training_status": _import_yes_pending(values[15]),
+        "apm_card_status": card_status,
+        "apm_card_number": card_number,
+        "apm_expiry_mode": expiry_mode,
+        "apm_expiry_date": expiry_date,
     }
 
-    # =====================================================
-    # PROCESAR UN BLOQUE
-    # =====================================================
-    def process_batch(
-        batch: list[dict[str, Any]],
-    ) -> None:
-        """
-        Procesa un bloque completo dentro de una transacción.
-
-        Si PostgreSQL rechaza el bloque, se revierte únicamente
-        este bloque. Los bloques previamente confirmados permanecen.
-        """
 
-        if not batch:
-            return
-
-        # =================================================
-        # ESTADÍSTICAS LOCALES
-        #
-        # Solo se suman al resultado global después del COMMIT.
-        # =================================================
-        batch_stats = {
-            "processed": len(batch),
-            "created_drivers": 0,
-            "updated_drivers": 0,
-            "created_trucks": 0,
-            "updated_trucks": 0,
-            "created_assignments": 0,
-            "updated_documents": 0,
-            "updated_apm": 0,
-        }
+def _normalize_transport_row(
+    excel_row: int,
+    values: tuple,
+    today: date,
+) -> dict[str, Any] | None:
+    """
+    Normaliza una fila de la plantilla (sin base de datos; puede
+    correr en el pool de app/services/excel_ingest.py).
 
-        batch_observations: list[
-            dict[str, Any]
-        ] = []
+    None = fila vacía; {"skip": mensaje} = fila omitida;
+    {"row", "documents", "warnings"} = fila válida.
+    """
+    values = tuple(values)
 
-        try:
-            # =================================================
-            # 1. VALORES PRESENTES EN EL BLOQUE
-            # =================================================
-            identifications = {
-                item["identification"]
-                for item in batch
-                if item["identification"]
-            }
+    # Necesitamos como mínimo hasta AE (índice 30).
+    if len(values) < 31:
+        values = values + (None,) * (31 - len(values))
 
-            plates = {
-                item["plate"]
-                for item in batch
-                if item["plate"]
-            }
+    name = _import_clean_upper(values[2])
+    identification = _import_identification(values[4])
+    plate = _import_plate(values[5])
 
-            owner_names = {
-                item["owner_name"]
-                for item in batch
-                if item["owner_name"]
-            }
+    # Fila completamente vacía.
+    if not name and not identification and not plate:
+        return None
 
-            # =================================================
-            # 2. CHOFERES EXISTENTES
-            # =================================================
-            drivers_by_identification: dict[
-                str,
-                Driver,
-            ] = {}
-
-            if identifications:
-                existing_drivers = list(
-                    db.session.scalars(
-                        select(Driver)
-                        .where(
-                            Driver.identification.in_(
-                                identifications
-                            )
-                        )
-                    ).all()
-                )
+    if not name or not identification:
+        return {"skip": "Fila omitida: falta nombre o cédula del chofer."}
 
-                drivers_by_identification = {
-                    driver.identification: driver
-                    for driver in existing_drivers
-                }
-
-            # =================================================
-            # 3. CABEZALES EXISTENTES
-            # =================================================
-            trucks_by_plate: dict[
-                str,
-                Truck,
-            ] = {}
-
-            if plates:
-                existing_trucks = list(
-                    db.session.scalars(
-                        select(Truck)
-                        .where(
-                            Truck.plate.in_(
-                                plates
-                            )
-                        )
-                    )
-                    .unique()
-                    .all()
-                )
+    if len(name) > 180 or len(identification) > 40 or len(plate) > 40:
+        return {
+            "skip": (
+                "Fila omitida: nombre, cédula o placa "
+                "exceden el largo permitido."
+            ),
+        }
 
-                trucks_by_plate = {
-                    normalize_plate(
-                        truck.plate
-                    ): truck
-                    for truck in existing_trucks
-                }
-
-            # =================================================
-            # 4. PROPIETARIOS EXISTENTES
-            #
-            # El modelo realmente usa UNIQUE(name, phone),
-            # por lo que la clave correcta incluye ambos.
-            # =================================================
-            owners_by_key: dict[
-                tuple[str, str],
-                TruckOwner,
-            ] = {}
-
-            if owner_names:
-                existing_owners = list(
-                    db.session.scalars(
-                        select(TruckOwner)
-                        .where(
-                            func.upper(
-                                TruckOwner.name
-                            ).in_(
-                                owner_names
-                            )
-                        )
-                    ).all()
-                )
+    warnings = []
 
-                owners_by_key = {
-                    (
-                        clean_upper(
-                            owner.name
-                        ),
-                        clean(
-                            owner.phone
-                        ),
-                    ): owner
-                    for owner in existing_owners
-                }
-
-            # =================================================
-            # 5. IDS EXISTENTES PARA CONSULTAS DEPENDIENTES
-            # =================================================
-            existing_driver_ids = {
-                driver.id
-                for driver
-                in drivers_by_identification.values()
-            }
+    # Pesos y dimensiones
+    weights_dimensions = None
+    raw_weights = values[28]
 
-            existing_truck_ids = {
-                truck.id
-                for truck
-                in trucks_by_plate.values()
-            }
+    if raw_weights not in (None, ""):
+        try:
+            weights_dimensions = Decimal(str(raw_weights))
+
+            # numeric(12, 2)
+            if not weights_dimensions.is_finite() or abs(weights_dimensions) >= Decimal("1e10"):
+                raise InvalidOperation
+        except (InvalidOperation, TypeError, ValueError):
+            warnings.append(
+                "Pesos y dimensiones contiene "
+                "un valor no numérico. "
+                "Ese campo se ignorará."
+            )
+            weights_dimensions = None
 
-            # =================================================
-            # 6. DOCUMENTOS EXISTENTES
-            # =================================================
-            documents_by_key: dict[
-                tuple[int, str],
-                DriverDocument,
-            ] = {}
-
-            if existing_driver_ids:
-                existing_documents = list(
-                    db.session.scalars(
-                        select(DriverDocument)
-                        .where(
-                            DriverDocument.driver_id.in_(
-                                existing_driver_ids
-                            )
-                        )
-                    ).all()
-                )
+    bonded_raw = _import_clean_upper(values[30])
+    bonded_status = None
+
+    if bonded_raw:
+        bonded_status = "BONDED" if "CAU" in bonded_raw else "PENDING"
+
+    rtv_date = _import_excel_date(values[23])
+
+    row = {
+        "row_no": excel_row,
+
+        # Chofer
+        "name": name,
+        "residence": _import_fit(_import_clean_upper(values[3]), 240),
+        "identification": identification,
+        "phone": _import_fit(_import_clean(values[6]), 40),
+
+        # Cabezal
+        "plate": plate or None,
+        "registration_date": _import_excel_date(values[1]),
+        "owner_name": _import_fit(_import_clean_upper(values[20]), 160),
+        "owner_phone": _import_fit(_import_clean(values[21]), 40),
+        "truck_dock_expiry": _import_excel_date(values[11]),
+        "circulation_card": _import_fit(_import_clean_upper(values[22]), 180),
+        "rtv_month": rtv_date.month if rtv_date else None,
+        "rtv_year": rtv_date.year if rtv_date else None,
+        "insurance_name": _import_fit(_import_clean_upper(values[25]), 160),
+        "rt_expiry": _import_excel_date(values[26]),
+        "rt_name": _import_fit(_import_clean_upper(values[27]), 180),
+        "weights_dimensions": weights_dimensions,
+        "policy_number": _import_fit(_import_clean_upper(values[29]), 120),
+        "bonded_status": bonded_status,
+
+        # APM
+        **_import_apm_values(values, today),
+    }
 
-                documents_by_key = {
-                    (
-                        document.driver_id,
-                        document.document_type,
-                    ): document
-                    for document
-                    in existing_documents
-                }
-
-            # =================================================
-            # 7. APM EXISTENTE
-            # =================================================
-            apm_by_driver: dict[
-                int,
-                DriverApmRecord,
-            ] = {}
-
-            if existing_driver_ids:
-                existing_apm = list(
-                    db.session.scalars(
-                        select(DriverApmRecord)
-                        .where(
-                            DriverApmRecord.driver_id.in_(
-                                existing_driver_ids
-                            )
-                        )
-                    ).all()
-                )
+    # Documentos del chofer
+    documents = []
 
-                apm_by_driver = {
-                    record.driver_id: record
-                    for record in existing_apm
-                }
-
-            # =================================================
-            # 8. ASIGNACIONES ACTIVAS EXISTENTES
-            # =================================================
-            assignment_by_driver: dict[
-                int,
-                DriverTruckAssignment,
-            ] = {}
-
-            assignment_by_truck: dict[
-                int,
-                DriverTruckAssignment,
-            ] = {}
-
-            assignment_conditions = []
-
-            if existing_driver_ids:
-                assignment_conditions.append(
-                    DriverTruckAssignment.driver_id.in_(
-                        existing_driver_ids
-                    )
-                )
+    for document_type, number, expiry in (
+        ("DOCK_PERMIT", None, values[10]),
+        ("GENERAL_CARD", values[12], values[13]),
+        ("CHEMICAL_PERMIT", None, values[14]),
+        ("LICENSE", None, values[18]),
+        ("CRIMINAL_RECORD", None, values[19]),
+    ):
+        document_number = _import_fit(_import_clean_upper(number), 100)
+        expiry_date = _import_excel_date(expiry)
+
+        documents.append({
+            "row_no": excel_row,
+            "identification": identification,
+            "document_type": document_type,
+            "document_number": document_number,
+            "expiry_date": expiry_date,
+            "status": _import_document_status(expiry_date, today),
+            "has_value": bool(document_number or expiry_date),
+        })
 
-            if existing_truck_ids:
-                assignment_conditions.append(
-                    DriverTruckAssignment.truck_id.in_(
-                        existing_truck_ids
-                    )
-                )
+    return {"row": row, "documents": documents, "warnings": warnings}
 
-            if assignment_conditions:
-                active_assignments = list(
-                    db.session.scalars(
-                        select(
-                            DriverTruckAssignment
-                        )
-                        .where(
-                            DriverTruckAssignment.status
-                            == "ACTIVE",
-                            or_(
-                                *assignment_conditions
-                            ),
-                        )
-                    ).all()
-                )
 
-                assignment_by_driver = {
-                    assignment.driver_id: assignment
-                    for assignment
-                    in active_assignments
-                }
-
-                assignment_by_truck = {
-                    assignment.truck_id: assignment
-                    for assignment
-                    in active_assignments
-                }
-
-            # =================================================
-            # 9. PRIMERA FASE
-            #
-            # Driver + Truck + Owner.
-            #
-            # No hacemos flush dentro del loop.
-            # =================================================
-            row_objects: list[
-                dict[str, Any]
-            ] = []
-
-            now = datetime.utcnow()
-
-            for item in batch:
-                # =============================================
-                # DRIVER
-                # =============================================
-                driver = (
-                    drivers_by_identification.get(
-                        item[
-                            "identification"
-                        ]
-                    )
-                )
+def parse_transport_workbook(
+    file_stream,
+    *,
+    progress=None,
+) -> dict[str, Any]:
+    """
+    Lee y normaliza la plantilla de choferes/cabezales sin consultar
+    la base de datos.
 
-                new_driver = False
+    La hoja se lee en streaming y las filas se normalizan con
+    map_rows() (pool de procesos en archivos grandes), en el orden
+    del Excel.
 
-                if driver is None:
-                    driver = Driver(
-                        name=(
-                            item["name"]
-                        ),
+    Devuelve {"rows", "documents", "errors", "skipped"}. Las filas
+    solo contienen texto, números, fechas y decimales: las sesiones de
+    carga (app/services/import_sessions.py) las guardan como JSON
+    entre la simulación y la aplicación.
+    """
+    progress = progress or _no_import_progress
 
-                        residence=(
-                            item["residence"]
-                            or None
-                        ),
+    # =====================================================
+    # 1. ABRIR EXCEL
+    # =====================================================
+    try:
+        workbook = open_workbook(file_stream)
+    except Exception as exc:
+        raise TransportValidationError(
+            "No fue posible leer el archivo Excel."
+        ) from exc
 
-                        identification=(
-                            item[
-                                "identification"
-                            ]
-                        ),
+    allowed_sheet_names = (
+        "VIGENCIA PERMISOS CALDERA",
+        "TRANSPORTES",
+    )
 
-                        phone_1=(
-                            item["phone"]
-                            or None
-                        ),
+    worksheet = None
 
-                        habitual_site_id=(
-                            habitual_site_id
-                        ),
+    for sheet_name in allowed_sheet_names:
+        if sheet_name in workbook.sheetnames:
+            worksheet = workbook[sheet_name]
+            break
 
-                        status="ACTIVE",
+    if worksheet is None:
+        workbook.close()
 
-                        created_by_user_id=(
-                            user_id
-                        ),
+        raise TransportValidationError(
+            "No se encontró una hoja válida. "
+            "La hoja debe llamarse "
+            "'VIGENCIA PERMISOS CALDERA' "
+            "o 'TRANSPORTES'."
+        )
 
-                        updated_by_user_id=(
-                            user_id
-                        ),
-                    )
+    # =====================================================
+    # 2. NORMALIZAR Y VALIDAR (sin base de datos)
+    # =====================================================
+    rows: list[dict[str, Any]] = []
+    documents: list[dict[str, Any]] = []
+    errors: list[dict[str, Any]] = []
+    skipped = 0
 
-                    db.session.add(
-                        driver
-                    )
+    total = sheet_row_estimate(worksheet)
 
-                    # Cache local para duplicados
-                    # dentro del mismo Excel.
-                    drivers_by_identification[
-                        item["identification"]
-                    ] = driver
+    try:
+        for excel_row, outcome in map_rows(
+            partial(_normalize_transport_row, today=date.today()),
+            iter_sheet_rows(worksheet),
+            total=total,
+            progress=progress,
+        ):
+            if outcome is None:
+                continue
 
-                    new_driver = True
+            if "skip" in outcome:
+                skipped += 1
+                errors.append({
+                    "row": excel_row,
+                    "message": outcome["skip"],
+                })
+                continue
 
-                    batch_stats[
-                        "created_drivers"
-                    ] += 1
+            rows.append(outcome["row"])
+            documents.extend(outcome["documents"])
 
-                else:
-                    driver.name = (
-                        item["name"]
-                    )
+            for message in outcome["warnings"]:
+                errors.append({
+                    "row": excel_row,
+                    "message": message,
+                })
 
-                    if item["residence"]:
-                        driver.residence = (
-                            item["residence"]
-                        )
-
-                    if item["phone"]:
-                        driver.phone_1 = (
-                            item["phone"]
-                        )
-
-                    # None significa:
-                    # no cambiar condición existente.
-                    if habitual_site_id:
-                        driver.habitual_site_id = (
-                            habitual_site_id
-                        )
-
-                    driver.updated_by_user_id = (
-                        user_id
-                    )
+    finally:
+        workbook.close()
 
-                    driver.updated_at = (
-                        now
-                    )
+    progress("Leyendo Excel", total, total, force=True)
 
-                    batch_stats[
-                        "updated_drivers"
-                    ] += 1
-
-                # =============================================
-                # TRUCK
-                # =============================================
-                truck = None
-                new_truck = False
-
-                if item["plate"]:
-                    truck = (
-                        trucks_by_plate.get(
-                            item["plate"]
-                        )
-                    )
+    return {
+        "rows": rows,
+        "documents": documents,
+        "errors": errors,
+        "skipped": skipped,
+    }
 
-                    if truck is None:
-                        truck = Truck(
-                            plate=(
-                                item["plate"]
-                            ),
-
-                            registration_date=(
-                                item[
-                                    "registration_date"
-                                ]
-                                or date.today()
-                            ),
-
-                            # Dato técnico.
-                            registered_site_id=(
-                                registered_site_id
-                            ),
-
-                            status="ACTIVE",
-
-                            bonded_status=(
-                                "PENDING"
-                            ),
-
-                            created_by_user_id=(
-                                user_id
-                            ),
-
-                            updated_by_user_id=(
-                                user_id
-                            ),
-                        )
-
-                        db.session.add(
-                            truck
-                        )
-
-                        trucks_by_plate[
-                            item["plate"]
-                        ] = truck
-
-                        new_truck = True
-
-                        batch_stats[
-                            "created_trucks"
-                        ] += 1
-
-                    else:
-                        if item[
-                            "registration_date"
-                        ]:
-                            truck.registration_date = (
-                                item[
-                                    "registration_date"
-                                ]
-                            )
 
-                        truck.updated_by_user_id = (
-                            user_id
-                        )
+def _no_import_progress(phase, done=0, total=0, *, force=False):
+    return None
 
-                        truck.updated_at = (
-                            now
-                        )
 
-                        batch_stats[
-                            "updated_trucks"
-                        ] += 1
-
-                    # =========================================
-                    # OWNER
-                    # =========================================
-                    owner = None
-
-                    if item["owner_name"]:
-                        owner_key = (
-                            item["owner_name"],
-                            item["owner_phone"],
-                        )
-
-                        owner = (
-                            owners_by_key.get(
-                                owner_key
-                            )
-                        )
-
-                        if owner is None:
-                            owner = TruckOwner(
-                                name=(
-                                    item[
-                                        "owner_name"
-                                    ]
-                                ),
-
-                                phone=(
-                                    item[
-                                        "owner_phone"
-                                    ]
-                                    or None
-                                ),
-
-                                is_active=True,
-                            )
-
-                            db.session.add(
-                                owner
-                            )
-
-                            owners_by_key[
-                                owner_key
-                            ] = owner
-
-                        else:
-                            if (
-                                item["owner_phone"]
-                                and owner.phone
-                                != item[
-                                    "owner_phone"
-                                ]
-                            ):
-                                owner.phone = (
-                                    item[
-                                        "owner_phone"
-                                    ]
-                                )
-
-                            if not owner.is_active:
-                                owner.is_active = (
-                                    True
-                                )
+def _transport_import_result(parsed: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "processed": len(parsed["rows"]),
+        "created_drivers": 0,
+        "updated_drivers": 0,
+        "created_trucks": 0,
+        "updated_trucks": 0,
+        "created_assignments": 0,
+        "updated_documents": 0,
+        "updated_apm": 0,
+        "document_changes": 0,
+        "skipped": int(parsed.get("skipped") or 0),
+        "errors": list(parsed.get("errors") or []),
+    }
 
-                            owner.updated_at = (
-                                now
-                            )
 
-                        # Usar relación ORM.
-                        # SQLAlchemy resuelve el owner_id
-                        # en el mismo flush.
-                        truck.owner = owner
-
-                    # =========================================
-                    # DATOS DEL CABEZAL
-                    # =========================================
-
-                    if item[
-                        "truck_dock_expiry"
-                    ]:
-                        truck.dock_permit_expiry_date = (
-                            item[
-                                "truck_dock_expiry"
-                            ]
-                        )
-
-                    if item[
-                        "circulation_card"
-                    ]:
-                        truck.circulation_card = (
-                            item[
-                                "circulation_card"
-                            ]
-                        )
-
-                    if item["rtv_date"]:
-                        truck.dekra_month = (
-                            item[
-                                "rtv_date"
-                            ].month
-                        )
-
-                        truck.dekra_year = (
-                            item[
-                                "rtv_date"
-                            ].year
-                        )
-
-                    if item[
-                        "insurance_name"
-                    ]:
-                        truck.insurance_name = (
-                            item[
-                                "insurance_name"
-                            ]
-                        )
-
-                    if item[
-                        "rt_expiry"
-                    ]:
-                        truck.rt_expiry_date = (
-                            item[
-                                "rt_expiry"
-                            ]
-                        )
-
-                    if item["rt_name"]:
-                        truck.rt_name = (
-                            item["rt_name"]
-                        )
-
-                    if item[
-                        "weights_dimensions"
-                    ] is not None:
-                        truck.weights_dimensions = (
-                            item[
-                                "weights_dimensions"
-                            ]
-                        )
-
-                    if item[
-                        "policy_number"
-                    ]:
-                        truck.policy_number = (
-                            item[
-                                "policy_number"
-                            ]
-                        )
-
-                    if item[
-                        "bonded_status"
-                    ]:
-                        truck.bonded_status = (
-                            item[
-                                "bonded_status"
-                            ]
-                        )
-
-                row_objects.append({
-                    "row": item["row"],
-                    "raw": item,
-                    "driver": driver,
-                    "truck": truck,
-                    "new_driver": (
-                        new_driver
-                    ),
-                    "new_truck": (
-                        new_truck
-                    ),
-                })
+def _stage_transport_import(parsed: dict[str, Any], progress) -> None:
+    progress("Preparando filas", 0, len(parsed["rows"]), force=True)
 
-            # =================================================
-            # 10. ÚNICO FLUSH EXPLÍCITO DEL BLOQUE
-            #
-            # Obtiene:
-            # - driver.id
-            # - truck.id
-            # - owner.id
-            #
-            # y envía juntos los cambios principales.
-            # =================================================
-            db.session.flush()
-
-            # =================================================
-            # 11. SEGUNDA FASE
-            #
-            # Documentos + APM + asignaciones.
-            #
-            # Ahora todos los IDs están disponibles.
-            # =================================================
-            for row_data in row_objects:
-                item = (
-                    row_data["raw"]
-                )
+    stage_rows(
+        "stg_transport_rows",
+        _TRANSPORT_IMPORT_ROW_COLUMNS,
+        parsed["rows"],
+    )
+    stage_rows(
+        "stg_transport_documents",
+        _TRANSPORT_IMPORT_DOCUMENT_COLUMNS,
+        parsed["documents"],
+    )
 
-                driver = (
-                    row_data["driver"]
-                )
 
-                truck = (
-                    row_data["truck"]
-                )
+def _apply_staged_transport_import(
+    result: dict[str, Any],
+    *,
+    user_id: int,
+    registered_site_id: int,
+    habitual_site_id: int | None,
+    progress,
+) -> None:
+    """
+    Aplica stg_transport_rows / stg_transport_documents. Sin COMMIT.
+    """
+    params = {
+        "user_id": user_id,
+        "registered_site_id": registered_site_id,
+        "habitual_site_id": habitual_site_id,
+        "now": datetime.utcnow(),
+        "today": date.today(),
+        "notes": "Carga masiva",
+    }
+    steps = 5
 
-                # =============================================
-                # DOCUMENTOS
-                # =============================================
-                document_values = {
-                    "DOCK_PERMIT": (
-                        document_payload(
-                            expiry=(
-                                item[
-                                    "driver_dock_expiry"
-                                ]
-                            )
-                        )
-                    ),
+    progress("Choferes", 0, steps, force=True)
 
-                    "GENERAL_CARD": (
-                        document_payload(
-                            number=(
-                                item[
-                                    "general_card_number"
-                                ]
-                            ),
-
-                            expiry=(
-                                item[
-                                    "general_card_expiry"
-                                ]
-                            ),
-                        )
-                    ),
+    (
+        result["created_drivers"],
+        result["updated_drivers"],
+    ) = upsert_counts(
+        execute(_TRANSPORT_IMPORT_DRIVERS_SQL, params)
+    )
 
-                    "CHEMICAL_PERMIT": (
-                        document_payload(
-                            expiry=(
-                                item[
-                                    "chemical_expiry"
-                                ]
-                            )
-                        )
-                    ),
+    progress("Cabezales", 1, steps, force=True)
 
-                    "LICENSE": (
-                        document_payload(
-                            expiry=(
-                                item[
-                                    "license_expiry"
-                                ]
-                            )
-                        )
-                    ),
+    execute(_TRANSPORT_IMPORT_OWNERS_SQL, params)
 
-                    "CRIMINAL_RECORD": (
-                        document_payload(
-                            expiry=(
-                                item[
-                                    "criminal_expiry"
-                                ]
-                            )
-                        )
-                    ),
-                }
+    # Primero los existentes, así los recién creados no se
+    # cuentan como actualizados.
+    result["updated_trucks"] = execute(
+        _TRANSPORT_IMPORT_UPDATE_TRUCKS_SQL,
+        params,
+    ).rowcount
 
-                for (
-                    document_type,
-                    payload,
-                ) in document_values.items():
+    result["created_trucks"] = execute(
+        _TRANSPORT_IMPORT_INSERT_TRUCKS_SQL,
+        params,
+    ).rowcount
 
-                    key = (
-                        driver.id,
-                        document_type,
-                    )
+    progress("Documentos", 2, steps, force=True)
 
-                    document = (
-                        documents_by_key.get(
-                            key
-                        )
-                    )
+    documents_count, document_changes = execute(
+        _TRANSPORT_IMPORT_DOCUMENTS_SQL,
+        params,
+    ).one()
 
-                    # Igual que el importador anterior:
-                    # no crear documento nuevo completamente vacío.
-                    if (
-                        document is None
-                        and not payload[
-                            "document_number"
-                        ]
-                        and not payload[
-                            "expiry_date"
-                        ]
-                    ):
-                        continue
-
-                    if document is None:
-                        document = (
-                            DriverDocument(
-                                driver_id=(
-                                    driver.id
-                                ),
-
-                                document_type=(
-                                    document_type
-                                ),
-
-                                # DriverDocument NO tiene
-                                # created_by_user_id.
-                                updated_by_user_id=(
-                                    user_id
-                                ),
-                            )
-                        )
+    progress("APM", 3, steps, force=True)
 
-                        db.session.add(
-                            document
-                        )
+    apm_count, apm_changes = execute(
+        _TRANSPORT_IMPORT_APM_SQL,
+        params,
+    ).one()
 
-                        documents_by_key[
-                            key
-                        ] = document
+    result["updated_documents"] = int(documents_count or 0)
+    result["updated_apm"] = int(apm_count or 0)
+    result["document_changes"] = int(document_changes or 0) + int(apm_changes or 0)
 
-                    document.document_number = (
-                        payload[
-                            "document_number"
-                        ]
-                    )
+    progress("Asignaciones", 4, steps, force=True)
 
-                    document.issue_date = (
-                        payload[
-                            "issue_date"
-                        ]
-                    )
+    result["created_assignments"] = int(
+        execute(
+            _TRANSPORT_IMPORT_ASSIGNMENTS_SQL,
+            params,
+        ).scalar()
+        or 0
+    )
 
-                    document.expiry_date = (
-                        payload[
-                            "expiry_date"
-                        ]
-                    )
+    for row_no, name, plate in execute(
+        _TRANSPORT_IMPORT_ASSIGNMENT_CONFLICTS_SQL
+    ):
+        result["errors"].append({
+            "row": row_no,
+            "message": (
+                f"No se cambió la asignación "
+                f"de {name}: "
+                f"el chofer o la placa "
+                f"{plate} ya tienen "
+                "una asignación activa distinta."
+            ),
+        })
 
-                    document.no_expiry = (
-                        payload[
-                            "no_expiry"
-                        ]
-                    )
+    # El SQL directo no pasa por el ORM: el índice de cumplimiento
+    # se recalcula al hacer COMMIT (app/services/write_hooks.py). La
+    # carga puede cambiar nombres, placas y propietarios: también se
+    # invalidan las fichas que los muestran como contraparte.
+    touched_driver_ids = execute(_TRANSPORT_IMPORT_TOUCHED_DRIVERS_SQL).scalars().all()
+    touched_truck_ids = execute(_TRANSPORT_IMPORT_TOUCHED_TRUCKS_SQL).scalars().all()
 
-                    document.status = (
-                        payload[
-                            "status"
-                        ]
-                    )
+    mark_transport_compliance_touched(
+        driver_ids=touched_driver_ids,
+        truck_ids=touched_truck_ids,
+    )
+    mark_transport_detail_touched(
+        renamed_driver_ids=touched_driver_ids,
+        renamed_truck_ids=touched_truck_ids,
+    )
+    mark_transport_counters_stale(
+        "drivers",
+        "trucks",
+        "driver_documents",
+        "assignments",
+    )
 
-                    document.notes = (
-                        payload[
-                            "notes"
-                        ]
-                    )
+    progress("Asignaciones", steps, steps, force=True)
 
-                    document.updated_by_user_id = (
-                        user_id
-                    )
 
-                    document.updated_at = (
-                        now
-                    )
+def _finish_transport_import_result(result: dict[str, Any]) -> dict[str, Any]:
+    result["errors"].sort(key=lambda error: error["row"])
+    result["error_count"] = len(result["errors"])
 
-                    if (
-                        payload[
-                            "document_number"
-                        ]
-                        or payload[
-                            "expiry_date"
-                        ]
-                    ):
-                        batch_stats[
-                            "updated_documents"
-                        ] += 1
-
-                # =============================================
-                # APM
-                # =============================================
-                if (
-                    item["apm_training"]
-                    or item["apm_card"]
-                    or item["apm_expiry_raw"]
-                ):
-                    record = (
-                        apm_by_driver.get(
-                            driver.id
-                        )
-                    )
+    # Evitar mandar una cantidad enorme de texto
+    # al navegador.
+    result["errors"] = result["errors"][:100]
 
-                    if record is None:
-                        record = (
-                            DriverApmRecord(
-                                driver_id=(
-                                    driver.id
-                                ),
-
-                                # DriverApmRecord NO tiene
-                                # created_by_user_id.
-                                updated_by_user_id=(
-                                    user_id
-                                ),
-                            )
-                        )
-
-                        db.session.add(
-                            record
-                        )
-
-                        apm_by_driver[
-                            driver.id
-                        ] = record
-
-                    record.training_status = (
-                        yes_pending(
-                            item[
-                                "apm_training"
-                            ]
-                        )
-                    )
+    return result
 
-                    card_upper = (
-                        item[
-                            "apm_card"
-                        ].upper()
-                    )
 
-                    if card_upper in {
-                        "",
-                        "PENDIENTE",
-                    }:
-                        record.card_status = (
-                            "PENDING"
-                        )
-
-                        record.card_number = (
-                            None
-                        )
-
-                    elif "VENC" in card_upper:
-                        record.card_status = (
-                            "EXPIRED"
-                        )
-
-                        record.card_number = (
-                            None
-                        )
-
-                    else:
-                        record.card_status = (
-                            "YES"
-                        )
-
-                        record.card_number = (
-                            item["apm_card"]
-                        )
-
-                    apm_expiry_text = (
-                        clean_upper(
-                            item[
-                                "apm_expiry_raw"
-                            ]
-                        )
-                    )
+def _require_registered_site(registered_site_id) -> None:
+    if not registered_site_id:
+        raise TransportValidationError(
+            "No fue posible determinar el predio técnico "
+            "para registrar los cabezales."
+        )
 
-                    if (
-                        "SIN VENCIMIENTO"
-                        in apm_expiry_text
-                    ):
-                        record.expiry_mode = (
-                            "NO_EXPIRY"
-                        )
-
-                        record.expiry_date = (
-                            None
-                        )
-
-                    elif (
-                        "PENDIENTE"
-                        in apm_expiry_text
-                    ):
-                        record.expiry_mode = (
-                            "PENDING"
-                        )
-
-                        record.expiry_date = (
-                            None
-                        )
-
-                    elif (
-                        "VENCIDO"
-                        in apm_expiry_text
-                    ):
-                        record.expiry_mode = (
-                            "EXPIRED"
-                        )
-
-                        record.card_status = (
-                            "EXPIRED"
-                        )
-
-                        record.expiry_date = (
-                            None
-                        )
-
-                    elif item[
-                        "apm_expiry_date"
-                    ]:
-                        record.expiry_date = (
-                            item[
-                                "apm_expiry_date"
-                            ]
-                        )
-
-                        if (
-                            item[
-                                "apm_expiry_date"
-                            ]
-                            < date.today()
-                        ):
-                            record.expiry_mode = (
-                                "EXPIRED"
-                            )
 
-                            record.card_status = (
-                                "EXPIRED"
-                            )
+def apply_transport_import(
+    parsed: dict[str, Any],
+    *,
+    user_id: int,
+    registered_site_id: int,
+    habitual_site_id: int | None = None,
+    progress=None,
+) -> dict[str, Any]:
+    """
+    Aplica las filas de parse_transport_workbook(). No hace COMMIT:
+    quien llama confirma o revierte la transacción completa.
+    """
+    _require_registered_site(registered_site_id)
 
-                        else:
-                            record.expiry_mode = (
-                                "DATE"
-                            )
+    progress = progress or _no_import_progress
+    result = _transport_import_result(parsed)
 
-                    else:
-                        record.expiry_mode = (
-                            "PENDING"
-                        )
+    if parsed["rows"]:
+        _stage_transport_import(parsed, progress)
+        _apply_staged_transport_import(
+            result,
+            user_id=user_id,
+            registered_site_id=registered_site_id,
+            habitual_site_id=habitual_site_id,
+            progress=progress,
+        )
 
-                        record.expiry_date = (
-                            None
-                        )
+    return _finish_transport_import_result(result)
 
-                    record.updated_by_user_id = (
-                        user_id
-                    )
 
-                    record.updated_at = (
-                        now
-                    )
+def bulk_import_transport_excel(
+    file_stream,
+    *,
+    user_id: int,
+    registered_site_id: int,
+    habitual_site_id: int | None = None,
+) -> dict[str, Any]:
+    """
+    Importa choferes/cabezales desde la plantilla Excel.
 
-                    batch_stats[
-                        "updated_apm"
-                    ] += 1
-
-                # =============================================
-                # ASIGNACIÓN CHOFER - CABEZAL
-                # =============================================
-                if truck is not None:
-                    current_driver_assignment = (
-                        assignment_by_driver.get(
-                            driver.id
-                        )
-                    )
+    Motor por conjuntos (app/services/bulk_import.py):
 
-                    current_truck_assignment = (
-                        assignment_by_truck.get(
-                            truck.id
-                        )
-                    )
+    - Excel en read_only=True; cada fila se normaliza y valida en
+      Python sin consultar la base de datos.
+    - Las filas se cargan con COPY en dos tablas temporales
+      (filas y documentos del chofer).
+    - Choferes, propietarios, cabezales, documentos, APM y
+      asignaciones se aplican con un puñado de sentencias
+      INSERT ... ON CONFLICT / UPDATE ... FROM, sin importar cuántas
+      filas tenga el archivo.
+    - Los cambios de documentos y APM quedan en
+      transport_document_changes, como en la edición manual.
+    - Un solo COMMIT: si PostgreSQL rechaza algo, no se guarda nada.
 
-                    if (
-                        current_driver_assignment
-                        is None
-                        and current_truck_assignment
-                        is None
-                    ):
-                        assignment = (
-                            DriverTruckAssignment(
-                                driver_id=(
-                                    driver.id
-                                ),
-
-                                truck_id=(
-                                    truck.id
-                                ),
-
-                                status="ACTIVE",
-
-                                started_at=(
-                                    datetime.combine(
-                                        item[
-                                            "registration_date"
-                                        ]
-                                        or date.today(),
-
-                                        datetime.min.time(),
-                                    )
-                                ),
-
-                                notes=(
-                                    "Carga masiva inicial"
-                                ),
-
-                                created_by_user_id=(
-                                    user_id
-                                ),
-                            )
-                        )
-
-                        db.session.add(
-                            assignment
-                        )
-
-                        # Actualizar cache local inmediatamente
-                        # para detectar duplicados dentro del bloque.
-                        assignment_by_driver[
-                            driver.id
-                        ] = assignment
-
-                        assignment_by_truck[
-                            truck.id
-                        ] = assignment
-
-                        batch_stats[
-                            "created_assignments"
-                        ] += 1
-
-                    elif (
-                        current_driver_assignment
-                        is not None
-                        and
-                        current_driver_assignment.truck_id
-                        == truck.id
-                    ):
-                        # Ya está correctamente ligado.
-                        pass
-
-                    else:
-                        batch_observations.append({
-                            "row": (
-                                item["row"]
-                            ),
-                            "message": (
-                                f"No se cambió la asignación "
-                                f"de {item['name']}: "
-                                f"el chofer o la placa "
-                                f"{item['plate']} ya tienen "
-                                "una asignación activa distinta."
-                            ),
-                        })
-
-            # =================================================
-            # 12. COMMIT DEL BLOQUE
-            #
-            # SQLAlchemy realiza aquí el flush final de:
-            # - documentos
-            # - APM
-            # - asignaciones
-            #
-            # No necesitamos llamar db.session.flush()
-            # nuevamente.
-            # =================================================
-            db.session.commit()
-
-            # =================================================
-            # 13. SOLO AHORA SUMAR CONTADORES
-            # =================================================
-            for key, value in (
-                batch_stats.items()
-            ):
-                result[key] += value
+    La pantalla de carga usa la sesión TRANSPORT_DRIVERS (simulación
+    y confirmación en segundo plano); esta función hace lo mismo en
+    un solo paso.
 
-            result["errors"].extend(
-                batch_observations
-            )
+    Conceptos:
 
-        except Exception as exc:
-            # =================================================
-            # Falla solamente este bloque.
-            #
-            # Los bloques anteriores ya hicieron COMMIT.
-            # =================================================
-            db.session.rollback()
+    registered_site_id
+        Dato técnico obligatorio para cabezales nuevos.
 
-            result["skipped"] += (
-                len(batch)
-            )
+    habitual_site_id
+        Únicamente distintivo de patiero.
+        None = chofer normal.
+    """
+    _require_registered_site(registered_site_id)
 
-            # No contamos como procesadas las filas
-            # de un bloque que fue revertido.
-            for item in batch:
-                result["errors"].append({
-                    "row": (
-                        item["row"]
-                    ),
-                    "message": (
-                        "El bloque de importación fue revertido. "
-                        f"Motivo: {exc}"
-                    ),
-                })
+    parsed = parse_transport_workbook(file_stream)
 
-    # =====================================================
-    # ABRIR EXCEL
-    # =====================================================
     try:
-        workbook = load_workbook(
-            file_stream,
-            read_only=True,
-            data_only=True,
+        result = apply_transport_import(
+            parsed,
+            user_id=user_id,
+            registered_site_id=registered_site_id,
+            habitual_site_id=habitual_site_id,
         )
+        db.session.commit()
 
     except Exception as exc:
-        raise TransportValidationError(
-            "No fue posible leer el archivo Excel."
-        ) from exc
-
-    # =====================================================
-    # HOJA
-    # =====================================================
-    allowed_sheet_names = (
-        "VIGENCIA PERMISOS CALDERA",
-        "TRANSPORTES",
-    )
-
-    worksheet = None
-
-    for sheet_name in (
-        allowed_sheet_names
-    ):
-        if (
-            sheet_name
-            in workbook.sheetnames
-        ):
-            worksheet = (
-                workbook[
-                    sheet_name
-                ]
-            )
-
-            break
-
-    if worksheet is None:
-        workbook.close()
-
-        raise TransportValidationError(
-            "No se encontró una hoja válida. "
-            "La hoja debe llamarse "
-            "'VIGENCIA PERMISOS CALDERA' "
-            "o 'TRANSPORTES'."
-        )
-
-    # =====================================================
-    # LEER SECUENCIALMENTE
-    #
-    # No guardamos todo el Excel en memoria.
-    # Solo mantenemos máximo BATCH_SIZE registros.
-    # =====================================================
-    batch: list[
-        dict[str, Any]
-    ] = []
-
-    try:
-        for excel_row, values in enumerate(
-            worksheet.iter_rows(
-                min_row=2,
-                values_only=True,
-            ),
-            start=2,
-        ):
-            values = tuple(
-                values
-            )
-
-            # Necesitamos como mínimo hasta AE (índice 30).
-            if len(values) < 31:
-                values = (
-                    values
-                    + (
-                        None,
-                    ) * (
-                        31
-                        - len(values)
-                    )
-                )
-
-            # =================================================
-            # DATOS PRINCIPALES
-            # =================================================
-            name = clean_upper(
-                values[2]
-            )
-
-            identification = (
-                normalize_identification(
-                    values[4]
-                )
-            )
+        db.session.rollback()
 
-            plate = normalize_plate(
-                values[5]
-            )
+        raise TransportServiceError(
+            "No fue posible completar la carga masiva. "
+            "No se guardó ninguna fila."
+        ) from exc
 
-            # Fila completamente vacía.
-            if (
-                not name
-                and not identification
-                and not plate
-            ):
-                continue
+    return result
 
-            # =================================================
-            # VALIDACIONES QUE NO NECESITAN BD
-            # =================================================
-            if (
-                not name
-                or not identification
-            ):
-                result["skipped"] += 1
 
-                result["errors"].append({
-                    "row": excel_row,
-                    "message": (
-                        "Fila omitida: falta nombre "
-                        "o cédula del chofer."
-                    ),
+# =========================================================
+# CARGA MASIVA: SESIÓN CON SIMULACIÓN
+# =========================================================
+_TRANSPORT_IMPORT_PREVIEW_SQL = """
+    SELECT
+        s.row_no,
+        s.name,
+        s.identification,
+        s.plate,
+        EXISTS (
+            SELECT 1
+            FROM yard_gate_alamo.drivers d
+            WHERE d.identification = s.identification
+        ) AS driver_exists,
+        s.plate IS NOT NULL AND EXISTS (
+            SELECT 1
+            FROM yard_gate_alamo.trucks t
+            WHERE t.plate = s.plate
+        ) AS truck_exists,
+        max(s.row_no) OVER (PARTITION BY s.identification) AS last_row_no
+    FROM stg_transport_rows s
+    ORDER BY s.row_no
+"""
+
+
+def preview_transport_import(
+    parsed: dict[str, Any],
+    *,
+    user_id: int,
+    registered_site_id: int,
+    habitual_site_id: int | None = None,
+    progress=None,
+) -> dict[str, Any]:
+    """
+    Simulación: clasifica cada fila contra lo que ya existe y ejecuta
+    el mismo SQL de apply_transport_import() para obtener los totales
+    y los conflictos reales. Quien llama hace ROLLBACK.
+    """
+    _require_registered_site(registered_site_id)
+
+    progress = progress or _no_import_progress
+    result = _transport_import_result(parsed)
+    rows: list[dict[str, Any]] = []
+
+    if parsed["rows"]:
+        _stage_transport_import(parsed, progress)
+
+        for (
+            row_no,
+            name,
+            identification,
+            plate,
+            driver_exists,
+            truck_exists,
+            last_row_no,
+        ) in execute(_TRANSPORT_IMPORT_PREVIEW_SQL):
+            key = f"{identification} · {plate}" if plate else identification
+
+            if row_no != last_row_no:
+                rows.append({
+                    "row": row_no,
+                    "action": "SKIP",
+                    "key": key,
+                    "detail": f"Cédula repetida: se usan los datos de la fila {last_row_no}.",
                 })
-
                 continue
 
-            # =================================================
-            # PESOS Y DIMENSIONES
-            # =================================================
-            weights_dimensions = None
-
-            raw_weights = (
-                values[28]
-            )
-
-            if raw_weights not in (
-                None,
-                "",
-            ):
-                try:
-                    weights_dimensions = (
-                        Decimal(
-                            str(
-                                raw_weights
-                            )
-                        )
-                    )
-
-                except (
-                    InvalidOperation,
-                    TypeError,
-                    ValueError,
-                ):
-                    result["errors"].append({
-                        "row": excel_row,
-                        "message": (
-                            "Pesos y dimensiones contiene "
-                            "un valor no numérico. "
-                            "Ese campo se ignorará."
-                        ),
-                    })
-
-                    weights_dimensions = (
-                        None
-                    )
-
-            # =================================================
-            # CAUCIONADO
-            # =================================================
-            bonded_raw = clean_upper(
-                values[30]
-            )
-
-            bonded_status = None
-
-            if bonded_raw:
-                bonded_status = (
-                    "BONDED"
-                    if "CAU" in bonded_raw
-                    else "PENDING"
-                )
-
-            # =================================================
-            # REGISTRO NORMALIZADO
-            # =================================================
-            item = {
-                "row": excel_row,
-
-                # ---------------------------------------------
-                # Driver
-                # ---------------------------------------------
-                "name": name,
-
-                "residence": (
-                    clean_upper(
-                        values[3]
-                    )
-                ),
-
-                "identification": (
-                    identification
-                ),
-
-                "phone": clean(
-                    values[6]
-                ),
-
-                # ---------------------------------------------
-                # Truck
-                # ---------------------------------------------
-                "plate": plate,
-
-                "registration_date": (
-                    excel_date(
-                        values[1]
-                    )
-                ),
-
-                # ---------------------------------------------
-                # Documentos driver
-                # ---------------------------------------------
-                "driver_dock_expiry": (
-                    excel_date(
-                        values[10]
-                    )
-                ),
-
-                "general_card_number": (
-                    clean_upper(
-                        values[12]
-                    )
-                ),
-
-                "general_card_expiry": (
-                    excel_date(
-                        values[13]
-                    )
-                ),
-
-                "chemical_expiry": (
-                    excel_date(
-                        values[14]
-                    )
-                ),
-
-                "license_expiry": (
-                    excel_date(
-                        values[18]
-                    )
-                ),
-
-                "criminal_expiry": (
-                    excel_date(
-                        values[19]
-                    )
-                ),
-
-                # ---------------------------------------------
-                # APM
-                # ---------------------------------------------
-                "apm_training": (
-                    clean_upper(
-                        values[15]
-                    )
-                ),
-
-                "apm_card": (
-                    clean(
-                        values[16]
-                    )
-                ),
-
-                "apm_expiry_raw": (
-                    values[17]
-                ),
-
-                "apm_expiry_date": (
-                    excel_date(
-                        values[17]
-                    )
-                ),
-
-                # ---------------------------------------------
-                # Owner
-                # ---------------------------------------------
-                "owner_name": (
-                    clean_upper(
-                        values[20]
-                    )
-                ),
-
-                "owner_phone": (
-                    clean(
-                        values[21]
-                    )
-                ),
+            detail = [f"Chofer {name}: {'se actualiza' if driver_exists else 'nuevo'}"]
 
-                # ---------------------------------------------
-                # Truck documentos/datos
-                # ---------------------------------------------
-                "truck_dock_expiry": (
-                    excel_date(
-                        values[11]
-                    )
-                ),
+            if plate:
+                detail.append(f"cabezal {plate}: {'se actualiza' if truck_exists else 'nuevo'}")
 
-                "circulation_card": (
-                    clean_upper(
-                        values[22]
-                    )
-                ),
+            rows.append({
+                "row": row_no,
+                "action": "UPDATE" if driver_exists else "CREATE",
+                "key": key,
+                "detail": "; ".join(detail),
+            })
 
-                "rtv_date": (
-                    excel_date(
-                        values[23]
-                    )
-                ),
-
-                "insurance_name": (
-                    clean_upper(
-                        values[25]
-                    )
-                ),
-
-                "rt_expiry": (
-                    excel_date(
-                        values[26]
-                    )
-                ),
-
-                "rt_name": (
-                    clean_upper(
-                        values[27]
-                    )
-                ),
-
-                "weights_dimensions": (
-                    weights_dimensions
-                ),
-
-                "policy_number": (
-                    clean_upper(
-                        values[29]
-                    )
-                ),
-
-                "bonded_status": (
-                    bonded_status
-                ),
-            }
-
-            batch.append(
-                item
-            )
-
-            # =================================================
-            # BLOQUE LLENO
-            # =================================================
-            if (
-                len(batch)
-                >= BATCH_SIZE
-            ):
-                process_batch(
-                    batch
-                )
-
-                batch = []
-
-        # =====================================================
-        # ÚLTIMO BLOQUE
-        # =====================================================
-        if batch:
-            process_batch(
-                batch
-            )
-
-    except Exception as exc:
-        db.session.rollback()
+        _apply_staged_transport_import(
+            result,
+            user_id=user_id,
+            registered_site_id=registered_site_id,
+            habitual_site_id=habitual_site_id,
+            progress=progress,
+        )
+
+    for error in parsed.get("errors") or []:
+        if error["message"].startswith("Fila omitida"):
+            rows.append({
+                "row": error["row"],
+                "action": "ERROR",
+                "key": "",
+                "detail": error["message"],
+            })
+
+    rows.sort(key=lambda row: row["row"])
+
+    return build_preview(
+        summary={
+            key: value
+            for key, value in result.items()
+            if key not in ("errors", "error_count")
+        },
+        rows=rows,
+        errors=result["errors"],
+        total_rows=len(parsed["rows"]) + result["skipped"],
+        can_commit=bool(parsed["rows"]),
+    )
 
-        raise TransportServiceError(
-            "No fue posible completar la carga masiva."
-        ) from exc
 
-    finally:
-        workbook.close()
+def _transport_session_kwargs(ctx) -> dict[str, Any]:
+    return {
+        "user_id": ctx.user_id,
+        "registered_site_id": ctx.params.get("registered_site_id"),
+        "habitual_site_id": ctx.params.get("habitual_site_id"),
+        "progress": ctx.progress,
+    }
 
-    # =====================================================
-    # RESULTADO FINAL
-    # =====================================================
-    result["error_count"] = (
-        len(
-            result["errors"]
-        )
-    )
 
-    # Evitar mandar una cantidad enorme de texto
-    # al navegador.
-    result["errors"] = (
-        result["errors"][:100]
-    )
+register_import(
+    "TRANSPORT_DRIVERS",
+    label="Carga masiva de choferes y cabezales",
+    parse=lambda stream, ctx: parse_transport_workbook(stream, progress=ctx.progress),
+    preview=lambda parsed, ctx: preview_transport_import(parsed, **_transport_session_kwargs(ctx)),
+    commit=lambda parsed, ctx: apply_transport_import(parsed, **_transport_session_kwargs(ctx)),
+    upload_endpoint="transport.drivers_bulk_upload",
+    user_errors=(TransportServiceError,),
+)
 
-    return result
 
 def build_transport_bulk_template() -> BytesIO:
     """
@@ -4476,6 +4017,26 @@ def build_transport_bulk_template() -> BytesIO:
 
     return output
 
+
+@register_export(
+    "TRANSPORT_TEMPLATE",
+    label="Plantilla de carga masiva de choferes",
+)
+def build_transport_bulk_template_export(
+    site_id,
+    params,
+) -> ExportFile:
+    """
+    Plantilla de carga masiva como exportación
+    (dentro de la petición o en export_worker.py).
+    """
+
+    return ExportFile(
+        filename="plantilla_carga_masiva_choferes.xlsx",
+        mimetype=XLSX_MIMETYPE,
+        data=build_transport_bulk_template(),
+    )
+
 def get_active_assignment_for_truck(
     truck_id: int,
 ) -> DriverTruckAssignment | None:
@@ -4599,8 +4160,21 @@ def assign_driver_to_truck(
         created_by_user_id=user_id,
     )
 
-    db.session.add(assignment)
-    db.session.flush()
+    # Los índices únicos parciales (una ACTIVE por chofer y por
+    # cabezal) rechazan una asignación simultánea que pasó las
+    # validaciones anteriores. El SAVEPOINT deja intacto el resto
+    # de la transacción de quien llama.
+    try:
+        with db.session.begin_nested():
+            db.session.add(assignment)
+
+            driver.current_truck_id = truck.id
+            truck.current_driver_id = driver.id
+    except IntegrityError as exc:
+        raise TransportConflictError(
+            "El chofer o el cabezal ya tienen otra "
+            "asignación activa."
+        ) from exc
 
     if commit:
         _commit_or_raise(
@@ -4612,6 +4186,29 @@ def assign_driver_to_truck(
     return assignment
 
 
+def _clear_assignment_pointers(
+    assignment: DriverTruckAssignment,
+) -> None:
+    """
+    Libera chofer y cabezal (current_truck_id / current_driver_id)
+    si todavía apuntan a esta asignación.
+    """
+    driver = db.session.get(Driver, assignment.driver_id)
+    truck = db.session.get(Truck, assignment.truck_id)
+
+    if (
+        driver is not None
+        and driver.current_truck_id == assignment.truck_id
+    ):
+        driver.current_truck_id = None
+
+    if (
+        truck is not None
+        and truck.current_driver_id == assignment.driver_id
+    ):
+        truck.current_driver_id = None
+
+
 def _end_assignment_without_commit(
     assignment: DriverTruckAssignment,
     *,
@@ -4626,6 +4223,7 @@ def _end_assignment_without_commit(
         )
 
     assignment.status = "ENDED"
+    _clear_assignment_pointers(assignment)
     assignment.ended_at = ended_at
     assignment.end_reason = _required_text(
         end_reason,
@@ -5147,6 +4745,121 @@ def cancel_incident(
     return incident
 
 
+# =========================================================
+# ADJUNTOS
+# =========================================================
+ATTACHMENT_TARGETS = {
+    "DRIVER": (Driver, "driver_id"),
+    "TRUCK": (Truck, "truck_id"),
+    "ASSIGNMENT": (DriverTruckAssignment, "assignment_id"),
+    "EXIT_PERMISSION": (DriverExitPermission, "exit_permission_id"),
+    "INCIDENT": (TransportIncident, "incident_id"),
+}
+
+ATTACHMENT_MIME_PREFIXES = (
+    "image/",
+    "application/pdf",
+)
+
+
+def validate_attachment_target(
+    target_type: Any,
+    target_id: Any,
+) -> tuple[str, int]:
+    """
+    Valida el destino de un adjunto y retorna (tipo, id).
+    """
+    target_type = _validate_choice(
+        target_type,
+        "tipo de destino",
+        set(ATTACHMENT_TARGETS),
+    )
+
+    target_id = _parse_int(
+        target_id,
+        "destino",
+        required=True,
+    )
+
+    model, _column = ATTACHMENT_TARGETS[target_type]
+
+    if db.session.get(model, target_id) is None:
+        raise TransportNotFoundError(
+            "El registro al que se intenta adjuntar no existe."
+        )
+
+    return target_type, target_id
+
+
+def register_transport_attachment(
+    *,
+    target_type: Any,
+    target_id: Any,
+    storage_key: str,
+    original_filename: Any,
+    mime_type: Any,
+    size_bytes: int | None,
+    description: Any = None,
+    content_sha256: str | None = None,
+    user_id: int,
+    commit: bool = True,
+) -> TransportAttachment:
+    """
+    Registra un adjunto que ya fue subido directo a R2.
+
+    La existencia del objeto la valida la ruta con head_object antes
+    de llamar a esta función.
+    """
+    target_type, target_id = validate_attachment_target(
+        target_type,
+        target_id,
+    )
+
+    mime_type = _clean_text(
+        mime_type,
+        max_length=120,
+    )
+
+    if not mime_type or not mime_type.lower().startswith(
+        ATTACHMENT_MIME_PREFIXES
+    ):
+        raise TransportValidationError(
+            "Solo se permiten imágenes o archivos PDF."
+        )
+
+    _model, column = ATTACHMENT_TARGETS[target_type]
+
+    attachment = TransportAttachment(
+        original_filename=_required_text(
+            original_filename,
+            "nombre del archivo",
+            max_length=255,
+        ),
+        stored_filename=storage_key.rsplit("/", 1)[-1][:255],
+        storage_path=storage_key,
+        mime_type=mime_type,
+        size_bytes=size_bytes,
+        content_sha256=content_sha256,
+        description=_clean_text(
+            description,
+            max_length=240,
+        ),
+        uploaded_by_user_id=user_id,
+        uploaded_at=datetime.utcnow(),
+    )
+
+    setattr(attachment, column, target_id)
+
+    db.session.add(attachment)
+
+    if commit:
+        _commit_or_raise(
+            "No fue posible registrar el adjunto."
+        )
+
+    return attachment
+
+
 # =========================================================
 # CONSULTAS LIVIANAS PARA SELECTORES
 # =========================================================
@@ -5159,51 +4872,48 @@ def get_available_drivers(
     Retorna únicamente choferes activos sin asignación activa.
 
     Se usa para selectores y nunca trae relaciones adicionales.
+    La disponibilidad sale de drivers.current_truck_id (índice
+    parcial ix_drivers_available_name); la búsqueda usa las claves
+    normalizadas de app/services/search.py.
     """
     safe_limit = max(
         1,
         min(limit, 100),
     )
 
-    active_assignment_exists = (
-        select(DriverTruckAssignment.id)
-        .where(
-            DriverTruckAssignment.driver_id == Driver.id,
-            DriverTruckAssignment.status == "ACTIVE",
-        )
-        .exists()
-    )
-
     query = (
         select(Driver)
+        .options(
+            noload("*"),
+        )
         .where(
             Driver.status == "ACTIVE",
-            ~active_assignment_exists,
-        )
-        .order_by(
-            Driver.name.asc(),
-            Driver.id.asc(),
+            Driver.current_truck_id.is_(None),
         )
         .limit(safe_limit)
     )
 
-    cleaned_search = _clean_text(
-        search,
-        upper=True,
-    )
-
-    if cleaned_search:
-        like_value = f"%{cleaned_search}%"
+    search_term = normalize_search_key(search)
 
+    if search_term:
         query = query.where(
-            or_(
-                func.upper(Driver.name).like(like_value),
-                func.upper(Driver.identification).like(
-                    like_value
-                ),
+            search_condition(
+                [Driver.search_key],
+                search_term,
+                multi_field=[Driver.search_key],
+            )
+        ).order_by(
+            search_rank(
+                [Driver.search_key],
+                search_term,
             )
         )
 
+    query = query.order_by(
+        Driver.name.asc(),
+        Driver.id.asc(),
+    )
+
     return list(
         db.session.scalars(query).all()
     )
@@ -5215,55 +4925,129 @@ def get_available_trucks(
     limit: int = 50,
 ) -> list[Truck]:
     """
-    Retorna cabezales activos sin asignación activa.
+    Retorna cabezales activos sin asignación activa
+    (trucks.current_driver_id, índice ix_trucks_available_plate).
     """
     safe_limit = max(
         1,
         min(limit, 100),
     )
 
-    active_assignment_exists = (
-        select(DriverTruckAssignment.id)
-        .where(
-            DriverTruckAssignment.truck_id == Truck.id,
-            DriverTruckAssignment.status == "ACTIVE",
-        )
-        .exists()
-    )
-
     query = (
         select(Truck)
+        .options(
+            noload("*"),
+        )
         .where(
             Truck.status == "ACTIVE",
-            ~active_assignment_exists,
-        )
-        .order_by(
-            Truck.plate.asc(),
-            Truck.id.asc(),
+            Truck.current_driver_id.is_(None),
         )
         .limit(safe_limit)
     )
 
-    cleaned_search = _clean_text(
-        search,
-        upper=True,
-    )
+    search_term = normalize_search_key(search)
 
-    if cleaned_search:
+    if search_term:
         query = query.where(
-            func.upper(Truck.plate).like(
-                f"%{cleaned_search}%"
+            search_condition(
+                [Truck.plate_key],
+                search_term,
+            )
+        ).order_by(
+            search_rank(
+                [Truck.plate_key],
+                search_term,
             )
         )
 
+    query = query.order_by(
+        Truck.plate.asc(),
+        Truck.id.asc(),
+    )
+
     return list(
         db.session.scalars(query).all()
     )
 
 
+@scheduled_job(
+    "transport_assignment_pointers",
+    every_seconds=86400,
+    minimum_seconds=3600,
+)
+def sync_assignment_pointers(
+    *,
+    commit: bool = True,
+) -> dict[str, int]:
+    """
+    Alinea drivers.current_truck_id / trucks.current_driver_id con
+    las asignaciones ACTIVE. Normalmente no cambia nada: corrige
+    datos anteriores a los punteros o escritos por fuera de
+    assign_driver_to_truck() / end_assignment().
+    """
+    drivers_fixed = execute(
+        """
+        UPDATE yard_gate_alamo.drivers dr
+        SET current_truck_id = a.truck_id
+        FROM yard_gate_alamo.drivers d
+        LEFT JOIN yard_gate_alamo.driver_truck_assignments a
+          ON a.driver_id = d.id
+         AND a.status = 'ACTIVE'
+        WHERE dr.id = d.id
+          AND dr.current_truck_id IS DISTINCT FROM a.truck_id
+        """
+    ).rowcount or 0
+
+    trucks_fixed = execute(
+        """
+        UPDATE yard_gate_alamo.trucks tr
+        SET current_driver_id = a.driver_id
+        FROM yard_gate_alamo.trucks t
+        LEFT JOIN yard_gate_alamo.driver_truck_assignments a
+          ON a.truck_id = t.id
+         AND a.status = 'ACTIVE'
+        WHERE tr.id = t.id
+          AND tr.current_driver_id IS DISTINCT FROM a.driver_id
+        """
+    ).rowcount or 0
+
+    result = {
+        "drivers_fixed": drivers_fixed,
+        "trucks_fixed": trucks_fixed,
+    }
+
+    if commit:
+        db.session.commit()
+
+    return result
+
+
 # =========================================================
 # ACTUALIZACIONES PROGRAMADAS
 # =========================================================
+def _bulk_status_update(
+    model,
+    owner_column,
+    *conditions,
+    **values: Any,
+) -> list[int]:
+    """
+    UPDATE directo; devuelve el chofer/cabezal de cada fila tocada.
+    """
+    return list(
+        db.session.execute(
+            update(model)
+            .where(*conditions)
+            .values(**values)
+            .returning(owner_column),
+            execution_options={
+                "synchronize_session": False,
+            },
+        ).scalars()
+    )
+
+
+@scheduled_job("transport_documents_expiry", every_seconds=3600)
 def refresh_expired_transport_documents(
     *,
     commit: bool = True,
@@ -5272,119 +5056,115 @@ def refresh_expired_transport_documents(
     Actualiza vencimientos mediante UPDATE directo.
 
     No carga todos los documentos en memoria.
-    Es apropiado para una tarea programada diaria.
+    La ejecuta el scheduler cada hora, así los documentos quedan
+    vencidos poco después del cambio de día. También recalcula el
+    índice de cumplimiento de quien tenía un vencimiento hoy o antes
+    e invalida la ficha 360° de los choferes/cabezales tocados.
     """
     today = date.today()
+    now = datetime.utcnow()
 
-    expired_driver_documents = (
-        db.session.query(DriverDocument)
-        .filter(
-            DriverDocument.no_expiry.is_(False),
-            DriverDocument.expiry_date.is_not(None),
-            DriverDocument.expiry_date < today,
-            DriverDocument.status.notin_(
-                {
-                    "EXPIRED",
-                    "NOT_APPLICABLE",
-                }
-            ),
-        )
-        .update(
+    expired_driver_documents = _bulk_status_update(
+        DriverDocument,
+        DriverDocument.driver_id,
+        DriverDocument.no_expiry.is_(False),
+        DriverDocument.expiry_date.is_not(None),
+        DriverDocument.expiry_date < today,
+        DriverDocument.status.notin_(
             {
-                DriverDocument.status: "EXPIRED",
-                DriverDocument.updated_at: datetime.utcnow(),
-            },
-            synchronize_session=False,
-        )
+                "EXPIRED",
+                "NOT_APPLICABLE",
+            }
+        ),
+        status="EXPIRED",
+        updated_at=now,
     )
 
-    valid_driver_documents = (
-        db.session.query(DriverDocument)
-        .filter(
-            DriverDocument.no_expiry.is_(False),
-            DriverDocument.expiry_date.is_not(None),
-            DriverDocument.expiry_date >= today,
-            DriverDocument.status == "EXPIRED",
-        )
-        .update(
+    valid_driver_documents = _bulk_status_update(
+        DriverDocument,
+        DriverDocument.driver_id,
+        DriverDocument.no_expiry.is_(False),
+        DriverDocument.expiry_date.is_not(None),
+        DriverDocument.expiry_date >= today,
+        DriverDocument.status == "EXPIRED",
+        status="VALID",
+        updated_at=now,
+    )
+
+    expired_truck_documents = _bulk_status_update(
+        TruckDocument,
+        TruckDocument.truck_id,
+        TruckDocument.no_expiry.is_(False),
+        TruckDocument.expiry_date.is_not(None),
+        TruckDocument.expiry_date < today,
+        TruckDocument.status.notin_(
             {
-                DriverDocument.status: "VALID",
-                DriverDocument.updated_at: datetime.utcnow(),
-            },
-            synchronize_session=False,
-        )
+                "EXPIRED",
+                "NOT_APPLICABLE",
+            }
+        ),
+        status="EXPIRED",
+        updated_at=now,
     )
 
-    expired_truck_documents = (
-        db.session.query(TruckDocument)
-        .filter(
-            TruckDocument.no_expiry.is_(False),
-            TruckDocument.expiry_date.is_not(None),
-            TruckDocument.expiry_date < today,
-            TruckDocument.status.notin_(
-                {
-                    "EXPIRED",
-                    "NOT_APPLICABLE",
-                }
-            ),
-        )
-        .update(
-            {
-                TruckDocument.status: "EXPIRED",
-                TruckDocument.updated_at: datetime.utcnow(),
-            },
-            synchronize_session=False,
-        )
+    valid_truck_documents = _bulk_status_update(
+        TruckDocument,
+        TruckDocument.truck_id,
+        TruckDocument.no_expiry.is_(False),
+        TruckDocument.expiry_date.is_not(None),
+        TruckDocument.expiry_date >= today,
+        TruckDocument.status == "EXPIRED",
+        status="VALID",
+        updated_at=now,
     )
 
-    valid_truck_documents = (
-        db.session.query(TruckDocument)
-        .filter(
-            TruckDocument.no_expiry.is_(False),
-            TruckDocument.expiry_date.is_not(None),
-            TruckDocument.expiry_date >= today,
-            TruckDocument.status == "EXPIRED",
-        )
-        .update(
-            {
-                TruckDocument.status: "VALID",
-                TruckDocument.updated_at: datetime.utcnow(),
-            },
-            synchronize_session=False,
-        )
+    expired_apm = _bulk_status_update(
+        DriverApmRecord,
+        DriverApmRecord.driver_id,
+        DriverApmRecord.expiry_date.is_not(None),
+        DriverApmRecord.expiry_date < today,
+        DriverApmRecord.expiry_mode == "DATE",
+        expiry_mode="EXPIRED",
+        card_status="EXPIRED",
+        updated_at=now,
     )
 
-    expired_apm = (
-        db.session.query(DriverApmRecord)
-        .filter(
-            DriverApmRecord.expiry_date.is_not(None),
-            DriverApmRecord.expiry_date < today,
-            DriverApmRecord.expiry_mode == "DATE",
-        )
-        .update(
-            {
-                DriverApmRecord.expiry_mode: "EXPIRED",
-                DriverApmRecord.card_status: "EXPIRED",
-                DriverApmRecord.updated_at: datetime.utcnow(),
-            },
-            synchronize_session=False,
-        )
+    # El UPDATE directo no pasa por after_flush.
+    if expired_driver_documents or valid_driver_documents:
+        mark_transport_counters_stale("driver_documents")
+
+    if expired_truck_documents or valid_truck_documents:
+        mark_transport_counters_stale("truck_documents")
+
+    mark_transport_detail_touched(
+        driver_ids=(
+            expired_driver_documents
+            + valid_driver_documents
+            + expired_apm
+        ),
+        truck_ids=(
+            expired_truck_documents
+            + valid_truck_documents
+        ),
     )
 
     result = {
-        "driver_documents_expired": (
+        "driver_documents_expired": len(
             expired_driver_documents
         ),
-        "driver_documents_validated": (
+        "driver_documents_validated": len(
             valid_driver_documents
         ),
-        "truck_documents_expired": (
+        "truck_documents_expired": len(
             expired_truck_documents
         ),
-        "truck_documents_validated": (
+        "truck_documents_validated": len(
             valid_truck_documents
         ),
-        "apm_expired": expired_apm,
+        "apm_expired": len(expired_apm),
+        "compliance_refreshed": (
+            refresh_stale_transport_compliance()
+        ),
     }
 
     if commit and any(result.values()):
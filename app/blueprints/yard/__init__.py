@@ -22,3 +22,6 @@ from . import routes_chassis  # noqa: F401
 from . import routes_tires  # noqa: F401
 from . import routes_reports  # noqa: F401
 from . import routes_print  # noqa: F401
+from . import routes_uploads  # noqa: F401
+from . import routes_exports  # noqa: F401
+from . import routes_imports  # noqa: F401
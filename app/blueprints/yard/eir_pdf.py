@@ -0,0 +1,445 @@
+# app/blueprints/yard/eir_pdf.py
+"""
+PDF del EIR generado en el servidor (ReportLab).
+
+Antes el "PDF" era la vista HTML que el navegador imprimía, con los
+daños dibujados por JavaScript. Aquí se dibuja el mismo contenido
+(yard/eir_pdf.html) como PDF real:
+
+- eir_pdf_payload(): todo lo que aparece en el documento, ya como texto.
+- render_eir_pdf(): dibuja solo a partir del payload.
+- eir_pdf_bytes(): payload → caché por contenido
+  (app/services/pdf_cache.py). Se llama al confirmar el EIR, así las
+  descargas posteriores salen de la caché; si el EIR se edita dentro
+  de su ventana de 24 h, el payload cambia y se dibuja uno nuevo.
+"""
+
+import os
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from flask import current_app
+from reportlab.graphics.shapes import Circle, Drawing, Image as ShapeImage, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from app.services.pdf_cache import cached_pdf
+
+# Subir al cambiar el dibujo (invalida la caché)
+EIR_PDF_VERSION = 1
+
+SIDE_LABELS = {
+    "RIGHT": "Costado derecho",
+    "LEFT": "Costado izquierdo",
+    "FRONT": "Frente",
+    "REAR": "Atrás",
+    "ROOF": "Techo",
+    "INTERIOR": "Interior",
+}
+
+DAMAGE_VIEWS = [
+    ("RIGHT", "right.png"),
+    ("LEFT", "left.png"),
+    ("FRONT", "front.png"),
+    ("REAR", "rear.png"),
+    ("INTERIOR", "interior.png"),
+    ("ROOF", "roof.png"),
+]
+
+DAMAGE_CODES = [
+    ("A", "Abollado"),
+    ("R", "Rayado"),
+    ("G", "Gotera"),
+    ("M", "Malo"),
+    ("C", "Costadura"),
+    ("F", "Falla"),
+    ("H", "Hueco"),
+    ("Q", "Quebrado"),
+]
+
+INSPECTION_ITEMS = [
+    ("lights", "Luces"),
+    ("twist_locks", "Twist locks"),
+    ("mudflaps", "Faldones"),
+    ("landing_gear", "Patas"),
+    ("structure", "Estructura"),
+]
+
+AXLE_SIDES = [
+    ("AX1_L", "Eje 1 izquierdo"),
+    ("AX2_L", "Eje 2 izquierdo"),
+    ("AX3_L", "Eje 3 izquierdo"),
+    ("AX3_R", "Eje 3 derecho"),
+    ("AX2_R", "Eje 2 derecho"),
+    ("AX1_R", "Eje 1 derecho"),
+]
+
+REEFER_ROWS = [
+    [
+        ("running_status", "Running"),
+        ("temperature", "Temperatura"),
+        ("genset", "Genset"),
+        ("plug", "Plug"),
+        ("cord", "Cord"),
+        ("computer", "Computer"),
+    ],
+    [
+        ("fuel", "Combustible"),
+        ("hourmeter", "Horímetro"),
+        ("alternator", "Alternador"),
+        ("battery", "Batería"),
+    ],
+]
+
+# Proporción de las vistas de daños (viewBox 1000x500 de la vista HTML)
+VIEW_WIDTH = 176
+VIEW_HEIGHT = 88
+
+
+def _txt(value) -> str:
+    if value is None:
+        return ""
+
+    return str(value).strip()
+
+
+# =========================================================
+# Payload
+# =========================================================
+
+def eir_pdf_payload(eir) -> dict:
+    """
+    Contenido exacto del PDF: misma lógica de respaldos (snapshot)
+    que la vista HTML.
+    """
+    chassis_snapshot = eir.chassis_snapshot_json or {}
+    container_snapshot = eir.container_snapshot_json or {}
+    reefer_snapshot = eir.reefer_snapshot_json or {}
+
+    inspection = chassis_snapshot.get("inspection") or {}
+    axle_seals = chassis_snapshot.get("axle_seals_entered") or {}
+
+    damages = sorted(eir.damages or [], key=lambda d: d.id or 0)
+
+    return {
+        "id": eir.id,
+        "header": {
+            "terminal": _txt(eir.terminal_name),
+            "date": _txt(eir.trip_date),
+            "time": eir.trip_time.strftime("%H:%M") if eir.trip_time else "",
+            "carrier": _txt(eir.carrier or "ATM"),
+            "origin": _txt(eir.origin),
+            "destination": _txt(eir.destination),
+            "driver": _txt(eir.driver_name),
+            "operation_type": _txt(eir.operation_type),
+            "container": _txt(
+                eir.container.code if eir.container else container_snapshot.get("container_code")
+            ),
+            "size": _txt(eir.container_size or container_snapshot.get("size")),
+            "seal": _txt(eir.container_seal or container_snapshot.get("seal")),
+            "document": _txt(eir.driver_id_doc or eir.truck_plate),
+            "shipping_line": _txt(eir.shipping_line or container_snapshot.get("shipping_line")),
+            "chassis": _txt(
+                eir.chassis.chassis_number if eir.chassis else chassis_snapshot.get("chassis_number")
+            ),
+            "chassis_plate": _txt(eir.chassis_plate or chassis_snapshot.get("plate")),
+        },
+        "has_container": bool(eir.has_container),
+        "has_chassis": bool(eir.has_chassis),
+        "is_reefer": bool(eir.is_reefer),
+        "damages": [
+            {
+                "side": _txt(d.side),
+                "damage_type": _txt(d.damage_type),
+                "x": float(d.x or 0),
+                "y": float(d.y or 0),
+                "notes": _txt(d.notes),
+            }
+            for d in damages
+        ],
+        "inspection": [
+            [
+                label,
+                _txt((inspection.get(code) or {}).get("status")),
+                _txt((inspection.get(code) or {}).get("detail")),
+            ]
+            for code, label in INSPECTION_ITEMS
+        ],
+        "axle_seals": [
+            [
+                label,
+                _txt((axle_seals.get(code) or {}).get("seal_1")),
+                _txt((axle_seals.get(code) or {}).get("seal_2")),
+            ]
+            for code, label in AXLE_SIDES
+            if (axle_seals.get(code) or {}).get("seal_1") or (axle_seals.get(code) or {}).get("seal_2")
+        ],
+        "reefer": {
+            key: _txt(reefer_snapshot.get(key))
+            for row in REEFER_ROWS
+            for key, _ in row
+        },
+        "reefer_notes": _txt(reefer_snapshot.get("notes")),
+        "general_notes": _txt(eir.general_notes),
+    }
+
+
+# =========================================================
+# Dibujo
+# =========================================================
+
+def _static_path(*parts) -> str:
+    return os.path.join(current_app.static_folder, "img", *parts)
+
+
+def _damage_view(side: str, image_name: str, damages: list[dict]) -> Drawing:
+    drawing = Drawing(VIEW_WIDTH, VIEW_HEIGHT)
+
+    image_path = _static_path("eir", image_name)
+    if os.path.exists(image_path):
+        drawing.add(ShapeImage(0, 0, VIEW_WIDTH, VIEW_HEIGHT, image_path))
+
+    for item in damages:
+        if item["side"] != side:
+            continue
+
+        # x/y vienen 0..1 desde la esquina superior izquierda
+        cx = item["x"] * VIEW_WIDTH
+        cy = VIEW_HEIGHT - item["y"] * VIEW_HEIGHT
+
+        drawing.add(Circle(
+            cx,
+            cy,
+            5.5,
+            fillColor=colors.HexColor("#DC2626"),
+            strokeColor=colors.white,
+            strokeWidth=0.8,
+        ))
+        drawing.add(String(
+            cx,
+            cy - 2.4,
+            item["damage_type"],
+            textAnchor="middle",
+            fontName="Helvetica-Bold",
+            fontSize=6.5,
+            fillColor=colors.white,
+        ))
+
+    return drawing
+
+
+def _grid_style(header_color="#0F3B63") -> TableStyle:
+    return TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor(header_color)),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 7.5),
+        ("GRID", (0, 0), (-1, -1), 0.35, colors.HexColor("#CBD5E1")),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TOPPADDING", (0, 0), (-1, -1), 3),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 3),
+    ])
+
+
+def render_eir_pdf(payload: dict) -> bytes:
+    bio = BytesIO()
+
+    doc = SimpleDocTemplate(
+        bio,
+        pagesize=letter,
+        rightMargin=18,
+        leftMargin=18,
+        topMargin=16,
+        bottomMargin=16,
+        title=f"EIR #{payload['id']}",
+    )
+
+    styles = getSampleStyleSheet()
+    label_style = ParagraphStyle("eir_label", parent=styles["Normal"], fontSize=6.5, leading=8, textColor=colors.HexColor("#475569"))
+    value_style = ParagraphStyle("eir_value", parent=styles["Normal"], fontName="Helvetica-Bold", fontSize=8.5, leading=10)
+    title_style = ParagraphStyle("eir_title", parent=styles["Normal"], fontName="Helvetica-Bold", fontSize=14, leading=16)
+    section_style = ParagraphStyle("eir_section", parent=styles["Normal"], fontName="Helvetica-Bold", fontSize=9, leading=11, spaceBefore=6, spaceAfter=3)
+    cell_style = ParagraphStyle("eir_cell", parent=styles["Normal"], fontSize=7.5, leading=9)
+
+    def cell(label: str, value: str):
+        return [Paragraph(escape(label), label_style), Paragraph(escape(value or ""), value_style)]
+
+    def section(title: str):
+        return Paragraph(escape(title), section_style)
+
+    header = payload["header"]
+    elements = []
+
+    # -----------------------------------------------------
+    # Encabezado
+    # -----------------------------------------------------
+    title_cells = [
+        Paragraph("EIR - CONDICIÓN DE EQUIPO", title_style),
+        Paragraph(f"Yard Gate Álamo · EIR #{payload['id']}", label_style),
+    ]
+
+    logo_path = _static_path("logo.png")
+    logo = Image(logo_path, width=70, height=35, kind="proportional") if os.path.exists(logo_path) else ""
+
+    top = Table([[logo, title_cells]], colWidths=[90, 486])
+    top.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "MIDDLE")]))
+    elements.append(top)
+    elements.append(Spacer(1, 6))
+
+    band = Table(
+        [
+            [
+                cell("Terminal", header["terminal"]),
+                cell("Fecha", header["date"]),
+                cell("Hora", header["time"]),
+                cell("Transportista", header["carrier"]),
+                cell("Origen", header["origin"]),
+                cell("Destino", header["destination"]),
+                cell("Chofer", header["driver"]),
+            ],
+            [
+                cell("Tipo de operación", header["operation_type"]), "",
+                cell("Contenedor", header["container"]), "",
+                cell("Tamaño", header["size"]),
+                cell("Marchamo", header["seal"]),
+                cell("Documento / placa", header["document"]),
+            ],
+            [
+                cell("Naviera", header["shipping_line"]), "",
+                cell("Chasis", header["chassis"]), "",
+                cell("Placa chasis", header["chassis_plate"]), "", "",
+            ],
+        ],
+        colWidths=[75, 69, 58, 98, 92, 104, 80],
+    )
+    band.setStyle(TableStyle([
+        ("SPAN", (0, 1), (1, 1)),
+        ("SPAN", (2, 1), (3, 1)),
+        ("SPAN", (0, 2), (1, 2)),
+        ("SPAN", (2, 2), (3, 2)),
+        ("SPAN", (4, 2), (6, 2)),
+        ("GRID", (0, 0), (-1, -1), 0.35, colors.HexColor("#CBD5E1")),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+    elements.append(band)
+
+    # -----------------------------------------------------
+    # Daños del contenedor
+    # -----------------------------------------------------
+    if payload["has_container"]:
+        elements.append(section("DAÑOS DEL CONTENEDOR"))
+
+        views = [
+            [Paragraph(escape(SIDE_LABELS[side]), label_style), _damage_view(side, image, payload["damages"])]
+            for side, image in DAMAGE_VIEWS
+        ]
+        view_grid = Table([views[0:3], views[3:6]], colWidths=[VIEW_WIDTH + 10] * 3)
+        view_grid.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP")]))
+        elements.append(view_grid)
+        elements.append(Spacer(1, 4))
+
+        legend = Table(
+            [[f"{code} = {label}" for code, label in DAMAGE_CODES]],
+            colWidths=[72] * len(DAMAGE_CODES),
+        )
+        legend.setStyle(TableStyle([
+            ("FONTSIZE", (0, 0), (-1, -1), 7),
+            ("GRID", (0, 0), (-1, -1), 0.35, colors.HexColor("#CBD5E1")),
+        ]))
+        elements.append(legend)
+        elements.append(Spacer(1, 4))
+
+        damage_rows = [["Vista", "Código", "Nota"]]
+        damage_rows += [
+            [
+                SIDE_LABELS.get(d["side"], d["side"]),
+                d["damage_type"],
+                Paragraph(escape(d["notes"]), cell_style),
+            ]
+            for d in payload["damages"]
+        ] or [["Sin daños registrados", "", ""]]
+
+        damage_table = Table(damage_rows, colWidths=[200, 90, 286], repeatRows=1)
+        damage_table.setStyle(_grid_style())
+        elements.append(damage_table)
+
+    # -----------------------------------------------------
+    # Chasis
+    # -----------------------------------------------------
+    if payload["has_chassis"]:
+        elements.append(section("REVISIÓN DE CHASIS"))
+
+        inspection_table = Table(
+            [["Elemento", "Estado", "Detalle"]] + [
+                [label, status, Paragraph(escape(detail), cell_style)]
+                for label, status, detail in payload["inspection"]
+            ],
+            colWidths=[150, 120, 306],
+        )
+        inspection_table.setStyle(_grid_style())
+        elements.append(inspection_table)
+        elements.append(Spacer(1, 4))
+
+        seal_table = Table(
+            [["Eje / lado", "Marchamo 1", "Marchamo 2"]]
+            + (payload["axle_seals"] or [["Sin marchamos registrados en el EIR", "", ""]]),
+            colWidths=[230, 173, 173],
+        )
+        seal_table.setStyle(_grid_style())
+        elements.append(seal_table)
+
+    # -----------------------------------------------------
+    # Refrigerado
+    # -----------------------------------------------------
+    if payload["is_reefer"]:
+        elements.append(section("EQUIPO REFRIGERADO"))
+
+        for row in REEFER_ROWS:
+            reefer_table = Table(
+                [
+                    [label for _, label in row],
+                    [payload["reefer"].get(key, "") for key, _ in row],
+                ],
+                colWidths=[576 / len(row)] * len(row),
+            )
+            reefer_table.setStyle(_grid_style())
+            elements.append(reefer_table)
+            elements.append(Spacer(1, 3))
+
+        elements.append(section("OBSERVACIONES RF"))
+        elements.append(Paragraph(escape(payload["reefer_notes"]) or "&nbsp;", cell_style))
+
+    # -----------------------------------------------------
+    # Observaciones y firmas
+    # -----------------------------------------------------
+    elements.append(section("OBSERVACIONES GENERALES"))
+    elements.append(Paragraph(escape(payload["general_notes"]) or "&nbsp;", cell_style))
+    elements.append(Spacer(1, 28))
+
+    signatures = Table(
+        [["FIRMA CHOFER", "FIRMA DESPACHADOR", "FECHA / HORA"]],
+        colWidths=[192, 192, 192],
+    )
+    signatures.setStyle(TableStyle([
+        ("LINEABOVE", (0, 0), (-1, 0), 0.6, colors.black),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("FONTSIZE", (0, 0), (-1, -1), 7.5),
+        ("LEFTPADDING", (0, 0), (-1, -1), 12),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 12),
+    ]))
+    elements.append(signatures)
+
+    doc.build(elements)
+
+    return bio.getvalue()
+
+
+def eir_pdf_bytes(eir) -> bytes:
+    """
+    PDF del EIR desde la caché por contenido (lo dibuja si no existe).
+    """
+    payload = eir_pdf_payload(eir)
+
+    return cached_pdf("EIR", EIR_PDF_VERSION, payload, lambda: render_eir_pdf(payload))
@@ -24,6 +24,7 @@ from app.models.container import Container, ContainerPosition
 from app.models.site import Site, UserSite
 from app.models.tire import Tire
 from app.models.tire_retread_event import TireRetreadEvent
+from app.services.write_hooks import mark_movements_touched
 
 
 CR_TZ = pytz.timezone("America/Costa_Rica")
@@ -860,6 +861,10 @@ def _insert_tire_reading_row(
 
     _insert_dynamic("yard_gate_alamo", "tire_readings", payload)
 
+    # Inserción por SQL directo: el listener de la sesión no la ve.
+    if resolved_event_type == "GATE_IN" and event_id:
+        mark_movements_touched([event_id])
+
 
 def _save_grouped_tire_readings(
     *,
@@ -1,7 +1,6 @@
 from datetime import datetime
-from io import BytesIO
 
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, abort, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, abort, session
 from flask_login import login_required, current_user
 from sqlalchemy import text
 
@@ -12,6 +11,8 @@ from app.models.chassis import Chassis, ChassisInventory
 from app.models.chassis_tire import ChassisTire
 from app.models.tire import Tire, TireReading, TirePosition
 from app.services.audit import audit_log
+from app.services.bulk_import import execute, stage_rows
+from app.services.xlsx_export import EXPORT_BATCH_SIZE, XlsxStreamWriter, xlsx_response
 
 from .routes import (
     _ensure_active_site,
@@ -122,6 +123,64 @@ def chassis_import_view():
     return render_template("yard/chassis_import.html")
 
 
+_CHASSIS_IMPORT_COLUMNS = [
+    ("chassis_number", "text NOT NULL"),
+    ("plate", "text"),
+    ("length_ft", "integer"),
+    ("axles", "integer"),
+    ("type_code", "text"),
+    ("status", "text NOT NULL"),
+    ("chassis_kind", "text NOT NULL"),
+    ("site_id", "integer NOT NULL"),
+]
+
+_CHASSIS_IMPORT_LATEST_CTE = """
+    WITH latest AS (
+        SELECT DISTINCT ON (s.chassis_number) s.*
+        FROM stg_chassis_import s
+        ORDER BY s.chassis_number, s.row_no DESC
+    ),
+    incoming AS (
+        SELECT l.*, (
+            SELECT max(c.id)
+            FROM yard_gate_alamo.chassis c
+            WHERE c.chassis_number = l.chassis_number
+        ) AS chassis_id
+        FROM latest l
+    )
+"""
+
+_CHASSIS_IMPORT_UPDATE_SQL = _CHASSIS_IMPORT_LATEST_CTE + """
+    UPDATE yard_gate_alamo.chassis c
+    SET site_id = i.site_id,
+        plate = i.plate,
+        length_ft = i.length_ft,
+        axles = i.axles,
+        type_code = i.type_code,
+        status = i.status,
+        chassis_kind = i.chassis_kind,
+        has_plate = (i.plate IS NOT NULL),
+        is_in_yard = TRUE,
+        updated_at = :now
+    FROM incoming i
+    WHERE c.id = i.chassis_id
+"""
+
+_CHASSIS_IMPORT_INSERT_SQL = _CHASSIS_IMPORT_LATEST_CTE + """
+    INSERT INTO yard_gate_alamo.chassis (
+        site_id, chassis_number, plate, length_ft, axles, type_code,
+        status, chassis_kind, has_plate, is_in_yard,
+        created_at, updated_at
+    )
+    SELECT
+        i.site_id, i.chassis_number, i.plate, i.length_ft, i.axles, i.type_code,
+        i.status, i.chassis_kind, (i.plate IS NOT NULL), TRUE,
+        :now, :now
+    FROM incoming i
+    WHERE i.chassis_id IS NULL
+"""
+
+
 @yard_bp.post("/chassis/import")
 @login_required
 def chassis_import_post():
@@ -138,18 +197,15 @@ def chassis_import_post():
         flash("Falta openpyxl en requirements.txt", "danger")
         return redirect(url_for("yard.chassis_import_view"))
 
-    wb = load_workbook(f, data_only=True)
+    wb = load_workbook(f, read_only=True, data_only=True)
     ws = wb.active
 
-    imported = 0
-    updated = 0
     errors = []
 
     sites = Site.query.all()
     sites_by_name = {(s.name or "").strip().upper(): s for s in sites}
 
     staged = []
-    numbers = []
 
     for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
         chassis_number = (str(row[0]).strip() if row and row[0] is not None else "")
@@ -210,9 +266,9 @@ def chassis_import_post():
             target_site_id = s.id
 
         staged.append({
-            "idx": idx,
+            "row_no": idx,
             "chassis_number": chassis_number,
-            "plate": plate,
+            "plate": plate or None,
             "length_ft": length_ft,
             "axles": axles,
             "type_code": type_code,
@@ -220,59 +276,22 @@ def chassis_import_post():
             "chassis_kind": chassis_kind,
             "site_id": target_site_id,
         })
-        numbers.append(chassis_number)
+
+    wb.close()
 
     if not staged:
         flash(f"No se importó nada. Errores: {len(errors)}", "danger")
         session["chassis_import_errors"] = errors[:200]
         return redirect(url_for("yard.chassis_import_view"))
 
-    existing_rows = (
-        Chassis.query
-        .filter(Chassis.chassis_number.in_(numbers))
-        .all()
-    )
-    existing_map = {c.chassis_number: c for c in existing_rows}
-
-    for item in staged:
-        chassis_number = item["chassis_number"]
-        plate = item["plate"]
-        length_ft = item["length_ft"]
-        axles = item["axles"]
-        type_code = item["type_code"]
-        status = item["status"]
-        chassis_kind = item["chassis_kind"]
-        target_site_id = item["site_id"]
-
-        existing = existing_map.get(chassis_number)
-
-        if existing:
-            existing.site_id = target_site_id
-            existing.plate = plate
-            existing.length_ft = length_ft
-            existing.axles = axles
-            existing.type_code = type_code
-            existing.status = status
-            existing.chassis_kind = chassis_kind
-            existing.has_plate = True if plate else False
-            existing.is_in_yard = True
-            db.session.add(existing)
-            updated += 1
-        else:
-            ch = Chassis(
-                site_id=target_site_id,
-                chassis_number=chassis_number,
-                plate=plate,
-                length_ft=length_ft,
-                axles=axles,
-                type_code=type_code,
-                status=status,
-                chassis_kind=chassis_kind,
-                has_plate=True if plate else False,
-                is_in_yard=True,
-            )
-            db.session.add(ch)
-            imported += 1
+    # Staging + SQL por conjuntos (app/services/bulk_import.py).
+    # El chasis se busca por número en cualquier predio; si el número
+    # se repite en el archivo gana la última fila.
+    stage_rows("stg_chassis_import", _CHASSIS_IMPORT_COLUMNS, staged)
+
+    params = {"now": datetime.utcnow()}
+    updated = execute(_CHASSIS_IMPORT_UPDATE_SQL, params).rowcount
+    imported = execute(_CHASSIS_IMPORT_INSERT_SQL, params).rowcount
 
     db.session.commit()
 
@@ -291,26 +310,6 @@ def chassis_import_post():
 def chassis_export():
     site_id = _ensure_active_site()
 
-    try:
-        from openpyxl import Workbook
-    except Exception:
-        flash("Falta openpyxl en requirements.txt", "danger")
-        return redirect(url_for("yard.chassis_list"))
-
-    rows = (
-        Chassis.query
-        .filter(
-            Chassis.site_id == site_id,
-            Chassis.is_in_yard.is_(True),
-        )
-        .order_by(Chassis.chassis_number.asc())
-        .all()
-    )
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Chassis"
-
     headers = [
         "chassis_number (número de chasis 5 dígitos)",
         "plate (placa) [opcional]",
@@ -321,42 +320,46 @@ def chassis_export():
         "chassis_kind (CHASIS/LOW_BOY/TANQUETA/PLANA/CARRETA) [opcional]",
         "predio (nombre del predio / Site.name) [opcional]",
     ]
-    ws.append(headers)
-    ws.freeze_panes = "A2"
 
-    for ch in rows:
-        ws.append([
-            ch.chassis_number,
-            ch.plate or "",
-            getattr(ch, "length_ft", "") or "",
-            getattr(ch, "axles", "") or "",
-            ch.type_code or "",
-            getattr(ch, "status", "") or "BUENO",
-            getattr(ch, "chassis_kind", "") or "CHASIS",
-            (ch.site.name if getattr(ch, "site", None) else ""),
-        ])
-
-    ws.column_dimensions["A"].width = 38
-    ws.column_dimensions["B"].width = 26
-    ws.column_dimensions["C"].width = 30
-    ws.column_dimensions["D"].width = 22
-    ws.column_dimensions["E"].width = 45
-    ws.column_dimensions["F"].width = 30
-    ws.column_dimensions["G"].width = 30
-    ws.column_dimensions["H"].width = 26
-
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+    writer = XlsxStreamWriter(
+        "Chassis",
+        headers,
+        freeze_header=True,
+        widths={"A": 38, "B": 26, "C": 30, "D": 22, "E": 45, "F": 30, "G": 30, "H": 26},
+    )
+
+    # El nombre del predio viene en la misma consulta (sin cargar
+    # ch.site fila por fila).
+    rows = (
+        db.session.query(Chassis, Site.name)
+        .outerjoin(Site, Site.id == Chassis.site_id)
+        .filter(
+            Chassis.site_id == site_id,
+            Chassis.is_in_yard.is_(True),
+        )
+        .order_by(Chassis.chassis_number.asc())
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+
+    try:
+        for ch, site_name in rows:
+            writer.append([
+                ch.chassis_number,
+                ch.plate or "",
+                getattr(ch, "length_ft", "") or "",
+                getattr(ch, "axles", "") or "",
+                ch.type_code or "",
+                getattr(ch, "status", "") or "BUENO",
+                getattr(ch, "chassis_kind", "") or "CHASIS",
+                site_name or "",
+            ])
+    except Exception:
+        writer.discard()
+        raise
 
     filename = "chassis_import_template.xlsx"
 
-    return send_file(
-        bio,
-        as_attachment=True,
-        download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    return xlsx_response(writer, filename)
 
 
 @yard_bp.get("/chassis/<int:chassis_id>")
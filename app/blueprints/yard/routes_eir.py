@@ -1,9 +1,10 @@
+import logging
 from datetime import datetime, timedelta
+from io import BytesIO
 
 import pytz
-from flask import render_template, redirect, url_for, flash, abort, request
+from flask import render_template, redirect, url_for, flash, abort, request, send_file
 from flask_login import login_required, current_user
-from sqlalchemy import or_
 
 from app.blueprints.yard import yard_bp
 from app.extensions import db
@@ -13,9 +14,13 @@ from app.models.eir import EIR
 from app.models.chassis import Chassis, ChassisInventory
 from app.models.movement import Movement
 from app.services.audit import audit_log
+from app.services.keyset import keyset_paginate
+from app.services.search import normalize_search_key, search_condition
 
+from .eir_pdf import eir_pdf_bytes
 from .routes import _ensure_active_site
 
+logger = logging.getLogger(__name__)
 
 UTC_TZ = pytz.utc
 
@@ -35,7 +40,6 @@ def eir_list_view():
     date_to = (request.args.get("date_to") or "").strip()
     status = (request.args.get("status") or "").strip().upper()
 
-    page = request.args.get("page", 1, type=int)
     per_page = 50
 
     query = (
@@ -51,11 +55,12 @@ def eir_list_view():
         .outerjoin(Chassis, Chassis.id == EIR.chassis_id)
     )
 
-    if q:
+    search_term = normalize_search_key(q)
+    if search_term:
         query = query.filter(
-            or_(
-                Container.code.ilike(f"%{q}%"),
-                Chassis.chassis_number.ilike(f"%{q}%")
+            search_condition(
+                [Container.code_key, Chassis.number_key],
+                search_term,
             )
         )
 
@@ -78,10 +83,12 @@ def eir_list_view():
     if status:
         query = query.filter(EIR.status == status)
 
-    pagination = (
-        query
-        .order_by(EIR.id.desc())
-        .paginate(page=page, per_page=per_page, error_out=False)
+    pagination = keyset_paginate(
+        query,
+        [(EIR.id, "desc")],
+        key=lambda eir: (eir.id,),
+        cursor=request.args.get("cursor"),
+        per_page=per_page,
     )
 
     rows = pagination.items
@@ -118,6 +125,26 @@ def eir_pdf_view(eir_id: int):
     if eir.site_id != site_id and getattr(current_user, "role", None) != "admin":
         abort(403)
 
+    # PDF del servidor; normalmente ya está en caché desde la
+    # confirmación (eir_pdf.py).
+    return send_file(
+        BytesIO(eir_pdf_bytes(eir)),
+        mimetype="application/pdf",
+        as_attachment=False,
+        download_name=f"EIR_{eir.id}.pdf",
+    )
+
+
+@yard_bp.get("/eir/<int:eir_id>/print")
+@login_required
+def eir_print_view(eir_id: int):
+    site_id = _ensure_active_site()
+
+    eir = EIR.query.get_or_404(eir_id)
+    if eir.site_id != site_id and getattr(current_user, "role", None) != "admin":
+        abort(403)
+
+    # Vista HTML imprimible (anterior "PDF")
     return render_template("yard/eir_pdf.html", eir=eir)
 
 
@@ -336,5 +363,11 @@ def eir_confirm_view(eir_id: int):
 
     db.session.commit()
 
+    # El PDF se dibuja una vez aquí; las descargas salen de la caché.
+    try:
+        eir_pdf_bytes(eir)
+    except Exception:
+        logger.exception("EIR_PDF_RENDER_FAILED eir_id=%s", eir.id)
+
     flash(f"EIR #{eir.id} confirmado correctamente. Se aplicó el Gate Out.", "success")
     return redirect(url_for("yard.eir_detail_view", eir_id=eir.id))
\ No newline at end of file
@@ -0,0 +1,101 @@
+import os
+
+from flask import abort, jsonify, redirect, render_template, url_for
+from flask_login import login_required, current_user
+
+from app.blueprints.yard import yard_bp
+from app.extensions import db
+from app.models.export_job import ExportJob
+from app.services.export_jobs import EXPORT_STATUS_DONE, export_kind_label
+from app.services.storage import get_storage
+from app.services.xlsx_export import stream_file_response
+
+from .routes import _is_admin_user
+
+# =========================================================
+# Exportaciones en segundo plano (EXPORT_ASYNC)
+# =========================================================
+#
+# /exports/<id>           pantalla que consulta el estado
+# /api/exports/<id>       estado en JSON (polling)
+# /exports/<id>/download  descarga (URL prefirmada de R2 o disco local)
+#
+
+
+def _get_export_job_or_404(job_id: int) -> ExportJob:
+    job = db.session.get(ExportJob, job_id)
+
+    if job is None:
+        abort(404)
+
+    if job.requested_by_user_id != current_user.id and not _is_admin_user():
+        abort(403)
+
+    return job
+
+
+def _export_job_payload(job: ExportJob) -> dict:
+    available = job.status == EXPORT_STATUS_DONE and bool(job.storage_key or job.local_path)
+
+    return {
+        "ok": True,
+        "id": job.id,
+        "kind": job.kind,
+        "label": export_kind_label(job.kind),
+        "status": job.status,
+        "file_name": job.file_name,
+        "rows": job.row_count,
+        "size_bytes": job.size_bytes,
+        "error": job.last_error if job.status == "FAILED" else None,
+        "download_url": url_for("yard.export_job_download", job_id=job.id) if available else None,
+    }
+
+
+@yard_bp.get("/exports/<int:job_id>")
+@login_required
+def export_job_view(job_id: int):
+    job = _get_export_job_or_404(job_id)
+
+    return render_template(
+        "yard/export_job.html",
+        job=job,
+        payload=_export_job_payload(job),
+    )
+
+
+@yard_bp.get("/api/exports/<int:job_id>")
+@login_required
+def api_export_job_status(job_id: int):
+    job = _get_export_job_or_404(job_id)
+    return jsonify(_export_job_payload(job))
+
+
+@yard_bp.get("/exports/<int:job_id>/download")
+@login_required
+def export_job_download(job_id: int):
+    job = _get_export_job_or_404(job_id)
+
+    if job.status != EXPORT_STATUS_DONE:
+        return redirect(url_for("yard.export_job_view", job_id=job.id))
+
+    if job.storage_key:
+        return redirect(
+            get_storage().presign_download(
+                job.storage_key,
+                filename=job.file_name,
+                content_type=job.mimetype,
+                inline=bool(job.inline),
+            )
+        )
+
+    if job.local_path and os.path.exists(job.local_path):
+        return stream_file_response(
+            job.local_path,
+            job.file_name,
+            job.mimetype or "application/octet-stream",
+            inline=bool(job.inline),
+            delete=False,
+        )
+
+    # Archivo vencido (purge_expired_exports) o de otro servidor.
+    abort(410)
@@ -3,18 +3,25 @@ from datetime import datetime
 
 from flask import render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import text
+from sqlalchemy import select, text
 
 from app.blueprints.yard import yard_bp
 from app.extensions import db
 from app.models.yard import YardBlock, YardBay
 from app.models.container import Container, ContainerPosition
-from app.models.movement import Movement, MovementPhoto
+from app.models.movement import Movement
 from app.models.site import Site
 from app.models.chassis import Chassis, ChassisInventory
 from app.models.chassis_tire import ChassisTire
 from app.services.audit import audit_log
-from app.services.storage import get_storage, build_photo_key
+from app.services.photo_uploads import (
+    spool_movement_photos,
+    enqueue_photo_uploads,
+    failed_photos,
+)
+from .routes_uploads import wants_direct_photo_upload, direct_upload_response
+from app.services.search import normalize_search_key, ranked_search
+from app.services.write_hooks import mark_containers_touched
 from app.services.yard_logic import find_first_free_slot
 
 from .routes import (
@@ -153,7 +160,8 @@ def api_chassis_search():
     Reglas:
     - Requiere al menos 2 caracteres.
     - Busca por número de chasis o placa.
-    - Ignora mayúsculas, minúsculas, espacios y guiones.
+    - Ignora mayúsculas, minúsculas, espacios, guiones y demás
+      separadores (claves normalizadas de app/services/search.py).
     - Devuelve un máximo de 20 resultados.
     - No modifica ningún registro.
     """
@@ -167,12 +175,7 @@ def api_chassis_search():
             "items": [],
         })
 
-    normalized_query = (
-        query_raw
-        .upper()
-        .replace("-", "")
-        .replace(" ", "")
-    )
+    normalized_query = normalize_search_key(query_raw)
 
     if len(normalized_query) < 2:
         return jsonify({
@@ -180,93 +183,23 @@ def api_chassis_search():
             "items": [],
         })
 
+    # Claves normalizadas con índice trigram: número exacto, placa
+    # exacta, prefijos y luego "contiene" (app/services/search.py).
     rows = db.session.execute(
-        text("""
-            SELECT
-                c.id,
-                c.chassis_number,
-                c.plate,
-                c.axles,
-                c.status,
-                c.site_id,
-                c.type_code
-            FROM yard_gate_alamo.chassis c
-            WHERE
-                REPLACE(
-                    REPLACE(
-                        UPPER(COALESCE(c.chassis_number, '')),
-                        '-',
-                        ''
-                    ),
-                    ' ',
-                    ''
-                ) LIKE :search_pattern
-                OR
-                REPLACE(
-                    REPLACE(
-                        UPPER(COALESCE(c.plate, '')),
-                        '-',
-                        ''
-                    ),
-                    ' ',
-                    ''
-                ) LIKE :search_pattern
-            ORDER BY
-                CASE
-                    WHEN REPLACE(
-                        REPLACE(
-                            UPPER(COALESCE(c.chassis_number, '')),
-                            '-',
-                            ''
-                        ),
-                        ' ',
-                        ''
-                    ) = :exact_query
-                    THEN 0
-
-                    WHEN REPLACE(
-                        REPLACE(
-                            UPPER(COALESCE(c.plate, '')),
-                            '-',
-                            ''
-                        ),
-                        ' ',
-                        ''
-                    ) = :exact_query
-                    THEN 1
-
-                    WHEN REPLACE(
-                        REPLACE(
-                            UPPER(COALESCE(c.chassis_number, '')),
-                            '-',
-                            ''
-                        ),
-                        ' ',
-                        ''
-                    ) LIKE :starts_with_pattern
-                    THEN 2
-
-                    WHEN REPLACE(
-                        REPLACE(
-                            UPPER(COALESCE(c.plate, '')),
-                            '-',
-                            ''
-                        ),
-                        ' ',
-                        ''
-                    ) LIKE :starts_with_pattern
-                    THEN 3
-
-                    ELSE 4
-                END,
-                c.chassis_number ASC
-            LIMIT 20
-        """),
-        {
-            "exact_query": normalized_query,
-            "starts_with_pattern": f"{normalized_query}%",
-            "search_pattern": f"%{normalized_query}%",
-        },
+        ranked_search(
+            select(
+                Chassis.id,
+                Chassis.chassis_number,
+                Chassis.plate,
+                Chassis.axles,
+                Chassis.status,
+                Chassis.site_id,
+                Chassis.type_code,
+            ),
+            [Chassis.number_key, Chassis.plate_key],
+            normalized_query,
+            limit=20,
+        )
     ).mappings().all()
 
     items = [
@@ -1203,6 +1136,9 @@ def gate_in_post():
                 "final_classification": (final_classification or None),
             })
 
+            # INSERT por SQL directo: el estado actual se recalcula al COMMIT.
+            mark_containers_touched([c.id])
+
         # =========================
         # NUEVA REGLA:
         # Gate In NO ubica físicamente el contenedor.
@@ -1759,35 +1695,17 @@ def gate_in_post():
     # =========================
     # Fotos contenedor
     # =========================
+    spooled_photos = []
+
     if has_container and c:
-        storage = get_storage()
-        photos = request.files.getlist("photos") or []
+        spooled_photos = spool_movement_photos(
+            movement_id=mv.id,
+            container_code=c.code,
+            files=request.files.getlist("photos"),
+            photo_type="CONTAINER",
+        )
 
-        for f in photos:
-            if not f or not f.filename:
-                continue
-            try:
-                key = build_photo_key(c.code, mv.id, f.filename)
-                url = storage.upload_fileobj(
-                    f,
-                    key,
-                    f.mimetype or "application/octet-stream",
-                )
-                db.session.add(
-                    MovementPhoto(
-                        movement_id=mv.id,
-                        photo_type="CONTAINER",
-                        url=url,
-                    )
-                )
-            except Exception as e:
-                db.session.add(
-                    MovementPhoto(
-                        movement_id=mv.id,
-                        photo_type="UPLOAD_ERROR",
-                        url=str(e),
-                    )
-                )
+    photo_failures = failed_photos(spooled_photos)
 
     audit_log(
         current_user.id,
@@ -1808,11 +1726,15 @@ def gate_in_post():
             "chassis_id": selected_chassis.id if selected_chassis else None,
             "workshop_ticket_id": workshop_ticket_id,
             "print_job_ids": print_job_ids,
+            "photos_pending": len(spooled_photos) - len(photo_failures),
+            "photos_failed": len(photo_failures),
         },
     )
 
     db.session.commit()
 
+    enqueue_photo_uploads([ph.id for ph in spooled_photos if ph not in photo_failures])
+
     if has_chassis and has_container:
         msg = f"Gate In registrado: {c.code} con chasis {selected_chassis.chassis_number}."
     elif has_chassis:
@@ -1827,4 +1749,18 @@ def gate_in_post():
         msg += " Se generó ticket de taller por hallazgos."
 
     flash(msg, "success")
+
+    if photo_failures:
+        flash(
+            f"{len(photo_failures)} foto(s) no se pudieron guardar y no quedaron en el movimiento.",
+            "warning",
+        )
+
+    if wants_direct_photo_upload():
+        return direct_upload_response(
+            mv if has_container and c else None,
+            url_for("yard.gate_in_view"),
+            "CONTAINER",
+        )
+
     return redirect(url_for("yard.gate_in_view"))
\ No newline at end of file
@@ -9,13 +9,18 @@ from app.blueprints.yard import yard_bp
 from app.extensions import db
 from app.models.container import Container, ContainerPosition
 from app.models.yard import YardBay
-from app.models.movement import Movement, MovementPhoto
+from app.models.movement import Movement
 from app.models.site import Site
 from app.models.eir import EIR, EIRContainerDamage
 from app.models.chassis import Chassis, ChassisInventory
 from app.models.chassis_tire import ChassisTire
 from app.services.audit import audit_log
-from app.services.storage import get_storage, build_photo_key
+from app.services.photo_uploads import (
+    spool_movement_photos,
+    enqueue_photo_uploads,
+    failed_photos,
+)
+from .routes_uploads import wants_direct_photo_upload, direct_upload_response
 
 from .routes import (
     _ensure_active_site,
@@ -940,23 +945,14 @@ def gate_out_post():
     db.session.add(mv)
     db.session.flush()
 
-    storage = get_storage()
-    photos = request.files.getlist("photos") or []
-
-    for f in photos:
-        if not f or not f.filename:
-            continue
-
-        key = build_photo_key(c.code, mv.id, f.filename)
-        url = storage.upload_fileobj(f, key, f.mimetype or "application/octet-stream")
+    spooled_photos = spool_movement_photos(
+        movement_id=mv.id,
+        container_code=c.code,
+        files=request.files.getlist("photos"),
+        photo_type="DRIVER_ID",
+    )
 
-        db.session.add(
-            MovementPhoto(
-                movement_id=mv.id,
-                photo_type="DRIVER_ID",
-                url=url,
-            )
-        )
+    photo_failures = failed_photos(spooled_photos)
 
     ContainerPosition.query.filter_by(container_id=c.id).delete()
     c.is_in_yard = False
@@ -972,12 +968,30 @@ def gate_out_post():
             "depth_row": depth_row,
             "tier": tier,
             "site_id": site_id,
+            "photos_pending": len(spooled_photos) - len(photo_failures),
+            "photos_failed": len(photo_failures),
         },
     )
 
     db.session.commit()
 
+    enqueue_photo_uploads([ph.id for ph in spooled_photos if ph not in photo_failures])
+
     flash(f"Gate Out registrado: {c.code}", "success")
+
+    if photo_failures:
+        flash(
+            f"{len(photo_failures)} foto(s) no se pudieron guardar y no quedaron en el movimiento.",
+            "warning",
+        )
+
+    if wants_direct_photo_upload():
+        return direct_upload_response(
+            mv,
+            url_for("yard.ticket_view", movement_id=mv.id),
+            "DRIVER_ID",
+        )
+
     return redirect(url_for("yard.ticket_view", movement_id=mv.id))
 
 
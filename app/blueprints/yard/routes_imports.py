@@ -0,0 +1,172 @@
+import json
+import time
+
+from flask import Response, abort, flash, jsonify, redirect, render_template, stream_with_context, url_for
+from flask_login import login_required, current_user
+
+from app.blueprints.yard import yard_bp
+from app.extensions import db
+from app.models.import_session import ImportSession
+from app.services.import_sessions import (
+    IMPORT_ACTIVE_STATUSES,
+    cancel_import_session,
+    get_import_kind,
+    import_kind_label,
+    request_import_commit,
+)
+
+from .routes import _is_admin_user
+
+# =========================================================
+# Cargas masivas con simulación
+# =========================================================
+#
+# /imports/<id>               pantalla: avance, simulación y confirmar
+# /api/imports/<id>           estado en JSON (polling)
+# /api/imports/<id>/events    avance en vivo (Server-Sent Events)
+# /imports/<id>/commit        confirma la simulación
+# /imports/<id>/cancel        descarta la sesión
+#
+
+# Un stream SSE ocupa un thread de Gunicorn: se cierra después de este
+# tiempo y el navegador (EventSource) se reconecta solo.
+SSE_MAX_SECONDS = 30
+SSE_POLL_SECONDS = 1
+
+
+def _get_import_session_or_404(session_id: int) -> ImportSession:
+    session = db.session.get(ImportSession, session_id)
+
+    if session is None:
+        abort(404)
+
+    if session.requested_by_user_id != current_user.id and not _is_admin_user():
+        abort(403)
+
+    return session
+
+
+def _import_session_payload(session: ImportSession) -> dict:
+    preview = session.preview or {}
+
+    return {
+        "ok": True,
+        "id": session.id,
+        "kind": session.kind,
+        "label": import_kind_label(session.kind),
+        "stage": session.stage,
+        "status": session.status,
+        "file_name": session.original_file_name,
+        "phase": session.progress_phase,
+        "done": session.progress_done or 0,
+        "total": session.progress_total or 0,
+        "can_commit": (
+            session.stage == "PREVIEW"
+            and session.status == "READY"
+            and bool(preview.get("can_commit"))
+        ),
+        "error": session.last_error if session.status == "FAILED" else None,
+        "expires_at": session.expires_at.isoformat() if session.expires_at else None,
+    }
+
+
+def _is_settled(payload: dict) -> bool:
+    return payload["status"] not in IMPORT_ACTIVE_STATUSES
+
+
+@yard_bp.get("/imports/<int:session_id>")
+@login_required
+def import_session_view(session_id: int):
+    session = _get_import_session_or_404(session_id)
+    spec = get_import_kind(session.kind)
+
+    return render_template(
+        "yard/import_session.html",
+        import_session=session,
+        payload=_import_session_payload(session),
+        preview=session.preview or {},
+        result=session.result or {},
+        back_url=url_for(spec.upload_endpoint) if spec and spec.upload_endpoint else None,
+    )
+
+
+@yard_bp.get("/api/imports/<int:session_id>")
+@login_required
+def api_import_session_status(session_id: int):
+    session = _get_import_session_or_404(session_id)
+    return jsonify(_import_session_payload(session))
+
+
+@yard_bp.get("/api/imports/<int:session_id>/events")
+@login_required
+def api_import_session_events(session_id: int):
+    session_pk = _get_import_session_or_404(session_id).id
+    db.session.rollback()
+
+    def events():
+        last = None
+        started = time.monotonic()
+
+        # El navegador reintenta a los 2 s si el stream se corta.
+        yield "retry: 2000\n\n"
+
+        while time.monotonic() - started < SSE_MAX_SECONDS:
+            session = db.session.get(ImportSession, session_pk, populate_existing=True)
+
+            if session is None:
+                break
+
+            payload = _import_session_payload(session)
+
+            # No dejar una transacción abierta entre consultas.
+            db.session.rollback()
+
+            data = json.dumps(payload)
+
+            if data != last:
+                yield f"event: progress\ndata: {data}\n\n"
+                last = data
+            else:
+                yield ": ping\n\n"
+
+            if _is_settled(payload):
+                yield "event: settled\ndata: {}\n\n"
+                break
+
+            time.sleep(SSE_POLL_SECONDS)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Nginx / proxy de Render: no acumular la respuesta.
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@yard_bp.post("/imports/<int:session_id>/commit")
+@login_required
+def import_session_commit(session_id: int):
+    session = _get_import_session_or_404(session_id)
+
+    if request_import_commit(session):
+        flash("Carga confirmada. Se está aplicando en segundo plano.", "success")
+    else:
+        flash("Esta simulación ya no se puede confirmar. Suba el archivo nuevamente.", "warning")
+
+    return redirect(url_for("yard.import_session_view", session_id=session_id))
+
+
+@yard_bp.post("/imports/<int:session_id>/cancel")
+@login_required
+def import_session_cancel(session_id: int):
+    session = _get_import_session_or_404(session_id)
+
+    if cancel_import_session(session):
+        flash("Carga descartada. No se guardó ningún cambio.", "info")
+    else:
+        flash("La carga ya no se puede descartar.", "warning")
+
+    return redirect(url_for("yard.import_session_view", session_id=session_id))
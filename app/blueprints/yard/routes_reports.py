@@ -1,8 +1,7 @@
-import io
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 import pytz
-from flask import render_template, request, redirect, url_for, flash, send_file
+from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from sqlalchemy import text
 
@@ -10,8 +9,12 @@ from app.blueprints.yard import yard_bp
 from app.extensions import db
 from app.models.container import Container
 from app.models.movement import Movement
+from app.models.movement_fact import MovementDailyFact, MovementFact
 from app.models.site import Site
 from app.services.audit import audit_log
+from app.services.query_stream import fetch_page, parse_page, stream_rows
+from app.services.export_jobs import ExportFile, export_response, register_export
+from app.services.xlsx_export import XLSX_MIMETYPE, XlsxStreamWriter
 
 from .routes import _ensure_active_site, REPORT_TYPES
 
@@ -34,6 +37,22 @@ def _cr_range_to_utc_naive(date_from: str, date_to: str):
     return d1_utc.replace(tzinfo=None), d2_utc.replace(tzinfo=None)
 
 
+def _cr_day_start_utc_naive(day: str, days: int = 0):
+    """
+    Inicio (00:00 CR) del día YYYY-MM-DD + days, en UTC naive.
+    Permite filtrar por rango en vez de columna::date.
+    """
+    local_naive = datetime.fromisoformat(day + "T00:00:00") + timedelta(days=days)
+    return CR_TZ.localize(local_naive).astimezone(UTC_TZ).replace(tzinfo=None)
+
+
+def _parse_iso_day(raw: str):
+    try:
+        return date.fromisoformat(raw) if raw else None
+    except ValueError:
+        return None
+
+
 def _parse_report_filters(args):
     movement_type = (args.get("movement_type") or "").strip().upper()
     if movement_type and movement_type not in REPORT_TYPES:
@@ -56,18 +75,31 @@ def _parse_report_filters(args):
     return movement_type, d1, d2, None
 
 
-def _query_report_rows(site_id, movement_type, d1, d2):
-    q = (
-        db.session.query(Movement, Container)
+def _report_rows_stmt(site_id, movement_type, d1, d2):
+    """
+    Movimientos del reporte como columnas sueltas (sin objetos ORM).
+    """
+    stmt = (
+        db.select(
+            Movement.id,
+            Movement.occurred_at,
+            Movement.movement_type,
+            Container.code.label("container_code"),
+            Movement.bay_code,
+            Movement.depth_row,
+            Movement.tier,
+            Movement.driver_name,
+            Movement.truck_plate,
+        )
         .join(Container, Container.id == Movement.container_id)
-        .filter(Movement.site_id == site_id)
-        .filter(Movement.occurred_at >= d1, Movement.occurred_at <= d2)
+        .where(Movement.site_id == site_id)
+        .where(Movement.occurred_at >= d1, Movement.occurred_at <= d2)
     )
 
     if movement_type:
-        q = q.filter(Movement.movement_type == movement_type)
+        stmt = stmt.where(Movement.movement_type == movement_type)
 
-    return q.order_by(Movement.occurred_at.asc()).all()
+    return stmt.order_by(Movement.occurred_at.asc(), Movement.id.asc())
 
 
 @yard_bp.get("/reports")
@@ -86,7 +118,10 @@ def reports_run():
         flash(err, "danger")
         return redirect(url_for("yard.reports_view"))
 
-    rows = _query_report_rows(site_id, movement_type, d1, d2)
+    pagination = fetch_page(
+        _report_rows_stmt(site_id, movement_type, d1, d2),
+        page=parse_page(request.args.get("page")),
+    )
 
     audit_log(
         current_user.id,
@@ -104,93 +139,82 @@ def reports_run():
 
     return render_template(
         "yard/reports.html",
-        rows=rows,
+        rows=pagination.items,
+        pagination=pagination,
         date_from=request.args.get("date_from"),
         date_to=request.args.get("date_to"),
         movement_type=movement_type,
     )
 
 
-@yard_bp.get("/reports/export")
-@login_required
-def reports_export():
-    site_id = _ensure_active_site()
-
-    movement_type, d1, d2, err = _parse_report_filters(request.args)
+@register_export("MOVEMENT_REPORT", label="Reporte de movimientos (Excel)", audit_action="REPORT_EXPORTED")
+def build_movement_report_export(site_id, params) -> ExportFile:
+    movement_type, d1, d2, err = _parse_report_filters(params)
     if err:
-        flash(err, "danger")
-        return redirect(url_for("yard.reports_view"))
+        raise ValueError(err)
 
-    rows = _query_report_rows(site_id, movement_type, d1, d2)
+    headers = ["Fecha/Hora", "Movimiento", "Contenedor", "Ubicación", "Chofer", "Placa"]
+    writer = XlsxStreamWriter("Reportes", headers, max_width=40)
 
     try:
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
+        # Las filas se leen por bloques y se escriben directo al archivo.
+        for r in stream_rows(_report_rows_stmt(site_id, movement_type, d1, d2)):
+            loc = "—"
+            if r.bay_code:
+                parts = [r.bay_code]
+                if r.depth_row:
+                    parts.append(f"F{int(r.depth_row):02d}")
+                if r.tier:
+                    parts.append(f"N{int(r.tier)}")
+                loc = " ".join(parts)
+
+            writer.append([
+                r.occurred_at.strftime("%Y-%m-%d %H:%M:%S") if r.occurred_at else "",
+                r.movement_type or "",
+                r.container_code or "",
+                loc,
+                r.driver_name or "",
+                r.truck_plate or "",
+            ])
+
+        path = writer.close()
     except Exception:
-        flash("No se puede exportar: falta openpyxl en requirements.txt", "danger")
-        return redirect(url_for("yard.reports_run", **request.args))
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reportes"
+        writer.discard()
+        raise
 
-    headers = ["Fecha/Hora", "Movimiento", "Contenedor", "Ubicación", "Chofer", "Placa"]
-    ws.append(headers)
-
-    for mv, c in rows:
-        loc = "—"
-        if mv.bay_code:
-            parts = [mv.bay_code]
-            if mv.depth_row:
-                parts.append(f"F{int(mv.depth_row):02d}")
-            if mv.tier:
-                parts.append(f"N{int(mv.tier)}")
-            loc = " ".join(parts)
-
-        ws.append([
-            mv.occurred_at.strftime("%Y-%m-%d %H:%M:%S") if mv.occurred_at else "",
-            mv.movement_type or "",
-            c.code if c else "",
-            loc,
-            mv.driver_name or "",
-            mv.truck_plate or "",
-        ])
-
-    for col_idx in range(1, len(headers) + 1):
-        max_len = 0
-        for cell in ws[get_column_letter(col_idx)]:
-            v = "" if cell.value is None else str(cell.value)
-            if len(v) > max_len:
-                max_len = len(v)
-        ws.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 2, 40)
-
-    buff = io.BytesIO()
-    wb.save(buff)
-    buff.seek(0)
+    mt = movement_type or "ALL"
 
-    audit_log(
-        current_user.id,
-        "REPORT_EXPORTED",
-        "report",
-        None,
-        {
-            "from": request.args.get("date_from"),
-            "to": request.args.get("date_to"),
-            "movement_type": movement_type or "ALL",
-            "rows": len(rows),
-            "site_id": site_id,
+    return ExportFile(
+        filename=f"reportes_{mt}_{params.get('date_from')}_a_{params.get('date_to')}.xlsx",
+        mimetype=XLSX_MIMETYPE,
+        path=path,
+        rows=writer.row_count,
+        audit_meta={
+            "from": params.get("date_from"),
+            "to": params.get("date_to"),
+            "movement_type": mt,
         },
     )
-    db.session.commit()
 
-    mt = movement_type or "ALL"
-    fname = f"reportes_{mt}_{request.args.get('date_from')}_a_{request.args.get('date_to')}.xlsx"
 
-    return send_file(
-        buff,
-        as_attachment=True,
-        download_name=fname,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+@yard_bp.get("/reports/export")
+@login_required
+def reports_export():
+    site_id = _ensure_active_site()
+
+    movement_type, d1, d2, err = _parse_report_filters(request.args)
+    if err:
+        flash(err, "danger")
+        return redirect(url_for("yard.reports_view"))
+
+    return export_response(
+        "MOVEMENT_REPORT",
+        site_id=site_id,
+        params={
+            "movement_type": movement_type,
+            "date_from": request.args.get("date_from"),
+            "date_to": request.args.get("date_to"),
+        },
     )
 
 
@@ -207,9 +231,72 @@ def reports_dashboard():
     return render_template(
         "yard/reports_dashboard.html",
         active_site=active_site,
+        summary=_movement_summary(site_id),
     )
 
 
+def _movement_summary(site_id: int, days: int = 30) -> dict:
+    """
+    Resumen de Gate In / Gate Out de los últimos días desde
+    movement_daily_facts (pocas filas por día, sin tocar movements).
+    """
+    today = datetime.now(CR_TZ).date()
+    week_start = today - timedelta(days=6)
+    period_start = today - timedelta(days=days - 1)
+
+    F = MovementDailyFact
+    base = (F.site_id == site_id, F.day >= period_start, F.day <= today)
+
+    def _sum_if(cond):
+        return db.func.coalesce(
+            db.func.sum(db.case((cond, F.movement_count), else_=0)),
+            0,
+        )
+
+    totals = {
+        mt: {"today": 0, "week": 0, "period": 0}
+        for mt in ("GATE_IN", "GATE_OUT")
+    }
+
+    for r in db.session.execute(
+        db.select(
+            F.movement_type,
+            _sum_if(F.day == today).label("today"),
+            _sum_if(F.day >= week_start).label("week"),
+            db.func.sum(F.movement_count).label("period"),
+        )
+        .where(*base)
+        .group_by(F.movement_type)
+    ):
+        totals[r.movement_type] = {
+            "today": int(r.today or 0),
+            "week": int(r.week or 0),
+            "period": int(r.period or 0),
+        }
+
+    def _top(column, *extra, limit: int = 8):
+        total = db.func.sum(F.movement_count).label("total")
+        rows = db.session.execute(
+            db.select(column.label("name"), total)
+            .where(*base, *extra)
+            .group_by(column)
+            .order_by(total.desc(), column)
+            .limit(limit)
+        ).all()
+        return [{"name": r.name or "N/D", "total": int(r.total or 0)} for r in rows]
+
+    return {
+        "days": days,
+        "period_start": period_start,
+        "today": today,
+        "totals": totals,
+        "by_size": _top(F.size),
+        "by_shipping_line": _top(F.shipping_line),
+        "by_origin": _top(F.origin_name, F.movement_type == "GATE_IN"),
+        "by_destination": _top(F.destination_name, F.movement_type == "GATE_OUT"),
+    }
+
+
 @yard_bp.get("/reportes/chasis-fuera")
 @login_required
 def report_chassis_outside():
@@ -259,18 +346,9 @@ def report_chassis_outside():
             CURRENT_DATE - COALESCE(e.inventory_out_at::date, e.finalized_at::date, e.trip_date) AS days_out,
             c.status
         FROM yard_gate_alamo.chassis c
-        LEFT JOIN LATERAL (
-            SELECT *
-            FROM yard_gate_alamo.eirs e
-            WHERE e.chassis_id = c.id
-              AND e.status = 'CONFIRMED'
-            ORDER BY
-                e.inventory_out_at DESC NULLS LAST,
-                e.finalized_at DESC NULLS LAST,
-                e.trip_date DESC,
-                e.id DESC
-            LIMIT 1
-        ) e ON TRUE
+        -- Último EIR confirmado, enlazado al escribir (movement_links)
+        LEFT JOIN yard_gate_alamo.eirs e
+            ON e.id = c.last_confirmed_eir_id
         LEFT JOIN yard_gate_alamo.sites s
             ON s.id = e.site_id
         WHERE c.is_in_yard = false
@@ -345,123 +423,63 @@ def report_container_movements():
     if movement_type not in valid_types:
         movement_type = ""
 
-    filters = ["mv.site_id = :site_id", "mv.movement_type IN ('GATE_IN', 'GATE_OUT')"]
-    params = {"site_id": site_id}
+    # Lee de movement_facts: chasis / origen / destino ya resueltos y
+    # day (fecha CR) indexado, sin LATERAL por fila.
+    stmt = db.select(
+        MovementFact.movement_id,
+        MovementFact.occurred_at,
+        MovementFact.movement_type,
+        MovementFact.container_id,
+        MovementFact.container_code,
+        MovementFact.chassis_number,
+        MovementFact.origin_name,
+        MovementFact.destination_name,
+    ).where(MovementFact.site_id == site_id)
 
-    if date_from:
-        filters.append("mv.occurred_at::date >= :date_from")
-        params["date_from"] = date_from
+    day_from = _parse_iso_day(date_from)
+    day_to = _parse_iso_day(date_to)
 
-    if date_to:
-        filters.append("mv.occurred_at::date <= :date_to")
-        params["date_to"] = date_to
+    if day_from:
+        stmt = stmt.where(MovementFact.day >= day_from)
 
-    if movement_type:
-        filters.append("mv.movement_type = :movement_type")
-        params["movement_type"] = movement_type
+    if day_to:
+        stmt = stmt.where(MovementFact.day <= day_to)
 
-    where_sql = " AND ".join(filters)
+    if movement_type:
+        stmt = stmt.where(MovementFact.movement_type == movement_type)
 
-    sql = text(f"""
-        SELECT
-            mv.id AS movement_id,
-            mv.occurred_at,
-            mv.movement_type,
-            c.id AS container_id,
-            c.code AS container_code,
-
-            -- Chasis para GATE_IN
-            ch_in.chassis_number AS chassis_gate_in,
-
-            -- Chasis para GATE_OUT
-            ch_out.chassis_number AS chassis_gate_out,
-
-            -- Origen para GATE_IN = destino del último EIR confirmado anterior
-            prev_eir.destination AS origin_name,
-
-            -- Destino para GATE_OUT
-            eir_out.destination AS destination_name
-
-        FROM yard_gate_alamo.movements mv
-        JOIN yard_gate_alamo.containers c
-          ON c.id = mv.container_id
-
-        -- Chasis del GATE_IN (vía tire_readings)
-        LEFT JOIN LATERAL (
-            SELECT tr.chassis_id
-            FROM yard_gate_alamo.tire_readings tr
-            WHERE tr.event_type = 'GATE_IN'
-              AND tr.event_id = mv.id
-              AND tr.chassis_id IS NOT NULL
-            ORDER BY tr.recorded_at DESC NULLS LAST, tr.id DESC
-            LIMIT 1
-        ) tr_in ON TRUE
-        LEFT JOIN yard_gate_alamo.chassis ch_in
-          ON ch_in.id = tr_in.chassis_id
-
-        -- EIR del GATE_OUT actual
-        LEFT JOIN yard_gate_alamo.eirs eir_out
-          ON eir_out.gate_out_movement_id = mv.id
-         AND eir_out.status = 'CONFIRMED'
-
-        LEFT JOIN yard_gate_alamo.chassis ch_out
-          ON ch_out.id = eir_out.chassis_id
-
-        -- EIR anterior del mismo contenedor para resolver ORIGEN del GATE_IN
-        LEFT JOIN LATERAL (
-            SELECT e_prev.destination
-            FROM yard_gate_alamo.eirs e_prev
-            WHERE e_prev.container_id = mv.container_id
-              AND e_prev.status = 'CONFIRMED'
-              AND COALESCE(e_prev.inventory_out_at, e_prev.finalized_at, e_prev.created_at) < mv.occurred_at
-            ORDER BY
-              COALESCE(e_prev.inventory_out_at, e_prev.finalized_at, e_prev.created_at) DESC,
-              e_prev.id DESC
-            LIMIT 1
-        ) prev_eir ON TRUE
-
-        WHERE {where_sql}
-        ORDER BY mv.occurred_at DESC, mv.id DESC
-    """)
+    total = db.session.execute(
+        stmt.with_only_columns(db.func.count()).order_by(None)
+    ).scalar() or 0
 
-    rows = db.session.execute(sql, params).mappings().all()
+    pagination = fetch_page(
+        stmt.order_by(MovementFact.occurred_at.desc(), MovementFact.movement_id.desc()),
+        page=parse_page(request.args.get("page")),
+        total=int(total),
+    )
 
     items = []
-    for r in rows:
-        movement_type_row = (r["movement_type"] or "").upper()
-
-        chassis_number = ""
-        origin_name = ""
-        destination_name = ""
-
-        if movement_type_row == "GATE_IN":
-            chassis_number = r["chassis_gate_in"] or ""
-            origin_name = r["origin_name"] or ""
-            destination_name = ""
-        elif movement_type_row == "GATE_OUT":
-            chassis_number = r["chassis_gate_out"] or ""
-            origin_name = ""
-            destination_name = r["destination_name"] or ""
-
-        occurred_at = r["occurred_at"]
+    for f in pagination.items:
+        occurred_at = f.occurred_at
         occurred_at_str = occurred_at.strftime("%d/%m/%Y %I:%M %p") if occurred_at else ""
 
         items.append({
-            "movement_id": r["movement_id"],
-            "container_id": r["container_id"],
-            "container_code": r["container_code"] or "",
+            "movement_id": f.movement_id,
+            "container_id": f.container_id,
+            "container_code": f.container_code or "",
             "occurred_at": occurred_at,
             "occurred_at_str": occurred_at_str,
-            "movement_type": movement_type_row,
-            "chassis_number": chassis_number,
-            "origin_name": origin_name,
-            "destination_name": destination_name,
+            "movement_type": f.movement_type,
+            "chassis_number": f.chassis_number or "",
+            "origin_name": f.origin_name or "",
+            "destination_name": f.destination_name or "",
         })
 
     return render_template(
         "yard/report_container_movements.html",
         items=items,
-        total=len(items),
+        total=pagination.total,
+        pagination=pagination,
         date_from=date_from,
         date_to=date_to,
         movement_type=movement_type,
@@ -475,6 +493,9 @@ def report_chassis_movements():
 
     date_from = (request.args.get("date_from") or "").strip()
     date_to = (request.args.get("date_to") or "").strip()
+
+    date_from = date_from if _parse_iso_day(date_from) else ""
+    date_to = date_to if _parse_iso_day(date_to) else ""
     movement_type = (request.args.get("movement_type") or "").strip().upper()
 
     valid_types = {"", "GATE_IN", "GATE_OUT"}
@@ -485,13 +506,16 @@ def report_chassis_movements():
     filters_out = ["e.site_id = :site_id", "e.status = 'CONFIRMED'", "e.chassis_id IS NOT NULL"]
     params = {"site_id": site_id}
 
+    # inspected_at por rango (usa índice); el día se interpreta en CR.
     if date_from:
-        filters_in.append("ci.inspected_at::date >= :date_from")
+        filters_in.append("ci.inspected_at >= :inspected_from")
+        params["inspected_from"] = _cr_day_start_utc_naive(date_from)
         filters_out.append("COALESCE(e.inventory_out_at::date, e.finalized_at::date, e.trip_date, e.created_at::date) >= :date_from")
         params["date_from"] = date_from
 
     if date_to:
-        filters_in.append("ci.inspected_at::date <= :date_to")
+        filters_in.append("ci.inspected_at < :inspected_to")
+        params["inspected_to"] = _cr_day_start_utc_naive(date_to, days=1)
         filters_out.append("COALESCE(e.inventory_out_at::date, e.finalized_at::date, e.trip_date, e.created_at::date) <= :date_to")
         params["date_to"] = date_to
 
@@ -1,7 +1,6 @@
 from datetime import datetime
-from io import BytesIO
 
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session
 from flask_login import login_required, current_user
 from sqlalchemy import text
 
@@ -11,6 +10,9 @@ from app.models.chassis import Chassis
 from app.models.chassis_tire import ChassisTire
 from app.models.tire import Tire
 from app.models.tire_retread_event import TireRetreadEvent
+from app.services.bulk_import import execute, stage_rows
+from app.services.search import normalize_search_key, search_field_prefix_pattern, search_like_pattern
+from app.services.xlsx_export import EXPORT_BATCH_SIZE, XlsxStreamWriter, xlsx_response
 
 from .routes import (
     _ensure_active_site,
@@ -36,16 +38,26 @@ def tires_list():
     filters = []
     params = {}
 
-    if q:
-        filters.append("""
+    # Claves normalizadas con índice trigram (app/services/search.py)
+    search_term = normalize_search_key(q)
+    if search_term:
+        params["q"] = search_like_pattern(search_term)
+
+        # Término corto: también al inicio de marca / marchamo.
+        field_pattern = search_field_prefix_pattern(search_term)
+        field_filter = ""
+
+        if field_pattern:
+            params["q_field"] = field_pattern
+            field_filter = "OR t.search_key LIKE :q_field ESCAPE '\\'"
+
+        filters.append(f"""
             (
-                t.tire_number ILIKE :q
-                OR COALESCE(t.brand, '') ILIKE :q
-                OR COALESCE(t.last_marchamo, '') ILIKE :q
-                OR COALESCE(ch.chassis_number, '') ILIKE :q
+                t.search_key LIKE :q ESCAPE '\\'
+                OR ch.number_key LIKE :q ESCAPE '\\'
+                {field_filter}
             )
         """)
-        params["q"] = f"%{q}%"
 
     if color == "VERDE":
         filters.append("""
@@ -527,22 +539,6 @@ def tires_import_view():
 def tires_export():
     _ensure_active_site()
 
-    try:
-        from openpyxl import Workbook
-    except Exception:
-        flash("Falta openpyxl en requirements.txt", "danger")
-        return redirect(url_for("yard.tires_list"))
-
-    rows = (
-        Tire.query
-        .order_by(Tire.tire_number.asc())
-        .all()
-    )
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Llantas"
-
     headers = [
         "id (no borrar si vas a actualizar)",
         "tire_number (número de llanta)",
@@ -552,39 +548,89 @@ def tires_export():
         "status (ASIGNADA/EN_TALLER_BODEGA/RECAUCHE/DESECHADA)",
         "notes (notas) [opcional]",
     ]
-    ws.append(headers)
-    ws.freeze_panes = "A2"
-
-    for t in rows:
-        ws.append([
-            t.id,
-            t.tire_number or "",
-            t.brand or "",
-            t.model or "",
-            t.size or "",
-            t.status or "EN_TALLER_BODEGA",
-            t.notes or "",
-        ])
-
-    ws.column_dimensions["A"].width = 24
-    ws.column_dimensions["B"].width = 28
-    ws.column_dimensions["C"].width = 22
-    ws.column_dimensions["D"].width = 22
-    ws.column_dimensions["E"].width = 18
-    ws.column_dimensions["F"].width = 28
-    ws.column_dimensions["G"].width = 40
-
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-
-    return send_file(
-        bio,
-        as_attachment=True,
-        download_name="llantas_import_template.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+
+    writer = XlsxStreamWriter(
+        "Llantas",
+        headers,
+        freeze_header=True,
+        widths={"A": 24, "B": 28, "C": 22, "D": 22, "E": 18, "F": 28, "G": 40},
     )
 
+    try:
+        for t in Tire.query.order_by(Tire.tire_number.asc()).yield_per(EXPORT_BATCH_SIZE):
+            writer.append([
+                t.id,
+                t.tire_number or "",
+                t.brand or "",
+                t.model or "",
+                t.size or "",
+                t.status or "EN_TALLER_BODEGA",
+                t.notes or "",
+            ])
+    except Exception:
+        writer.discard()
+        raise
+
+    return xlsx_response(writer, "llantas_import_template.xlsx")
+
+
+_TIRES_IMPORT_COLUMNS = [
+    ("tire_id", "integer"),
+    ("tire_number", "text NOT NULL"),
+    ("brand", "text"),
+    ("model", "text"),
+    ("size", "text"),
+    ("status", "text NOT NULL"),
+    ("notes", "text"),
+]
+
+# La llanta se busca primero por id y luego por número. Si dos filas
+# apuntan a la misma llanta gana la última.
+_TIRES_IMPORT_TARGET_CTE = """
+    WITH resolved AS (
+        SELECT
+            s.*,
+            COALESCE(by_id.id, by_number.id) AS target_id
+        FROM stg_tires_import s
+        LEFT JOIN yard_gate_alamo.tires by_id
+          ON by_id.id = s.tire_id
+        LEFT JOIN yard_gate_alamo.tires by_number
+          ON by_number.tire_number = s.tire_number
+    )
+"""
+
+_TIRES_IMPORT_UPDATE_SQL = _TIRES_IMPORT_TARGET_CTE + """
+    , latest AS (
+        SELECT DISTINCT ON (r.target_id) r.*
+        FROM resolved r
+        WHERE r.target_id IS NOT NULL
+        ORDER BY r.target_id, r.row_no DESC
+    )
+    UPDATE yard_gate_alamo.tires t
+    SET tire_number = l.tire_number,
+        brand = l.brand,
+        model = l.model,
+        size = l.size,
+        status = l.status,
+        notes = l.notes
+    FROM latest l
+    WHERE t.id = l.target_id
+"""
+
+# Después del UPDATE: las filas que no encontraron llanta, ni por id
+# ni por número, son llantas nuevas.
+_TIRES_IMPORT_INSERT_SQL = _TIRES_IMPORT_TARGET_CTE + """
+    INSERT INTO yard_gate_alamo.tires (
+        tire_number, brand, model, size, status, notes,
+        last_is_flat, created_at
+    )
+    SELECT
+        r.tire_number, r.brand, r.model, r.size, r.status, r.notes,
+        FALSE, :now
+    FROM resolved r
+    WHERE r.target_id IS NULL
+"""
+
 
 @yard_bp.post("/llantas/import")
 @login_required
@@ -602,16 +648,13 @@ def tires_import_post():
         flash("Falta openpyxl en requirements.txt", "danger")
         return redirect(url_for("yard.tires_import_view"))
 
-    wb = load_workbook(f, data_only=True)
+    wb = load_workbook(f, read_only=True, data_only=True)
     ws = wb.active
 
-    imported = 0
-    updated = 0
     errors = []
 
     staged = []
-    ids_to_find = []
-    tire_numbers_to_find = []
+    used_numbers_in_file = set()
 
     for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
         tire_id_raw = row[0] if len(row) > 0 else None
@@ -637,9 +680,15 @@ def tires_import_post():
                 errors.append(f"Fila {idx}: id inválido ({tire_id_raw}).")
                 continue
 
+        if tire_number in used_numbers_in_file:
+            errors.append(f"Fila {idx}: tire_number repetido en el mismo archivo ({tire_number}).")
+            continue
+
+        used_numbers_in_file.add(tire_number)
+
         staged.append({
-            "idx": idx,
-            "id": tire_id,
+            "row_no": idx,
+            "tire_id": tire_id,
             "tire_number": tire_number,
             "brand": brand or None,
             "model": model or None,
@@ -648,64 +697,19 @@ def tires_import_post():
             "notes": notes or None,
         })
 
-        if tire_id:
-            ids_to_find.append(tire_id)
-        tire_numbers_to_find.append(tire_number)
+    wb.close()
 
     if not staged:
         flash(f"No se importó nada. Errores: {len(errors)}", "danger")
         session["tires_import_errors"] = errors[:200]
         return redirect(url_for("yard.tires_import_view"))
 
-    existing_by_id = {}
-    if ids_to_find:
-        rows_by_id = Tire.query.filter(Tire.id.in_(ids_to_find)).all()
-        existing_by_id = {t.id: t for t in rows_by_id}
-
-    existing_by_number = {}
-    if tire_numbers_to_find:
-        rows_by_number = Tire.query.filter(Tire.tire_number.in_(tire_numbers_to_find)).all()
-        existing_by_number = {t.tire_number: t for t in rows_by_number}
-
-    used_numbers_in_file = set()
-
-    for item in staged:
-        tire_id = item["id"]
-        tire_number = item["tire_number"]
-
-        if tire_number in used_numbers_in_file:
-            errors.append(f"Fila {item['idx']}: tire_number repetido en el mismo archivo ({tire_number}).")
-            continue
+    # Staging + SQL por conjuntos (app/services/bulk_import.py).
+    stage_rows("stg_tires_import", _TIRES_IMPORT_COLUMNS, staged)
 
-        used_numbers_in_file.add(tire_number)
-
-        tire = None
-
-        if tire_id and tire_id in existing_by_id:
-            tire = existing_by_id[tire_id]
-        elif tire_number in existing_by_number:
-            tire = existing_by_number[tire_number]
-
-        if tire:
-            tire.tire_number = tire_number
-            tire.brand = item["brand"]
-            tire.model = item["model"]
-            tire.size = item["size"]
-            tire.status = item["status"]
-            tire.notes = item["notes"]
-            db.session.add(tire)
-            updated += 1
-        else:
-            tire = Tire(
-                tire_number=tire_number,
-                brand=item["brand"],
-                model=item["model"],
-                size=item["size"],
-                status=item["status"],
-                notes=item["notes"],
-            )
-            db.session.add(tire)
-            imported += 1
+    params = {"now": datetime.utcnow()}
+    updated = execute(_TIRES_IMPORT_UPDATE_SQL).rowcount
+    imported = execute(_TIRES_IMPORT_INSERT_SQL, params).rowcount
 
     db.session.commit()
 
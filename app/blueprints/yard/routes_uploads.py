@@ -0,0 +1,195 @@
+from datetime import datetime
+
+from flask import current_app, request, jsonify, url_for
+from flask_login import login_required, current_user
+
+from app.blueprints.yard import yard_bp
+from app.extensions import db
+from app.models.container import Container
+from app.models.movement import Movement, MovementPhoto
+from app.services.audit import audit_log
+from app.services.photo_uploads import PHOTO_STATUS_UPLOADED, enqueue_photo_variants
+from app.services.storage import get_storage, build_photo_key, photo_key_prefix
+
+from .routes import _ensure_active_site
+
+# =========================================================
+# Subida directa de fotos a R2 (URL prefirmada)
+# =========================================================
+#
+# 1. POST /api/movements/<id>/photos/presign  -> URL PUT + key
+# 2. El navegador hace PUT del archivo directo a R2.
+# 3. POST /api/movements/<id>/photos/confirm  -> valida el objeto
+#    en R2 y registra el MovementPhoto.
+#
+# Las fotos ya no pasan por Gunicorn.
+#
+# La deduplicación por contenido la hace el servidor: el trabajo de
+# variantes descarga el objeto, calcula su SHA-256 y, si ya existe en
+# stored_objects, apunta la foto al objeto existente y borra la copia.
+# Nunca se confía en un hash enviado por el navegador.
+#
+
+DIRECT_PHOTO_TYPES = {"CONTAINER", "DAMAGE", "DRIVER_ID", "OTHER"}
+
+
+def wants_direct_photo_upload() -> bool:
+    """
+    True cuando el formulario fue enviado por direct_upload.js y la
+    subida directa está habilitada (PHOTO_DIRECT_UPLOAD).
+    """
+    return (
+        bool(current_app.config.get("PHOTO_DIRECT_UPLOAD"))
+        and request.headers.get("X-Direct-Upload") == "1"
+    )
+
+
+def direct_upload_response(movement: Movement | None, redirect_url: str, photo_type: str):
+    """
+    Respuesta JSON de Gate In / Gate Out para que el navegador suba
+    las fotos del movimiento recién creado y luego redirija.
+    """
+    can_upload = bool(movement and movement.container_id)
+
+    return jsonify({
+        "ok": True,
+        "movement_id": movement.id if movement else None,
+        "photo_type": photo_type,
+        "presign_url": (
+            url_for("yard.api_movement_photo_presign", movement_id=movement.id)
+            if can_upload else None
+        ),
+        "confirm_url": (
+            url_for("yard.api_movement_photo_confirm", movement_id=movement.id)
+            if can_upload else None
+        ),
+        "redirect_url": redirect_url,
+    })
+
+
+def _movement_for_upload(movement_id: int):
+    site_id = _ensure_active_site()
+
+    mv = db.session.get(Movement, movement_id)
+    if not mv or mv.site_id != site_id or not mv.container_id:
+        return None, None
+
+    c = db.session.get(Container, mv.container_id)
+    if not c:
+        return None, None
+
+    return mv, c
+
+
+def _clean_photo_type(raw) -> str | None:
+    photo_type = (raw or "CONTAINER").strip().upper()
+    return photo_type if photo_type in DIRECT_PHOTO_TYPES else None
+
+
+@yard_bp.post("/api/movements/<int:movement_id>/photos/presign")
+@login_required
+def api_movement_photo_presign(movement_id: int):
+    mv, c = _movement_for_upload(movement_id)
+    if not mv:
+        return jsonify({"ok": False, "error": "MOVEMENT_NOT_FOUND"}), 404
+
+    data = request.get_json(silent=True) or {}
+
+    filename = (data.get("filename") or "").strip() or "foto.jpg"
+    content_type = (data.get("content_type") or "").strip().lower() or "image/jpeg"
+
+    if not content_type.startswith("image/"):
+        return jsonify({"ok": False, "error": "INVALID_CONTENT_TYPE"}), 400
+
+    if not _clean_photo_type(data.get("photo_type")):
+        return jsonify({"ok": False, "error": "INVALID_PHOTO_TYPE"}), 400
+
+    try:
+        size = int(data.get("size") or 0)
+    except (TypeError, ValueError):
+        size = 0
+
+    max_bytes = int(current_app.config.get("DIRECT_UPLOAD_MAX_BYTES") or 0)
+    if max_bytes and size > max_bytes:
+        return jsonify({"ok": False, "error": "FILE_TOO_LARGE"}), 400
+
+    key = build_photo_key(c.code, mv.id, filename)
+
+    upload = get_storage().presign_upload(
+        key,
+        content_type=content_type,
+        expires_in=int(current_app.config.get("DIRECT_UPLOAD_EXPIRES_SECONDS") or 900),
+    )
+
+    return jsonify({"ok": True, **upload})
+
+
+@yard_bp.post("/api/movements/<int:movement_id>/photos/confirm")
+@login_required
+def api_movement_photo_confirm(movement_id: int):
+    mv, c = _movement_for_upload(movement_id)
+    if not mv:
+        return jsonify({"ok": False, "error": "MOVEMENT_NOT_FOUND"}), 404
+
+    data = request.get_json(silent=True) or {}
+
+    key = (data.get("key") or "").strip()
+    photo_type = _clean_photo_type(data.get("photo_type"))
+
+    if not photo_type:
+        return jsonify({"ok": False, "error": "INVALID_PHOTO_TYPE"}), 400
+
+    # Solo se aceptan keys emitidas para este movimiento.
+    if not key.startswith(photo_key_prefix(c.code, mv.id)) or ".." in key:
+        return jsonify({"ok": False, "error": "INVALID_KEY"}), 400
+
+    existing = MovementPhoto.query.filter_by(movement_id=mv.id, storage_key=key).first()
+    if existing:
+        return jsonify({"ok": True, "photo_id": existing.id, "url": existing.url})
+
+    storage = get_storage()
+    head = storage.head_object(key)
+
+    if head is None:
+        return jsonify({"ok": False, "error": "OBJECT_NOT_FOUND"}), 400
+
+    size = int(head.get("ContentLength") or 0)
+    content_type = (head.get("ContentType") or "").lower()
+    max_bytes = int(current_app.config.get("DIRECT_UPLOAD_MAX_BYTES") or 0)
+
+    if (max_bytes and size > max_bytes) or not content_type.startswith("image/"):
+        storage.delete_object(key)
+        return jsonify({"ok": False, "error": "OBJECT_REJECTED"}), 400
+
+    photo = MovementPhoto(
+        movement_id=mv.id,
+        photo_type=photo_type,
+        url=storage.public_url(key),
+        status=PHOTO_STATUS_UPLOADED,
+        storage_key=key,
+        content_type=content_type,
+        uploaded_at=datetime.utcnow(),
+    )
+    db.session.add(photo)
+    db.session.flush()
+
+    audit_log(
+        current_user.id,
+        "MOVEMENT_PHOTO_UPLOADED",
+        "movement",
+        mv.id,
+        {
+            "photo_id": photo.id,
+            "photo_type": photo_type,
+            "key": key,
+            "size_bytes": size,
+            "direct_upload": True,
+        },
+    )
+
+    db.session.commit()
+
+    # Miniatura y versión web se generan fuera de la petición.
+    enqueue_photo_variants([photo.id])
+
+    return jsonify({"ok": True, "photo_id": photo.id, "url": photo.url})
@@ -43,6 +43,254 @@ class Config:
     R2_PUBLIC_BASE_URL = os.getenv("R2_PUBLIC_BASE_URL")  # opcional
     PRINT_AGENT_KEY = os.getenv("PRINT_AGENT_KEY", "")
 
+    # ==========================================================
+    # Subida directa a R2 (URL prefirmada)
+    # ==========================================================
+
+    # true: el navegador sube las fotos directo a R2 y luego
+    # confirma la subida. Requiere CORS del bucket con PUT
+    # permitido para el dominio de la aplicación.
+    # false: las fotos viajan en el formulario (spool + pool).
+    PHOTO_DIRECT_UPLOAD = (
+        os.getenv("PHOTO_DIRECT_UPLOAD", "false")
+        .strip()
+        .lower()
+        in {"1", "true", "yes", "on"}
+    )
+
+    DIRECT_UPLOAD_EXPIRES_SECONDS = int(
+        os.getenv("DIRECT_UPLOAD_EXPIRES_SECONDS", "900")
+    )
+
+    # Tamaño máximo aceptado al confirmar una subida directa.
+    DIRECT_UPLOAD_MAX_BYTES = int(
+        os.getenv("DIRECT_UPLOAD_MAX_BYTES", str(25 * 1024 * 1024))
+    )
+
+    # ==========================================================
+    # Subida de fotos en segundo plano
+    # ==========================================================
+
+    # Carpeta local donde se guardan las fotos recibidas hasta
+    # que el pool de subida las envía a R2.
+    PHOTO_SPOOL_DIR = os.getenv("PHOTO_SPOOL_DIR", "")
+
+    # Threads por proceso Gunicorn dedicados a subir fotos.
+    PHOTO_UPLOAD_WORKERS = int(
+        os.getenv("PHOTO_UPLOAD_WORKERS", "2")
+    )
+
+    # Máximo de fotos en cola por proceso. El exceso queda
+    # PENDING y lo recoge el barrido de reintentos.
+    PHOTO_UPLOAD_QUEUE_LIMIT = int(
+        os.getenv("PHOTO_UPLOAD_QUEUE_LIMIT", "64")
+    )
+
+    # Intentos inmediatos dentro de una misma tarea.
+    PHOTO_UPLOAD_ATTEMPTS = int(
+        os.getenv("PHOTO_UPLOAD_ATTEMPTS", "3")
+    )
+
+    # Intentos acumulados antes de dejar la foto en RETRY sin
+    # volver a encolarla automáticamente.
+    PHOTO_UPLOAD_MAX_ATTEMPTS = int(
+        os.getenv("PHOTO_UPLOAD_MAX_ATTEMPTS", "12")
+    )
+
+    PHOTO_UPLOAD_RETRY_SWEEP_SECONDS = int(
+        os.getenv("PHOTO_UPLOAD_RETRY_SWEEP_SECONDS", "120")
+    )
+
+    # Una foto PENDING/UPLOADING sin avance durante este tiempo
+    # se considera abandonada (worker reciclado) y se reintenta.
+    PHOTO_UPLOAD_STALE_MINUTES = int(
+        os.getenv("PHOTO_UPLOAD_STALE_MINUTES", "10")
+    )
+
+    # ==========================================================
+    # Exportaciones en segundo plano
+    # ==========================================================
+
+    # true: las exportaciones grandes (inventario, reportes, PDFs)
+    # se encolan y las genera export_worker.py; el usuario descarga
+    # el archivo cuando está listo.
+    # false: se generan dentro de la petición (sin worker).
+    EXPORT_ASYNC = (
+        os.getenv("EXPORT_ASYNC", "false")
+        .strip()
+        .lower()
+        in {"1", "true", "yes", "on"}
+    )
+
+    # Carpeta para los archivos cuando no hay R2 configurado.
+    EXPORT_LOCAL_DIR = os.getenv("EXPORT_LOCAL_DIR", "")
+
+    # Horas que el archivo queda disponible para descargar.
+    EXPORT_FILE_TTL_HOURS = int(
+        os.getenv("EXPORT_FILE_TTL_HOURS", "24")
+    )
+
+    EXPORT_WORKER_POLL_SECONDS = int(
+        os.getenv("EXPORT_WORKER_POLL_SECONDS", "3")
+    )
+
+    # Un trabajo RUNNING sin latido del worker en este tiempo se
+    # considera abandonado (worker reiniciado) y vuelve a la cola.
+    EXPORT_JOB_STALE_MINUTES = int(
+        os.getenv("EXPORT_JOB_STALE_MINUTES", "15")
+    )
+
+    # Cada cuánto el worker marca heartbeat_at mientras genera.
+    EXPORT_JOB_HEARTBEAT_SECONDS = int(
+        os.getenv("EXPORT_JOB_HEARTBEAT_SECONDS", "30")
+    )
+
+    EXPORT_JOB_MAX_ATTEMPTS = int(
+        os.getenv("EXPORT_JOB_MAX_ATTEMPTS", "2")
+    )
+
+    # ==========================================================
+    # Cargas masivas con simulación (app/services/import_sessions.py)
+    # ==========================================================
+
+    # Carpeta para el Excel subido y las filas normalizadas cuando no
+    # hay R2 configurado.
+    IMPORT_LOCAL_DIR = os.getenv("IMPORT_LOCAL_DIR", "")
+
+    # Threads por proceso web cuando no hay worker (EXPORT_ASYNC=false).
+    IMPORT_LOCAL_WORKERS = int(
+        os.getenv("IMPORT_LOCAL_WORKERS", "1")
+    )
+
+    # Horas que una simulación lista puede confirmarse.
+    IMPORT_SESSION_TTL_HOURS = int(
+        os.getenv("IMPORT_SESSION_TTL_HOURS", "24")
+    )
+
+    # Una sesión PENDING/RUNNING sin avance en este tiempo se da por
+    # interrumpida.
+    IMPORT_SESSION_STALE_MINUTES = int(
+        os.getenv("IMPORT_SESSION_STALE_MINUTES", "30")
+    )
+
+    # Filas y errores que se guardan en la simulación.
+    IMPORT_PREVIEW_ROWS = int(
+        os.getenv("IMPORT_PREVIEW_ROWS", "500")
+    )
+
+    # ==========================================================
+    # Lectura de Excel en cargas masivas (app/services/excel_ingest.py)
+    # ==========================================================
+
+    # Procesos para normalizar filas de archivos grandes; 0 o 1 = en el
+    # mismo proceso. Los hijos vuelven a importar el script principal:
+    # scripts propios deben crear la app bajo if __name__ == "__main__".
+    EXCEL_PARSE_PROCESSES = int(
+        os.getenv("EXCEL_PARSE_PROCESSES", str(min(os.cpu_count() or 1, 4)))
+    )
+
+    # Filas (según la dimensión de la hoja) desde las que se usa el pool.
+    EXCEL_PARSE_PARALLEL_MIN_ROWS = int(
+        os.getenv("EXCEL_PARSE_PARALLEL_MIN_ROWS", "5000")
+    )
+
+    EXCEL_PARSE_CHUNK_ROWS = int(
+        os.getenv("EXCEL_PARSE_CHUNK_ROWS", "2000")
+    )
+
+    # ==========================================================
+    # Caché de PDFs por contenido (prelista, evacuación, EIR)
+    # ==========================================================
+
+    # Carpeta local de la caché (por defecto en /tmp).
+    PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "")
+
+    # Tamaño máximo en disco; se eliminan los menos usados.
+    PDF_CACHE_MAX_MB = int(
+        os.getenv("PDF_CACHE_MAX_MB", "200")
+    )
+
+    # ==========================================================
+    # Scheduler de mantenimiento (app/services/scheduler.py)
+    # ==========================================================
+
+    # false: ningún proceso ejecuta los trabajos periódicos.
+    SCHEDULER_ENABLED = (
+        os.getenv("SCHEDULER_ENABLED", "true")
+        .strip()
+        .lower()
+        in {"1", "true", "yes", "on"}
+    )
+
+    # Cada cuánto cada proceso revisa el liderazgo y los trabajos
+    # vencidos.
+    SCHEDULER_TICK_SECONDS = int(
+        os.getenv("SCHEDULER_TICK_SECONDS", "30")
+    )
+
+    # Días de historial en scheduler_runs.
+    SCHEDULER_HISTORY_DAYS = int(
+        os.getenv("SCHEDULER_HISTORY_DAYS", "14")
+    )
+
+    # Notificaciones que se conservan por usuario / predio.
+    NOTIFICATIONS_KEEP = int(
+        os.getenv("NOTIFICATIONS_KEEP", "20")
+    )
+
+    # ==========================================================
+    # Hechos de movimientos (movement_facts)
+    # ==========================================================
+
+    # Cada cuánto el scheduler completa hechos faltantes y vuelve a
+    # resolver los movimientos recientes.
+    MOVEMENT_FACTS_SWEEP_SECONDS = int(
+        os.getenv("MOVEMENT_FACTS_SWEEP_SECONDS", "300")
+    )
+
+    # Ventana en la que un EIR confirmado tarde todavía actualiza el
+    # destino / chasis del movimiento.
+    MOVEMENT_FACTS_LOOKBACK_HOURS = int(
+        os.getenv("MOVEMENT_FACTS_LOOKBACK_HOURS", "48")
+    )
+
+    # ==========================================================
+    # Índice de cumplimiento de transporte (transport_compliance)
+    # ==========================================================
+
+    # Ventana de "por vencer" en el panel y en los filtros.
+    TRANSPORT_EXPIRING_DAYS = int(
+        os.getenv("TRANSPORT_EXPIRING_DAYS", "15")
+    )
+
+    # Cada cuánto se recalcula el índice completo.
+    TRANSPORT_COMPLIANCE_REBUILD_SECONDS = int(
+        os.getenv("TRANSPORT_COMPLIANCE_REBUILD_SECONDS", "86400")
+    )
+
+    # Fichas 360° de choferes/cabezales en caché por proceso
+    # (app/services/transport_detail.py). 0 = sin caché.
+    TRANSPORT_DETAIL_CACHE_SIZE = int(
+        os.getenv("TRANSPORT_DETAIL_CACHE_SIZE", "500")
+    )
+
+    # Cada cuánto se comparan los contadores del resumen de
+    # Transportes contra COUNT(*) (transport_counters).
+    TRANSPORT_COUNTERS_RECONCILE_SECONDS = int(
+        os.getenv("TRANSPORT_COUNTERS_RECONCILE_SECONDS", "3600")
+    )
+
+    # Meses que los incidentes cerrados se quedan en transport_incidents
+    # antes de pasar al archivo particionado por mes
+    # (app/services/transport_incident_archive.py).
+    TRANSPORT_INCIDENT_ARCHIVE_MONTHS = int(
+        os.getenv("TRANSPORT_INCIDENT_ARCHIVE_MONTHS", "12")
+    )
+
+    TRANSPORT_INCIDENT_ARCHIVE_SECONDS = int(
+        os.getenv("TRANSPORT_INCIDENT_ARCHIVE_SECONDS", "86400")
+    )
+
     # Registra en logs las rutas que superen este tiempo.
     SLOW_REQUEST_MS = int(
         os.getenv("SLOW_REQUEST_MS", "1000")
@@ -75,4 +323,9 @@ class Config:
 
     PRINT_JOB_STALE_SWEEP_SECONDS = int(
         os.getenv("PRINT_JOB_STALE_SWEEP_SECONDS", "60")
+    )
+
+    # Días que se conservan los trabajos DONE / FAILED.
+    PRINT_JOB_RETENTION_DAYS = int(
+        os.getenv("PRINT_JOB_RETENTION_DAYS", "30")
     )
\ No newline at end of file
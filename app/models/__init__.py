@@ -3,8 +3,14 @@
 from .user import User
 from .yard import YardBlock, YardBay
 from .container import Container, ContainerPosition
+from .container_state import ContainerCurrentState
 from .movement import Movement, MovementPhoto
+from .movement_fact import MovementFact, MovementDailyFact
+from .stored_object import StoredObject
 from .audit import AuditLog
+from .export_job import ExportJob
+from .import_session import ImportSession
+from .scheduler_run import SchedulerRun
 from .ticket import TicketPrint
 from .tire import Tire, TireReading, TirePosition
 from .container_classification import ContainerClassification
@@ -32,6 +38,10 @@ from .transport import (
     TransportDocumentChange,
     TransportAttachment,
 )
+from .transport_compliance import TransportCompliance
+from .transport_counter import TransportCounter
+from .transport_detail import TransportDetailVersion
+from .transport_incident_archive import TransportIncidentArchive, TransportIncidentFollowUpArchive
 
 from .tica import (
     TicaTransporter,
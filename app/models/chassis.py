@@ -1,6 +1,7 @@
 # app/models/chassis.py
 from datetime import datetime
 from app.extensions import db
+from app.services.search import search_key_sql
 
 SCHEMA = "yard_gate_alamo"
 
@@ -11,6 +12,30 @@ class Chassis(db.Model):
         db.UniqueConstraint("site_id", "chassis_number", name="uq_chassis_site_number"),
         db.Index("idx_chassis_site_number", "site_id", "chassis_number"),
         db.Index("idx_chassis_site_inyard", "site_id", "site_id", "is_in_yard"),
+        # Búsqueda (app/services/search.py): trigram para "contiene",
+        # text_pattern_ops para prefijos de 1-2 caracteres.
+        db.Index(
+            "ix_chassis_number_key_trgm",
+            "number_key",
+            postgresql_using="gin",
+            postgresql_ops={"number_key": "gin_trgm_ops"},
+        ),
+        db.Index(
+            "ix_chassis_plate_key_trgm",
+            "plate_key",
+            postgresql_using="gin",
+            postgresql_ops={"plate_key": "gin_trgm_ops"},
+        ),
+        db.Index(
+            "ix_chassis_number_key_prefix",
+            "number_key",
+            postgresql_ops={"number_key": "text_pattern_ops"},
+        ),
+        db.Index(
+            "ix_chassis_plate_key_prefix",
+            "plate_key",
+            postgresql_ops={"plate_key": "text_pattern_ops"},
+        ),
         {"schema": SCHEMA},
     )
 
@@ -31,6 +56,10 @@ class Chassis(db.Model):
     # Placa (si aplica)
     plate = db.Column(db.String(20), nullable=True)
 
+    # Claves de búsqueda normalizadas (las calcula PostgreSQL)
+    number_key = db.Column(db.Text, db.Computed(search_key_sql("chassis_number"), persisted=True))
+    plate_key = db.Column(db.Text, db.Computed(search_key_sql("plate"), persisted=True))
+
     # ✅ NUEVAS columnas (soportan import masivo y dashboard)
     length_ft = db.Column(db.Integer, nullable=True)  # 20 / 40 / 45
     axles = db.Column(db.Integer, nullable=True)      # 2 / 3
@@ -42,6 +71,13 @@ class Chassis(db.Model):
     status = db.Column(db.String(30), nullable=False, default="BUENO")
     chassis_kind = db.Column(db.String(30), nullable=False, default="CHASIS")
 
+    # Último EIR confirmado (app/services/movement_links.py)
+    last_confirmed_eir_id = db.Column(
+        db.Integer,
+        db.ForeignKey(f"{SCHEMA}.eirs.id", use_alter=True, name="fk_chassis_last_confirmed_eir"),
+        nullable=True,
+    )
+
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
 
@@ -1,6 +1,7 @@
 # app/models/container.py
 from datetime import datetime
 from app.extensions import db
+from app.services.search import search_key_sql
 
 SCHEMA = "yard_gate_alamo"
 
@@ -11,6 +12,13 @@ class Container(db.Model):
         db.UniqueConstraint("site_id", "code", name="uq_containers_site_code"),
         db.Index("ix_containers_site_code", "site_id", "code"),
         db.Index("ix_containers_site_in_yard", "site_id", "is_in_yard"),
+        db.Index("ix_containers_site_updated", "site_id", "updated_at", "id"),
+        db.Index(
+            "ix_containers_code_key_trgm",
+            "code_key",
+            postgresql_using="gin",
+            postgresql_ops={"code_key": "gin_trgm_ops"},
+        ),
         {"schema": SCHEMA},
     )
 
@@ -24,6 +32,10 @@ class Container(db.Model):
     )
 
     code = db.Column(db.String(13), nullable=False)
+
+    # Clave de búsqueda normalizada (app/services/search.py)
+    code_key = db.Column(db.Text, db.Computed(search_key_sql("code"), persisted=True))
+
     size = db.Column(db.String(10), nullable=False)
     year = db.Column(db.Integer, nullable=True)
     status_notes = db.Column(db.Text, nullable=True)
@@ -0,0 +1,52 @@
+# app/models/container_state.py
+from datetime import datetime
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class ContainerCurrentState(db.Model):
+    """
+    Estado actual de un contenedor: datos de su última clasificación y
+    su último Gate In.
+
+    Evita calcular la "última clasificación" (row_number / DISTINCT ON)
+    sobre todo el historial en cada carga del inventario. Se actualiza
+    en la misma transacción que el Gate In, la clasificación o la carga
+    masiva (ver app/services/container_state.py).
+
+    Los días en patio se derivan de last_gate_in_at al leer.
+    """
+
+    __tablename__ = "container_current_state"
+    __table_args__ = (
+        db.Index("ix_container_state_site_line", "site_id", "shipping_line"),
+        db.Index("ix_container_state_site_class", "site_id", "final_classification"),
+        db.Index("ix_container_state_site_gate_in", "site_id", "last_gate_in_at"),
+        {"schema": SCHEMA},
+    )
+
+    container_id = db.Column(
+        db.Integer,
+        db.ForeignKey(f"{SCHEMA}.containers.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    site_id = db.Column(db.Integer, db.ForeignKey(f"{SCHEMA}.sites.id"), nullable=False)
+
+    # Última clasificación (en mayúsculas, '' si no hay)
+    classification_id = db.Column(db.Integer, nullable=True)
+    classified_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    shipping_line = db.Column(db.String(80), nullable=False, default="", server_default="")
+    final_classification = db.Column(db.String(20), nullable=False, default="", server_default="")
+    max_gross_kg = db.Column(db.Integer, nullable=True)
+    manufacture_year = db.Column(db.SmallInteger, nullable=True)
+    summary_text = db.Column(db.Text, nullable=True)
+
+    # Último GATE_IN
+    last_gate_in_movement_id = db.Column(db.Integer, nullable=True)
+    last_gate_in_at = db.Column(db.DateTime, nullable=True)
+
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    container = db.relationship("Container", lazy=True)
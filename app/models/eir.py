@@ -289,9 +289,11 @@ class EIR(db.Model):
         lazy=True
     )
 
-    chassis = db.relationship("Chassis", lazy=True)
+    # foreign_keys explícito: chassis / movements también apuntan a eirs
+    # (last_confirmed_eir_id / previous_eir_id).
+    chassis = db.relationship("Chassis", foreign_keys=[chassis_id], lazy=True)
     container = db.relationship("Container", lazy=True)
-    gate_out_movement = db.relationship("Movement", lazy=True)
+    gate_out_movement = db.relationship("Movement", foreign_keys=[gate_out_movement_id], lazy=True)
 
     damages = db.relationship(
         "EIRContainerDamage",
@@ -0,0 +1,65 @@
+# app/models/export_job.py
+from datetime import datetime
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class ExportJob(db.Model):
+    """
+    Exportación generada fuera de la petición HTTP.
+
+    La petición crea el trabajo (PENDING); export_worker.py lo reclama,
+    genera el archivo y lo guarda en R2 o en disco local (DONE). El
+    usuario consulta el estado y descarga el archivo cuando está listo.
+    """
+
+    __tablename__ = "export_jobs"
+    __table_args__ = (
+        db.Index("ix_export_jobs_status_created", "status", "created_at"),
+        db.Index("ix_export_jobs_user_created", "requested_by_user_id", "created_at"),
+        {"schema": SCHEMA},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # INVENTORY_XLSX | EVACUATION_PDF | PRELIST_PDF | TRANSPORT_TEMPLATE | MOVEMENT_REPORT
+    kind = db.Column(db.String(40), nullable=False)
+
+    # PENDING | RUNNING | DONE | FAILED
+    status = db.Column(db.String(16), nullable=False, default="PENDING", server_default="PENDING")
+
+    site_id = db.Column(db.Integer, db.ForeignKey(f"{SCHEMA}.sites.id"), nullable=True)
+
+    requested_by_user_id = db.Column(
+        db.Integer,
+        db.ForeignKey(f"{SCHEMA}.users.id"),
+        nullable=True,
+    )
+
+    # Filtros de la pantalla que originó la exportación.
+    params = db.Column(db.JSON, nullable=True)
+
+    claimed_by = db.Column(db.String(120), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    # Lo actualiza el worker mientras genera (ver export_jobs.ExportHeartbeat).
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_error = db.Column(db.Text, nullable=True)
+
+    # Resultado
+    file_name = db.Column(db.String(255), nullable=True)
+    mimetype = db.Column(db.String(120), nullable=True)
+    inline = db.Column(db.Boolean, nullable=False, default=False, server_default="false")
+
+    storage_key = db.Column(db.Text, nullable=True)
+    local_path = db.Column(db.Text, nullable=True)
+
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    row_count = db.Column(db.Integer, nullable=True)
+
+    expires_at = db.Column(db.DateTime, nullable=True)
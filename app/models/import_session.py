@@ -0,0 +1,81 @@
+# app/models/import_session.py
+from datetime import datetime
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class ImportSession(db.Model):
+    """
+    Carga masiva en dos pasos (app/services/import_sessions.py).
+
+    1. PREVIEW: el worker lee el Excel una sola vez, guarda las filas
+       normalizadas y calcula una simulación (qué se crea, actualiza u
+       omite y los errores por fila) sin guardar nada.
+    2. COMMIT: cuando el usuario confirma, el worker aplica las filas
+       guardadas; el Excel no se vuelve a leer.
+
+    El avance (progress_*) se actualiza durante ambos pasos y la
+    pantalla lo recibe por SSE.
+    """
+
+    __tablename__ = "import_sessions"
+    __table_args__ = (
+        db.Index("ix_import_sessions_status_created", "status", "created_at"),
+        db.Index("ix_import_sessions_user_created", "requested_by_user_id", "created_at"),
+        {"schema": SCHEMA},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # TRANSPORT_DRIVERS | INVENTORY
+    kind = db.Column(db.String(40), nullable=False)
+
+    # PREVIEW | COMMIT
+    stage = db.Column(db.String(16), nullable=False, default="PREVIEW", server_default="PREVIEW")
+
+    # PENDING | RUNNING | READY | DONE | FAILED | CANCELLED | EXPIRED
+    status = db.Column(db.String(16), nullable=False, default="PENDING", server_default="PENDING")
+
+    site_id = db.Column(db.Integer, db.ForeignKey(f"{SCHEMA}.sites.id"), nullable=True)
+
+    requested_by_user_id = db.Column(
+        db.Integer,
+        db.ForeignKey(f"{SCHEMA}.users.id"),
+        nullable=True,
+    )
+
+    # Opciones del formulario (p. ej. habitual_site_id).
+    params = db.Column(db.JSON, nullable=True)
+
+    original_file_name = db.Column(db.String(255), nullable=True)
+
+    # Excel subido y filas normalizadas: key de R2 o ruta local
+    # según storage (R2 | LOCAL).
+    storage = db.Column(db.String(10), nullable=False, default="LOCAL", server_default="LOCAL")
+    source_ref = db.Column(db.Text, nullable=True)
+    parsed_ref = db.Column(db.Text, nullable=True)
+
+    row_count = db.Column(db.Integer, nullable=True)
+
+    # Avance del paso en curso
+    progress_phase = db.Column(db.String(40), nullable=True)
+    progress_done = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    progress_total = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # Simulación (PREVIEW) y resultado final (COMMIT)
+    preview = db.Column(db.JSON, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+
+    claimed_by = db.Column(db.String(120), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_error = db.Column(db.Text, nullable=True)
+
+    # La simulación deja de ser confirmable después de esta fecha.
+    expires_at = db.Column(db.DateTime, nullable=True)
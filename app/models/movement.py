@@ -47,6 +47,22 @@ class Movement(db.Model):
 
     notes = db.Column(db.Text, nullable=True)
 
+    # Relaciones resueltas al escribir (app/services/movement_links.py)
+    # GATE_IN: chasis de la lectura de llantas / GATE_OUT: chasis del EIR
+    chassis_id = db.Column(
+        db.Integer,
+        db.ForeignKey(f"{SCHEMA}.chassis.id"),
+        nullable=True,
+        index=True,
+    )
+
+    # GATE_IN: último EIR confirmado del contenedor antes del ingreso
+    previous_eir_id = db.Column(
+        db.Integer,
+        db.ForeignKey(f"{SCHEMA}.eirs.id", use_alter=True, name="fk_movements_previous_eir"),
+        nullable=True,
+    )
+
     created_by_user_id = db.Column(
         db.Integer,
         db.ForeignKey(f"{SCHEMA}.users.id"),
@@ -81,6 +97,7 @@ class MovementPhoto(db.Model):
     __tablename__ = "movement_photos"
     __table_args__ = (
         db.Index("ix_movement_photos_movement", "movement_id"),
+        db.Index("ix_movement_photos_status", "status"),
         {"schema": SCHEMA},
     )
 
@@ -94,7 +111,25 @@ class MovementPhoto(db.Model):
     )
 
     photo_type = db.Column(db.String(30), nullable=False)  # CONTAINER, DAMAGE, DRIVER_ID, OTHER
-    url = db.Column(db.Text, nullable=False)  # URL pública (R2) o path local
+    url = db.Column(db.Text, nullable=True)  # URL pública (R2); vacío mientras la subida está pendiente
+    web_url = db.Column(db.Text, nullable=True)  # versión reducida (ver app/services/images.py)
+    thumb_url = db.Column(db.Text, nullable=True)  # miniatura para grillas
     uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    # Subida en segundo plano (ver app/services/photo_uploads.py)
+    # PENDING | UPLOADING | UPLOADED | RETRY | FAILED (sin archivo temporal, no se reintenta)
+    status = db.Column(
+        db.String(20),
+        nullable=False,
+        default="UPLOADED",
+        server_default="UPLOADED",
+    )
+    storage_key = db.Column(db.Text, nullable=True)
+    content_sha256 = db.Column(db.String(64), nullable=True, index=True)  # ver StoredObject
+    content_type = db.Column(db.String(120), nullable=True)
+    spool_path = db.Column(db.Text, nullable=True)  # archivo temporal local hasta completar la subida
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
     movement = db.relationship("Movement", back_populates="photos", lazy=True)
\ No newline at end of file
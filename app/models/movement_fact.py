@@ -0,0 +1,89 @@
+# app/models/movement_fact.py
+from datetime import datetime
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class MovementFact(db.Model):
+    """
+    Un registro por movimiento GATE_IN / GATE_OUT con los datos que los
+    reportes antes resolvían fila por fila (LATERAL sobre tire_readings
+    y eirs): chasis, origen, destino, tamaño y naviera.
+
+    day es la fecha de Costa Rica del movimiento, para filtrar por día
+    con índice en vez de occurred_at::date.
+
+    Se mantiene desde app/services/movement_facts.py.
+    """
+
+    __tablename__ = "movement_facts"
+    __table_args__ = (
+        db.Index("ix_movement_facts_site_day", "site_id", "day"),
+        db.Index("ix_movement_facts_site_occurred", "site_id", "occurred_at"),
+        {"schema": SCHEMA},
+    )
+
+    movement_id = db.Column(
+        db.Integer,
+        db.ForeignKey(f"{SCHEMA}.movements.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    site_id = db.Column(db.Integer, db.ForeignKey(f"{SCHEMA}.sites.id"), nullable=False)
+
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    movement_type = db.Column(db.String(20), nullable=False)  # GATE_IN | GATE_OUT
+
+    container_id = db.Column(db.Integer, nullable=True)
+    container_code = db.Column(db.String(13), nullable=True)
+
+    # Dimensiones ('' cuando no aplica, para agrupar sin NULL)
+    size = db.Column(db.String(10), nullable=False, default="", server_default="")
+    shipping_line = db.Column(db.String(80), nullable=False, default="", server_default="")
+    origin_name = db.Column(db.String(150), nullable=False, default="", server_default="")
+    destination_name = db.Column(db.String(150), nullable=False, default="", server_default="")
+
+    chassis_number = db.Column(db.String(50), nullable=True)
+
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class MovementDailyFact(db.Model):
+    """
+    Conteo diario de movimientos por predio / día / tipo / tamaño /
+    naviera / origen / destino. Se recalcula por (predio, día) a partir
+    de movement_facts cada vez que cambia alguno de sus movimientos.
+    """
+
+    __tablename__ = "movement_daily_facts"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "site_id",
+            "day",
+            "movement_type",
+            "size",
+            "shipping_line",
+            "origin_name",
+            "destination_name",
+            name="uq_movement_daily_facts_dims",
+        ),
+        {"schema": SCHEMA},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    site_id = db.Column(db.Integer, db.ForeignKey(f"{SCHEMA}.sites.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    movement_type = db.Column(db.String(20), nullable=False)
+    size = db.Column(db.String(10), nullable=False, default="", server_default="")
+    shipping_line = db.Column(db.String(80), nullable=False, default="", server_default="")
+    origin_name = db.Column(db.String(150), nullable=False, default="", server_default="")
+    destination_name = db.Column(db.String(150), nullable=False, default="", server_default="")
+
+    movement_count = db.Column(db.Integer, nullable=False, default=0)
+
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
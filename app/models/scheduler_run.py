@@ -0,0 +1,40 @@
+# app/models/scheduler_run.py
+from datetime import datetime
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class SchedulerRun(db.Model):
+    """
+    Historial de ejecuciones de los trabajos periódicos
+    (app/services/scheduler.py).
+
+    La última ejecución de cada trabajo se toma de aquí, así el
+    calendario no se reinicia cuando otro proceso toma el liderazgo.
+    """
+
+    __tablename__ = "scheduler_runs"
+    __table_args__ = (
+        db.Index("ix_scheduler_runs_job_started", "job_name", "started_at"),
+        db.Index("ix_scheduler_runs_started", "started_at"),
+        {"schema": SCHEMA},
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+
+    job_name = db.Column(db.String(80), nullable=False)
+
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+
+    # OK | FAILED
+    status = db.Column(db.String(16), nullable=False)
+
+    # Lo que devolvió el trabajo (conteos)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    # host:pid del proceso que lo ejecutó
+    worker = db.Column(db.String(120), nullable=True)
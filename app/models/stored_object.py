@@ -0,0 +1,35 @@
+# app/models/stored_object.py
+from datetime import datetime
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class StoredObject(db.Model):
+    """
+    Índice de contenido de los archivos subidos a R2.
+
+    Una misma foto (mismo SHA-256) se sube una sola vez; las filas de
+    MovementPhoto / TransportAttachment posteriores apuntan a este objeto.
+    """
+
+    __tablename__ = "stored_objects"
+    __table_args__ = (
+        db.UniqueConstraint("content_sha256", name="uq_stored_objects_content_sha256"),
+        {"schema": SCHEMA},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    content_sha256 = db.Column(db.String(64), nullable=False)
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    content_type = db.Column(db.String(120), nullable=True)
+
+    storage_key = db.Column(db.Text, nullable=False)
+    url = db.Column(db.Text, nullable=False)
+
+    # Versiones derivadas (solo fotos)
+    web_url = db.Column(db.Text, nullable=True)
+    thumb_url = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
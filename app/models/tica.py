@@ -367,6 +367,11 @@ class TicaGeneratedFile(db.Model):
             "ix_tica_generated_files_created_at",
             "created_at",
         ),
+        db.Index(
+            "ix_tica_generated_files_created_id",
+            "created_at",
+            "id",
+        ),
         db.Index(
             "ix_tica_generated_files_trip",
             "trip_number",
@@ -1,12 +1,21 @@
 from datetime import datetime
 from app.extensions import db
+from app.services.search import search_keys_sql
 
 SCHEMA = "yard_gate_alamo"
 
 
 class Tire(db.Model):
     __tablename__ = "tires"
-    __table_args__ = {"schema": SCHEMA}
+    __table_args__ = (
+        db.Index(
+            "ix_tires_search_key_trgm",
+            "search_key",
+            postgresql_using="gin",
+            postgresql_ops={"search_key": "gin_trgm_ops"},
+        ),
+        {"schema": SCHEMA},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     tire_number = db.Column(db.String(30), nullable=False, unique=True)
@@ -22,6 +31,12 @@ class Tire(db.Model):
     last_is_flat = db.Column(db.Boolean, nullable=False, default=False)
     last_tire_state = db.Column(db.String(20), nullable=True)
 
+    # Número, marca y último marchamo normalizados (app/services/search.py)
+    search_key = db.Column(
+        db.Text,
+        db.Computed(search_keys_sql("tire_number", "brand", "last_marchamo"), persisted=True),
+    )
+
     def __repr__(self) -> str:
         return f"<Tire {self.tire_number}>"
     
@@ -37,7 +52,10 @@ class TirePosition(db.Model):
 
 class TireReading(db.Model):
     __tablename__ = "tire_readings"
-    __table_args__ = {"schema": SCHEMA}
+    __table_args__ = (
+        db.Index("ix_tire_readings_event", "event_type", "event_id"),
+        {"schema": SCHEMA},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     site_id = db.Column(db.Integer, nullable=False)
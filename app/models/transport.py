@@ -5,6 +5,7 @@ from sqlalchemy import CheckConstraint, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 
 from app.extensions import db
+from app.services.search import search_key_sql, search_keys_sql
 
 SCHEMA = "yard_gate_alamo"
 
@@ -20,12 +21,24 @@ class TruckOwner(db.Model):
             "phone",
             name="uq_truck_owners_name_phone",
         ),
+        Index(
+            "ix_truck_owners_name_key_trgm",
+            "name_key",
+            postgresql_using="gin",
+            postgresql_ops={"name_key": "gin_trgm_ops"},
+        ),
         {"schema": SCHEMA},
     )
 
     id = db.Column(db.Integer, primary_key=True)
 
     name = db.Column(db.String(160), nullable=False)
+
+    # Clave de búsqueda normalizada (app/services/search.py)
+    name_key = db.Column(
+        db.Text,
+        db.Computed(search_key_sql("name"), persisted=True),
+    )
     phone = db.Column(db.String(40), nullable=True)
     email = db.Column(db.String(160), nullable=True)
     notes = db.Column(db.Text, nullable=True)
@@ -77,10 +90,36 @@ class Driver(db.Model):
             "ix_drivers_name",
             "name",
         ),
+        Index(
+            "ix_drivers_name_id",
+            "name",
+            "id",
+        ),
         Index(
             "ix_drivers_habitual_site_id",
             "habitual_site_id",
         ),
+        Index(
+            "ix_drivers_search_key_trgm",
+            "search_key",
+            postgresql_using="gin",
+            postgresql_ops={"search_key": "gin_trgm_ops"},
+        ),
+        # Prefijos de 1-2 caracteres (app/services/search.py)
+        Index(
+            "ix_drivers_search_key_prefix",
+            "search_key",
+            postgresql_ops={"search_key": "text_pattern_ops"},
+        ),
+        # Selector de asignación: activos sin cabezal, por nombre.
+        Index(
+            "ix_drivers_available_name",
+            "name",
+            "id",
+            postgresql_where=db.text(
+                "status = 'ACTIVE' AND current_truck_id IS NULL"
+            ),
+        ),
         {"schema": SCHEMA},
     )
 
@@ -94,6 +133,16 @@ class Driver(db.Model):
     phone_1 = db.Column(db.String(40), nullable=True)
     phone_2 = db.Column(db.String(40), nullable=True)
 
+    # Nombre, cédula, residencia y teléfonos normalizados
+    # (app/services/search.py)
+    search_key = db.Column(
+        db.Text,
+        db.Computed(
+            search_keys_sql("name", "identification", "residence", "phone_1", "phone_2"),
+            persisted=True,
+        ),
+    )
+
     habitual_site_id = db.Column(
         db.Integer,
         db.ForeignKey(f"{SCHEMA}.sites.id"),
@@ -107,6 +156,18 @@ class Driver(db.Model):
         server_default="ACTIVE",
     )
 
+    # Cabezal de la asignación ACTIVE (NULL = disponible). Lo
+    # mantienen assign_driver_to_truck() / end_assignment().
+    current_truck_id = db.Column(
+        db.Integer,
+        db.ForeignKey(
+            f"{SCHEMA}.trucks.id",
+            use_alter=True,
+            name="fk_drivers_current_truck_id",
+        ),
+        nullable=True,
+    )
+
     notes = db.Column(db.Text, nullable=True)
 
     created_by_user_id = db.Column(
@@ -437,6 +498,27 @@ class Truck(db.Model):
             "ix_trucks_owner_id",
             "owner_id",
         ),
+        Index(
+            "ix_trucks_plate_key_trgm",
+            "plate_key",
+            postgresql_using="gin",
+            postgresql_ops={"plate_key": "gin_trgm_ops"},
+        ),
+        # Prefijos de 1-2 caracteres (app/services/search.py)
+        Index(
+            "ix_trucks_plate_key_prefix",
+            "plate_key",
+            postgresql_ops={"plate_key": "text_pattern_ops"},
+        ),
+        # Selector de asignación: activos sin chofer, por placa.
+        Index(
+            "ix_trucks_available_plate",
+            "plate",
+            "id",
+            postgresql_where=db.text(
+                "status = 'ACTIVE' AND current_driver_id IS NULL"
+            ),
+        ),
         {"schema": SCHEMA},
     )
 
@@ -452,6 +534,12 @@ class Truck(db.Model):
 
     plate = db.Column(db.String(40), nullable=False)
 
+    # Clave de búsqueda normalizada (app/services/search.py)
+    plate_key = db.Column(
+        db.Text,
+        db.Computed(search_key_sql("plate"), persisted=True),
+    )
+
     owner_id = db.Column(
         db.Integer,
         db.ForeignKey(f"{SCHEMA}.truck_owners.id"),
@@ -465,6 +553,18 @@ class Truck(db.Model):
         server_default="ACTIVE",
     )
 
+    # Chofer de la asignación ACTIVE (NULL = disponible). Lo
+    # mantienen assign_driver_to_truck() / end_assignment().
+    current_driver_id = db.Column(
+        db.Integer,
+        db.ForeignKey(
+            f"{SCHEMA}.drivers.id",
+            use_alter=True,
+            name="fk_trucks_current_driver_id",
+        ),
+        nullable=True,
+    )
+
     dock_permit_number = db.Column(db.String(100), nullable=True)
     dock_permit_expiry_date = db.Column(db.Date, nullable=True)
 
@@ -712,6 +812,20 @@ class DriverTruckAssignment(db.Model):
             "ix_driver_truck_assignments_started_at",
             "started_at",
         ),
+        # Una sola asignación ACTIVE por chofer y por cabezal: dos
+        # asignaciones simultáneas no pueden quedar ambas guardadas.
+        Index(
+            "uq_driver_truck_assignments_active_driver",
+            "driver_id",
+            unique=True,
+            postgresql_where=db.text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "uq_driver_truck_assignments_active_truck",
+            "truck_id",
+            unique=True,
+            postgresql_where=db.text("status = 'ACTIVE'"),
+        ),
         {"schema": SCHEMA},
     )
 
@@ -919,17 +1033,31 @@ class TransportIncident(db.Model):
             """,
             name="ck_transport_incidents_status",
         ),
+        # Por chofer/cabezal en orden de fecha (ficha y línea de
+        # tiempo); también sirven para buscar solo por driver_id /
+        # truck_id.
         Index(
-            "ix_transport_incidents_driver_id",
+            "ix_transport_incidents_driver_occurred",
             "driver_id",
+            "occurred_at",
         ),
         Index(
-            "ix_transport_incidents_truck_id",
+            "ix_transport_incidents_truck_occurred",
             "truck_id",
+            "occurred_at",
+        ),
+        # Listado (keyset por occurred_at, id), filtro por estado y
+        # selección de cerrados antiguos para el archivo.
+        Index(
+            "ix_transport_incidents_occurred",
+            "occurred_at",
+            "id",
         ),
         Index(
-            "ix_transport_incidents_status",
+            "ix_transport_incidents_status_occurred",
             "status",
+            "occurred_at",
+            "id",
         ),
         Index(
             "ix_transport_incidents_next_follow_up_at",
@@ -1042,8 +1170,9 @@ class TransportIncidentFollowUp(db.Model):
     __tablename__ = "transport_incident_follow_ups"
     __table_args__ = (
         Index(
-            "ix_transport_incident_follow_ups_incident_id",
+            "ix_transport_incident_follow_ups_incident_contacted",
             "incident_id",
+            "contacted_at",
         ),
         Index(
             "ix_transport_incident_follow_ups_contacted_at",
@@ -1120,10 +1249,14 @@ class TransportDocumentChange(db.Model):
             "entity_type IN ('DRIVER', 'TRUCK', 'APM')",
             name="ck_transport_document_changes_entity_type",
         ),
+        # Historial de un chofer/cabezal, del más reciente al más
+        # antiguo (keyset sobre changed_at, id).
         Index(
-            "ix_transport_document_changes_entity",
+            "ix_transport_document_changes_entity_changed",
             "entity_type",
             "entity_id",
+            "changed_at",
+            "id",
         ),
         Index(
             "ix_transport_document_changes_changed_at",
@@ -1262,6 +1395,9 @@ class TransportAttachment(db.Model):
     mime_type = db.Column(db.String(120), nullable=True)
     size_bytes = db.Column(db.BigInteger, nullable=True)
 
+    # SHA-256 del contenido (índice en stored_objects)
+    content_sha256 = db.Column(db.String(64), nullable=True)
+
     description = db.Column(db.String(240), nullable=True)
 
     uploaded_by_user_id = db.Column(
@@ -0,0 +1,65 @@
+# app/models/transport_compliance.py
+from datetime import datetime
+
+from sqlalchemy import CheckConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class TransportCompliance(db.Model):
+    """
+    Índice de cumplimiento documental por chofer y por cabezal.
+
+    Resume los documentos del chofer (driver_documents + APM) o del
+    cabezal (vencimientos de trucks + truck_documents) para responder
+    "quién vence en los próximos N días" o "quién tiene documentos
+    vencidos" sin recorrer las tablas de documentos.
+
+    Se recalcula en la misma transacción que el documento (ver
+    app/services/transport_compliance.py y write_hooks.py), cada hora
+    para lo que venció desde el último cálculo y completo cada noche.
+    """
+
+    __tablename__ = "transport_compliance"
+    __table_args__ = (
+        CheckConstraint(
+            "entity_type IN ('DRIVER', 'TRUCK')",
+            name="ck_transport_compliance_entity_type",
+        ),
+        CheckConstraint(
+            "worst_status IN ('VALID', 'PENDING', 'EXPIRED')",
+            name="ck_transport_compliance_worst_status",
+        ),
+        Index(
+            "ix_transport_compliance_next_expiry",
+            "entity_type",
+            "next_expiry_date",
+        ),
+        Index(
+            "ix_transport_compliance_worst_status",
+            "entity_type",
+            "worst_status",
+        ),
+        {"schema": SCHEMA},
+    )
+
+    # DRIVER | TRUCK
+    entity_type = db.Column(db.String(10), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+
+    # Próximo vencimiento de un documento todavía vigente
+    next_expiry_date = db.Column(db.Date, nullable=True)
+
+    # Peor estado actual: EXPIRED > PENDING > VALID
+    worst_status = db.Column(db.String(10), nullable=False, default="VALID", server_default="VALID")
+
+    expired_count = db.Column(db.SmallInteger, nullable=False, default=0, server_default="0")
+    pending_count = db.Column(db.SmallInteger, nullable=False, default=0, server_default="0")
+
+    # Documentos que bloquean: [{"document", "status", "expiry_date"}]
+    blocking_documents = db.Column(JSONB, nullable=False, default=list, server_default="[]")
+
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,33 @@
+# app/models/transport_counter.py
+from datetime import datetime
+
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class TransportCounter(db.Model):
+    """
+    Contadores del módulo Transportes: una fila por tabla y estado
+    (p. ej. incidents/OPEN, exit_permissions/AUTHORIZED).
+
+    Se actualizan por diferencia en la misma transacción que el cambio
+    de estado (app/services/write_hooks.py); las escrituras por SQL
+    directo recuentan su tabla al hacer COMMIT. Un barrido periódico
+    compara contra COUNT(*) y corrige cualquier desfase
+    (app/services/transport_counters.py).
+    """
+
+    __tablename__ = "transport_counters"
+    __table_args__ = (
+        {"schema": SCHEMA},
+    )
+
+    # drivers | trucks | assignments | exit_permissions | incidents |
+    # driver_documents | truck_documents
+    counter_key = db.Column(db.String(40), primary_key=True)
+    status = db.Column(db.String(30), primary_key=True)
+
+    value = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
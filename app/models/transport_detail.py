@@ -0,0 +1,39 @@
+# app/models/transport_detail.py
+from datetime import datetime
+
+from sqlalchemy import CheckConstraint
+
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class TransportDetailVersion(db.Model):
+    """
+    Versión de la ficha 360° de cada chofer y cabezal.
+
+    Cada transacción que cambia algo de la ficha (datos, documentos,
+    asignaciones, permisos, incidentes, adjuntos o historial) suma 1
+    antes del COMMIT (app/services/write_hooks.py). La caché de
+    app/services/transport_detail.py guarda la ficha junto con la
+    versión con la que se armó y solo la reutiliza mientras coincida.
+
+    Sin fila = versión 0 (nunca cambió desde que existe la tabla).
+    """
+
+    __tablename__ = "transport_detail_versions"
+    __table_args__ = (
+        CheckConstraint(
+            "entity_type IN ('DRIVER', 'TRUCK')",
+            name="ck_transport_detail_versions_entity_type",
+        ),
+        {"schema": SCHEMA},
+    )
+
+    # DRIVER | TRUCK
+    entity_type = db.Column(db.String(10), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+
+    version = db.Column(db.BigInteger, nullable=False, default=1, server_default="1")
+
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,120 @@
+# app/models/transport_incident_archive.py
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.extensions import db
+
+SCHEMA = "yard_gate_alamo"
+
+
+class TransportIncidentArchive(db.Model):
+    """
+    Incidentes cerrados (RESOLVED / CANCELLED) que salieron de
+    transport_incidents por antigüedad.
+
+    Tabla particionada por mes de occurred_at
+    (transport_incidents_archive_pAAAAMM). Las particiones las crea el
+    archivado al mover filas y se pueden separar (DETACH) para llevar
+    meses completos a almacenamiento frío
+    (app/services/transport_incident_archive.py).
+
+    Sin FK: el archivo no bloquea cambios en choferes, cabezales o
+    usuarios. Los adjuntos quedan como copia de sus metadatos en
+    attachments; los archivos siguen en el storage.
+    """
+
+    __tablename__ = "transport_incidents_archive"
+    __table_args__ = (
+        Index(
+            "ix_transport_incidents_archive_id",
+            "id",
+        ),
+        Index(
+            "ix_transport_incidents_archive_driver",
+            "driver_id",
+            "occurred_at",
+        ),
+        Index(
+            "ix_transport_incidents_archive_truck",
+            "truck_id",
+            "occurred_at",
+        ),
+        {
+            "schema": SCHEMA,
+            "postgresql_partition_by": "RANGE (occurred_at)",
+        },
+    )
+
+    # La llave de partición tiene que estar en la PK.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    occurred_at = db.Column(db.DateTime, primary_key=True)
+
+    driver_id = db.Column(db.Integer, nullable=True)
+    truck_id = db.Column(db.Integer, nullable=False)
+
+    incident_type = db.Column(db.String(20), nullable=False)
+
+    location = db.Column(db.String(240), nullable=True)
+    description = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(20), nullable=False)
+
+    last_follow_up_at = db.Column(db.DateTime, nullable=True)
+    next_follow_up_at = db.Column(db.DateTime, nullable=True)
+
+    resolution = db.Column(db.Text, nullable=True)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+
+    reported_by_user_id = db.Column(db.Integer, nullable=True)
+    resolved_by_user_id = db.Column(db.Integer, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    # [{"id", "original_filename", "storage_path", "mime_type", ...}]
+    attachments = db.Column(JSONB, nullable=False, default=list, server_default="[]")
+
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class TransportIncidentFollowUpArchive(db.Model):
+    """
+    Seguimientos de los incidentes archivados. Se particionan por el
+    occurred_at del incidente (no por contacted_at): un mes separado
+    se lleva el incidente junto con todos sus seguimientos.
+    """
+
+    __tablename__ = "transport_incident_follow_ups_archive"
+    __table_args__ = (
+        Index(
+            "ix_transport_incident_follow_ups_archive_incident",
+            "incident_id",
+            "occurred_at",
+        ),
+        {
+            "schema": SCHEMA,
+            "postgresql_partition_by": "RANGE (occurred_at)",
+        },
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    occurred_at = db.Column(db.DateTime, primary_key=True)
+
+    incident_id = db.Column(db.Integer, nullable=False)
+
+    contacted_at = db.Column(db.DateTime, nullable=False)
+
+    contact_name = db.Column(db.String(180), nullable=True)
+    current_situation = db.Column(db.Text, nullable=False)
+    repair_estimate = db.Column(db.String(240), nullable=True)
+
+    notes = db.Column(db.Text, nullable=True)
+
+    next_follow_up_at = db.Column(db.DateTime, nullable=True)
+
+    resolved = db.Column(db.Boolean, nullable=False, default=False)
+
+    created_by_user_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,200 @@
+# app/services/bulk_import.py
+"""
+Motor de cargas masivas por tabla de staging.
+
+Las cargas de Excel (choferes/cabezales, inventario, chasis, llantas,
+GPS y catálogos TICA) resolvían cada fila con el ORM: una consulta o
+un objeto por fila y, en choferes, un COMMIT cada 20 filas. Con
+archivos de miles de filas eso tomaba minutos.
+
+Ahora cada carga:
+
+1. Lee y valida el Excel en Python (solo lo que no necesita la base
+   de datos) y produce filas normalizadas.
+2. Las envía con un solo COPY a una tabla temporal
+   (CREATE TEMP TABLE ... ON COMMIT DROP) dentro de la transacción
+   de la sesión.
+3. Resuelve llaves contra las tablas reales con JOIN y aplica los
+   cambios con pocas sentencias INSERT ... ON CONFLICT /
+   UPDATE ... FROM, junto con el historial de cambios.
+
+La tabla temporal desaparece con el COMMIT o el ROLLBACK. Todo se
+ejecuta en la conexión de db.session, así el resto de la carga puede
+seguir usando el ORM en la misma transacción.
+
+Las escrituras por SQL directo no pasan por los listeners del ORM:
+quien inserte movimientos o contenedores debe llamar a
+mark_movements_touched() / mark_containers_touched()
+(app/services/write_hooks.py).
+"""
+
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from io import BytesIO
+from typing import Any, Iterable
+
+from sqlalchemy import text
+
+from app.extensions import db
+
+_IDENTIFIER_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+# Filas por cada COPY: acota la memoria del buffer.
+COPY_CHUNK_ROWS = 5000
+
+
+# =========================================================
+# Formato de texto de COPY
+# =========================================================
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+
+    if isinstance(value, bool):
+        return "t" if value else "f"
+
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return format(value, "f")
+
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_from(sql: str, payload: bytes) -> None:
+    """
+    COPY ... FROM STDIN en la conexión de la sesión, con el driver
+    que esté instalado (pg8000 en producción).
+    """
+    dbapi_connection = db.session.connection().connection.driver_connection
+    cursor = dbapi_connection.cursor()
+
+    try:
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            cursor.copy_expert(sql, BytesIO(payload))
+        elif hasattr(cursor, "copy"):
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(payload)
+        else:
+            # pg8000
+            cursor.execute(sql, stream=BytesIO(payload))
+    finally:
+        cursor.close()
+
+
+# =========================================================
+# Tabla de staging
+# =========================================================
+
+class StagingTable:
+    """
+    Tabla temporal con row_no (fila del Excel) más las columnas
+    declaradas: [(nombre, tipo SQL), ...].
+    """
+
+    def __init__(self, name: str, columns: list[tuple[str, str]]):
+        for identifier in [name, *(column for column, _ in columns)]:
+            if not _IDENTIFIER_RE.match(identifier):
+                raise ValueError(f"Identificador inválido: {identifier}")
+
+        self.name = name
+        self.columns = [("row_no", "integer NOT NULL"), *columns]
+        self.row_count = 0
+
+    @property
+    def column_names(self) -> list[str]:
+        return [column for column, _ in self.columns]
+
+    def create(self) -> "StagingTable":
+        columns_sql = ", ".join(f"{column} {sql_type}" for column, sql_type in self.columns)
+
+        db.session.execute(text(
+            f"CREATE TEMP TABLE {self.name} ({columns_sql}) ON COMMIT DROP"
+        ))
+
+        return self
+
+    def copy(self, rows: Iterable[dict[str, Any]]) -> int:
+        """
+        Carga rows (dicts con row_no y las columnas) con COPY, en
+        tandas de COPY_CHUNK_ROWS. Devuelve las filas cargadas.
+        """
+        names = self.column_names
+        sql = f"COPY {self.name} ({', '.join(names)}) FROM STDIN"
+
+        lines: list[str] = []
+        copied = 0
+
+        for row in rows:
+            lines.append("\t".join(_copy_value(row.get(name)) for name in names))
+
+            if len(lines) >= COPY_CHUNK_ROWS:
+                _copy_from(sql, ("\n".join(lines) + "\n").encode("utf-8"))
+                copied += len(lines)
+                lines = []
+
+        if lines:
+            _copy_from(sql, ("\n".join(lines) + "\n").encode("utf-8"))
+            copied += len(lines)
+
+        self.row_count += copied
+        return copied
+
+    def analyze(self) -> None:
+        # Autovacuum no analiza tablas temporales: sin estadísticas el
+        # planificador asume pocas filas y evita los hash joins.
+        db.session.execute(text(f"ANALYZE {self.name}"))
+
+
+def stage_rows(
+    name: str,
+    columns: list[tuple[str, str]],
+    rows: Iterable[dict[str, Any]],
+) -> StagingTable:
+    """
+    Crea la tabla temporal, la carga con COPY y la analiza.
+    """
+    table = StagingTable(name, columns).create()
+    table.copy(rows)
+    table.analyze()
+
+    return table
+
+
+# =========================================================
+# Resultados
+# =========================================================
+
+def execute(sql, params: dict[str, Any] | None = None):
+    if isinstance(sql, str):
+        sql = text(sql)
+
+    return db.session.execute(sql, params or {})
+
+
+def upsert_counts(result) -> tuple[int, int]:
+    """
+    (creadas, actualizadas) de un INSERT ... ON CONFLICT DO UPDATE
+    con RETURNING (xmax = 0) AS inserted como primera columna.
+    """
+    created = 0
+    updated = 0
+
+    for row in result:
+        if row[0]:
+            created += 1
+        else:
+            updated += 1
+
+    return created, updated
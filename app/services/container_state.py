@@ -0,0 +1,128 @@
+# app/services/container_state.py
+"""
+Mantenimiento de container_current_state (última clasificación y
+último Gate In por contenedor).
+
+refresh_container_state() recalcula la fila de los contenedores
+indicados con un solo INSERT ... SELECT. El listener de la sesión
+(app/services/write_hooks.py) lo llama antes del COMMIT con los
+contenedores que recibieron una clasificación o un GATE_IN, así el
+estado cambia en la misma transacción que el dato.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _refresh_state_sql(where_sql: str):
+    return text(f"""
+        INSERT INTO yard_gate_alamo.container_current_state (
+            container_id, site_id,
+            classification_id, classified_at, shipping_line,
+            final_classification, max_gross_kg, manufacture_year, summary_text,
+            last_gate_in_movement_id, last_gate_in_at,
+            updated_at
+        )
+        SELECT
+            c.id,
+            c.site_id,
+            cls.id,
+            cls.classified_at,
+            UPPER(COALESCE(cls.shipping_line, '')),
+            UPPER(COALESCE(cls.final_classification, '')),
+            cls.max_gross_kg,
+            cls.manufacture_year,
+            cls.summary_text,
+            gi.id,
+            gi.occurred_at,
+            NOW() AT TIME ZONE 'UTC'
+        FROM yard_gate_alamo.containers c
+        LEFT JOIN LATERAL (
+            SELECT
+                cc.id,
+                cc.classified_at,
+                cc.shipping_line,
+                cc.final_classification,
+                cc.max_gross_kg,
+                cc.manufacture_year,
+                cc.summary_text
+            FROM yard_gate_alamo.container_classifications cc
+            WHERE cc.container_id = c.id
+            ORDER BY cc.classified_at DESC, cc.id DESC
+            LIMIT 1
+        ) cls ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT mv.id, mv.occurred_at
+            FROM yard_gate_alamo.movements mv
+            WHERE mv.container_id = c.id
+              AND mv.movement_type = 'GATE_IN'
+              AND mv.occurred_at IS NOT NULL
+            ORDER BY mv.occurred_at DESC, mv.id DESC
+            LIMIT 1
+        ) gi ON TRUE
+        WHERE {where_sql}
+        ON CONFLICT (container_id) DO UPDATE SET
+            site_id = EXCLUDED.site_id,
+            classification_id = EXCLUDED.classification_id,
+            classified_at = EXCLUDED.classified_at,
+            shipping_line = EXCLUDED.shipping_line,
+            final_classification = EXCLUDED.final_classification,
+            max_gross_kg = EXCLUDED.max_gross_kg,
+            manufacture_year = EXCLUDED.manufacture_year,
+            summary_text = EXCLUDED.summary_text,
+            last_gate_in_movement_id = EXCLUDED.last_gate_in_movement_id,
+            last_gate_in_at = EXCLUDED.last_gate_in_at,
+            updated_at = EXCLUDED.updated_at
+    """)
+
+
+_REFRESH_BY_IDS_SQL = _refresh_state_sql("c.id = ANY(:ids)")
+_REFRESH_BY_RANGE_SQL = _refresh_state_sql("c.id > :after_id AND c.id <= :upto_id")
+
+
+def refresh_container_state(container_ids) -> int:
+    """
+    Recalcula el estado actual de los contenedores indicados.
+    No hace COMMIT.
+    """
+    ids = sorted({int(cid) for cid in container_ids or [] if cid})
+
+    if not ids:
+        return 0
+
+    return db.session.execute(_REFRESH_BY_IDS_SQL, {"ids": ids}).rowcount or 0
+
+
+def backfill_container_state(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Llena container_current_state para todos los contenedores, por
+    rangos de id. Hace COMMIT por lote.
+    """
+    max_id = db.session.execute(
+        text("SELECT COALESCE(MAX(id), 0) FROM yard_gate_alamo.containers")
+    ).scalar() or 0
+
+    updated = 0
+    after_id = 0
+
+    while after_id < max_id:
+        upto_id = after_id + batch_size
+
+        updated += db.session.execute(
+            _REFRESH_BY_RANGE_SQL,
+            {"after_id": after_id, "upto_id": upto_id},
+        ).rowcount or 0
+
+        db.session.commit()
+
+        logger.info("CONTAINER_STATE_BACKFILL upto_id=%s updated=%s", upto_id, updated)
+        after_id = upto_id
+
+    return updated
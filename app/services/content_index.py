@@ -0,0 +1,129 @@
+# app/services/content_index.py
+"""
+Deduplicación por contenido de los archivos subidos a R2.
+
+El SHA-256 se calcula mientras el archivo se copia (spool o descarga),
+sin una segunda lectura. Si el contenido ya existe en stored_objects,
+la nueva fila apunta al objeto existente y no se sube nada a R2.
+"""
+
+import hashlib
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.extensions import db
+from app.models.stored_object import StoredObject
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class HashingWriter:
+    """
+    Envuelve un file-like de escritura y calcula SHA-256 al vuelo.
+
+    No expone seek(): boto3 lo trata como no posicionable y escribe
+    las partes de la descarga en orden.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk) -> int:
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        return self._fileobj.write(chunk)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class _DiscardWriter:
+    def write(self, chunk) -> int:
+        return len(chunk)
+
+
+def hash_storage_object(storage, key: str) -> tuple[str, int]:
+    """
+    SHA-256 y tamaño de un objeto ya subido a R2, calculados por el
+    servidor al descargarlo (sin guardarlo). Para subidas directas:
+    el hash que envía el navegador no prueba que tenga el contenido.
+    """
+    writer = HashingWriter(_DiscardWriter())
+    storage.download_fileobj(key, writer)
+
+    return writer.hexdigest(), writer.size
+
+
+def copy_and_hash(src, dst) -> tuple[str, int]:
+    """
+    Copia src -> dst por bloques calculando SHA-256 y tamaño.
+    """
+    writer = HashingWriter(dst)
+
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+
+        writer.write(chunk)
+
+    return writer.hexdigest(), writer.size
+
+
+def normalize_sha256(value) -> str | None:
+    raw = (str(value or "")).strip().lower()
+
+    if len(raw) != 64 or any(ch not in "0123456789abcdef" for ch in raw):
+        return None
+
+    return raw
+
+
+def find_stored_object(content_sha256: str | None) -> StoredObject | None:
+    content_sha256 = normalize_sha256(content_sha256)
+
+    if not content_sha256:
+        return None
+
+    return StoredObject.query.filter_by(content_sha256=content_sha256).first()
+
+
+def register_stored_object(
+    *,
+    content_sha256: str,
+    storage_key: str,
+    url: str,
+    size_bytes: int | None = None,
+    content_type: str | None = None,
+    web_url: str | None = None,
+    thumb_url: str | None = None,
+) -> None:
+    """
+    Agrega el objeto al índice.
+
+    Dos subidas simultáneas del mismo contenido no fallan: la segunda
+    se ignora (ON CONFLICT DO NOTHING). No ejecuta commit.
+    """
+    content_sha256 = normalize_sha256(content_sha256)
+
+    if not content_sha256 or not storage_key or not url:
+        return
+
+    stmt = (
+        pg_insert(StoredObject)
+        .values(
+            content_sha256=content_sha256,
+            storage_key=storage_key,
+            url=url,
+            size_bytes=size_bytes,
+            content_type=content_type,
+            web_url=web_url,
+            thumb_url=thumb_url,
+        )
+        .on_conflict_do_nothing(index_elements=["content_sha256"])
+    )
+
+    db.session.execute(stmt)
+
@@ -0,0 +1,269 @@
+# app/services/excel_ingest.py
+"""
+Lectura de Excel para las cargas masivas.
+
+Etapa común de ingesta para choferes/cabezales, inventario y catálogos
+TICA:
+
+- open_workbook(): openpyxl en read_only + data_only. Las hojas se
+  leen como stream (no se arma el árbol completo de celdas).
+- iter_sheet_rows(): (fila del Excel, tupla de valores), sin filas
+  vacías.
+- map_rows(): aplica la normalización/validación de cada importador
+  fila por fila. En archivos grandes las filas se agrupan en tandas
+  que procesa un pool de procesos; los resultados vuelven en el orden
+  del Excel, así las reglas que dependen del orden (duplicados dentro
+  del archivo, "gana la primera/última fila") siguen en quien llama.
+
+La lectura del XML sigue en el proceso que llama y se solapa con la
+normalización de las tandas anteriores. La función por fila debe ser
+de nivel de módulo (o functools.partial de una), sin base de datos ni
+current_app: se ejecuta en otro proceso.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Iterable, Iterator
+
+from flask import current_app
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+
+def _config_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(current_app.config.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+
+    return max(value, minimum)
+
+
+# =========================================================
+# Workbook
+# =========================================================
+
+def open_workbook(file_source):
+    """
+    Abre el Excel en modo streaming. Acepta bytes o un stream.
+    Quien llama traduce el error de openpyxl a su propio mensaje.
+    """
+    if isinstance(file_source, (bytes, bytearray)):
+        file_source = BytesIO(file_source)
+    else:
+        try:
+            file_source.seek(0)
+        except (AttributeError, OSError):
+            pass
+
+    return load_workbook(
+        filename=file_source,
+        read_only=True,
+        data_only=True,
+    )
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def iter_sheet_rows(
+    worksheet,
+    *,
+    min_row: int = 2,
+    skip_blank: bool = True,
+) -> Iterator[tuple[int, tuple]]:
+    """
+    (número de fila del Excel, valores) desde min_row.
+    """
+    for row_number, values in enumerate(
+        worksheet.iter_rows(min_row=min_row, values_only=True),
+        start=min_row,
+    ):
+        if skip_blank and all(_is_blank(value) for value in values):
+            continue
+
+        yield row_number, tuple(values)
+
+
+def sheet_row_estimate(worksheet, *, min_row: int = 2) -> int:
+    """
+    Filas de datos según la dimensión guardada en el archivo (0 si el
+    archivo no la trae). Solo sirve para el avance y para decidir si
+    vale la pena usar el pool.
+    """
+    try:
+        max_row = int(worksheet.max_row or 0)
+    except (TypeError, ValueError):
+        return 0
+
+    return max(max_row - min_row + 1, 0)
+
+
+# =========================================================
+# Pool de procesos
+# =========================================================
+#
+# Como los demás pools de la app: se crea de forma perezosa y se
+# recrea si cambia el PID. forkserver evita copiar el proceso web
+# (threads, conexiones abiertas) en cada hijo.
+#
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_mp_context(),
+            )
+            _pool_pid = pid
+
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+
+    return _pool
+
+
+def _reset_pool() -> None:
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+
+        _pool = None
+        _pool_pid = None
+
+
+def _map_chunk(row_func: Callable, chunk: list[tuple[int, tuple]]) -> list:
+    return [row_func(row_number, values) for row_number, values in chunk]
+
+
+def _chunks(rows: Iterable[tuple[int, tuple]], size: int) -> Iterator[list[tuple[int, tuple]]]:
+    chunk = []
+
+    for item in rows:
+        chunk.append(item)
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def _parallel_workers(total: int) -> int:
+    """
+    Procesos a usar para este archivo; 0 = en el mismo proceso.
+    """
+    workers = _config_int("EXCEL_PARSE_PROCESSES", min(os.cpu_count() or 1, 4))
+    min_rows = _config_int("EXCEL_PARSE_PARALLEL_MIN_ROWS", 5000, minimum=1)
+
+    if workers < 2 or total < min_rows:
+        return 0
+
+    return workers
+
+
+# =========================================================
+# Normalización por filas
+# =========================================================
+
+def map_rows(
+    row_func: Callable[[int, tuple], Any],
+    rows: Iterable[tuple[int, tuple]],
+    *,
+    total: int = 0,
+    progress: Callable | None = None,
+    phase: str = "Leyendo Excel",
+) -> Iterator[tuple[int, Any]]:
+    """
+    Devuelve (fila, row_func(fila, valores)) en el orden de rows.
+
+    total (sheet_row_estimate) decide si se usa el pool; con pocas
+    filas o EXCEL_PARSE_PROCESSES < 2 todo corre en este proceso.
+    """
+    chunk_rows = _config_int("EXCEL_PARSE_CHUNK_ROWS", 2000, minimum=100)
+    workers = _parallel_workers(total)
+    done = 0
+
+    if workers:
+        try:
+            pool = _get_pool(workers)
+        except (OSError, ValueError):
+            logger.exception("EXCEL_PARSE_POOL_UNAVAILABLE")
+            workers = 0
+
+    if not workers:
+        for row_number, values in rows:
+            yield row_number, row_func(row_number, values)
+
+            done += 1
+
+            if progress and done % 200 == 0:
+                progress(phase, done, total)
+
+        return
+
+    # Tandas en vuelo acotadas: la memoria no depende del tamaño del
+    # archivo y el orden se conserva consumiendo siempre la más antigua.
+    pending = deque()
+    max_pending = workers * 2
+
+    def drain_oldest():
+        nonlocal done
+
+        chunk, future = pending.popleft()
+
+        for (row_number, _), result in zip(chunk, future.result()):
+            yield row_number, result
+
+        done += len(chunk)
+
+        if progress:
+            progress(phase, done, total)
+
+    try:
+        for chunk in _chunks(rows, chunk_rows):
+            pending.append((chunk, pool.submit(_map_chunk, row_func, chunk)))
+
+            while len(pending) >= max_pending:
+                yield from drain_oldest()
+
+        while pending:
+            yield from drain_oldest()
+
+    except Exception:
+        for _, future in pending:
+            future.cancel()
+
+        # Un hijo que murió deja el pool inservible (BrokenProcessPool).
+        if getattr(pool, "_broken", False):
+            _reset_pool()
+
+        raise
@@ -0,0 +1,605 @@
+# app/services/export_jobs.py
+"""
+Exportaciones en segundo plano.
+
+Las exportaciones grandes (inventario, reportes de movimientos, PDFs
+de evacuación/prelista, plantilla de transporte) competían con Gate In
+por los threads de Gunicorn. Con EXPORT_ASYNC=true:
+
+1. La petición crea un ExportJob (PENDING) y redirige a su pantalla.
+2. export_worker.py reclama el trabajo (FOR UPDATE SKIP LOCKED),
+   genera el archivo con su propia conexión y lo guarda en R2
+   (o en EXPORT_LOCAL_DIR sin R2).
+3. Al terminar registra la auditoría (p. ej. REPORT_EXPORTED) y
+   notifica al usuario, que descarga el archivo.
+
+Con EXPORT_ASYNC=false el mismo generador se ejecuta dentro de la
+petición, como antes.
+
+Cada tipo de exportación se registra con @register_export junto a su
+ruta. El generador recibe (site_id, params) y no usa request ni
+current_user.
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from flask import current_app, redirect, send_file, url_for
+from flask_login import current_user
+from sqlalchemy import func, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.extensions import db
+from app.models.dispatch import UserNotification
+from app.models.export_job import ExportJob
+from app.services.audit import audit_log
+from app.services.scheduler import scheduled_job
+from app.services.storage import export_key, get_storage
+from app.services.xlsx_export import stream_file_response
+
+EXPORT_STATUS_PENDING = "PENDING"
+EXPORT_STATUS_RUNNING = "RUNNING"
+EXPORT_STATUS_DONE = "DONE"
+EXPORT_STATUS_FAILED = "FAILED"
+
+
+@dataclass
+class ExportFile:
+    """
+    Resultado de un generador: archivo en disco (path, se elimina
+    después de guardarlo) o en memoria (data).
+    """
+
+    filename: str
+    mimetype: str
+    path: str | None = None
+    data: BytesIO | None = None
+    rows: int | None = None
+    inline: bool = False
+    audit_meta: dict = field(default_factory=dict)
+
+    def size(self) -> int:
+        if self.path:
+            return os.path.getsize(self.path)
+
+        return len(self.data.getbuffer()) if self.data is not None else 0
+
+    def open(self):
+        if self.path:
+            return open(self.path, "rb")
+
+        self.data.seek(0)
+        return self.data
+
+    def discard(self) -> None:
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+# =========================================================
+# Registro de tipos de exportación
+# =========================================================
+
+_EXPORT_KINDS: dict[str, dict] = {}
+
+
+def register_export(kind: str, *, label: str, audit_action: str | None = None, audit_entity: str = "report"):
+    """
+    Registra el generador de un tipo de exportación.
+
+    audit_action: acción de auditoría que se registra al completar
+    (dentro de la petición o en el worker).
+    """
+    def decorator(fn):
+        _EXPORT_KINDS[kind] = {
+            "builder": fn,
+            "label": label,
+            "audit_action": audit_action,
+            "audit_entity": audit_entity,
+        }
+        return fn
+
+    return decorator
+
+
+def export_kind_label(kind: str) -> str:
+    spec = _EXPORT_KINDS.get(kind)
+    return spec["label"] if spec else kind
+
+
+def async_exports_enabled() -> bool:
+    return bool(current_app.config.get("EXPORT_ASYNC"))
+
+
+def build_export(kind: str, *, site_id: int | None, params: dict | None) -> ExportFile:
+    spec = _EXPORT_KINDS.get(kind)
+
+    if spec is None:
+        raise ValueError(f"Tipo de exportación desconocido: {kind}")
+
+    return spec["builder"](site_id, dict(params or {}))
+
+
+def _audit_export(kind: str, *, user_id: int | None, site_id: int | None, export_file: ExportFile, job_id: int | None = None) -> None:
+    spec = _EXPORT_KINDS.get(kind) or {}
+    action = spec.get("audit_action")
+
+    if not action:
+        return
+
+    meta = dict(export_file.audit_meta)
+    meta.setdefault("rows", export_file.rows)
+    meta.setdefault("site_id", site_id)
+
+    if job_id:
+        meta["export_job_id"] = job_id
+
+    audit_log(user_id, action, spec.get("audit_entity"), None, meta)
+
+
+def export_file_response(export_file: ExportFile):
+    if export_file.path:
+        return stream_file_response(
+            export_file.path,
+            export_file.filename,
+            export_file.mimetype,
+            inline=export_file.inline,
+        )
+
+    export_file.data.seek(0)
+
+    response = send_file(
+        export_file.data,
+        as_attachment=not export_file.inline,
+        download_name=export_file.filename,
+        mimetype=export_file.mimetype,
+    )
+
+    if export_file.inline:
+        response.headers["Content-Disposition"] = f"inline; filename={export_file.filename}"
+
+    return response
+
+
+def export_response(kind: str, *, site_id: int | None, params: dict | None = None):
+    """
+    Respuesta de una ruta de exportación.
+
+    EXPORT_ASYNC=true: encola y redirige a la pantalla del trabajo.
+    EXPORT_ASYNC=false: genera el archivo en la petición.
+    """
+    if async_exports_enabled():
+        job = enqueue_export(kind, site_id=site_id, user_id=current_user.id, params=params)
+        return redirect(url_for("yard.export_job_view", job_id=job.id))
+
+    export_file = build_export(kind, site_id=site_id, params=params)
+
+    try:
+        _audit_export(kind, user_id=current_user.id, site_id=site_id, export_file=export_file)
+        db.session.commit()
+    except Exception:
+        export_file.discard()
+        raise
+
+    return export_file_response(export_file)
+
+
+def enqueue_export(kind: str, *, site_id: int | None, user_id: int | None, params: dict | None) -> ExportJob:
+    if kind not in _EXPORT_KINDS:
+        raise ValueError(f"Tipo de exportación desconocido: {kind}")
+
+    job = ExportJob(
+        kind=kind,
+        status=EXPORT_STATUS_PENDING,
+        site_id=site_id,
+        requested_by_user_id=user_id,
+        params=dict(params or {}),
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    return job
+
+
+# =========================================================
+# Worker
+# =========================================================
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"[:120]
+
+
+def _local_export_dir() -> str:
+    path = (
+        current_app.config.get("EXPORT_LOCAL_DIR")
+        or os.path.join(tempfile.gettempdir(), "yard_exports")
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _use_r2() -> bool:
+    return (current_app.config.get("STORAGE_PROVIDER") or "").lower() == "r2"
+
+
+def _requeue_stale_export_jobs(now: datetime) -> int:
+    """
+    Trabajos RUNNING de un worker que murió: vuelven a PENDING o
+    quedan FAILED si agotaron los intentos.
+    """
+    stale_minutes = max(int(current_app.config.get("EXPORT_JOB_STALE_MINUTES") or 15), 1)
+    max_attempts = max(int(current_app.config.get("EXPORT_JOB_MAX_ATTEMPTS") or 2), 1)
+    stale_before = now - timedelta(minutes=stale_minutes)
+
+    # Sin latido: el worker lo marca cada EXPORT_JOB_HEARTBEAT_SECONDS
+    # mientras genera, así una exportación larga no se duplica.
+    stale_filter = (
+        ExportJob.status == EXPORT_STATUS_RUNNING,
+        func.coalesce(ExportJob.heartbeat_at, ExportJob.claimed_at) < stale_before,
+    )
+
+    failed = (
+        db.session.query(ExportJob)
+        .filter(*stale_filter, ExportJob.attempts >= max_attempts)
+        .update(
+            {
+                ExportJob.status: EXPORT_STATUS_FAILED,
+                ExportJob.finished_at: now,
+                ExportJob.last_error: "El worker no terminó la exportación.",
+            },
+            synchronize_session=False,
+        )
+    )
+
+    requeued = (
+        db.session.query(ExportJob)
+        .filter(*stale_filter)
+        .update(
+            {
+                ExportJob.status: EXPORT_STATUS_PENDING,
+                ExportJob.claimed_by: None,
+                ExportJob.claimed_at: None,
+                ExportJob.heartbeat_at: None,
+            },
+            synchronize_session=False,
+        )
+    )
+
+    if failed or requeued:
+        db.session.commit()
+    else:
+        db.session.rollback()
+
+    return failed + requeued
+
+
+def claim_next_export_job(worker_id: str | None = None) -> ExportJob | None:
+    """
+    Reclama el trabajo PENDING más antiguo. Varios workers pueden
+    correr a la vez: SKIP LOCKED evita que dos tomen el mismo.
+    """
+    now = datetime.utcnow()
+
+    job = (
+        db.session.query(ExportJob)
+        .filter(ExportJob.status == EXPORT_STATUS_PENDING)
+        .order_by(ExportJob.created_at.asc(), ExportJob.id.asc())
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+
+    if job is None:
+        db.session.rollback()
+        return None
+
+    job.status = EXPORT_STATUS_RUNNING
+    job.claimed_by = worker_id or _worker_id()
+    job.claimed_at = now
+    job.heartbeat_at = now
+    job.attempts = int(job.attempts or 0) + 1
+    job.last_error = None
+
+    db.session.commit()
+
+    return job
+
+
+class ExportHeartbeat:
+    """
+    Marca heartbeat_at del trabajo cada EXPORT_JOB_HEARTBEAT_SECONDS
+    desde un thread, con una conexión y transacción propias (como
+    ImportProgress), mientras el generador corre.
+    """
+
+    def __init__(self, job_id: int, worker_id: str):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = max(int(current_app.config.get("EXPORT_JOB_HEARTBEAT_SECONDS") or 30), 1)
+        self._app = current_app._get_current_object()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _beat(self) -> None:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    db.text("""
+                        UPDATE yard_gate_alamo.export_jobs
+                        SET heartbeat_at = :now
+                        WHERE id = :id
+                          AND status = 'RUNNING'
+                          AND claimed_by = :worker
+                    """),
+                    {"id": self.job_id, "worker": self.worker_id, "now": datetime.utcnow()},
+                )
+        except Exception:
+            # Un latido perdido no interrumpe la exportación.
+            self._app.logger.exception("EXPORT_HEARTBEAT_FAILED id=%s", self.job_id)
+
+    def _run(self) -> None:
+        with self._app.app_context():
+            while not self._stop.wait(self.interval):
+                self._beat()
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"export-heartbeat-{self.job_id}",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _owned_job_filter(job_id: int, worker_id: str | None):
+    # El trabajo sigue siendo de este worker (no fue devuelto a la cola
+    # y reclamado por otro).
+    return (
+        ExportJob.id == job_id,
+        ExportJob.status == EXPORT_STATUS_RUNNING,
+        ExportJob.claimed_by == worker_id,
+    )
+
+
+def _store_export_file(job: ExportJob, export_file: ExportFile) -> dict:
+    """
+    Guarda el archivo y retorna los valores del resultado para el
+    trabajo. No modifica job.
+    """
+    values = {
+        "file_name": export_file.filename,
+        "mimetype": export_file.mimetype,
+        "inline": bool(export_file.inline),
+        "size_bytes": export_file.size(),
+        "row_count": export_file.rows,
+    }
+
+    fh = export_file.open()
+
+    try:
+        if _use_r2():
+            key = export_key(job.id, export_file.filename)
+            get_storage().upload_fileobj(fh, key, content_type=export_file.mimetype)
+            values["storage_key"] = key
+        else:
+            path = os.path.join(_local_export_dir(), f"{job.id}_{os.path.basename(export_file.filename)}")
+
+            with open(path, "wb") as dst:
+                shutil.copyfileobj(fh, dst, 1024 * 1024)
+
+            values["local_path"] = path
+    finally:
+        if export_file.path:
+            fh.close()
+
+        export_file.discard()
+
+    return values
+
+
+def _notify_export_ready(job: ExportJob) -> None:
+    if not job.requested_by_user_id or not job.site_id:
+        return
+
+    db.session.add(UserNotification(
+        site_id=job.site_id,
+        user_id=job.requested_by_user_id,
+        title="Exportación lista",
+        message=f"{export_kind_label(job.kind)}: {job.file_name}",
+        related_type="EXPORT_READY",
+        related_id=job.id,
+        is_read=False,
+        created_at=datetime.utcnow(),
+    ))
+
+
+def run_export_job(job: ExportJob) -> bool:
+    """
+    Genera, guarda y registra un trabajo ya reclamado.
+
+    Solo lo completa si sigue reclamado por este worker: si se dio por
+    abandonado y otro worker lo tomó, el resultado se descarta sin
+    auditoría ni notificación.
+    """
+    job_id = job.id
+    worker_id = job.claimed_by
+    started = time.monotonic()
+
+    try:
+        with ExportHeartbeat(job_id, worker_id):
+            export_file = build_export(job.kind, site_id=job.site_id, params=job.params)
+
+        # El generador pudo dejar la sesión con lecturas abiertas.
+        job = db.session.get(ExportJob, job_id)
+
+        if job is None or job.status != EXPORT_STATUS_RUNNING or job.claimed_by != worker_id:
+            export_file.discard()
+            db.session.rollback()
+
+            current_app.logger.warning("EXPORT_JOB_LOST_CLAIM id=%s worker=%s", job_id, worker_id)
+            return False
+
+        with ExportHeartbeat(job_id, worker_id):
+            values = _store_export_file(job, export_file)
+
+        ttl_hours = max(int(current_app.config.get("EXPORT_FILE_TTL_HOURS") or 24), 1)
+        now = datetime.utcnow()
+
+        done = db.session.execute(
+            update(ExportJob)
+            .where(*_owned_job_filter(job_id, worker_id))
+            .values(
+                **values,
+                status=EXPORT_STATUS_DONE,
+                finished_at=now,
+                expires_at=now + timedelta(hours=ttl_hours),
+            )
+        ).rowcount
+
+        if not done:
+            db.session.rollback()
+
+            current_app.logger.warning("EXPORT_JOB_LOST_CLAIM id=%s worker=%s", job_id, worker_id)
+            return False
+
+        _audit_export(
+            job.kind,
+            user_id=job.requested_by_user_id,
+            site_id=job.site_id,
+            export_file=export_file,
+            job_id=job.id,
+        )
+        _notify_export_ready(job)
+
+        db.session.commit()
+
+        current_app.logger.info(
+            "EXPORT_JOB_DONE id=%s kind=%s rows=%s bytes=%s duration_s=%.2f",
+            job.id,
+            job.kind,
+            job.row_count,
+            job.size_bytes,
+            time.monotonic() - started,
+        )
+        return True
+
+    except Exception as exc:
+        db.session.rollback()
+
+        current_app.logger.exception("EXPORT_JOB_FAILED id=%s", job_id)
+
+        max_attempts = max(int(current_app.config.get("EXPORT_JOB_MAX_ATTEMPTS") or 2), 1)
+        job = db.session.get(ExportJob, job_id)
+
+        if job is not None and job.status == EXPORT_STATUS_RUNNING and job.claimed_by == worker_id:
+            retry = int(job.attempts or 0) < max_attempts and isinstance(exc, OperationalError)
+
+            job.status = EXPORT_STATUS_PENDING if retry else EXPORT_STATUS_FAILED
+            job.finished_at = None if retry else datetime.utcnow()
+            job.last_error = str(exc)[:2000]
+            db.session.commit()
+        else:
+            db.session.rollback()
+
+        return False
+
+
+def purge_expired_exports(limit: int = 100) -> int:
+    """
+    Elimina los archivos de exportaciones vencidas (el registro se
+    conserva como historial).
+    """
+    jobs = (
+        ExportJob.query
+        .filter(
+            ExportJob.status == EXPORT_STATUS_DONE,
+            ExportJob.expires_at < datetime.utcnow(),
+            db.or_(ExportJob.storage_key.isnot(None), ExportJob.local_path.isnot(None)),
+        )
+        .order_by(ExportJob.expires_at.asc())
+        .limit(limit)
+        .all()
+    )
+
+    for job in jobs:
+        try:
+            if job.storage_key:
+                get_storage().delete_object(job.storage_key)
+
+            if job.local_path and os.path.exists(job.local_path):
+                os.remove(job.local_path)
+        except Exception:
+            current_app.logger.exception("EXPORT_PURGE_FAILED id=%s", job.id)
+            continue
+
+        job.storage_key = None
+        job.local_path = None
+
+    if jobs:
+        db.session.commit()
+    else:
+        db.session.rollback()
+
+    return len(jobs)
+
+
+@scheduled_job("exports_maintenance", every_seconds=300)
+def maintain_export_jobs() -> dict:
+    """
+    Trabajos RUNNING huérfanos y archivos vencidos. Lo ejecuta el
+    scheduler en un solo proceso, ya no el bucle del worker.
+    """
+    return {
+        "requeued": _requeue_stale_export_jobs(datetime.utcnow()),
+        "purged": purge_expired_exports(),
+    }
+
+
+def run_export_worker(*, once: bool = False) -> None:
+    """
+    Bucle del proceso export_worker.py (requiere app context).
+    También procesa las sesiones de carga masiva
+    (app/services/import_sessions.py) cuando no hay exportaciones.
+    """
+    from app.services.import_sessions import run_pending_import_sessions
+
+    worker_id = _worker_id()
+    poll_seconds = max(int(current_app.config.get("EXPORT_WORKER_POLL_SECONDS") or 3), 1)
+
+    current_app.logger.info("EXPORT_WORKER_STARTED worker=%s", worker_id)
+
+    while True:
+        try:
+            job = claim_next_export_job(worker_id)
+
+            if job is not None:
+                run_export_job(job)
+            elif run_pending_import_sessions(worker_id):
+                continue
+            elif once:
+                return
+            else:
+                time.sleep(poll_seconds)
+
+        except (OperationalError, ProgrammingError):
+            db.session.rollback()
+            current_app.logger.exception("EXPORT_WORKER_DB_ERROR")
+            time.sleep(poll_seconds)
+
+        finally:
+            # Cada trabajo con una sesión limpia.
+            db.session.remove()
@@ -0,0 +1,75 @@
+# app/services/images.py
+"""
+Versiones reducidas de las fotos de movimientos.
+
+Cada foto original se acompaña de:
+- web:   lado mayor acotado, para ver en pantalla.
+- thumb: miniatura para las grillas del inventario.
+
+Las versiones se generan en JPEG sin metadatos EXIF (ubicación GPS,
+modelo del teléfono, etc.). La orientación EXIF se aplica antes de
+descartarla para que la imagen no quede rotada. El original se
+conserva intacto como evidencia.
+"""
+
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Fotos de teléfono ~12-50 MP. Se rechaza cualquier cosa absurda
+# (posible "decompression bomb").
+Image.MAX_IMAGE_PIXELS = 80_000_000
+
+PHOTO_VARIANTS = {
+    # nombre: (lado mayor en px, calidad JPEG)
+    "web": (1600, 82),
+    "thumb": (320, 72),
+}
+
+
+def build_photo_variants(source) -> dict[str, BytesIO]:
+    """
+    Genera las versiones definidas en PHOTO_VARIANTS.
+
+    source: ruta o file-like de la imagen original.
+    Retorna {nombre: BytesIO JPEG} listo para subir.
+    """
+    largest = max(size for size, _quality in PHOTO_VARIANTS.values())
+
+    with Image.open(source) as img:
+        # En JPEG permite decodificar directamente a una escala menor,
+        # evitando cargar la foto completa en memoria.
+        img.draft("RGB", (largest, largest))
+
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        variants: dict[str, BytesIO] = {}
+
+        # De mayor a menor: cada versión se reduce desde la anterior.
+        current = img
+
+        for name, (max_px, quality) in sorted(
+            PHOTO_VARIANTS.items(),
+            key=lambda item: item[1][0],
+            reverse=True,
+        ):
+            current = current.copy()
+            current.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
+
+            buf = BytesIO()
+            # Sin exif=...: el archivo resultante no lleva metadatos.
+            current.save(
+                buf,
+                format="JPEG",
+                quality=quality,
+                optimize=True,
+                progressive=True,
+            )
+            buf.seek(0)
+
+            variants[name] = buf
+
+    return variants
@@ -0,0 +1,797 @@
+# app/services/import_sessions.py
+"""
+Cargas masivas con vista previa y avance en vivo.
+
+Las cargas grandes (choferes/cabezales, inventario) se procesaban
+dentro de la petición: el usuario no veía nada hasta el final y el
+timeout de Gunicorn (120 s) podía cortar la carga a la mitad.
+
+Ahora cada carga es una ImportSession:
+
+1. La petición guarda el Excel (R2 o disco local), crea la sesión
+   (PREVIEW / PENDING) y redirige a su pantalla.
+2. Un worker la toma, lee el Excel UNA vez, guarda las filas
+   normalizadas (JSON comprimido) y calcula la simulación: filas que
+   se crean, actualizan u omiten y errores por fila. La simulación
+   ejecuta el mismo SQL que la carga real y hace ROLLBACK.
+3. El usuario revisa la simulación y confirma: la sesión pasa a
+   COMMIT / PENDING y el worker aplica las filas guardadas en una
+   sola transacción, junto con el estado DONE de la sesión.
+
+El avance se escribe en la sesión con una conexión aparte (no se
+mezcla con la transacción de la carga) y la pantalla lo recibe por
+SSE (/api/imports/<id>/events).
+
+Worker: con EXPORT_ASYNC=true lo ejecuta export_worker.py (el mismo
+proceso de las exportaciones); si no, un thread del proceso web.
+
+Cada tipo de carga se registra con register_import() junto a su
+importador:
+
+    parse(stream, ctx) -> payload          sin base de datos
+    preview(payload, ctx) -> dict          simulación, sin COMMIT
+    commit(payload, ctx) -> dict           aplica, sin COMMIT
+
+ctx es un ImportContext (predio, usuario, opciones, progress).
+"""
+
+import atexit
+import gzip
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from typing import Any, Callable
+
+from flask import current_app
+
+from app.extensions import db
+from app.models.dispatch import UserNotification
+from app.models.import_session import ImportSession
+from app.services.audit import audit_log
+from app.services.scheduler import scheduled_job
+from app.services.storage import get_storage, import_key
+
+IMPORT_STAGE_PREVIEW = "PREVIEW"
+IMPORT_STAGE_COMMIT = "COMMIT"
+
+IMPORT_STATUS_PENDING = "PENDING"
+IMPORT_STATUS_RUNNING = "RUNNING"
+IMPORT_STATUS_READY = "READY"
+IMPORT_STATUS_DONE = "DONE"
+IMPORT_STATUS_FAILED = "FAILED"
+IMPORT_STATUS_CANCELLED = "CANCELLED"
+IMPORT_STATUS_EXPIRED = "EXPIRED"
+
+IMPORT_ACTIVE_STATUSES = (IMPORT_STATUS_PENDING, IMPORT_STATUS_RUNNING)
+
+
+class ImportAbort(Exception):
+    """
+    Error esperado de un importador (archivo inválido, datos que
+    cambiaron desde la simulación). El mensaje se muestra al usuario.
+    """
+
+
+# =========================================================
+# Registro de tipos de carga
+# =========================================================
+
+@dataclass(frozen=True)
+class ImportKind:
+    name: str
+    label: str
+    parse: Callable
+    preview: Callable
+    commit: Callable
+    # Pantalla de la carga (enlace "volver").
+    upload_endpoint: str | None = None
+    # Errores del importador cuyo mensaje se muestra tal cual.
+    user_errors: tuple = ()
+
+
+_IMPORT_KINDS: dict[str, ImportKind] = {}
+
+
+def register_import(
+    kind: str,
+    *,
+    label: str,
+    parse: Callable,
+    preview: Callable,
+    commit: Callable,
+    upload_endpoint: str | None = None,
+    user_errors: tuple = (),
+) -> None:
+    _IMPORT_KINDS[kind] = ImportKind(
+        name=kind,
+        label=label,
+        parse=parse,
+        preview=preview,
+        commit=commit,
+        upload_endpoint=upload_endpoint,
+        user_errors=tuple(user_errors),
+    )
+
+
+def get_import_kind(kind: str) -> ImportKind | None:
+    return _IMPORT_KINDS.get(kind)
+
+
+def import_kind_label(kind: str) -> str:
+    spec = _IMPORT_KINDS.get(kind)
+    return spec.label if spec else kind
+
+
+# =========================================================
+# Simulación
+# =========================================================
+
+PREVIEW_ACTIONS = ("CREATE", "UPDATE", "SKIP", "ERROR")
+
+
+def build_preview(
+    *,
+    summary: dict[str, Any],
+    rows: list[dict[str, Any]],
+    errors: list[dict[str, Any]],
+    total_rows: int,
+    can_commit: bool,
+) -> dict[str, Any]:
+    """
+    Formato común de la simulación que guarda la sesión:
+
+        rows    [{"row", "action", "key", "detail"}, ...]
+                action: CREATE | UPDATE | SKIP | ERROR
+        errors  [{"row", "message"}, ...]
+
+    Las listas se recortan a IMPORT_PREVIEW_ROWS; los totales quedan
+    en summary, row_total y error_count.
+    """
+    try:
+        limit = max(int(current_app.config.get("IMPORT_PREVIEW_ROWS") or 500), 1)
+    except (TypeError, ValueError):
+        limit = 500
+
+    actions = {action: 0 for action in PREVIEW_ACTIONS}
+
+    for row in rows:
+        actions[row["action"]] = actions.get(row["action"], 0) + 1
+
+    errors = sorted(errors, key=lambda error: error.get("row") or 0)
+
+    return {
+        "summary": summary,
+        "actions": actions,
+        "total_rows": int(total_rows or 0),
+        "rows": rows[:limit],
+        "row_total": len(rows),
+        "errors": errors[:limit],
+        "error_count": len(errors),
+        "can_commit": bool(can_commit),
+    }
+
+
+# =========================================================
+# Avance
+# =========================================================
+
+class ImportProgress:
+    """
+    progress(phase, done, total): guarda el avance en la sesión con
+    una conexión y transacción propias, como mucho cada min_interval
+    segundos salvo que cambie la fase.
+    """
+
+    def __init__(self, session_id: int | None, min_interval: float = 0.5):
+        self.session_id = session_id
+        self.min_interval = min_interval
+        self._phase = None
+        self._last_write = 0.0
+
+    def __call__(self, phase: str, done: int = 0, total: int = 0, *, force: bool = False) -> None:
+        if self.session_id is None:
+            return
+
+        now = time.monotonic()
+
+        if (
+            not force
+            and phase == self._phase
+            and now - self._last_write < self.min_interval
+        ):
+            return
+
+        self._phase = phase
+        self._last_write = now
+
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    db.text("""
+                        UPDATE yard_gate_alamo.import_sessions
+                        SET progress_phase = :phase,
+                            progress_done = :done,
+                            progress_total = :total,
+                            updated_at = :now
+                        WHERE id = :id
+                    """),
+                    {
+                        "id": self.session_id,
+                        "phase": (phase or "")[:40],
+                        "done": int(done or 0),
+                        "total": int(total or 0),
+                        "now": datetime.utcnow(),
+                    },
+                )
+        except Exception:
+            # El avance es informativo: nunca interrumpe la carga.
+            current_app.logger.exception("IMPORT_PROGRESS_FAILED id=%s", self.session_id)
+
+
+def _no_progress(phase: str, done: int = 0, total: int = 0, *, force: bool = False) -> None:
+    return None
+
+
+@dataclass
+class ImportContext:
+    site_id: int | None
+    user_id: int | None
+    params: dict = field(default_factory=dict)
+    progress: Callable = _no_progress
+
+
+# =========================================================
+# Archivos (Excel subido y filas normalizadas)
+# =========================================================
+
+def _use_r2() -> bool:
+    return (current_app.config.get("STORAGE_PROVIDER") or "").lower() == "r2"
+
+
+def _local_import_dir() -> str:
+    path = (
+        current_app.config.get("IMPORT_LOCAL_DIR")
+        or os.path.join(tempfile.gettempdir(), "yard_imports")
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _store_blob(session: ImportSession, filename: str, fileobj) -> str:
+    if session.storage == "R2":
+        key = import_key(session.id, filename)
+        get_storage().upload_fileobj(fileobj, key)
+        return key
+
+    name = os.path.basename(import_key(session.id, filename))
+    path = os.path.join(_local_import_dir(), f"{session.id}_{name}")
+
+    with open(path, "wb") as dst:
+        while True:
+            chunk = fileobj.read(1024 * 1024)
+            if not chunk:
+                break
+            dst.write(chunk)
+
+    return path
+
+
+def _load_blob(session: ImportSession, ref: str) -> bytes:
+    if session.storage == "R2":
+        buffer = BytesIO()
+        get_storage().download_fileobj(ref, buffer)
+        return buffer.getvalue()
+
+    with open(ref, "rb") as fh:
+        return fh.read()
+
+
+def _delete_blob(session: ImportSession, ref: str | None) -> None:
+    if not ref:
+        return
+
+    try:
+        if session.storage == "R2":
+            get_storage().delete_object(ref)
+        elif os.path.exists(ref):
+            os.remove(ref)
+    except Exception:
+        current_app.logger.exception("IMPORT_BLOB_DELETE_FAILED id=%s", session.id)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return format(value, "f")
+
+    raise TypeError(f"No serializable: {type(value).__name__}")
+
+
+def _encode_payload(payload) -> bytes:
+    """
+    Filas normalizadas -> JSON comprimido. Fechas y decimales quedan
+    como texto: el COPY de las tablas de staging los acepta así.
+    """
+    raw = json.dumps(payload, default=_json_default, ensure_ascii=False, separators=(",", ":"))
+    return gzip.compress(raw.encode("utf-8"), compresslevel=5)
+
+
+def _decode_payload(data: bytes):
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+
+# =========================================================
+# Crear, confirmar y cancelar
+# =========================================================
+
+def async_imports_enabled() -> bool:
+    # Mismo worker que las exportaciones (export_worker.py).
+    return bool(current_app.config.get("EXPORT_ASYNC"))
+
+
+def create_import_session(
+    kind: str,
+    *,
+    file_storage,
+    site_id: int | None,
+    user_id: int | None,
+    params: dict | None = None,
+) -> ImportSession:
+    """
+    Guarda el Excel subido, crea la sesión y la encola para la
+    simulación.
+    """
+    if kind not in _IMPORT_KINDS:
+        raise ValueError(f"Tipo de carga desconocido: {kind}")
+
+    session = ImportSession(
+        kind=kind,
+        stage=IMPORT_STAGE_PREVIEW,
+        status=IMPORT_STATUS_PENDING,
+        site_id=site_id,
+        requested_by_user_id=user_id,
+        params=dict(params or {}),
+        original_file_name=(file_storage.filename or "archivo.xlsx")[:255],
+        storage="R2" if _use_r2() else "LOCAL",
+        progress_phase="En cola",
+    )
+    db.session.add(session)
+    db.session.flush()
+
+    stream = getattr(file_storage, "stream", file_storage)
+
+    try:
+        stream.seek(0)
+    except (AttributeError, OSError):
+        pass
+
+    session.source_ref = _store_blob(session, session.original_file_name, stream)
+    db.session.commit()
+
+    _dispatch(session.id)
+
+    return session
+
+
+def request_import_commit(session: ImportSession) -> bool:
+    """
+    Encola la aplicación de una simulación lista. False si ya no se
+    puede confirmar (vencida, con errores bloqueantes o en curso).
+    """
+    if session.stage != IMPORT_STAGE_PREVIEW or session.status != IMPORT_STATUS_READY:
+        return False
+
+    if not (session.preview or {}).get("can_commit"):
+        return False
+
+    if session.expires_at and session.expires_at < datetime.utcnow():
+        return False
+
+    updated = (
+        db.session.query(ImportSession)
+        .filter(
+            ImportSession.id == session.id,
+            ImportSession.stage == IMPORT_STAGE_PREVIEW,
+            ImportSession.status == IMPORT_STATUS_READY,
+        )
+        .update(
+            {
+                ImportSession.stage: IMPORT_STAGE_COMMIT,
+                ImportSession.status: IMPORT_STATUS_PENDING,
+                ImportSession.progress_phase: "En cola",
+                ImportSession.progress_done: 0,
+                ImportSession.progress_total: 0,
+                ImportSession.claimed_by: None,
+                ImportSession.claimed_at: None,
+                ImportSession.updated_at: datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+
+    if not updated:
+        return False
+
+    _dispatch(session.id)
+    return True
+
+
+def cancel_import_session(session: ImportSession) -> bool:
+    if session.status not in (IMPORT_STATUS_READY, IMPORT_STATUS_PENDING):
+        return False
+
+    updated = (
+        db.session.query(ImportSession)
+        .filter(
+            ImportSession.id == session.id,
+            ImportSession.status.in_((IMPORT_STATUS_READY, IMPORT_STATUS_PENDING)),
+        )
+        .update(
+            {
+                ImportSession.status: IMPORT_STATUS_CANCELLED,
+                ImportSession.finished_at: datetime.utcnow(),
+                ImportSession.updated_at: datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+
+    if updated:
+        session = db.session.get(ImportSession, session.id)
+        _release_blobs(session)
+        db.session.commit()
+
+    return bool(updated)
+
+
+def _release_blobs(session: ImportSession) -> None:
+    _delete_blob(session, session.source_ref)
+    _delete_blob(session, session.parsed_ref)
+    session.source_ref = None
+    session.parsed_ref = None
+
+
+# =========================================================
+# Worker
+# =========================================================
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"[:120]
+
+
+def _claim(query, worker_id: str | None) -> ImportSession | None:
+    session = query.with_for_update(skip_locked=True).first()
+
+    if session is None:
+        db.session.rollback()
+        return None
+
+    session.status = IMPORT_STATUS_RUNNING
+    session.claimed_by = worker_id or _worker_id()
+    session.claimed_at = datetime.utcnow()
+    session.updated_at = session.claimed_at
+    session.attempts = int(session.attempts or 0) + 1
+    session.last_error = None
+
+    db.session.commit()
+
+    return session
+
+
+def claim_next_import_session(worker_id: str | None = None) -> ImportSession | None:
+    """
+    Reclama la sesión PENDING más antigua (FOR UPDATE SKIP LOCKED).
+    """
+    return _claim(
+        db.session.query(ImportSession)
+        .filter(ImportSession.status == IMPORT_STATUS_PENDING)
+        .order_by(ImportSession.created_at.asc(), ImportSession.id.asc()),
+        worker_id,
+    )
+
+
+def claim_import_session(session_id: int, worker_id: str | None = None) -> ImportSession | None:
+    return _claim(
+        db.session.query(ImportSession)
+        .filter(
+            ImportSession.id == session_id,
+            ImportSession.status == IMPORT_STATUS_PENDING,
+        ),
+        worker_id,
+    )
+
+
+def _notify(session: ImportSession, title: str, message: str) -> None:
+    if not session.requested_by_user_id or not session.site_id:
+        return
+
+    db.session.add(UserNotification(
+        site_id=session.site_id,
+        user_id=session.requested_by_user_id,
+        title=title,
+        message=message,
+        related_type="IMPORT_SESSION",
+        related_id=session.id,
+        is_read=False,
+        created_at=datetime.utcnow(),
+    ))
+
+
+def _run_preview(session: ImportSession, spec: ImportKind, ctx: ImportContext) -> None:
+    session_id = session.id
+
+    ctx.progress("Descargando archivo", force=True)
+    data = _load_blob(session, session.source_ref)
+
+    payload = spec.parse(BytesIO(data), ctx)
+    del data
+
+    ctx.progress("Guardando filas", force=True)
+    encoded = _encode_payload(payload)
+
+    # La simulación trabaja sobre las mismas filas (ya pasadas por
+    # JSON) que usará la carga confirmada.
+    payload = _decode_payload(encoded)
+
+    session = db.session.get(ImportSession, session_id)
+    parsed_ref = _store_blob(session, "rows.json.gz", BytesIO(encoded))
+    del encoded
+
+    try:
+        preview = spec.preview(payload, ctx)
+    finally:
+        # La simulación nunca se guarda.
+        db.session.rollback()
+
+    ttl_hours = max(int(current_app.config.get("IMPORT_SESSION_TTL_HOURS") or 24), 1)
+    now = datetime.utcnow()
+
+    session = db.session.get(ImportSession, session_id)
+    _delete_blob(session, session.source_ref)
+
+    session.source_ref = None
+    session.parsed_ref = parsed_ref
+    session.preview = preview
+    session.row_count = preview.get("total_rows")
+    session.status = IMPORT_STATUS_READY
+    session.progress_phase = "Simulación lista"
+    session.updated_at = now
+    session.expires_at = now + timedelta(hours=ttl_hours)
+
+    _notify(
+        session,
+        "Simulación de carga lista",
+        f"{spec.label}: {session.original_file_name}",
+    )
+    db.session.commit()
+
+
+def _run_commit(session: ImportSession, spec: ImportKind, ctx: ImportContext) -> None:
+    session_id = session.id
+
+    ctx.progress("Cargando filas", force=True)
+    payload = _decode_payload(_load_blob(session, session.parsed_ref))
+
+    result = spec.commit(payload, ctx)
+
+    # Datos y estado DONE en la misma transacción.
+    session = db.session.get(ImportSession, session_id)
+    now = datetime.utcnow()
+
+    session.result = result
+    session.status = IMPORT_STATUS_DONE
+    session.progress_phase = "Carga aplicada"
+    session.finished_at = now
+    session.updated_at = now
+
+    audit_log(
+        session.requested_by_user_id,
+        "BULK_IMPORT_COMMITTED",
+        "import_session",
+        session.id,
+        {"kind": session.kind, "file": session.original_file_name, "result": result},
+    )
+    _notify(
+        session,
+        "Carga masiva aplicada",
+        f"{spec.label}: {session.original_file_name}",
+    )
+    db.session.commit()
+
+    _release_blobs(session)
+    db.session.commit()
+
+
+def run_import_session(session: ImportSession) -> bool:
+    """
+    Ejecuta el paso pendiente (simulación o aplicación) de una sesión
+    ya reclamada.
+    """
+    session_id = session.id
+    started = time.monotonic()
+    spec = _IMPORT_KINDS.get(session.kind)
+
+    ctx = ImportContext(
+        site_id=session.site_id,
+        user_id=session.requested_by_user_id,
+        params=dict(session.params or {}),
+        progress=ImportProgress(session_id),
+    )
+
+    try:
+        if spec is None:
+            raise ImportAbort(f"Tipo de carga desconocido: {session.kind}")
+
+        if session.stage == IMPORT_STAGE_COMMIT:
+            _run_commit(session, spec, ctx)
+        else:
+            _run_preview(session, spec, ctx)
+
+        current_app.logger.info(
+            "IMPORT_SESSION_DONE id=%s kind=%s stage=%s duration_s=%.2f",
+            session_id,
+            session.kind,
+            session.stage,
+            time.monotonic() - started,
+        )
+        return True
+
+    except Exception as exc:
+        db.session.rollback()
+
+        if isinstance(exc, ImportAbort) or (spec and isinstance(exc, spec.user_errors)):
+            message = str(exc)
+        else:
+            current_app.logger.exception("IMPORT_SESSION_FAILED id=%s", session_id)
+            message = f"Error inesperado: {exc}"
+
+        session = db.session.get(ImportSession, session_id)
+
+        if session is not None:
+            session.status = IMPORT_STATUS_FAILED
+            session.last_error = message[:2000]
+            session.finished_at = datetime.utcnow()
+            session.updated_at = session.finished_at
+            _release_blobs(session)
+            db.session.commit()
+
+        return False
+
+
+def run_pending_import_sessions(worker_id: str | None = None) -> bool:
+    """
+    Un paso del worker: procesa una sesión pendiente si la hay.
+    """
+    session = claim_next_import_session(worker_id)
+
+    if session is None:
+        return False
+
+    run_import_session(session)
+    return True
+
+
+# =========================================================
+# Sin worker (EXPORT_ASYNC=false): thread del proceso web
+# =========================================================
+#
+# Igual que los pools de fotos y movement_facts: se crea de forma
+# perezosa y se recrea si cambia el PID.
+#
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            try:
+                workers = max(int(current_app.config.get("IMPORT_LOCAL_WORKERS") or 1), 1)
+            except (TypeError, ValueError):
+                workers = 1
+
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="import-session",
+            )
+            _executor_pid = pid
+
+            atexit.register(_executor.shutdown, wait=False)
+
+    return _executor
+
+
+def _run_local(app, session_id: int) -> None:
+    with app.app_context():
+        try:
+            session = claim_import_session(session_id)
+
+            if session is not None:
+                run_import_session(session)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("IMPORT_SESSION_LOCAL_FAILED id=%s", session_id)
+        finally:
+            db.session.remove()
+
+
+def _dispatch(session_id: int) -> None:
+    if async_imports_enabled():
+        return
+
+    app = current_app._get_current_object()
+    _get_executor().submit(_run_local, app, session_id)
+
+
+# =========================================================
+# Mantenimiento (scheduler)
+# =========================================================
+
+@scheduled_job("import_sessions_maintenance", every_seconds=300)
+def maintain_import_sessions() -> dict:
+    """
+    - PENDING/RUNNING sin avance (proceso reiniciado): FAILED.
+    - READY vencidas: EXPIRED.
+    En ambos casos se eliminan los archivos guardados.
+    """
+    now = datetime.utcnow()
+    stale_minutes = max(int(current_app.config.get("IMPORT_SESSION_STALE_MINUTES") or 30), 1)
+
+    stale = (
+        ImportSession.query
+        .filter(
+            ImportSession.status.in_(IMPORT_ACTIVE_STATUSES),
+            ImportSession.updated_at < now - timedelta(minutes=stale_minutes),
+        )
+        .all()
+    )
+
+    for session in stale:
+        session.status = IMPORT_STATUS_FAILED
+        session.last_error = "La carga se interrumpió (proceso reiniciado). Suba el archivo nuevamente."
+        session.finished_at = now
+        session.updated_at = now
+        _release_blobs(session)
+
+    expired = (
+        ImportSession.query
+        .filter(
+            ImportSession.status == IMPORT_STATUS_READY,
+            ImportSession.expires_at < now,
+        )
+        .all()
+    )
+
+    for session in expired:
+        session.status = IMPORT_STATUS_EXPIRED
+        session.finished_at = now
+        session.updated_at = now
+        _release_blobs(session)
+
+    if stale or expired:
+        db.session.commit()
+    else:
+        db.session.rollback()
+
+    return {"failed": len(stale), "expired": len(expired)}
+
@@ -0,0 +1,287 @@
+# app/services/keyset.py
+"""
+Paginación por keyset (seek) para listados grandes.
+
+OFFSET obliga a PostgreSQL a leer y descartar todas las filas de las
+páginas anteriores, y paginate() agrega un COUNT(*) sobre todo el
+filtro. Aquí cada página se pide con una condición sobre el orden del
+listado ("después de la última fila vista"), así la página 500 cuesta
+lo mismo que la primera si hay índice sobre esas columnas.
+
+- El orden se declara una vez: [(expresión, "asc" | "desc"), ...].
+  La última expresión debe ser única (normalmente id) y ninguna puede
+  ser NULL (usar coalesce en la expresión si hace falta).
+- El cursor es un token opaco firmado con SECRET_KEY con los valores
+  de la fila frontera, la dirección y el número de página.
+- El total es opcional y acotado: se cuentan como máximo total_cap
+  filas; si hay más se muestra "más de N".
+"""
+
+from datetime import date, datetime
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.sql import Select
+
+from app.extensions import db
+
+KEYSET_TOTAL_CAP = 1000
+
+_CURSOR_SALT = "keyset-cursor"
+
+
+class KeysetPage:
+    """
+    Página de resultados para las plantillas: has_prev / has_next,
+    prev_cursor / next_cursor (para ?cursor=...), page y total.
+    """
+
+    def __init__(
+        self,
+        items: list,
+        *,
+        page: int,
+        per_page: int,
+        prev_cursor: str | None,
+        next_cursor: str | None,
+        total: int | None = None,
+        total_is_estimate: bool = False,
+    ):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def pages(self) -> int | None:
+        if self.total is None or self.total_is_estimate:
+            return None
+
+        return max((self.total + self.per_page - 1) // self.per_page, 1)
+
+    @property
+    def total_label(self) -> str:
+        if self.total is None:
+            return ""
+
+        if self.total_is_estimate:
+            return f"más de {self.total}"
+
+        return str(self.total)
+
+
+# =========================================================
+# Cursor
+# =========================================================
+
+def _serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt=_CURSOR_SALT)
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+
+    return value
+
+
+def encode_cursor(values, *, direction: str, page: int) -> str:
+    return _serializer().dumps({
+        "v": [_dump_value(v) for v in values],
+        "dir": direction,
+        "p": int(page),
+    })
+
+
+def decode_cursor(token: str | None) -> dict | None:
+    """
+    None si no hay cursor o es inválido (se muestra la primera página).
+    """
+    if not token:
+        return None
+
+    try:
+        data = _serializer().loads(token)
+    except BadSignature:
+        return None
+
+    if not isinstance(data, dict) or data.get("dir") not in {"next", "prev"}:
+        return None
+
+    data["v"] = [_load_value(v) for v in data.get("v") or []]
+    return data
+
+
+# =========================================================
+# Consulta
+# =========================================================
+
+def _seek_condition(order, values, *, forward: bool):
+    """
+    Filas estrictamente después (forward) o antes de values según order.
+    """
+    directions = {d for _, d in order}
+
+    # Misma dirección en todas las columnas: comparación de filas,
+    # que PostgreSQL resuelve con el índice compuesto.
+    if len(directions) == 1:
+        descending = directions == {"desc"}
+        left = tuple_(*[expr for expr, _ in order])
+        right = tuple_(*values)
+        return left < right if descending == forward else left > right
+
+    clauses = []
+
+    for i, (expr, direction) in enumerate(order):
+        descending = direction == "desc"
+        cmp = expr < values[i] if descending == forward else expr > values[i]
+        equal = [order[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, cmp))
+
+    return or_(*clauses)
+
+
+def _order_clauses(order, *, forward: bool):
+    clauses = []
+
+    for expr, direction in order:
+        descending = direction == "desc"
+        clauses.append(expr.desc() if descending == forward else expr.asc())
+
+    return clauses
+
+
+def _fetch(stmt, *, scalars: bool):
+    if isinstance(stmt, Select):
+        result = db.session.execute(stmt)
+        return result.scalars().all() if scalars else result.all()
+
+    # Query del ORM (Model.query / db.session.query)
+    return stmt.all()
+
+
+def _capped_total(stmt, cap: int) -> tuple[int, bool]:
+    limited = stmt.order_by(None).limit(cap + 1)
+
+    if isinstance(limited, Select):
+        count = db.session.execute(
+            select(func.count()).select_from(limited.subquery())
+        ).scalar() or 0
+    else:
+        count = limited.count()
+
+    if count > cap:
+        return cap, True
+
+    return count, False
+
+
+def keyset_paginate(
+    stmt,
+    order,
+    *,
+    key,
+    cursor: str | None = None,
+    per_page: int = 50,
+    scalars: bool = False,
+    with_total: bool = True,
+    total_cap: int = KEYSET_TOTAL_CAP,
+) -> KeysetPage:
+    """
+    Pagina stmt (Select o Query del ORM) con keyset.
+
+    order: [(expresión, "asc" | "desc"), ...], la última única.
+    key:   función fila -> tupla con los valores de order.
+    scalars: para Select, devuelve .scalars() como db.paginate.
+    """
+    per_page = max(int(per_page or 1), 1)
+    state = decode_cursor(cursor)
+
+    if state is not None and len(state["v"]) != len(order):
+        state = None
+
+    total, total_is_estimate = (None, False)
+    if with_total:
+        total, total_is_estimate = _capped_total(stmt, total_cap)
+
+    forward = state is None or state["dir"] == "next"
+
+    # El orden lo pone order; se descarta el que traiga stmt.
+    page_stmt = stmt.order_by(None)
+
+    if state is not None:
+        page_stmt = page_stmt.filter(_seek_condition(order, state["v"], forward=forward))
+
+    page_stmt = page_stmt.order_by(*_order_clauses(order, forward=forward)).limit(per_page + 1)
+    rows = _fetch(page_stmt, scalars=scalars)
+
+    # Cursor que ya no apunta a nada (filas borradas): primera página.
+    if state is not None and not rows:
+        return keyset_paginate(
+            stmt,
+            order,
+            key=key,
+            per_page=per_page,
+            scalars=scalars,
+            with_total=with_total,
+            total_cap=total_cap,
+        )
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if not forward:
+        rows.reverse()
+
+    page = max(int(state["p"]), 1) if state is not None else 1
+
+    if forward:
+        has_next = has_more
+        has_prev = state is not None
+    else:
+        has_next = True
+        has_prev = has_more
+
+    prev_cursor = None
+    next_cursor = None
+
+    if rows and has_prev:
+        prev_cursor = encode_cursor(key(rows[0]), direction="prev", page=page - 1)
+
+    if rows and has_next:
+        next_cursor = encode_cursor(key(rows[-1]), direction="next", page=page + 1)
+
+    return KeysetPage(
+        list(rows),
+        page=page,
+        per_page=per_page,
+        prev_cursor=prev_cursor,
+        next_cursor=next_cursor,
+        total=total,
+        total_is_estimate=total_is_estimate,
+    )
@@ -0,0 +1,392 @@
+# app/services/movement_facts.py
+"""
+Hechos de movimientos pre-calculados para reportes y dashboards.
+
+Los reportes de movimientos resolvían por cada fila el chasis, el
+origen (EIR confirmado anterior) y el destino (EIR del Gate Out), y
+filtraban con occurred_at::date, lo que impide usar
+ix_movements_site_occurred_at. Chasis y EIR anterior ahora vienen
+enlazados en movements (ver app/services/movement_links.py).
+
+Ahora esa resolución se hace una sola vez por movimiento:
+
+1. movement_facts: una fila por GATE_IN / GATE_OUT con chasis, origen,
+   destino, tamaño, naviera y el día de Costa Rica (day).
+2. movement_daily_facts: conteos por predio / día / tipo / tamaño /
+   naviera / origen / destino, recalculados por (predio, día).
+
+Mantenimiento incremental:
+
+- El listener de la sesión (app/services/write_hooks.py) anota los
+  movimientos tocados en cada transacción. Después del COMMIT se
+  refrescan en un thread del proceso, sin demorar la petición.
+- Un barrido periódico (app/services/scheduler.py, en un solo
+  proceso del clúster) completa los movimientos que aún no tienen
+  hecho (históricos, cola llena, inserciones por SQL directo) y vuelve
+  a resolver los de las últimas MOVEMENT_FACTS_LOOKBACK_HOURS (EIR
+  confirmados después del Gate Out).
+"""
+
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+from app.extensions import db
+from app.services.scheduler import scheduled_job
+
+logger = logging.getLogger(__name__)
+
+FACT_MOVEMENT_TYPES = ("GATE_IN", "GATE_OUT")
+
+
+# =========================================================
+# SQL
+# =========================================================
+
+_UPSERT_FACTS_SQL = text("""
+    INSERT INTO yard_gate_alamo.movement_facts (
+        movement_id, site_id, occurred_at, day, movement_type,
+        container_id, container_code, size, shipping_line,
+        origin_name, destination_name, chassis_number, refreshed_at
+    )
+    SELECT
+        mv.id,
+        mv.site_id,
+        mv.occurred_at,
+        (mv.occurred_at AT TIME ZONE 'UTC' AT TIME ZONE 'America/Costa_Rica')::date,
+        mv.movement_type,
+        c.id,
+        c.code,
+        COALESCE(c.size, ''),
+        COALESCE(
+            CASE WHEN cls.id IS NOT NULL THEN cls.shipping_line
+                 ELSE cls_first.shipping_line END,
+            ''
+        ),
+
+        -- Origen del GATE_IN = destino del último EIR confirmado anterior
+        CASE WHEN mv.movement_type = 'GATE_IN'
+             THEN COALESCE(prev_eir.destination, '') ELSE '' END,
+
+        -- Destino del GATE_OUT = EIR confirmado del movimiento
+        CASE WHEN mv.movement_type = 'GATE_OUT'
+             THEN COALESCE(eir_out.destination, '') ELSE '' END,
+
+        ch.chassis_number,
+
+        :now
+
+    -- Solo movimientos con contenedor, como el reporte original: los
+    -- GATE_IN de solo chasis no cuentan en reportes ni totales.
+    FROM yard_gate_alamo.movements mv
+    JOIN yard_gate_alamo.containers c
+      ON c.id = mv.container_id
+
+    -- Naviera vigente al momento del movimiento (no la última), para
+    -- que recalcular un día dé siempre los mismos conteos. Si el
+    -- contenedor se clasificó después, la primera clasificación.
+    LEFT JOIN LATERAL (
+        SELECT cc.id, cc.shipping_line
+        FROM yard_gate_alamo.container_classifications cc
+        WHERE cc.container_id = mv.container_id
+          AND cc.classified_at <= mv.occurred_at
+        ORDER BY cc.classified_at DESC, cc.id DESC
+        LIMIT 1
+    ) cls ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT cc.shipping_line
+        FROM yard_gate_alamo.container_classifications cc
+        WHERE cc.container_id = mv.container_id
+        ORDER BY cc.classified_at ASC, cc.id ASC
+        LIMIT 1
+    ) cls_first ON cls.id IS NULL
+
+    -- Chasis y EIR anterior enlazados al escribir (movement_links)
+    LEFT JOIN yard_gate_alamo.chassis ch
+      ON ch.id = mv.chassis_id
+    LEFT JOIN yard_gate_alamo.eirs prev_eir
+      ON prev_eir.id = mv.previous_eir_id
+
+    -- EIR del GATE_OUT
+    LEFT JOIN LATERAL (
+        SELECT e.destination
+        FROM yard_gate_alamo.eirs e
+        WHERE e.gate_out_movement_id = mv.id
+          AND e.status = 'CONFIRMED'
+        ORDER BY e.id DESC
+        LIMIT 1
+    ) eir_out ON mv.movement_type = 'GATE_OUT'
+
+    WHERE mv.id = ANY(:movement_ids)
+      AND mv.movement_type IN ('GATE_IN', 'GATE_OUT')
+
+    ON CONFLICT (movement_id) DO UPDATE SET
+        site_id = EXCLUDED.site_id,
+        occurred_at = EXCLUDED.occurred_at,
+        day = EXCLUDED.day,
+        movement_type = EXCLUDED.movement_type,
+        container_id = EXCLUDED.container_id,
+        container_code = EXCLUDED.container_code,
+        size = EXCLUDED.size,
+        shipping_line = EXCLUDED.shipping_line,
+        origin_name = EXCLUDED.origin_name,
+        destination_name = EXCLUDED.destination_name,
+        chassis_number = EXCLUDED.chassis_number,
+        refreshed_at = EXCLUDED.refreshed_at
+
+    RETURNING movement_id, site_id, day
+""")
+
+# Hechos de movimientos que ya no califican (cambiaron de tipo o
+# quedaron sin contenedor).
+_DELETE_STALE_FACTS_SQL = text("""
+    DELETE FROM yard_gate_alamo.movement_facts
+    WHERE movement_id = ANY(:movement_ids)
+      AND NOT (movement_id = ANY(:kept_ids))
+""")
+
+# Serializa la reconstrucción de un (predio, día): el refresco después
+# del COMMIT y movement_facts_sweep pueden coincidir. Con el lock, el
+# DELETE del segundo ya ve lo que insertó el primero.
+_LOCK_DAILY_SQL = text("""
+    SELECT pg_advisory_xact_lock(
+        CAST(:site_id AS integer),
+        CAST(:day AS date) - DATE '2000-01-01'
+    )
+""")
+
+_DELETE_DAILY_SQL = text("""
+    DELETE FROM yard_gate_alamo.movement_daily_facts
+    WHERE site_id = :site_id
+      AND day = :day
+""")
+
+_INSERT_DAILY_SQL = text("""
+    INSERT INTO yard_gate_alamo.movement_daily_facts (
+        site_id, day, movement_type, size, shipping_line,
+        origin_name, destination_name, movement_count, refreshed_at
+    )
+    SELECT
+        f.site_id,
+        f.day,
+        f.movement_type,
+        f.size,
+        f.shipping_line,
+        f.origin_name,
+        f.destination_name,
+        COUNT(*),
+        :now
+    FROM yard_gate_alamo.movement_facts f
+    WHERE f.site_id = :site_id
+      AND f.day = :day
+    GROUP BY
+        f.site_id, f.day, f.movement_type, f.size,
+        f.shipping_line, f.origin_name, f.destination_name
+""")
+
+
+# =========================================================
+# Refresco
+# =========================================================
+
+def _rebuild_daily_facts(site_days, now: datetime) -> None:
+    for site_id, day in sorted(site_days):
+        params = {"site_id": site_id, "day": day, "now": now}
+        db.session.execute(_LOCK_DAILY_SQL, params)
+        db.session.execute(_DELETE_DAILY_SQL, params)
+        db.session.execute(_INSERT_DAILY_SQL, params)
+
+
+def refresh_movement_facts(movement_ids) -> int:
+    """
+    Recalcula los hechos de los movimientos indicados y los conteos
+    diarios de los (predio, día) afectados, incluido el día anterior
+    si el movimiento cambió de fecha.
+
+    No hace COMMIT.
+    """
+    ids = sorted({int(mid) for mid in movement_ids or [] if mid})
+
+    if not ids:
+        return 0
+
+    now = datetime.utcnow()
+
+    previous = db.session.execute(
+        text("""
+            SELECT site_id, day
+            FROM yard_gate_alamo.movement_facts
+            WHERE movement_id = ANY(:movement_ids)
+        """),
+        {"movement_ids": ids},
+    ).all()
+
+    current = db.session.execute(
+        _UPSERT_FACTS_SQL,
+        {"movement_ids": ids, "now": now},
+    ).all()
+
+    db.session.execute(
+        _DELETE_STALE_FACTS_SQL,
+        {"movement_ids": ids, "kept_ids": [r.movement_id for r in current]},
+    )
+
+    site_days = {(r.site_id, r.day) for r in previous}
+    site_days.update((r.site_id, r.day) for r in current)
+
+    _rebuild_daily_facts(site_days, now)
+
+    return len(current)
+
+
+@scheduled_job(
+    "movement_facts_sweep",
+    every_seconds=300,
+    config_key="MOVEMENT_FACTS_SWEEP_SECONDS",
+    minimum_seconds=30,
+)
+def refresh_pending_movement_facts(limit: int = 2000) -> int:
+    """
+    Completa los movimientos sin hecho (del más reciente hacia atrás,
+    así el histórico se llena por tandas) y vuelve a resolver los de
+    las últimas MOVEMENT_FACTS_LOOKBACK_HOURS.
+
+    Hace COMMIT.
+    """
+    lookback_hours = max(int(current_app.config.get("MOVEMENT_FACTS_LOOKBACK_HOURS", 48)), 1)
+    since = datetime.utcnow() - timedelta(hours=lookback_hours)
+
+    missing_ids = db.session.execute(
+        text("""
+            SELECT mv.id
+            FROM yard_gate_alamo.movements mv
+            LEFT JOIN yard_gate_alamo.movement_facts f
+              ON f.movement_id = mv.id
+            WHERE f.movement_id IS NULL
+              AND mv.movement_type IN ('GATE_IN', 'GATE_OUT')
+              AND mv.container_id IS NOT NULL
+            ORDER BY mv.id DESC
+            LIMIT :limit
+        """),
+        {"limit": int(limit)},
+    ).scalars().all()
+
+    recent_ids = db.session.execute(
+        text("""
+            SELECT mv.id
+            FROM yard_gate_alamo.movements mv
+            WHERE mv.occurred_at >= :since
+              AND mv.movement_type IN ('GATE_IN', 'GATE_OUT')
+            ORDER BY mv.id DESC
+            LIMIT :limit
+        """),
+        {"since": since, "limit": int(limit)},
+    ).scalars().all()
+
+    refreshed = refresh_movement_facts(set(missing_ids) | set(recent_ids))
+    db.session.commit()
+
+    if missing_ids:
+        logger.info("MOVEMENT_FACTS_BACKFILL rows=%s", len(missing_ids))
+
+    return refreshed
+
+
+def backfill_movement_facts(batch_size: int = 2000) -> int:
+    """
+    Recalcula los hechos de todos los movimientos por rangos de id
+    (p. ej. después de backfill_movement_links). Hace COMMIT por lote.
+    """
+    max_id = db.session.execute(
+        text("SELECT COALESCE(MAX(id), 0) FROM yard_gate_alamo.movements")
+    ).scalar() or 0
+
+    refreshed = 0
+    after_id = 0
+
+    while after_id < max_id:
+        upto_id = after_id + batch_size
+        refreshed += refresh_movement_facts(range(after_id + 1, upto_id + 1))
+        db.session.commit()
+
+        logger.info("MOVEMENT_FACTS_BACKFILL upto_id=%s refreshed=%s", upto_id, refreshed)
+        after_id = upto_id
+
+    return refreshed
+
+
+# =========================================================
+# Thread de refresco (uno por proceso)
+# =========================================================
+#
+# Gunicorn hace fork de los workers: el pool se crea de forma
+# perezosa y se recrea si cambia el PID, nunca se hereda del master.
+# Un solo thread basta: cada tarea es un INSERT ... SELECT acotado.
+#
+_executor = None
+_executor_pid = None
+_executor_slots = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid, _executor_slots
+
+    pid = os.getpid()
+
+    if _executor is not None and _executor_pid == pid:
+        return _executor, _executor_slots
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="movement-facts",
+            )
+            _executor_slots = threading.BoundedSemaphore(32)
+            _executor_pid = pid
+
+            atexit.register(_executor.shutdown, wait=True)
+
+    return _executor, _executor_slots
+
+
+def _refresh_task(app, movement_ids) -> None:
+    with app.app_context():
+        try:
+            refresh_movement_facts(movement_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("MOVEMENT_FACTS_REFRESH_FAILED ids=%s", sorted(movement_ids or [])[:20])
+        finally:
+            db.session.remove()
+
+
+def enqueue_movement_facts_refresh(movement_ids) -> bool:
+    """
+    Envía el refresco al thread del proceso. Si la cola está llena no
+    hace nada: el barrido periódico recoge esos movimientos.
+    """
+    ids = {int(mid) for mid in movement_ids or [] if mid}
+
+    if not ids:
+        return False
+
+    app = current_app._get_current_object()
+    executor, slots = _get_executor()
+
+    if not slots.acquire(blocking=False):
+        logger.warning("MOVEMENT_FACTS_QUEUE_FULL ids=%s", len(ids))
+        return False
+
+    future = executor.submit(_refresh_task, app, ids)
+    future.add_done_callback(lambda _f: slots.release())
+
+    return True
@@ -0,0 +1,170 @@
+# app/services/movement_links.py
+"""
+Relaciones desnormalizadas que antes se resolvían con LATERAL en cada
+reporte:
+
+- movements.chassis_id: chasis del GATE_IN (última lectura de llantas
+  del evento) o del GATE_OUT (EIR confirmado del movimiento).
+- movements.previous_eir_id: para GATE_IN, el último EIR confirmado del
+  contenedor anterior al movimiento (su destino es el origen).
+- chassis.last_confirmed_eir_id: último EIR confirmado del chasis.
+
+Se mantienen al escribir: el listener de la sesión (ver
+app/services/write_hooks.py) llama a link_movements() y
+refresh_chassis_last_eir() antes del COMMIT, dentro de la misma
+transacción. backfill_links.py completa el histórico una sola vez.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+# =========================================================
+# SQL
+# =========================================================
+
+def _link_movements_sql(where_sql: str):
+    return text(f"""
+        UPDATE yard_gate_alamo.movements mv
+        SET
+            chassis_id = CASE mv.movement_type
+                WHEN 'GATE_IN' THEN (
+                    SELECT tr.chassis_id
+                    FROM yard_gate_alamo.tire_readings tr
+                    WHERE tr.event_type = 'GATE_IN'
+                      AND tr.event_id = mv.id
+                      AND tr.chassis_id IS NOT NULL
+                    ORDER BY tr.recorded_at DESC NULLS LAST, tr.id DESC
+                    LIMIT 1
+                )
+                WHEN 'GATE_OUT' THEN (
+                    SELECT e.chassis_id
+                    FROM yard_gate_alamo.eirs e
+                    WHERE e.gate_out_movement_id = mv.id
+                      AND e.status = 'CONFIRMED'
+                    ORDER BY e.id DESC
+                    LIMIT 1
+                )
+                ELSE mv.chassis_id
+            END,
+            previous_eir_id = CASE mv.movement_type
+                WHEN 'GATE_IN' THEN (
+                    SELECT e_prev.id
+                    FROM yard_gate_alamo.eirs e_prev
+                    WHERE e_prev.container_id = mv.container_id
+                      AND e_prev.status = 'CONFIRMED'
+                      AND COALESCE(e_prev.inventory_out_at, e_prev.finalized_at, e_prev.created_at) < mv.occurred_at
+                    ORDER BY
+                      COALESCE(e_prev.inventory_out_at, e_prev.finalized_at, e_prev.created_at) DESC,
+                      e_prev.id DESC
+                    LIMIT 1
+                )
+                ELSE NULL
+            END
+        WHERE {where_sql}
+          AND mv.movement_type IN ('GATE_IN', 'GATE_OUT')
+    """)
+
+
+def _link_chassis_sql(where_sql: str):
+    return text(f"""
+        UPDATE yard_gate_alamo.chassis c
+        SET last_confirmed_eir_id = (
+            SELECT e.id
+            FROM yard_gate_alamo.eirs e
+            WHERE e.chassis_id = c.id
+              AND e.status = 'CONFIRMED'
+            ORDER BY
+                e.inventory_out_at DESC NULLS LAST,
+                e.finalized_at DESC NULLS LAST,
+                e.trip_date DESC,
+                e.id DESC
+            LIMIT 1
+        )
+        WHERE {where_sql}
+    """)
+
+
+_LINK_MOVEMENTS_BY_IDS_SQL = _link_movements_sql("mv.id = ANY(:ids)")
+_LINK_MOVEMENTS_BY_RANGE_SQL = _link_movements_sql("mv.id > :after_id AND mv.id <= :upto_id")
+
+_LINK_CHASSIS_BY_IDS_SQL = _link_chassis_sql("c.id = ANY(:ids)")
+_LINK_CHASSIS_BY_RANGE_SQL = _link_chassis_sql("c.id > :after_id AND c.id <= :upto_id")
+
+
+# =========================================================
+# Escritura
+# =========================================================
+
+def _clean_ids(ids) -> list[int]:
+    return sorted({int(i) for i in ids or [] if i})
+
+
+def link_movements(movement_ids) -> int:
+    """
+    Recalcula chassis_id / previous_eir_id de los movimientos indicados.
+    No hace COMMIT.
+    """
+    ids = _clean_ids(movement_ids)
+
+    if not ids:
+        return 0
+
+    return db.session.execute(_LINK_MOVEMENTS_BY_IDS_SQL, {"ids": ids}).rowcount or 0
+
+
+def refresh_chassis_last_eir(chassis_ids) -> int:
+    """
+    Recalcula last_confirmed_eir_id de los chasis indicados.
+    No hace COMMIT.
+    """
+    ids = _clean_ids(chassis_ids)
+
+    if not ids:
+        return 0
+
+    return db.session.execute(_LINK_CHASSIS_BY_IDS_SQL, {"ids": ids}).rowcount or 0
+
+
+# =========================================================
+# Backfill (una sola vez, por rangos de id)
+# =========================================================
+
+def _backfill_by_range(table: str, stmt, batch_size: int) -> int:
+    max_id = db.session.execute(
+        text(f"SELECT COALESCE(MAX(id), 0) FROM yard_gate_alamo.{table}")
+    ).scalar() or 0
+
+    updated = 0
+    after_id = 0
+
+    while after_id < max_id:
+        upto_id = after_id + batch_size
+
+        updated += db.session.execute(
+            stmt,
+            {"after_id": after_id, "upto_id": upto_id},
+        ).rowcount or 0
+
+        # Lotes cortos: no retiene locks sobre toda la tabla.
+        db.session.commit()
+
+        logger.info("LINKS_BACKFILL table=%s upto_id=%s updated=%s", table, upto_id, updated)
+        after_id = upto_id
+
+    return updated
+
+
+def backfill_movement_links(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    return _backfill_by_range("movements", _LINK_MOVEMENTS_BY_RANGE_SQL, batch_size)
+
+
+def backfill_chassis_last_eir(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    return _backfill_by_range("chassis", _LINK_CHASSIS_BY_RANGE_SQL, batch_size)
@@ -1,9 +1,13 @@
 from datetime import datetime
 
+from flask import current_app
+from sqlalchemy import text
+
 from app.extensions import db
 from app.models.dispatch import UserNotification
 from app.models.user import User
 from app.models.site import UserSite
+from app.services.scheduler import scheduled_job
 
 
 def _normalize_roles(roles):
@@ -85,8 +89,6 @@ def create_notifications_for_roles(
 
         db.session.add(notification)
         created.append(notification)
-        db.session.flush()
-        trim_user_notifications(user.id, site_id, keep=20)
 
     return created
 
@@ -110,19 +112,46 @@ def notification_url(notification):
     if related_type == "EMPTY_LIST":
         return "inventory.evacuation_list", {}
 
-    return None, {}
+    if related_type == "EXPORT_READY" and related_id:
+        return "yard.export_job_view", {"job_id": related_id}
 
-def trim_user_notifications(user_id: int, site_id: int, keep: int = 20):
-    old_rows = (
-        UserNotification.query
-        .filter(
-            UserNotification.user_id == user_id,
-            UserNotification.site_id == site_id,
-        )
-        .order_by(UserNotification.created_at.desc(), UserNotification.id.desc())
-        .offset(keep)
-        .all()
-    )
+    if related_type == "IMPORT_SESSION" and related_id:
+        return "yard.import_session_view", {"session_id": related_id}
+
+    return None, {}
 
-    for row in old_rows:
-        db.session.delete(row)
\ No newline at end of file
+# =========================================================
+# Recorte periódico (scheduler)
+# =========================================================
+#
+# Antes se recortaba usuario por usuario al crear cada notificación
+# (un SELECT + DELETE por destinatario). Ahora un solo DELETE por
+# conjunto deja las últimas NOTIFICATIONS_KEEP por usuario / predio.
+#
+_TRIM_NOTIFICATIONS_SQL = text("""
+    DELETE FROM yard_gate_alamo.user_notifications un
+    USING (
+        SELECT id
+        FROM (
+            SELECT
+                id,
+                row_number() OVER (
+                    PARTITION BY user_id, site_id
+                    ORDER BY created_at DESC, id DESC
+                ) AS rn
+            FROM yard_gate_alamo.user_notifications
+        ) ranked
+        WHERE ranked.rn > :keep
+    ) old
+    WHERE un.id = old.id
+""")
+
+
+@scheduled_job("notifications_trim", every_seconds=3600)
+def trim_notifications() -> int:
+    keep = max(int(current_app.config.get("NOTIFICATIONS_KEEP", 20)), 1)
+
+    deleted = db.session.execute(_TRIM_NOTIFICATIONS_SQL, {"keep": keep}).rowcount
+    db.session.commit()
+
+    return deleted
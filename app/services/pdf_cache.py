@@ -0,0 +1,232 @@
+# app/services/pdf_cache.py
+"""
+Caché de PDFs por contenido.
+
+La prelista, la lista de evacuación y el EIR se reconstruían con
+ReportLab en cada clic aunque los datos no hubieran cambiado. Aquí la
+llave es el SHA-256 de (tipo, versión de la plantilla, filas de
+entrada): mismos datos → mismo PDF, sin volver a dibujarlo.
+
+Niveles:
+
+1. Disco local (PDF_CACHE_DIR), LRU por tamaño total
+   (PDF_CACHE_MAX_MB): un acierto actualiza el mtime y al guardar se
+   borran los archivos más viejos hasta quedar bajo el límite.
+2. R2 (STORAGE_PROVIDER=r2): pdf-cache/{tipo}/{sha256}.pdf, compartido
+   entre instancias y el export_worker. La expiración se deja a una
+   regla de ciclo de vida del bucket sobre el prefijo pdf-cache/.
+
+Al cambiar el dibujo de un PDF se sube su versión: las llaves viejas
+dejan de usarse y el LRU las elimina.
+
+La caché nunca interrumpe la generación: cualquier error de disco o
+R2 se registra y el PDF se dibuja igual.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+from botocore.exceptions import ClientError
+from flask import current_app
+
+from app.services.storage import get_storage, pdf_cache_key
+
+logger = logging.getLogger(__name__)
+
+_lru_lock = threading.Lock()
+
+
+def pdf_content_key(kind: str, version: int | str, payload) -> str:
+    """
+    SHA-256 de las entradas exactas del PDF. payload debe contener
+    todo lo que se dibuja (filas, filtros, encabezados).
+    """
+    raw = json.dumps(
+        {"kind": kind, "version": str(version), "payload": payload},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# =========================================================
+# Disco local (LRU)
+# =========================================================
+
+def _cache_dir() -> str:
+    path = (
+        current_app.config.get("PDF_CACHE_DIR")
+        or os.path.join(tempfile.gettempdir(), "yard_pdf_cache")
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _max_bytes() -> int:
+    return max(int(current_app.config.get("PDF_CACHE_MAX_MB") or 200), 1) * 1024 * 1024
+
+
+def _local_path(kind: str, digest: str) -> str:
+    return os.path.join(_cache_dir(), f"{kind.lower()}_{digest}.pdf")
+
+
+def _read_local(kind: str, digest: str) -> bytes | None:
+    path = _local_path(kind, digest)
+
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+    except FileNotFoundError:
+        return None
+
+    # LRU: el último uso es el mtime
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+    return data
+
+
+def _evict_local() -> None:
+    directory = _cache_dir()
+    limit = _max_bytes()
+
+    with _lru_lock:
+        entries = []
+        total = 0
+
+        for entry in os.scandir(directory):
+            if not entry.is_file() or not entry.name.endswith(".pdf"):
+                continue
+
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total <= limit:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            total -= size
+            if total <= limit:
+                break
+
+
+def _write_local(kind: str, digest: str, data: bytes) -> None:
+    path = _local_path(kind, digest)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+
+    # Atómico: otra petición nunca lee un PDF a medias.
+    os.replace(tmp_path, path)
+
+    _evict_local()
+
+
+# =========================================================
+# R2
+# =========================================================
+
+def _use_r2() -> bool:
+    return (current_app.config.get("STORAGE_PROVIDER") or "").lower() == "r2"
+
+
+def _read_r2(kind: str, digest: str) -> bytes | None:
+    buffer = BytesIO()
+
+    try:
+        get_storage().download_fileobj(pdf_cache_key(kind, digest), buffer)
+    except ClientError as exc:
+        code = str(exc.response.get("Error", {}).get("Code", ""))
+        if code in {"404", "NoSuchKey", "NotFound"}:
+            return None
+        raise
+
+    return buffer.getvalue()
+
+
+def _write_r2(kind: str, digest: str, data: bytes) -> None:
+    get_storage().upload_fileobj(
+        BytesIO(data),
+        pdf_cache_key(kind, digest),
+        content_type="application/pdf",
+    )
+
+
+# =========================================================
+# API
+# =========================================================
+
+def get_cached_pdf(kind: str, digest: str) -> bytes | None:
+    try:
+        data = _read_local(kind, digest)
+        if data is not None:
+            return data
+    except OSError:
+        logger.exception("PDF_CACHE_LOCAL_READ_FAILED kind=%s", kind)
+
+    if not _use_r2():
+        return None
+
+    try:
+        data = _read_r2(kind, digest)
+    except Exception:
+        logger.exception("PDF_CACHE_R2_READ_FAILED kind=%s", kind)
+        return None
+
+    if data is not None:
+        # Próximo acierto en esta instancia sin ir a R2
+        try:
+            _write_local(kind, digest, data)
+        except OSError:
+            logger.exception("PDF_CACHE_LOCAL_WRITE_FAILED kind=%s", kind)
+
+    return data
+
+
+def store_cached_pdf(kind: str, digest: str, data: bytes) -> None:
+    try:
+        _write_local(kind, digest, data)
+    except OSError:
+        logger.exception("PDF_CACHE_LOCAL_WRITE_FAILED kind=%s", kind)
+
+    if not _use_r2():
+        return
+
+    try:
+        _write_r2(kind, digest, data)
+    except Exception:
+        logger.exception("PDF_CACHE_R2_WRITE_FAILED kind=%s", kind)
+
+
+def cached_pdf(kind: str, version: int | str, payload, render) -> bytes:
+    """
+    PDF para payload: desde la caché si existe; si no, render()
+    (sin argumentos, devuelve bytes) y se guarda.
+    """
+    digest = pdf_content_key(kind, version, payload)
+
+    data = get_cached_pdf(kind, digest)
+    if data is not None:
+        logger.debug("PDF_CACHE_HIT kind=%s key=%s", kind, digest[:12])
+        return data
+
+    data = render()
+    store_cached_pdf(kind, digest, data)
+
+    return data
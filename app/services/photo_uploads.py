@@ -0,0 +1,630 @@
+# app/services/photo_uploads.py
+"""
+Subida de fotos de movimientos en segundo plano.
+
+Gate In / Gate Out ya no suben las fotos a R2 dentro de la petición:
+
+1. La foto se copia a disco local (spool) y se registra un
+   MovementPhoto en estado PENDING dentro de la misma transacción
+   del movimiento.
+2. Después del COMMIT se encola su id en un pool acotado de threads
+   del proceso Gunicorn.
+3. El thread sube el archivo a R2 junto con sus versiones reducidas
+   (web / thumb, ver app/services/images.py), completa las URLs y marca
+   la foto UPLOADED. Si falla tras varios intentos queda en RETRY.
+   Si el archivo temporal no existe (no se pudo guardar o se perdió
+   con el servidor) queda en FAILED: no hay nada que reintentar y la
+   foto debe subirse de nuevo.
+   Antes de subir se consulta el índice de contenido (SHA-256, ver
+   app/services/content_index.py): si la misma foto ya existe en R2,
+   la fila apunta al objeto existente y no se vuelve a subir.
+4. Un barrido periódico (app/services/scheduler.py, en cada proceso)
+   vuelve a encolar las fotos RETRY y las que quedaron abandonadas
+   por un worker reciclado.
+"""
+
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_
+
+from app.extensions import db
+from app.models.movement import MovementPhoto
+from app.services.scheduler import scheduled_job
+from app.services.content_index import (
+    HashingWriter,
+    copy_and_hash,
+    find_stored_object,
+    register_stored_object,
+)
+from app.services.images import build_photo_variants
+from app.services.storage import get_storage, build_photo_key, derived_photo_key
+
+logger = logging.getLogger(__name__)
+
+PHOTO_STATUS_PENDING = "PENDING"
+PHOTO_STATUS_UPLOADING = "UPLOADING"
+PHOTO_STATUS_UPLOADED = "UPLOADED"
+PHOTO_STATUS_RETRY = "RETRY"
+PHOTO_STATUS_FAILED = "FAILED"
+
+_CLAIMABLE_STATUSES = (PHOTO_STATUS_PENDING, PHOTO_STATUS_RETRY)
+
+
+# =========================================================
+# Pool de subida (uno por proceso)
+# =========================================================
+#
+# Gunicorn hace fork de los workers: el pool se crea de forma
+# perezosa y se recrea si cambia el PID, nunca se hereda del master.
+#
+_executor = None
+_executor_pid = None
+_executor_slots = None
+_executor_lock = threading.Lock()
+
+
+def _config_int(name: str, default: int, minimum: int = 1) -> int:
+    try:
+        value = int(current_app.config.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+
+    return max(value, minimum)
+
+
+def _get_executor():
+    global _executor, _executor_pid, _executor_slots
+
+    pid = os.getpid()
+
+    if _executor is not None and _executor_pid == pid:
+        return _executor, _executor_slots
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            workers = _config_int("PHOTO_UPLOAD_WORKERS", 2)
+            queue_limit = _config_int("PHOTO_UPLOAD_QUEUE_LIMIT", 64)
+
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="photo-upload",
+            )
+            _executor_slots = threading.BoundedSemaphore(queue_limit)
+            _executor_pid = pid
+
+            # Permite terminar las subidas en curso durante el
+            # graceful shutdown del worker.
+            atexit.register(_executor.shutdown, wait=True)
+
+    return _executor, _executor_slots
+
+
+# =========================================================
+# Spool local
+# =========================================================
+
+def _spool_dir() -> str:
+    path = (current_app.config.get("PHOTO_SPOOL_DIR") or "").strip()
+
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), "yard_gate_photo_spool")
+
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
+
+def _spool_fileobj(fileobj, filename: str) -> tuple[str, str, int]:
+    """
+    Copia la foto al spool calculando su SHA-256 en la misma pasada.
+
+    Retorna (ruta, sha256, tamaño).
+    """
+    ext = (filename.rsplit(".", 1)[-1] if "." in filename else "jpg").lower()
+    path = os.path.join(_spool_dir(), f"{uuid.uuid4().hex}.{ext}")
+
+    stream = getattr(fileobj, "stream", fileobj)
+
+    with open(path, "wb") as out:
+        content_sha256, size = copy_and_hash(stream, out)
+
+    return path, content_sha256, size
+
+
+def _discard_spool_file(path: str | None) -> None:
+    if not path:
+        return
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("PHOTO_SPOOL_CLEANUP_FAILED path=%s", path)
+
+
+def spool_movement_photos(
+    *,
+    movement_id: int,
+    container_code: str,
+    files,
+    photo_type: str,
+) -> list[MovementPhoto]:
+    """
+    Guarda las fotos en disco local y agrega sus MovementPhoto PENDING
+    a la sesión actual.
+
+    No ejecuta commit. Después del commit del movimiento se debe llamar
+    a enqueue_photo_uploads() con las filas devueltas.
+
+    Una foto que no se pudo guardar en disco se devuelve en estado
+    FAILED (ver failed_photos()) para avisar al usuario.
+    """
+    rows: list[MovementPhoto] = []
+    seen_hashes: set[str] = set()
+
+    for f in files or []:
+        if not f or not f.filename:
+            continue
+
+        try:
+            spool_path, content_sha256, _size = _spool_fileobj(f, f.filename)
+        except OSError as exc:
+            logger.exception("PHOTO_SPOOL_FAILED movement_id=%s", movement_id)
+
+            row = MovementPhoto(
+                movement_id=movement_id,
+                photo_type=photo_type,
+                status=PHOTO_STATUS_FAILED,
+                content_type=f.mimetype or None,
+                last_error=f"No fue posible guardar la foto temporalmente: {exc}"[:2000],
+            )
+            db.session.add(row)
+            rows.append(row)
+            continue
+
+        # La misma foto repetida en un mismo envío no agrega nada.
+        if content_sha256 in seen_hashes:
+            _discard_spool_file(spool_path)
+            continue
+
+        seen_hashes.add(content_sha256)
+
+        existing = find_stored_object(content_sha256)
+
+        if existing is not None:
+            _discard_spool_file(spool_path)
+
+            db.session.add(
+                _photo_from_stored_object(
+                    existing,
+                    movement_id=movement_id,
+                    photo_type=photo_type,
+                )
+            )
+            continue
+
+        row = MovementPhoto(
+            movement_id=movement_id,
+            photo_type=photo_type,
+            url=None,
+            status=PHOTO_STATUS_PENDING,
+            storage_key=build_photo_key(container_code, movement_id, f.filename),
+            content_sha256=content_sha256,
+            content_type=f.mimetype or "application/octet-stream",
+            spool_path=spool_path,
+            attempts=0,
+        )
+
+        db.session.add(row)
+        rows.append(row)
+
+    return rows
+
+
+def failed_photos(rows) -> list[MovementPhoto]:
+    return [row for row in rows or [] if row.status == PHOTO_STATUS_FAILED]
+
+
+def _photo_from_stored_object(stored, *, movement_id: int, photo_type: str) -> MovementPhoto:
+    """
+    MovementPhoto que reutiliza un objeto ya existente en R2.
+    """
+    return MovementPhoto(
+        movement_id=movement_id,
+        photo_type=photo_type,
+        url=stored.url,
+        web_url=stored.web_url,
+        thumb_url=stored.thumb_url,
+        status=PHOTO_STATUS_UPLOADED,
+        storage_key=stored.storage_key,
+        content_sha256=stored.content_sha256,
+        content_type=stored.content_type,
+        uploaded_at=datetime.utcnow(),
+    )
+
+
+def _point_to_stored_object(photo: MovementPhoto, stored) -> None:
+    photo.url = stored.url
+    photo.web_url = stored.web_url
+    photo.thumb_url = stored.thumb_url
+    photo.storage_key = stored.storage_key
+    photo.content_type = stored.content_type or photo.content_type
+
+
+# =========================================================
+# Encolado
+# =========================================================
+
+def _submit_photo_tasks(task, photo_ids) -> int:
+    ids = [int(pid) for pid in photo_ids or [] if pid]
+
+    if not ids:
+        return 0
+
+    app = current_app._get_current_object()
+    executor, slots = _get_executor()
+
+    queued = 0
+
+    for photo_id in ids:
+        if not slots.acquire(blocking=False):
+            logger.warning(
+                "PHOTO_UPLOAD_QUEUE_FULL task=%s photo_id=%s",
+                task.__name__,
+                photo_id,
+            )
+            continue
+
+        future = executor.submit(task, app, photo_id)
+        future.add_done_callback(lambda _f: slots.release())
+        queued += 1
+
+    return queued
+
+
+def enqueue_photo_uploads(photo_ids) -> int:
+    """
+    Envía las fotos al pool de subida.
+
+    Debe llamarse después del COMMIT para que los threads encuentren
+    las filas. Si la cola del proceso está llena, la foto queda PENDING
+    y la recoge el barrido de reintentos.
+    """
+    return _submit_photo_tasks(_upload_photo_task, photo_ids)
+
+
+def enqueue_photo_variants(photo_ids) -> int:
+    """
+    Genera web / thumb de fotos que ya están en R2 (subida directa
+    desde el navegador). El original se descarga de R2 en el thread.
+    """
+    return _submit_photo_tasks(_variants_task, photo_ids)
+
+
+def _claim_photo(photo_id: int) -> bool:
+    """
+    Marca la foto como UPLOADING solo si sigue pendiente.
+
+    El UPDATE condicional impide que dos threads o procesos suban la
+    misma foto a la vez.
+    """
+    claimed = (
+        db.session.query(MovementPhoto)
+        .filter(
+            MovementPhoto.id == photo_id,
+            MovementPhoto.status.in_(_CLAIMABLE_STATUSES),
+        )
+        .update(
+            {
+                MovementPhoto.status: PHOTO_STATUS_UPLOADING,
+                MovementPhoto.attempts: MovementPhoto.attempts + 1,
+                MovementPhoto.last_attempt_at: datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+    )
+
+    db.session.commit()
+
+    return claimed > 0
+
+
+def _upload_photo_task(app, photo_id: int) -> None:
+    with app.app_context():
+        try:
+            _upload_photo(photo_id)
+        except Exception:
+            db.session.rollback()
+            logger.exception("PHOTO_UPLOAD_TASK_FAILED photo_id=%s", photo_id)
+        finally:
+            db.session.remove()
+
+
+def _variants_task(app, photo_id: int) -> None:
+    with app.app_context():
+        try:
+            photo = db.session.get(MovementPhoto, photo_id)
+
+            if photo is None or photo.thumb_url or not photo.storage_key:
+                db.session.commit()
+                return
+
+            storage_key = photo.storage_key
+
+            # Descarga y variantes sin transacción abierta (ver _upload_photo).
+            db.session.commit()
+
+            storage = get_storage()
+
+            with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as tmp:
+                writer = HashingWriter(tmp)
+                storage.download_fileobj(storage_key, writer)
+                content_sha256 = writer.hexdigest()
+
+                existing = find_stored_object(content_sha256)
+
+                if existing is not None and existing.storage_key != storage_key:
+                    # Contenido repetido: se usa el objeto existente y se
+                    # elimina la copia recién subida por el navegador.
+                    photo = db.session.get(MovementPhoto, photo_id)
+
+                    if photo is None:
+                        db.session.commit()
+                        return
+
+                    _point_to_stored_object(photo, existing)
+                    photo.content_sha256 = content_sha256
+                    db.session.commit()
+
+                    storage.delete_object(storage_key)
+                    return
+
+                db.session.commit()
+
+                tmp.seek(0)
+                variants = _store_photo_variants(photo_id, storage_key, tmp)
+
+            photo = db.session.get(MovementPhoto, photo_id)
+
+            if photo is None:
+                db.session.commit()
+                return
+
+            photo.web_url = variants.get("web")
+            photo.thumb_url = variants.get("thumb")
+            photo.content_sha256 = content_sha256
+
+            register_stored_object(
+                content_sha256=content_sha256,
+                storage_key=storage_key,
+                url=photo.url,
+                size_bytes=writer.size,
+                content_type=photo.content_type,
+                web_url=photo.web_url,
+                thumb_url=photo.thumb_url,
+            )
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("PHOTO_VARIANTS_TASK_FAILED photo_id=%s", photo_id)
+        finally:
+            db.session.remove()
+
+
+def _store_photo_variants(photo_id: int, storage_key: str | None, source) -> dict:
+    """
+    Sube las versiones web / thumb junto al original y retorna sus
+    URLs ({"web": ..., "thumb": ...}). No usa la sesión.
+
+    Un fallo aquí no invalida la foto: las páginas usan el original
+    cuando no existe miniatura.
+    """
+    if not storage_key:
+        return {}
+
+    try:
+        variants = build_photo_variants(source)
+    except Exception as exc:
+        logger.warning(
+            "PHOTO_VARIANTS_FAILED photo_id=%s error=%s",
+            photo_id,
+            exc,
+        )
+        return {}
+
+    storage = get_storage()
+    urls = {}
+
+    try:
+        for name, buf in variants.items():
+            urls[name] = storage.upload_fileobj(
+                buf,
+                derived_photo_key(storage_key, name),
+                "image/jpeg",
+            )
+    except Exception as exc:
+        logger.warning(
+            "PHOTO_VARIANTS_UPLOAD_FAILED photo_id=%s error=%s",
+            photo_id,
+            exc,
+        )
+        return {}
+
+    return urls
+
+
+def _upload_photo(photo_id: int) -> None:
+    if not _claim_photo(photo_id):
+        return
+
+    photo = db.session.get(MovementPhoto, photo_id)
+
+    if photo is None:
+        db.session.commit()
+        return
+
+    if not photo.spool_path or not os.path.exists(photo.spool_path):
+        photo.status = PHOTO_STATUS_FAILED
+        photo.spool_path = None
+        photo.last_error = "El archivo temporal ya no existe en este servidor."
+        db.session.commit()
+
+        logger.error("PHOTO_UPLOAD_SPOOL_MISSING photo_id=%s", photo_id)
+        return
+
+    # Otra subida con el mismo contenido pudo terminar mientras esta
+    # esperaba en la cola.
+    existing = find_stored_object(photo.content_sha256)
+
+    if existing is not None:
+        spool_path = photo.spool_path
+
+        _point_to_stored_object(photo, existing)
+        photo.status = PHOTO_STATUS_UPLOADED
+        photo.spool_path = None
+        photo.last_error = None
+        photo.uploaded_at = datetime.utcnow()
+        db.session.commit()
+
+        _discard_spool_file(spool_path)
+        return
+
+    spool_path = photo.spool_path
+    storage_key = photo.storage_key
+    content_type = photo.content_type or "application/octet-stream"
+
+    # La subida a R2 (con reintentos y esperas) no retiene una conexión
+    # del pool: se cierra la transacción de lectura y se abre otra solo
+    # para guardar el resultado.
+    db.session.commit()
+
+    attempts = _config_int("PHOTO_UPLOAD_ATTEMPTS", 3)
+    last_error = None
+    url = None
+
+    for attempt in range(1, attempts + 1):
+        try:
+            with open(spool_path, "rb") as fh:
+                url = get_storage().upload_fileobj(fh, storage_key, content_type)
+            break
+        except Exception as exc:
+            last_error = str(exc)
+            logger.warning(
+                "PHOTO_UPLOAD_ATTEMPT_FAILED photo_id=%s attempt=%s error=%s",
+                photo_id,
+                attempt,
+                last_error,
+            )
+
+            if attempt < attempts:
+                time.sleep(min(2 ** attempt, 30))
+
+    variants = _store_photo_variants(photo_id, storage_key, spool_path) if url else {}
+
+    photo = db.session.get(MovementPhoto, photo_id)
+
+    if photo is None:
+        db.session.commit()
+        return
+
+    if url is None:
+        photo.status = PHOTO_STATUS_RETRY
+        photo.last_error = (last_error or "Error desconocido")[:2000]
+        db.session.commit()
+        return
+
+    photo.url = url
+    photo.web_url = variants.get("web")
+    photo.thumb_url = variants.get("thumb")
+    photo.status = PHOTO_STATUS_UPLOADED
+    photo.spool_path = None
+    photo.last_error = None
+    photo.uploaded_at = datetime.utcnow()
+
+    register_stored_object(
+        content_sha256=photo.content_sha256,
+        storage_key=storage_key,
+        url=url,
+        size_bytes=os.path.getsize(spool_path),
+        content_type=photo.content_type,
+        web_url=photo.web_url,
+        thumb_url=photo.thumb_url,
+    )
+
+    db.session.commit()
+
+    _discard_spool_file(spool_path)
+
+
+# =========================================================
+# Barrido de reintentos
+# =========================================================
+
+# Trabajo local del scheduler: el spool está en el disco de cada
+# servidor, así que cada proceso revisa el suyo.
+@scheduled_job(
+    "photo_upload_retry",
+    every_seconds=120,
+    config_key="PHOTO_UPLOAD_RETRY_SWEEP_SECONDS",
+    cluster=False,
+)
+def retry_pending_photo_uploads(limit: int = 100) -> int:
+    """
+    Vuelve a encolar fotos en RETRY y fotos PENDING/UPLOADING
+    abandonadas (por ejemplo, por reciclaje del worker).
+
+    Solo toma filas cuyo archivo temporal existe en este servidor y que
+    no superaron PHOTO_UPLOAD_MAX_ATTEMPTS.
+    """
+    stale_minutes = _config_int("PHOTO_UPLOAD_STALE_MINUTES", 10)
+    max_attempts = _config_int("PHOTO_UPLOAD_MAX_ATTEMPTS", 12)
+    stale_before = datetime.utcnow() - timedelta(minutes=stale_minutes)
+
+    # Una subida UPLOADING sin avance se devuelve a RETRY para que
+    # pueda reclamarse de nuevo.
+    db.session.query(MovementPhoto).filter(
+        MovementPhoto.status == PHOTO_STATUS_UPLOADING,
+        MovementPhoto.last_attempt_at < stale_before,
+    ).update(
+        {MovementPhoto.status: PHOTO_STATUS_RETRY},
+        synchronize_session=False,
+    )
+
+    rows = (
+        db.session.query(MovementPhoto.id, MovementPhoto.spool_path)
+        .filter(
+            MovementPhoto.spool_path.isnot(None),
+            MovementPhoto.attempts < max_attempts,
+            or_(
+                MovementPhoto.status == PHOTO_STATUS_RETRY,
+                (
+                    (MovementPhoto.status == PHOTO_STATUS_PENDING)
+                    & (MovementPhoto.uploaded_at < stale_before)
+                ),
+            ),
+        )
+        .order_by(MovementPhoto.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+    db.session.commit()
+
+    local_ids = [
+        photo_id
+        for photo_id, spool_path in rows
+        if spool_path and os.path.exists(spool_path)
+    ]
+
+    return enqueue_photo_uploads(local_ids)
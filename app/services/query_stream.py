@@ -0,0 +1,125 @@
+# app/services/query_stream.py
+"""
+Lectura de consultas grandes de reportes.
+
+- stream_rows: recorre el resultado por bloques (stream_results +
+  yield_per) como tuplas de columnas, sin crear objetos ORM ni cargar
+  todo el rango en memoria. Lo usan las exportaciones.
+- fetch_page: trae una sola página (LIMIT/OFFSET) para las vistas HTML.
+  Pide una fila extra para saber si hay página siguiente, sin COUNT(*)
+  sobre la consulta completa.
+
+Las consultas deben seleccionar columnas (select(Model.col, ...) o
+text(...)), no entidades completas.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+from app.extensions import db
+from app.services.xlsx_export import EXPORT_BATCH_SIZE
+
+REPORT_PER_PAGE = 100
+
+
+def stream_rows(stmt, params: dict | None = None, *, batch_size: int = EXPORT_BATCH_SIZE, mappings: bool = False):
+    """
+    Itera las filas del resultado leyendo batch_size a la vez.
+
+    El cursor queda abierto mientras se consume el generador; consumirlo
+    completo (o cerrarlo) antes de hacer commit.
+    """
+    result = db.session.execute(
+        stmt,
+        params or {},
+        execution_options={"stream_results": True, "yield_per": batch_size},
+    )
+
+    if mappings:
+        result = result.mappings()
+
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+class RowPage:
+    """
+    Página de resultados con la misma interfaz que usan las plantillas
+    con db.paginate (page, has_prev, has_next, prev_num, next_num).
+
+    total/pages solo existen si la vista los calculó aparte.
+    """
+
+    def __init__(self, items: list, page: int, per_page: int, has_next: bool, total: int | None = None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+        self.total = total
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 1
+
+    @property
+    def prev_num(self) -> int | None:
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self) -> int | None:
+        return self.page + 1 if self.has_next else None
+
+    @property
+    def pages(self) -> int | None:
+        if self.total is None:
+            return None
+
+        return max((self.total + self.per_page - 1) // self.per_page, 1)
+
+
+def parse_page(raw, default: int = 1) -> int:
+    try:
+        return max(int(raw or default), 1)
+    except (TypeError, ValueError):
+        return default
+
+
+def fetch_page(
+    stmt,
+    params: dict | None = None,
+    *,
+    page: int = 1,
+    per_page: int = REPORT_PER_PAGE,
+    mappings: bool = False,
+    total: int | None = None,
+) -> RowPage:
+    """
+    Ejecuta stmt limitado a una página.
+
+    Para text(...) el SQL debe terminar en ORDER BY; se le agrega
+    LIMIT/OFFSET al final.
+    """
+    page = max(int(page or 1), 1)
+    params = dict(params or {})
+    offset = (page - 1) * per_page
+
+    if isinstance(stmt, TextClause):
+        stmt = text(f"{stmt.text}\nLIMIT :page_limit OFFSET :page_offset")
+        params["page_limit"] = per_page + 1
+        params["page_offset"] = offset
+    else:
+        stmt = stmt.limit(per_page + 1).offset(offset)
+
+    result = db.session.execute(stmt, params)
+    rows = result.mappings().all() if mappings else result.all()
+
+    return RowPage(
+        items=rows[:per_page],
+        page=page,
+        per_page=per_page,
+        has_next=len(rows) > per_page,
+        total=total,
+    )
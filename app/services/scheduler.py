@@ -0,0 +1,372 @@
+# app/services/scheduler.py
+"""
+Trabajos periódicos de mantenimiento dentro de la aplicación.
+
+Antes cada tarea de mantenimiento se colgaba de peticiones de usuarios
+(el polling del agente de impresión, los Gate In / Gate Out, el
+thread de movement_facts) con un lock por proceso, y algunas no las
+llamaba nadie (vencimiento de documentos de transporte).
+
+Ahora cada proceso web tiene un thread "scheduler" que cada
+SCHEDULER_TICK_SECONDS revisa qué trabajos registrados están vencidos:
+
+- Trabajos de clúster (cluster=True): solo los ejecuta el líder. El
+  liderazgo es un advisory lock de sesión de PostgreSQL
+  (pg_try_advisory_lock) retenido en una conexión dedicada: si el
+  proceso muere, la conexión se cierra, el lock se libera y otro
+  proceso lo toma en su siguiente tick.
+- Trabajos locales (cluster=False): los ejecuta cada proceso, para lo
+  que depende de su disco (p. ej. fotos en spool).
+
+Cada ejecución queda en scheduler_runs (duración, resultado, error).
+La última ejecución de un trabajo de clúster se lee de esa tabla, así
+el calendario se mantiene aunque cambie el líder.
+
+Registro:
+
+    @scheduled_job("nombre", every_seconds=3600)
+    def tarea() -> int | dict | None: ...
+
+La función corre con app context y sin argumentos; hace su propio
+COMMIT o se confirma al terminar. El thread arranca de forma perezosa
+en la primera petición de cada proceso (Gunicorn hace fork) y se
+desactiva con SCHEDULER_ENABLED=false.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from flask import current_app
+
+from app.extensions import db
+from app.models.scheduler_run import SchedulerRun
+
+logger = logging.getLogger(__name__)
+
+# Llave del advisory lock de liderazgo (constante para todo el clúster).
+SCHEDULER_LOCK_KEY = 74_112_026_041
+
+
+@dataclass(frozen=True)
+class ScheduledJob:
+    name: str
+    func: Callable
+    every_seconds: int
+    config_key: str | None = None
+    minimum_seconds: int = 15
+    cluster: bool = True
+
+
+_JOBS: dict[str, ScheduledJob] = {}
+
+
+def scheduled_job(
+    name: str,
+    *,
+    every_seconds: int,
+    config_key: str | None = None,
+    minimum_seconds: int = 15,
+    cluster: bool = True,
+):
+    """
+    Registra la función como trabajo periódico. Con config_key el
+    intervalo se lee de la configuración (every_seconds por defecto).
+    """
+    def decorator(func):
+        _JOBS[name] = ScheduledJob(
+            name=name,
+            func=func,
+            every_seconds=every_seconds,
+            config_key=config_key,
+            minimum_seconds=minimum_seconds,
+            cluster=cluster,
+        )
+        return func
+
+    return decorator
+
+
+def registered_jobs() -> list[ScheduledJob]:
+    return sorted(_JOBS.values(), key=lambda job: job.name)
+
+
+def _config_int(name: str, default: int, minimum: int = 1) -> int:
+    try:
+        value = int(current_app.config.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+
+    return max(value, minimum)
+
+
+def _interval_seconds(job: ScheduledJob) -> int:
+    if job.config_key:
+        return _config_int(job.config_key, job.every_seconds, job.minimum_seconds)
+
+    return max(job.every_seconds, job.minimum_seconds)
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"[:120]
+
+
+# =========================================================
+# Liderazgo (advisory lock de sesión)
+# =========================================================
+#
+# Fuera de PostgreSQL (desarrollo con SQLite) no hay advisory locks:
+# el proceso se considera líder.
+#
+_SINGLE_PROCESS = object()
+
+
+def _hold_leadership(conn, worker: str):
+    """
+    Devuelve la conexión que retiene el lock si este proceso es el
+    líder, o None si lo es otro.
+    """
+    if conn is _SINGLE_PROCESS:
+        return conn
+
+    if conn is not None:
+        try:
+            conn.exec_driver_sql("SELECT 1")
+            return conn
+        except Exception:
+            logger.warning("SCHEDULER_LEADER_LOST worker=%s", worker)
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    if db.engine.dialect.name != "postgresql":
+        return _SINGLE_PROCESS
+
+    # AUTOCOMMIT: la conexión retiene el lock sin quedar
+    # "idle in transaction".
+    conn = db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+    try:
+        acquired = conn.execute(
+            db.text("SELECT pg_try_advisory_lock(:key)"),
+            {"key": SCHEDULER_LOCK_KEY},
+        ).scalar()
+    except Exception:
+        conn.close()
+        raise
+
+    if not acquired:
+        conn.close()
+        return None
+
+    logger.info("SCHEDULER_LEADER_ACQUIRED worker=%s", worker)
+    return conn
+
+
+# =========================================================
+# Ejecución
+# =========================================================
+
+def _last_cluster_runs(names) -> dict[str, datetime]:
+    if not names:
+        return {}
+
+    rows = (
+        db.session.query(SchedulerRun.job_name, db.func.max(SchedulerRun.started_at))
+        .filter(SchedulerRun.job_name.in_(names))
+        .group_by(SchedulerRun.job_name)
+        .all()
+    )
+    db.session.rollback()
+
+    return {name: started_at for name, started_at in rows}
+
+
+def _result_json(result):
+    if result is None or isinstance(result, dict):
+        return result
+
+    return {"count": result}
+
+
+def run_job(job: ScheduledJob, worker: str | None = None) -> SchedulerRun:
+    """
+    Ejecuta job una vez y guarda la ejecución en scheduler_runs.
+    Nunca propaga el error del trabajo.
+    """
+    worker = worker or _worker_id()
+    started_at = datetime.utcnow()
+    started_monotonic = time.monotonic()
+
+    status = "OK"
+    result = None
+    error = None
+
+    try:
+        result = _result_json(job.func())
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        status = "FAILED"
+        error = f"{type(exc).__name__}: {exc}"[:4000]
+        logger.exception("SCHEDULER_JOB_FAILED job=%s", job.name)
+
+    duration_ms = int((time.monotonic() - started_monotonic) * 1000)
+
+    run = SchedulerRun(
+        job_name=job.name,
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        duration_ms=duration_ms,
+        status=status,
+        result=result,
+        error=error,
+        worker=worker,
+    )
+    db.session.add(run)
+    db.session.commit()
+
+    logger.info(
+        "SCHEDULER_JOB job=%s status=%s duration_ms=%s result=%s",
+        job.name,
+        status,
+        duration_ms,
+        result,
+    )
+
+    return run
+
+
+def _run_due_jobs(*, is_leader: bool, local_last: dict, worker: str) -> None:
+    jobs = registered_jobs()
+    now = datetime.utcnow()
+
+    cluster_last = {}
+    if is_leader:
+        cluster_last = _last_cluster_runs([job.name for job in jobs if job.cluster])
+
+    for job in jobs:
+        interval = _interval_seconds(job)
+
+        if job.cluster:
+            if not is_leader:
+                continue
+
+            last = cluster_last.get(job.name)
+            if last is not None and now - last < timedelta(seconds=interval):
+                continue
+        else:
+            last = local_last.get(job.name)
+            if last is not None and time.monotonic() - last < interval:
+                continue
+
+            local_last[job.name] = time.monotonic()
+
+        try:
+            run_job(job, worker)
+        except Exception:
+            # No se pudo guardar la ejecución: se reintenta en el
+            # siguiente tick.
+            db.session.rollback()
+            logger.exception("SCHEDULER_RUN_NOT_RECORDED job=%s", job.name)
+        finally:
+            db.session.remove()
+
+
+def _scheduler_loop(app) -> None:
+    worker = _worker_id()
+    leader_conn = None
+    local_last: dict[str, float] = {}
+
+    while True:
+        with app.app_context():
+            tick_seconds = _config_int("SCHEDULER_TICK_SECONDS", 30, minimum=5)
+
+            try:
+                leader_conn = _hold_leadership(leader_conn, worker)
+                _run_due_jobs(
+                    is_leader=leader_conn is not None,
+                    local_last=local_last,
+                    worker=worker,
+                )
+            except Exception:
+                db.session.rollback()
+                logger.exception("SCHEDULER_TICK_FAILED worker=%s", worker)
+            finally:
+                db.session.remove()
+
+        time.sleep(tick_seconds)
+
+
+# =========================================================
+# Thread del scheduler (uno por proceso)
+# =========================================================
+#
+# Igual que los pools de fotos y movement_facts: se crea de forma
+# perezosa y se recrea si cambia el PID, nunca se hereda del master.
+#
+_thread = None
+_thread_pid = None
+_thread_lock = threading.Lock()
+
+
+def start_scheduler(app) -> bool:
+    """
+    Arranca el thread del scheduler en este proceso si no está
+    corriendo. Devuelve True si lo arrancó.
+    """
+    global _thread, _thread_pid
+
+    pid = os.getpid()
+
+    if _thread is not None and _thread_pid == pid:
+        return False
+
+    with _thread_lock:
+        if _thread is not None and _thread_pid == pid:
+            return False
+
+        _thread = threading.Thread(
+            target=_scheduler_loop,
+            args=(app,),
+            name="scheduler",
+            daemon=True,
+        )
+        _thread_pid = pid
+        _thread.start()
+
+    return True
+
+
+def init_scheduler(app) -> None:
+    if not app.config.get("SCHEDULER_ENABLED", True):
+        return
+
+    @app.before_request
+    def _ensure_scheduler_started():
+        start_scheduler(app)
+
+
+# =========================================================
+# Retención del historial
+# =========================================================
+
+@scheduled_job("scheduler_runs_retention", every_seconds=86400)
+def purge_scheduler_runs() -> int:
+    days = _config_int("SCHEDULER_HISTORY_DAYS", 14)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    deleted = (
+        db.session.query(SchedulerRun)
+        .filter(SchedulerRun.started_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+
+    return deleted
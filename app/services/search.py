@@ -0,0 +1,134 @@
+# app/services/search.py
+"""
+Búsqueda por claves normalizadas con índices trigram (pg_trgm).
+
+Cada catálogo buscable guarda columnas *_key generadas por PostgreSQL
+(GENERATED ALWAYS AS ... STORED): el texto en mayúsculas y sin
+espacios, guiones ni otros separadores. Como las calcula la base de
+datos, se mantienen solas en cualquier INSERT/UPDATE, también en los
+que se hacen por SQL directo.
+
+Sobre esas columnas hay índices GIN gin_trgm_ops, que resuelven
+LIKE '%abc%' sin recorrer la tabla, y btree text_pattern_ops para los
+prefijos cortos (menos de 3 caracteres no forman un trigrama).
+
+Requiere una vez por base de datos:
+
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+- normalize_search_key(): misma normalización del lado de Python,
+  para el texto que escribe el usuario.
+- search_condition(): condición de búsqueda sobre una o más claves.
+  Las claves de varios campos (search_keys_sql) van en multi_field:
+  un término corto busca el prefijo de cada campo, no solo del primero.
+- search_rank(): exacto, luego prefijo, luego contiene (por columna,
+  en el orden indicado), para autocompletar.
+"""
+
+from sqlalchemy import case, func, literal, or_
+
+# Menos caracteres que esto no forman trigramas: solo prefijo (btree).
+MIN_TRIGRAM_LENGTH = 3
+
+
+def search_key_sql(column: str) -> str:
+    """
+    Expresión SQL de la clave normalizada de una columna, para
+    db.Computed(). Debe coincidir con normalize_search_key().
+    """
+    return f"regexp_replace(upper(coalesce({column}, '')), '[^[:alnum:]]', '', 'g')"
+
+
+def search_keys_sql(*columns: str) -> str:
+    """
+    Varias columnas en una sola clave, separadas por '|' (el texto
+    normalizado nunca lo contiene, así una búsqueda no cruza campos).
+    """
+    return " || '|' || ".join(search_key_sql(column) for column in columns)
+
+
+def normalize_search_key(value) -> str:
+    return "".join(ch for ch in str(value or "").upper() if ch.isalnum())
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_like_pattern(term: str, *, substring: bool = True) -> str:
+    """
+    Patrón LIKE (escape '\\') para term ya normalizado. Con
+    substring=False, o si term es muy corto para trigramas, solo
+    prefijo. Para SQL directo: key LIKE :q ESCAPE '\\'.
+    """
+    escaped = _escape_like(term)
+
+    if substring and len(term) >= MIN_TRIGRAM_LENGTH:
+        return f"%{escaped}%"
+
+    return f"{escaped}%"
+
+
+def search_field_prefix_pattern(term: str) -> str | None:
+    """
+    Para claves de varios campos (search_keys_sql): algún campo
+    distinto del primero empieza con term. Solo hace falta con
+    términos cortos, que search_like_pattern() deja como prefijo de la
+    clave completa. None si no aplica.
+    """
+    if len(term) >= MIN_TRIGRAM_LENGTH:
+        return None
+
+    return f"%|{_escape_like(term)}%"
+
+
+def search_condition(columns, term: str, *, substring: bool = True, multi_field=()):
+    """
+    Alguna de las claves contiene term (ya normalizado).
+
+    multi_field: claves de columns armadas con search_keys_sql. Con un
+    término corto también se busca al inicio de cada campo (esa parte
+    no usa índice; son catálogos chicos).
+    """
+    pattern = search_like_pattern(term, substring=substring)
+    conditions = [column.like(pattern, escape="\\") for column in columns]
+
+    field_pattern = search_field_prefix_pattern(term) if substring else None
+
+    if field_pattern:
+        conditions += [column.like(field_pattern, escape="\\") for column in multi_field]
+
+    return or_(*conditions)
+
+
+def search_rank(columns, term: str):
+    """
+    0..n-1: igual a la columna i; n..2n-1: empieza con term en la
+    columna i; 2n: lo contiene. Menor es mejor.
+    """
+    prefix = f"{_escape_like(term)}%"
+    n = len(columns)
+
+    whens = [(column == term, literal(i)) for i, column in enumerate(columns)]
+    whens += [(column.like(prefix, escape="\\"), literal(n + i)) for i, column in enumerate(columns)]
+
+    return case(*whens, else_=literal(2 * n))
+
+
+def ranked_search(stmt, columns, term: str, *, limit: int = 20):
+    """
+    Autocompletar: filtra con el índice trigram y ordena exacto →
+    prefijo → contiene; dentro de cada grupo, por similitud.
+    """
+    similarity = func.greatest(*[func.similarity(column, term) for column in columns])
+
+    return (
+        stmt
+        .where(search_condition(columns, term))
+        .order_by(
+            search_rank(columns, term),
+            similarity.desc(),
+            *columns,
+        )
+        .limit(limit)
+    )
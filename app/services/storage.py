@@ -1,8 +1,25 @@
 # app/services/storage.py
 import os
+import threading
 import uuid
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+MB = 1024 * 1024
+
+
+def _env_int(names: tuple[str, ...], default: int, minimum: int = 1) -> int:
+    for name in names:
+        raw = os.environ.get(name)
+        if raw in (None, ""):
+            continue
+        try:
+            return max(int(raw), minimum)
+        except (TypeError, ValueError):
+            break
+    return default
 
 
 class Storage:
@@ -40,24 +57,53 @@ class Storage:
         # Base pública opcional para guardar URLs que sí abren en el navegador (R2.dev / custom domain)
         self.public_base_url = os.environ.get("R2_PUBLIC_BASE_URL") or os.environ.get("PUBLIC_BASE_URL")
 
+        # Pool HTTP compartido por todos los threads del proceso
+        # (gthread + pool de subida de fotos + partes multipart).
+        self.max_pool_connections = _env_int(("STORAGE_MAX_POOL_CONNECTIONS",), 25)
+
         # Config recomendado para S3-compatible (Cloudflare R2)
         cfg = Config(
             region_name="auto",
             signature_version="s3v4",
             s3={"addressing_style": "path"},
             retries={"max_attempts": 5, "mode": "standard"},
+            max_pool_connections=self.max_pool_connections,
+            tcp_keepalive=True,
+        )
+
+        # Archivos grandes: multipart con partes concurrentes.
+        self.transfer_config = TransferConfig(
+            multipart_threshold=_env_int(("STORAGE_MULTIPART_THRESHOLD_MB",), 8) * MB,
+            multipart_chunksize=_env_int(("STORAGE_MULTIPART_CHUNKSIZE_MB",), 8) * MB,
+            max_concurrency=_env_int(("STORAGE_MAX_CONCURRENCY",), 4),
+            use_threads=True,
         )
 
-        self.s3 = boto3.client(
+        # Session propia: el cliente es thread-safe, la Session por
+        # defecto de boto3 no lo es durante su creación.
+        self.s3 = boto3.session.Session().client(
             "s3",
             endpoint_url=self.endpoint_url,
             aws_access_key_id=self.access_key,
             aws_secret_access_key=self.secret_key,
             config=cfg,
-            use_ssl=True,
+            # Permite apuntar a un S3 local (MinIO, etc.) por http:// en desarrollo.
+            use_ssl=self.endpoint_url.lower().startswith("https://"),
             verify=True,
         )
 
+    def public_url(self, key: str) -> str:
+        """
+        URL para guardar en BD:
+        - Si existe R2_PUBLIC_BASE_URL (recomendado), devuelve: {public_base}/{key}
+        - Si no, devuelve: {endpoint}/{bucket}/{key} (puede no ser accesible públicamente)
+        """
+        if self.public_base_url:
+            return f"{self.public_base_url.rstrip('/')}/{key}"
+
+        base = self.endpoint_url.rstrip("/")
+        return f"{base}/{self.bucket}/{key}"
+
     def upload_fileobj(self, fileobj, key: str, content_type: str | None = None) -> str:
         """
         Sube un archivo (file-like) a R2/S3 y retorna una URL para guardar en BD.
@@ -72,17 +118,145 @@ class Storage:
             Bucket=self.bucket,
             Key=key,
             ExtraArgs=extra,
+            Config=self.transfer_config,
         )
 
-        if self.public_base_url:
-            return f"{self.public_base_url.rstrip('/')}/{key}"
+        return self.public_url(key)
 
-        base = self.endpoint_url.rstrip("/")
-        return f"{base}/{self.bucket}/{key}"
+    def presign_upload(self, key: str, content_type: str | None = None, expires_in: int = 900) -> dict:
+        """
+        Genera una URL prefirmada para que el navegador suba el archivo
+        directo a R2/S3 con PUT, sin pasar por Gunicorn.
+
+        R2 no soporta formularios POST con policy, por eso se usa PUT.
+        El tamaño se valida al confirmar la subida (head_object).
+        El navegador debe enviar exactamente los headers devueltos.
+        """
+        params = {"Bucket": self.bucket, "Key": key}
+        headers = {}
+
+        if content_type:
+            params["ContentType"] = content_type
+            headers["Content-Type"] = content_type
+
+        url = self.s3.generate_presigned_url(
+            "put_object",
+            Params=params,
+            ExpiresIn=int(expires_in),
+            HttpMethod="PUT",
+        )
+
+        return {
+            "method": "PUT",
+            "url": url,
+            "headers": headers,
+            "key": key,
+            "expires_in": int(expires_in),
+        }
+
+    def presign_download(
+        self,
+        key: str,
+        filename: str | None = None,
+        content_type: str | None = None,
+        expires_in: int = 300,
+        inline: bool = False,
+    ) -> str:
+        """
+        URL prefirmada de descarga (GET) para objetos privados, p. ej.
+        exportaciones. El navegador descarga directo de R2.
+        """
+        params = {"Bucket": self.bucket, "Key": key}
+
+        if filename:
+            disposition = "inline" if inline else "attachment"
+            params["ResponseContentDisposition"] = f'{disposition}; filename="{filename}"'
+
+        if content_type:
+            params["ResponseContentType"] = content_type
+
+        return self.s3.generate_presigned_url(
+            "get_object",
+            Params=params,
+            ExpiresIn=int(expires_in),
+        )
+
+    def head_object(self, key: str) -> dict | None:
+        """
+        Metadatos del objeto o None si no existe.
+        """
+        try:
+            return self.s3.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            code = str(exc.response.get("Error", {}).get("Code", ""))
+            if code in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+
+    def download_fileobj(self, key: str, fileobj) -> None:
+        self.s3.download_fileobj(
+            Bucket=self.bucket,
+            Key=key,
+            Fileobj=fileobj,
+            Config=self.transfer_config,
+        )
+
+    def delete_object(self, key: str) -> None:
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+
+# =========================================================
+# Instancia compartida por proceso
+# =========================================================
+#
+# Crear el cliente boto3 implica leer configuración, resolver el
+# endpoint y abrir conexiones TLS nuevas. Se crea una sola vez por
+# proceso Gunicorn y se reutiliza desde todos sus threads.
+# Se recrea si cambia el PID (fork del master hacia los workers).
+#
+_storage = None
+_storage_pid = None
+_storage_lock = threading.Lock()
 
 
 def get_storage() -> Storage:
-    return Storage()
+    global _storage, _storage_pid
+
+    pid = os.getpid()
+    storage = _storage
+
+    if storage is not None and _storage_pid == pid:
+        return storage
+
+    with _storage_lock:
+        if _storage is None or _storage_pid != pid:
+            _storage = Storage()
+            _storage_pid = pid
+
+        return _storage
+
+
+def reset_storage() -> None:
+    """
+    Descarta la instancia compartida (p. ej. tras cambiar credenciales
+    en variables de entorno).
+    """
+    global _storage, _storage_pid
+
+    with _storage_lock:
+        _storage = None
+        _storage_pid = None
+
+
+def _key_ext(filename: str, default: str = "jpg") -> str:
+    ext = (filename.rsplit(".", 1)[-1] if "." in (filename or "") else default).lower()
+    ext = "".join(ch for ch in ext if ch.isalnum())[:10]
+    return ext or default
+
+
+def photo_key_prefix(container_code: str, movement_id: int) -> str:
+    safe = (container_code or "").replace("-", "").replace(" ", "")
+    return f"photos/{safe}/movement_{movement_id}/"
 
 
 def build_photo_key(container_code: str, movement_id: int, filename: str) -> str:
@@ -90,9 +264,55 @@ def build_photo_key(container_code: str, movement_id: int, filename: str) -> str
     Genera key estable y segura:
       photos/{CONTENEDOR_SIN_GUIONES}/movement_{id}/{rand}.{ext}
     """
-    ext = (filename.rsplit(".", 1)[-1] if "." in filename else "jpg").lower()
-    safe = (container_code or "").replace("-", "").replace(" ", "")
     rand = uuid.uuid4().hex[:12]
-    return f"photos/{safe}/movement_{movement_id}/{rand}.{ext}"
+    return f"{photo_key_prefix(container_code, movement_id)}{rand}.{_key_ext(filename)}"
+
 
+def derived_photo_key(key: str, variant: str) -> str:
+    """
+    Key de una versión derivada, junto al original:
+      photos/.../movement_{id}/{rand}.{ext} -> photos/.../movement_{id}/{rand}_{variant}.jpg
+    """
+    base = key.rsplit(".", 1)[0] if "." in key.rsplit("/", 1)[-1] else key
+    return f"{base}_{variant}.jpg"
 
+
+def attachment_key_prefix(target_type: str, target_id: int) -> str:
+    return f"transport/{(target_type or '').strip().lower()}/{int(target_id)}/"
+
+
+def build_attachment_key(target_type: str, target_id: int, filename: str) -> str:
+    """
+    Key para adjuntos de transportistas:
+      transport/{tipo}/{id}/{rand}.{ext}
+    """
+    rand = uuid.uuid4().hex[:12]
+    return f"{attachment_key_prefix(target_type, target_id)}{rand}.{_key_ext(filename, 'bin')}"
+
+
+def export_key(job_id: int, filename: str) -> str:
+    """
+    Key de una exportación generada en segundo plano:
+      exports/{job_id}/{rand}.{ext}
+    """
+    rand = uuid.uuid4().hex[:12]
+    return f"exports/{int(job_id)}/{rand}.{_key_ext(filename, 'bin')}"
+
+
+def import_key(session_id: int, filename: str) -> str:
+    """
+    Key de un archivo de carga masiva (Excel subido o filas
+    normalizadas):
+      imports/{session_id}/{rand}.{ext}
+    """
+    rand = uuid.uuid4().hex[:12]
+    return f"imports/{int(session_id)}/{rand}.{_key_ext(filename, 'bin')}"
+
+
+def pdf_cache_key(kind: str, digest: str) -> str:
+    """
+    Key de un PDF en caché por contenido (app/services/pdf_cache.py):
+      pdf-cache/{tipo}/{sha256}.pdf
+    """
+    safe_kind = "".join(ch for ch in (kind or "").lower() if ch.isalnum() or ch in "-_") or "pdf"
+    return f"pdf-cache/{safe_kind}/{digest}.pdf"
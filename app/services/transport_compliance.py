@@ -0,0 +1,454 @@
+# app/services/transport_compliance.py
+"""
+Mantenimiento de transport_compliance (índice de cumplimiento
+documental de choferes y cabezales).
+
+Por chofer: los cinco documentos de driver_documents (faltante =
+pendiente) más capacitación y carné APM.
+Por cabezal: permiso de muelle, seguro y RT de trucks más los
+documentos de truck_documents.
+
+Las reglas son las mismas que usa la matriz de choferes al armar
+pendientes/vencidos. Cada refresco recalcula las filas indicadas con
+un solo INSERT ... SELECT:
+
+- write_hooks.py lo llama antes del COMMIT con los choferes/cabezales
+  cuyos documentos cambiaron (ORM o mark_transport_compliance_touched()).
+- refresh_expired_transport_documents() (cada hora) recalcula las
+  filas cuyo próximo vencimiento ya pasó.
+- transport_compliance_rebuild (cada noche) recalcula todo y corrige
+  cualquier desfase.
+"""
+
+import logging
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, exists, func, or_, select, text
+
+from app.extensions import db
+from app.models.transport_compliance import TransportCompliance
+from app.services.scheduler import scheduled_job
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 5000
+
+DEFAULT_EXPIRING_DAYS = 15
+
+DRIVER_COMPLIANCE_DOCUMENTS = (
+    "DOCK_PERMIT",
+    "GENERAL_CARD",
+    "CHEMICAL_PERMIT",
+    "LICENSE",
+    "CRIMINAL_RECORD",
+)
+
+COMPLIANCE_DOCUMENT_LABELS = {
+    "DOCK_PERMIT": "Permiso muelle chofer",
+    "GENERAL_CARD": "Carnet",
+    "CHEMICAL_PERMIT": "Permiso químico",
+    "LICENSE": "Licencia",
+    "CRIMINAL_RECORD": "Hoja delincuencia",
+    "APM_TRAINING": "Capacitación APM",
+    "APM_CARD": "Carnet APM",
+    "TRUCK_DOCK_PERMIT": "Permiso muelle cabezal",
+    "TRUCK_INSURANCE": "Seguro",
+    "TRUCK_RT": "RT",
+}
+
+# Filtros de las listas (?compliance=...)
+COMPLIANCE_FILTERS = {
+    "EXPIRED": "Con vencidos",
+    "EXPIRING": "Por vencer",
+    "PENDING": "Con pendientes",
+    "OK": "Al día",
+}
+
+
+def expiring_days_default() -> int:
+    try:
+        days = int(current_app.config.get("TRANSPORT_EXPIRING_DAYS", DEFAULT_EXPIRING_DAYS))
+    except (TypeError, ValueError):
+        days = DEFAULT_EXPIRING_DAYS
+
+    return max(days, 1)
+
+
+# =========================================================
+# SQL
+# =========================================================
+#
+# Cada consulta interna devuelve una fila por documento:
+# (entity_id, document, sort_order, status, expiry_date), con status
+# NULL para lo que no aplica. La agregación es común.
+#
+
+_DRIVER_ITEMS_SQL = """
+    SELECT
+        d.id AS entity_id,
+        t.document,
+        t.sort_order,
+        CASE
+            WHEN dd.id IS NULL THEN 'PENDING'
+            WHEN dd.status = 'NOT_APPLICABLE' THEN NULL
+            WHEN dd.status IN ('EXPIRED', 'PENDING') THEN dd.status
+            WHEN NOT dd.no_expiry AND dd.expiry_date < :today THEN 'EXPIRED'
+            ELSE 'VALID'
+        END AS status,
+        CASE WHEN NOT dd.no_expiry THEN dd.expiry_date END AS expiry_date
+    FROM yard_gate_alamo.drivers d
+    CROSS JOIN unnest(CAST(:document_types AS text[]))
+        WITH ORDINALITY AS t(document, sort_order)
+    LEFT JOIN yard_gate_alamo.driver_documents dd
+      ON dd.driver_id = d.id
+     AND dd.document_type = t.document
+    WHERE {where}
+
+    UNION ALL
+
+    SELECT
+        d.id,
+        apm.document,
+        apm.sort_order,
+        apm.status,
+        apm.expiry_date
+    FROM yard_gate_alamo.drivers d
+    LEFT JOIN yard_gate_alamo.driver_apm_records a
+      ON a.driver_id = d.id
+    CROSS JOIN LATERAL (
+        VALUES
+            (
+                'APM_TRAINING',
+                CAST(100 AS bigint),
+                CASE WHEN a.training_status = 'YES' THEN 'VALID' ELSE 'PENDING' END,
+                CAST(NULL AS date)
+            ),
+            (
+                'APM_CARD',
+                CAST(101 AS bigint),
+                CASE
+                    WHEN COALESCE(a.card_status, 'PENDING') = 'PENDING' THEN 'PENDING'
+                    WHEN a.card_status = 'EXPIRED' THEN 'EXPIRED'
+                    WHEN a.expiry_mode = 'DATE' AND a.expiry_date < :today THEN 'EXPIRED'
+                    ELSE 'VALID'
+                END,
+                CASE WHEN a.expiry_mode = 'DATE' THEN a.expiry_date END
+            )
+    ) AS apm(document, sort_order, status, expiry_date)
+    WHERE {where}
+"""
+
+_TRUCK_ITEMS_SQL = """
+    SELECT
+        t.id AS entity_id,
+        doc.document,
+        doc.sort_order,
+        CASE
+            WHEN doc.expiry_date IS NULL THEN 'PENDING'
+            WHEN doc.expiry_date < :today THEN 'EXPIRED'
+            ELSE 'VALID'
+        END AS status,
+        doc.expiry_date
+    FROM yard_gate_alamo.trucks t
+    CROSS JOIN LATERAL (
+        VALUES
+            ('TRUCK_DOCK_PERMIT', CAST(1 AS bigint), t.dock_permit_expiry_date),
+            ('TRUCK_INSURANCE', CAST(2 AS bigint), t.insurance_expiry_date),
+            ('TRUCK_RT', CAST(3 AS bigint), t.rt_expiry_date)
+    ) AS doc(document, sort_order, expiry_date)
+    WHERE {where}
+
+    UNION ALL
+
+    SELECT
+        t.id,
+        td.document_type,
+        CAST(100 AS bigint),
+        CASE
+            WHEN td.status = 'NOT_APPLICABLE' THEN NULL
+            WHEN td.status IN ('EXPIRED', 'PENDING') THEN td.status
+            WHEN NOT td.no_expiry AND td.expiry_date < :today THEN 'EXPIRED'
+            ELSE 'VALID'
+        END,
+        CASE WHEN NOT td.no_expiry THEN td.expiry_date END
+    FROM yard_gate_alamo.trucks t
+    JOIN yard_gate_alamo.truck_documents td
+      ON td.truck_id = t.id
+    WHERE {where}
+"""
+
+
+def _refresh_sql(entity_type: str, items_sql: str):
+    return text(f"""
+        INSERT INTO yard_gate_alamo.transport_compliance (
+            entity_type, entity_id,
+            next_expiry_date, worst_status,
+            expired_count, pending_count,
+            blocking_documents, refreshed_at
+        )
+        SELECT
+            '{entity_type}',
+            i.entity_id,
+            MIN(i.expiry_date) FILTER (
+                WHERE i.status = 'VALID' AND i.expiry_date >= :today
+            ),
+            CASE
+                WHEN bool_or(i.status = 'EXPIRED') THEN 'EXPIRED'
+                WHEN bool_or(i.status = 'PENDING') THEN 'PENDING'
+                ELSE 'VALID'
+            END,
+            count(*) FILTER (WHERE i.status = 'EXPIRED'),
+            count(*) FILTER (WHERE i.status = 'PENDING'),
+            COALESCE(
+                jsonb_agg(
+                    jsonb_build_object(
+                        'document', i.document,
+                        'status', i.status,
+                        'expiry_date', i.expiry_date
+                    )
+                    ORDER BY i.sort_order, i.document
+                ) FILTER (WHERE i.status IN ('EXPIRED', 'PENDING')),
+                '[]'::jsonb
+            ),
+            NOW() AT TIME ZONE 'UTC'
+        FROM ({items_sql}) i
+        WHERE i.status IS NOT NULL
+        GROUP BY i.entity_id
+        ON CONFLICT (entity_type, entity_id) DO UPDATE SET
+            next_expiry_date = EXCLUDED.next_expiry_date,
+            worst_status = EXCLUDED.worst_status,
+            expired_count = EXCLUDED.expired_count,
+            pending_count = EXCLUDED.pending_count,
+            blocking_documents = EXCLUDED.blocking_documents,
+            refreshed_at = EXCLUDED.refreshed_at
+    """)
+
+
+_BY_IDS = "{alias}.id = ANY(:ids)"
+_BY_RANGE = "{alias}.id > :after_id AND {alias}.id <= :upto_id"
+
+_REFRESH_DRIVERS_BY_IDS_SQL = _refresh_sql(
+    "DRIVER", _DRIVER_ITEMS_SQL.format(where=_BY_IDS.format(alias="d"))
+)
+_REFRESH_DRIVERS_BY_RANGE_SQL = _refresh_sql(
+    "DRIVER", _DRIVER_ITEMS_SQL.format(where=_BY_RANGE.format(alias="d"))
+)
+_REFRESH_TRUCKS_BY_IDS_SQL = _refresh_sql(
+    "TRUCK", _TRUCK_ITEMS_SQL.format(where=_BY_IDS.format(alias="t"))
+)
+_REFRESH_TRUCKS_BY_RANGE_SQL = _refresh_sql(
+    "TRUCK", _TRUCK_ITEMS_SQL.format(where=_BY_RANGE.format(alias="t"))
+)
+
+_ENTITY_SQL = {
+    "DRIVER": (
+        "yard_gate_alamo.drivers",
+        _REFRESH_DRIVERS_BY_IDS_SQL,
+        _REFRESH_DRIVERS_BY_RANGE_SQL,
+    ),
+    "TRUCK": (
+        "yard_gate_alamo.trucks",
+        _REFRESH_TRUCKS_BY_IDS_SQL,
+        _REFRESH_TRUCKS_BY_RANGE_SQL,
+    ),
+}
+
+
+def _params(**extra) -> dict:
+    return {
+        "today": date.today(),
+        "document_types": list(DRIVER_COMPLIANCE_DOCUMENTS),
+        **extra,
+    }
+
+
+# =========================================================
+# Refresco
+# =========================================================
+
+def _refresh(entity_type: str, entity_ids) -> int:
+    ids = sorted({int(i) for i in entity_ids or [] if i})
+
+    if not ids:
+        return 0
+
+    _, by_ids_sql, _ = _ENTITY_SQL[entity_type]
+
+    return db.session.execute(by_ids_sql, _params(ids=ids)).rowcount or 0
+
+
+def refresh_driver_compliance(driver_ids) -> int:
+    """
+    Recalcula el índice de los choferes indicados. No hace COMMIT.
+    """
+    return _refresh("DRIVER", driver_ids)
+
+
+def refresh_truck_compliance(truck_ids) -> int:
+    """
+    Recalcula el índice de los cabezales indicados. No hace COMMIT.
+    """
+    return _refresh("TRUCK", truck_ids)
+
+
+def refresh_stale_transport_compliance() -> int:
+    """
+    Filas cuyo próximo vencimiento ya pasó: ese documento ahora está
+    vencido y hay que recalcular estado y próximo vencimiento.
+    No hace COMMIT.
+    """
+    rows = db.session.execute(
+        select(
+            TransportCompliance.entity_type,
+            TransportCompliance.entity_id,
+        ).where(
+            TransportCompliance.next_expiry_date < date.today()
+        )
+    ).all()
+
+    driver_ids = [row.entity_id for row in rows if row.entity_type == "DRIVER"]
+    truck_ids = [row.entity_id for row in rows if row.entity_type == "TRUCK"]
+
+    return refresh_driver_compliance(driver_ids) + refresh_truck_compliance(truck_ids)
+
+
+def rebuild_transport_compliance(batch_size: int = REBUILD_BATCH_SIZE) -> dict[str, int]:
+    """
+    Recalcula el índice completo por rangos de id y elimina filas de
+    choferes/cabezales que ya no existen. Hace COMMIT por lote.
+    """
+    result = {}
+
+    for entity_type, (table_name, _, by_range_sql) in _ENTITY_SQL.items():
+        max_id = db.session.execute(
+            text(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}")
+        ).scalar() or 0
+
+        updated = 0
+        after_id = 0
+
+        while after_id < max_id:
+            upto_id = after_id + batch_size
+
+            updated += db.session.execute(
+                by_range_sql,
+                _params(after_id=after_id, upto_id=upto_id),
+            ).rowcount or 0
+
+            db.session.commit()
+            after_id = upto_id
+
+        db.session.execute(
+            text(f"""
+                DELETE FROM yard_gate_alamo.transport_compliance tc
+                WHERE tc.entity_type = :entity_type
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {table_name} e WHERE e.id = tc.entity_id
+                  )
+            """),
+            {"entity_type": entity_type},
+        )
+        db.session.commit()
+
+        result[entity_type.lower()] = updated
+
+    logger.info("TRANSPORT_COMPLIANCE_REBUILD %s", result)
+
+    return result
+
+
+@scheduled_job(
+    "transport_compliance_rebuild",
+    every_seconds=86400,
+    config_key="TRANSPORT_COMPLIANCE_REBUILD_SECONDS",
+    minimum_seconds=3600,
+)
+def nightly_transport_compliance_rebuild() -> dict[str, int]:
+    return rebuild_transport_compliance()
+
+
+# =========================================================
+# Consultas
+# =========================================================
+
+def compliance_condition(
+    filter_key: str | None,
+    *,
+    today: date,
+    days: int,
+):
+    """
+    Condición sobre TransportCompliance para un filtro de
+    COMPLIANCE_FILTERS (None si no aplica).
+
+    Un próximo vencimiento anterior a hoy cuenta como vencido aunque
+    el refresco horario todavía no haya pasado.
+    """
+    tc = TransportCompliance
+    overdue = tc.next_expiry_date < today
+    not_overdue = or_(tc.next_expiry_date.is_(None), tc.next_expiry_date >= today)
+
+    if filter_key == "EXPIRED":
+        return or_(tc.worst_status == "EXPIRED", overdue)
+
+    if filter_key == "EXPIRING":
+        return tc.next_expiry_date.between(today, today + timedelta(days=days))
+
+    if filter_key == "PENDING":
+        return and_(tc.worst_status == "PENDING", not_overdue)
+
+    if filter_key == "OK":
+        return and_(tc.worst_status == "VALID", not_overdue)
+
+    return None
+
+
+def compliance_filter(
+    entity_type: str,
+    entity_id_column,
+    filter_key: str | None,
+    *,
+    today: date,
+    days: int,
+):
+    """
+    EXISTS sobre el índice para filtrar la lista de choferes o de
+    cabezales (None si el filtro no aplica). Usa la llave primaria del
+    índice, no las tablas de documentos.
+    """
+    condition = compliance_condition(filter_key, today=today, days=days)
+
+    if condition is None:
+        return None
+
+    return exists().where(
+        TransportCompliance.entity_type == entity_type,
+        TransportCompliance.entity_id == entity_id_column,
+        condition,
+    )
+
+
+def compliance_summary(*, today: date, days: int) -> dict[str, dict[str, int]]:
+    """
+    Totales por filtro para choferes y cabezales, desde el índice.
+    """
+    summary = {}
+
+    for entity_type in ("DRIVER", "TRUCK"):
+        columns = [
+            func.count().filter(
+                compliance_condition(key, today=today, days=days)
+            ).label(key)
+            for key in COMPLIANCE_FILTERS
+        ]
+
+        row = db.session.execute(
+            select(*columns).where(
+                TransportCompliance.entity_type == entity_type
+            )
+        ).one()
+
+        summary[entity_type] = {key: int(row[i] or 0) for i, key in enumerate(COMPLIANCE_FILTERS)}
+
+    return summary
@@ -0,0 +1,297 @@
+# app/services/transport_counters.py
+"""
+Contadores incrementales del módulo Transportes (transport_counters).
+
+El resumen del módulo y los filtros por estado de las listas leen
+números ya calculados en lugar de COUNT(*) en cada visita:
+
+- write_hooks.py anota en cada flush los cambios de estado de las
+  filas contadas (nueva: +1, borrada: -1, cambio de estado: -1/+1) y
+  antes del COMMIT aplica las diferencias con un solo INSERT ... ON
+  CONFLICT, dentro de la misma transacción.
+- Las escrituras por SQL directo (carga masiva, job de vencimientos)
+  no pasan por el ORM: llaman a mark_transport_counters_stale()
+  (write_hooks.py) y la tabla se recuenta al hacer COMMIT.
+- transport_counters_reconcile (cada hora) compara cada contador con
+  COUNT(*), deja en el log cualquier desfase y lo corrige.
+
+Aplicar diferencias toma un advisory lock compartido por tabla y el
+recuento uno exclusivo: el recuento espera a las transacciones que ya
+aplicaron su diferencia y las siguientes esperan al recuento, así
+ninguna se cuenta dos veces ni se pierde.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, text
+
+from app.extensions import db
+from app.models.transport import (
+    Driver,
+    DriverDocument,
+    DriverExitPermission,
+    DriverTruckAssignment,
+    TransportIncident,
+    Truck,
+    TruckDocument,
+)
+from app.models.transport_counter import TransportCounter
+from app.services.scheduler import scheduled_job
+
+logger = logging.getLogger(__name__)
+
+# Primera llave de los advisory locks (la segunda es hashtext(tabla)).
+_LOCK_CLASS = 48_490
+
+# counter_key -> (modelo, tabla)
+COUNTER_SOURCES = {
+    "drivers": (Driver, "yard_gate_alamo.drivers"),
+    "trucks": (Truck, "yard_gate_alamo.trucks"),
+    "assignments": (DriverTruckAssignment, "yard_gate_alamo.driver_truck_assignments"),
+    "exit_permissions": (DriverExitPermission, "yard_gate_alamo.driver_exit_permissions"),
+    "incidents": (TransportIncident, "yard_gate_alamo.transport_incidents"),
+    "driver_documents": (DriverDocument, "yard_gate_alamo.driver_documents"),
+    "truck_documents": (TruckDocument, "yard_gate_alamo.truck_documents"),
+}
+
+COUNTED_MODELS = {
+    model: counter_key
+    for counter_key, (model, _) in COUNTER_SOURCES.items()
+}
+
+OPEN_INCIDENT_STATUSES = ("OPEN", "FOLLOW_UP")
+
+
+# =========================================================
+# Diferencias (misma transacción)
+# =========================================================
+
+_LOCK_SHARED_SQL = text("""
+    SELECT pg_advisory_xact_lock_shared(:lock_class, hashtext(:key))
+""")
+
+_LOCK_EXCLUSIVE_SQL = text("""
+    SELECT pg_advisory_xact_lock(:lock_class, hashtext(:key))
+""")
+
+
+def _lock_counter(counter_key: str, *, exclusive: bool) -> None:
+    db.session.execute(
+        _LOCK_EXCLUSIVE_SQL if exclusive else _LOCK_SHARED_SQL,
+        {"lock_class": _LOCK_CLASS, "key": counter_key},
+    )
+
+
+_APPLY_DELTAS_SQL = text("""
+    INSERT INTO yard_gate_alamo.transport_counters AS c (
+        counter_key,
+        status,
+        value,
+        updated_at
+    )
+    SELECT d.counter_key, d.status, d.delta, :now
+    FROM unnest(
+        CAST(:counter_keys AS text[]),
+        CAST(:statuses AS text[]),
+        CAST(:deltas AS bigint[])
+    ) AS d(counter_key, status, delta)
+    ORDER BY d.counter_key, d.status
+    ON CONFLICT (counter_key, status) DO UPDATE
+    SET value = c.value + EXCLUDED.value,
+        updated_at = EXCLUDED.updated_at
+""")
+
+
+def _apply_deltas(items) -> int:
+    return db.session.execute(
+        _APPLY_DELTAS_SQL,
+        {
+            "counter_keys": [counter_key for (counter_key, _), _ in items],
+            "statuses": [status for (_, status), _ in items],
+            "deltas": [delta for _, delta in items],
+            "now": datetime.utcnow(),
+        },
+    ).rowcount or 0
+
+
+def apply_transport_counter_changes(
+    deltas: dict[tuple[str, str], int] | None,
+    stale_keys=(),
+) -> int:
+    """
+    Suma {(counter_key, status): diferencia} y recuenta las tablas de
+    stale_keys (su diferencia ya no hace falta). No hace COMMIT.
+
+    Los locks se toman en orden de counter_key para que dos
+    transacciones no se bloqueen entre sí.
+    """
+    stale = set(stale_keys or ()) & set(COUNTER_SOURCES)
+
+    items = sorted(
+        (key, delta)
+        for key, delta in (deltas or {}).items()
+        if delta and key[1] and key[0] not in stale
+    )
+
+    keys = sorted(stale | {counter_key for (counter_key, _), _ in items})
+
+    for counter_key in keys:
+        _lock_counter(counter_key, exclusive=counter_key in stale)
+
+    for counter_key in sorted(stale):
+        _recount(counter_key)
+
+    return _apply_deltas(items) if items else 0
+
+
+# =========================================================
+# Recuento
+# =========================================================
+
+def _actual_counts_sql(table: str) -> str:
+    return f"""
+        SELECT status, count(*) AS value
+        FROM {table}
+        GROUP BY status
+    """
+
+
+def _drift_sql(table: str):
+    return text(f"""
+        WITH actual AS ({_actual_counts_sql(table)}),
+        stored AS (
+            SELECT status, value
+            FROM yard_gate_alamo.transport_counters
+            WHERE counter_key = :key
+        )
+        SELECT
+            coalesce(a.status, s.status) AS status,
+            coalesce(s.value, 0) AS stored,
+            coalesce(a.value, 0) AS actual
+        FROM actual a
+        FULL OUTER JOIN stored s
+          ON s.status = a.status
+        WHERE coalesce(s.value, 0) <> coalesce(a.value, 0)
+        ORDER BY 1
+    """)
+
+
+def _recount_sql(table: str):
+    return text(f"""
+        WITH actual AS ({_actual_counts_sql(table)}),
+        zeroed AS (
+            UPDATE yard_gate_alamo.transport_counters c
+            SET value = 0,
+                updated_at = :now
+            WHERE c.counter_key = :key
+              AND c.value <> 0
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM actual a
+                  WHERE a.status = c.status
+              )
+        )
+        INSERT INTO yard_gate_alamo.transport_counters AS c (
+            counter_key,
+            status,
+            value,
+            updated_at
+        )
+        SELECT :key, a.status, a.value, :now
+        FROM actual a
+        ON CONFLICT (counter_key, status) DO UPDATE
+        SET value = EXCLUDED.value,
+            updated_at = EXCLUDED.updated_at
+        WHERE c.value IS DISTINCT FROM EXCLUDED.value
+    """)
+
+
+_DRIFT_SQL = {
+    counter_key: _drift_sql(table)
+    for counter_key, (_, table) in COUNTER_SOURCES.items()
+}
+
+_RECOUNT_SQL = {
+    counter_key: _recount_sql(table)
+    for counter_key, (_, table) in COUNTER_SOURCES.items()
+}
+
+
+def _recount(counter_key: str) -> None:
+    # Con el lock exclusivo ya tomado: en READ COMMITTED el COUNT(*)
+    # de esta sentencia ve lo que confirmaron quienes lo tenían.
+    db.session.execute(
+        _RECOUNT_SQL[counter_key],
+        {"key": counter_key, "now": datetime.utcnow()},
+    )
+
+
+@scheduled_job(
+    "transport_counters_reconcile",
+    every_seconds=3600,
+    config_key="TRANSPORT_COUNTERS_RECONCILE_SECONDS",
+    minimum_seconds=300,
+)
+def reconcile_transport_counters() -> dict[str, int]:
+    """
+    Compara cada contador con COUNT(*) y corrige los que no coinciden.
+    Un desfase indica una escritura que no pasó por write_hooks ni
+    llamó a mark_transport_counters_stale().
+    """
+    result = {"checked": 0, "drifted": 0}
+
+    for counter_key in sorted(COUNTER_SOURCES):
+        _lock_counter(counter_key, exclusive=True)
+
+        drift = db.session.execute(
+            _DRIFT_SQL[counter_key],
+            {"key": counter_key},
+        ).all()
+
+        result["checked"] += 1
+
+        if drift:
+            result["drifted"] += len(drift)
+
+            for row in drift:
+                logger.warning(
+                    "TRANSPORT_COUNTER_DRIFT key=%s status=%s stored=%s actual=%s",
+                    counter_key,
+                    row.status,
+                    row.stored,
+                    row.actual,
+                )
+
+            _recount(counter_key)
+
+        # Libera el lock de esta tabla antes de pasar a la siguiente.
+        db.session.commit()
+
+    return result
+
+
+# =========================================================
+# Lectura
+# =========================================================
+
+def transport_counters(*counter_keys: str) -> dict[str, dict[str, int]]:
+    """
+    {counter_key: {status: valor}} en una sola consulta sobre una tabla
+    de pocas filas.
+    """
+    stmt = select(
+        TransportCounter.counter_key,
+        TransportCounter.status,
+        TransportCounter.value,
+    )
+
+    if counter_keys:
+        stmt = stmt.where(TransportCounter.counter_key.in_(counter_keys))
+
+    counters = {key: {} for key in counter_keys or COUNTER_SOURCES}
+
+    for row in db.session.execute(stmt):
+        counters.setdefault(row.counter_key, {})[row.status] = int(row.value or 0)
+
+    return counters
@@ -0,0 +1,746 @@
+# app/services/transport_detail.py
+"""
+Ficha 360° de choferes y cabezales (modelo de lectura).
+
+La ficha junta datos, documentos, APM, cumplimiento, asignación
+actual e historial reciente de asignaciones, permisos de salida,
+incidentes (con seguimientos), adjuntos y cambios documentales.
+
+- Se arma con una cantidad fija de consultas: la fila principal,
+  un selectinload por colección y una consulta con LIMIT por cada
+  historial. No depende de cuántos años de historial tenga el chofer
+  o el cabezal.
+- El resultado son dicts/listas con tipos de Python (date, datetime),
+  de solo lectura: lo usan las plantillas y la API JSON.
+- Se guarda en una caché por proceso junto con la versión de
+  transport_detail_versions. write_hooks.py sube la versión en la
+  misma transacción que cualquier cambio de la ficha, así que una
+  ficha en caché nunca es más vieja que la versión que la acompaña.
+  Cada lectura cuesta una consulta (la versión) mientras no cambie.
+
+Las escrituras por SQL directo deben llamar a
+mark_transport_detail_touched() (write_hooks.py).
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import select, text
+from sqlalchemy.orm import joinedload, noload, selectinload
+
+from app.extensions import db
+from app.models.transport import (
+    Driver,
+    DriverExitPermission,
+    DriverTruckAssignment,
+    TransportAttachment,
+    TransportDocumentChange,
+    TransportIncident,
+    Truck,
+)
+from app.models.transport_compliance import TransportCompliance
+from app.models.transport_detail import TransportDetailVersion
+
+DETAIL_ASSIGNMENT_LIMIT = 20
+DETAIL_PERMISSION_LIMIT = 10
+DETAIL_INCIDENT_LIMIT = 10
+DETAIL_ATTACHMENT_LIMIT = 20
+DETAIL_CHANGE_LIMIT = 20
+
+DEFAULT_CACHE_SIZE = 500
+
+
+# =========================================================
+# Versiones
+# =========================================================
+
+# Un solo INSERT ... ON CONFLICT para todos los tocados. Los
+# seguimientos de incidentes llegan por incident_id.
+#
+# La ficha incluye nombre/cédula del chofer y placa/propietario del
+# cabezal de la contraparte (asignaciones, permisos, incidentes): si
+# cambian, también se invalidan las fichas de las contrapartes.
+_BUMP_VERSIONS_SQL = text("""
+    WITH renamed_drivers AS (
+        SELECT unnest(CAST(:renamed_driver_ids AS integer[])) AS id
+    ),
+    renamed_trucks AS (
+        SELECT unnest(CAST(:renamed_truck_ids AS integer[])) AS id
+        UNION
+        SELECT t.id
+        FROM yard_gate_alamo.trucks t
+        WHERE t.owner_id = ANY(CAST(:owner_ids AS integer[]))
+    )
+    INSERT INTO yard_gate_alamo.transport_detail_versions AS v (
+        entity_type,
+        entity_id,
+        version,
+        changed_at
+    )
+    SELECT entity_type, entity_id, 1, now()
+    FROM (
+        SELECT 'DRIVER' AS entity_type, unnest(CAST(:driver_ids AS integer[])) AS entity_id
+        UNION
+        SELECT 'TRUCK', unnest(CAST(:truck_ids AS integer[]))
+        UNION
+        SELECT 'DRIVER', id FROM renamed_drivers
+        UNION
+        SELECT 'TRUCK', id FROM renamed_trucks
+
+        -- Contrapartes de los choferes renombrados
+        UNION
+        SELECT 'TRUCK', a.truck_id
+        FROM yard_gate_alamo.driver_truck_assignments a
+        WHERE a.driver_id IN (SELECT id FROM renamed_drivers)
+        UNION
+        SELECT 'TRUCK', p.truck_id
+        FROM yard_gate_alamo.driver_exit_permissions p
+        WHERE p.driver_id IN (SELECT id FROM renamed_drivers)
+        UNION
+        SELECT 'TRUCK', i.truck_id
+        FROM yard_gate_alamo.transport_incidents i
+        WHERE i.driver_id IN (SELECT id FROM renamed_drivers)
+
+        -- Contrapartes de los cabezales con otra placa o propietario
+        UNION
+        SELECT 'DRIVER', a.driver_id
+        FROM yard_gate_alamo.driver_truck_assignments a
+        WHERE a.truck_id IN (SELECT id FROM renamed_trucks)
+        UNION
+        SELECT 'DRIVER', p.driver_id
+        FROM yard_gate_alamo.driver_exit_permissions p
+        WHERE p.truck_id IN (SELECT id FROM renamed_trucks)
+        UNION
+        SELECT 'DRIVER', i.driver_id
+        FROM yard_gate_alamo.transport_incidents i
+        WHERE i.truck_id IN (SELECT id FROM renamed_trucks)
+        UNION
+        SELECT 'DRIVER', i.driver_id
+        FROM yard_gate_alamo.transport_incidents i
+        WHERE i.id = ANY(CAST(:incident_ids AS integer[]))
+        UNION
+        SELECT 'TRUCK', i.truck_id
+        FROM yard_gate_alamo.transport_incidents i
+        WHERE i.id = ANY(CAST(:incident_ids AS integer[]))
+    ) touched
+    WHERE entity_id IS NOT NULL
+    ORDER BY entity_type, entity_id
+    ON CONFLICT (entity_type, entity_id) DO UPDATE
+    SET version = v.version + 1,
+        changed_at = EXCLUDED.changed_at
+""")
+
+
+def _ids(values) -> list[int]:
+    return sorted({int(i) for i in values or [] if i})
+
+
+def bump_transport_detail_versions(
+    *,
+    driver_ids=(),
+    truck_ids=(),
+    incident_ids=(),
+    renamed_driver_ids=(),
+    renamed_truck_ids=(),
+    owner_ids=(),
+) -> int:
+    """
+    Invalida la ficha de los choferes/cabezales indicados (y de los
+    de los incidentes indicados). renamed_* / owner_ids: además las
+    fichas que los muestran como contraparte. No hace COMMIT.
+    """
+    params = {
+        "driver_ids": _ids(driver_ids),
+        "truck_ids": _ids(truck_ids),
+        "incident_ids": _ids(incident_ids),
+        "renamed_driver_ids": _ids(renamed_driver_ids),
+        "renamed_truck_ids": _ids(renamed_truck_ids),
+        "owner_ids": _ids(owner_ids),
+    }
+
+    if not any(params.values()):
+        return 0
+
+    return db.session.execute(_BUMP_VERSIONS_SQL, params).rowcount or 0
+
+
+def _current_version(entity_type: str, entity_id: int) -> int:
+    version = db.session.scalar(
+        select(TransportDetailVersion.version).where(
+            TransportDetailVersion.entity_type == entity_type,
+            TransportDetailVersion.entity_id == entity_id,
+        )
+    )
+
+    return int(version or 0)
+
+
+# =========================================================
+# Caché por proceso
+# =========================================================
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_size() -> int:
+    try:
+        size = int(current_app.config.get("TRANSPORT_DETAIL_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    except (TypeError, ValueError):
+        size = DEFAULT_CACHE_SIZE
+
+    return max(size, 0)
+
+
+def _cache_get(key: tuple[str, int], version: int):
+    with _cache_lock:
+        entry = _cache.get(key)
+
+        if entry is None or entry[0] != version:
+            return None
+
+        _cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_put(key: tuple[str, int], version: int, payload: dict) -> None:
+    size = _cache_size()
+
+    if not size:
+        return
+
+    with _cache_lock:
+        _cache[key] = (version, payload)
+        _cache.move_to_end(key)
+
+        while len(_cache) > size:
+            _cache.popitem(last=False)
+
+
+def clear_transport_detail_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+# =========================================================
+# Serialización
+# =========================================================
+
+def _user(user) -> dict | None:
+    if user is None:
+        return None
+
+    return {"id": user.id, "username": user.username}
+
+
+def _site(site) -> dict | None:
+    if site is None:
+        return None
+
+    return {"id": site.id, "name": site.name}
+
+
+def _owner(owner) -> dict | None:
+    if owner is None:
+        return None
+
+    return {"id": owner.id, "name": owner.name, "phone": owner.phone}
+
+
+def _document(document) -> dict:
+    return {
+        "id": document.id,
+        "document_type": document.document_type,
+        "document_number": document.document_number,
+        "status": document.status,
+        "issue_date": document.issue_date,
+        "expiry_date": document.expiry_date,
+        "no_expiry": document.no_expiry,
+        "notes": document.notes,
+        "updated_at": document.updated_at,
+    }
+
+
+def _apm(record) -> dict | None:
+    if record is None:
+        return None
+
+    return {
+        "id": record.id,
+        "training_status": record.training_status,
+        "card_status": record.card_status,
+        "card_number": record.card_number,
+        "expiry_mode": record.expiry_mode,
+        "expiry_date": record.expiry_date,
+        "notes": record.notes,
+        "updated_at": record.updated_at,
+    }
+
+
+def _compliance(row) -> dict | None:
+    if row is None:
+        return None
+
+    return {
+        "worst_status": row.worst_status,
+        "next_expiry_date": row.next_expiry_date,
+        "expired_count": row.expired_count,
+        "pending_count": row.pending_count,
+        "blocking_documents": list(row.blocking_documents or []),
+        "refreshed_at": row.refreshed_at,
+    }
+
+
+def _driver_ref(driver) -> dict | None:
+    if driver is None:
+        return None
+
+    return {
+        "id": driver.id,
+        "name": driver.name,
+        "identification": driver.identification,
+    }
+
+
+def _truck_ref(truck) -> dict | None:
+    if truck is None:
+        return None
+
+    return {
+        "id": truck.id,
+        "plate": truck.plate,
+        "owner": _owner(truck.owner),
+    }
+
+
+def _assignment(assignment) -> dict | None:
+    if assignment is None:
+        return None
+
+    return {
+        "id": assignment.id,
+        "status": assignment.status,
+        "started_at": assignment.started_at,
+        "ended_at": assignment.ended_at,
+        "end_reason": assignment.end_reason,
+        "notes": assignment.notes,
+        "driver": _driver_ref(assignment.driver),
+        "truck": _truck_ref(assignment.truck),
+        "created_by": _user(assignment.created_by),
+        "ended_by": _user(assignment.ended_by),
+    }
+
+
+def _exit_permission(permission) -> dict:
+    return {
+        "id": permission.id,
+        "status": permission.status,
+        "departure_at": permission.departure_at,
+        "expected_return_at": permission.expected_return_at,
+        "actual_return_at": permission.actual_return_at,
+        "reason": permission.reason,
+        "destination": permission.destination,
+        "driver": _driver_ref(permission.driver),
+        "truck": _truck_ref(permission.truck),
+        "authorized_by": _user(permission.authorized_by),
+        "returned_by": _user(permission.returned_by),
+    }
+
+
+def _follow_up(follow_up) -> dict:
+    return {
+        "id": follow_up.id,
+        "contacted_at": follow_up.contacted_at,
+        "contact_name": follow_up.contact_name,
+        "current_situation": follow_up.current_situation,
+        "repair_estimate": follow_up.repair_estimate,
+        "next_follow_up_at": follow_up.next_follow_up_at,
+        "resolved": follow_up.resolved,
+        "created_by": _user(follow_up.created_by),
+    }
+
+
+def _incident(incident) -> dict:
+    return {
+        "id": incident.id,
+        "incident_type": incident.incident_type,
+        "status": incident.status,
+        "occurred_at": incident.occurred_at,
+        "location": incident.location,
+        "description": incident.description,
+        "next_follow_up_at": incident.next_follow_up_at,
+        "resolved_at": incident.resolved_at,
+        "driver": _driver_ref(incident.driver),
+        "truck": _truck_ref(incident.truck),
+        "reported_by": _user(incident.reported_by),
+        "follow_ups": [
+            _follow_up(follow_up)
+            for follow_up in sorted(
+                incident.follow_ups,
+                key=lambda item: (item.contacted_at, item.id),
+                reverse=True,
+            )
+        ],
+    }
+
+
+def _attachment(attachment) -> dict:
+    return {
+        "id": attachment.id,
+        "original_filename": attachment.original_filename,
+        "mime_type": attachment.mime_type,
+        "size_bytes": attachment.size_bytes,
+        "description": attachment.description,
+        "uploaded_at": attachment.uploaded_at,
+        "uploaded_by": _user(attachment.uploaded_by),
+    }
+
+
+def _change(change) -> dict:
+    return {
+        "id": change.id,
+        "entity_type": change.entity_type,
+        "document_type": change.document_type,
+        "field_name": change.field_name,
+        "old_value": change.old_value,
+        "new_value": change.new_value,
+        "changed_at": change.changed_at,
+        "notes": change.notes,
+        "changed_by": _user(change.changed_by),
+    }
+
+
+def detail_json(value):
+    """
+    Copia de la ficha lista para jsonify (fechas en ISO 8601).
+    """
+    if isinstance(value, dict):
+        return {key: detail_json(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [detail_json(item) for item in value]
+
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return str(value)
+
+    return value
+
+
+# =========================================================
+# Consultas (cantidad fija por ficha)
+# =========================================================
+
+# Chofer/cabezal relacionado: solo la fila (y el propietario del
+# cabezal), sin sus colecciones.
+def _driver_option(relationship):
+    return joinedload(relationship).noload("*")
+
+
+def _truck_option(relationship):
+    return joinedload(relationship).options(
+        joinedload(Truck.owner).noload("*"),
+        noload("*"),
+    )
+
+
+def _recent_assignments(column, entity_id: int, *, active_only: bool = False):
+    stmt = (
+        select(DriverTruckAssignment)
+        .options(
+            _driver_option(DriverTruckAssignment.driver),
+            _truck_option(DriverTruckAssignment.truck),
+        )
+        .where(column == entity_id)
+        .order_by(
+            DriverTruckAssignment.started_at.desc(),
+            DriverTruckAssignment.id.desc(),
+        )
+    )
+
+    if active_only:
+        return db.session.scalar(
+            stmt.where(DriverTruckAssignment.status == "ACTIVE").limit(1)
+        )
+
+    return db.session.scalars(stmt.limit(DETAIL_ASSIGNMENT_LIMIT)).unique().all()
+
+
+def _recent_exit_permissions(column, entity_id: int):
+    stmt = (
+        select(DriverExitPermission)
+        .options(
+            _driver_option(DriverExitPermission.driver),
+            _truck_option(DriverExitPermission.truck),
+        )
+        .where(column == entity_id)
+        .order_by(
+            DriverExitPermission.departure_at.desc(),
+            DriverExitPermission.id.desc(),
+        )
+        .limit(DETAIL_PERMISSION_LIMIT)
+    )
+
+    return db.session.scalars(stmt).unique().all()
+
+
+def _recent_incidents(column, entity_id: int):
+    # Un selectinload para los seguimientos de los N incidentes.
+    stmt = (
+        select(TransportIncident)
+        .options(
+            _driver_option(TransportIncident.driver),
+            _truck_option(TransportIncident.truck),
+            selectinload(TransportIncident.follow_ups),
+        )
+        .where(column == entity_id)
+        .order_by(
+            TransportIncident.occurred_at.desc(),
+            TransportIncident.id.desc(),
+        )
+        .limit(DETAIL_INCIDENT_LIMIT)
+    )
+
+    return db.session.scalars(stmt).unique().all()
+
+
+def _recent_attachments(column, entity_id: int):
+    stmt = (
+        select(TransportAttachment)
+        .where(column == entity_id)
+        .order_by(
+            TransportAttachment.uploaded_at.desc(),
+            TransportAttachment.id.desc(),
+        )
+        .limit(DETAIL_ATTACHMENT_LIMIT)
+    )
+
+    return db.session.scalars(stmt).unique().all()
+
+
+# El historial del APM se guarda como entity_type APM con el id del
+# chofer.
+_CHANGE_ENTITY_TYPES = {
+    "DRIVER": ("DRIVER", "APM"),
+    "TRUCK": ("TRUCK",),
+}
+
+
+def _recent_changes(entity_type: str, entity_id: int):
+    # Una consulta por tipo, cada una recorre
+    # ix_transport_document_changes_entity_changed con LIMIT.
+    changes = []
+
+    for change_type in _CHANGE_ENTITY_TYPES[entity_type]:
+        stmt = (
+            select(TransportDocumentChange)
+            .where(
+                TransportDocumentChange.entity_type == change_type,
+                TransportDocumentChange.entity_id == entity_id,
+            )
+            .order_by(
+                TransportDocumentChange.changed_at.desc(),
+                TransportDocumentChange.id.desc(),
+            )
+            .limit(DETAIL_CHANGE_LIMIT)
+        )
+
+        changes.extend(db.session.scalars(stmt).unique().all())
+
+    changes.sort(key=lambda item: (item.changed_at, item.id), reverse=True)
+
+    return changes[:DETAIL_CHANGE_LIMIT]
+
+
+def _history_payload(entity_type: str, entity_id: int, owner_column: str) -> dict:
+    """
+    Secciones comunes a chofer y cabezal; owner_column es driver_id o
+    truck_id.
+    """
+    assignment_column = getattr(DriverTruckAssignment, owner_column)
+
+    return {
+        "active_assignment": _assignment(
+            _recent_assignments(assignment_column, entity_id, active_only=True)
+        ),
+        "assignments": [
+            _assignment(item)
+            for item in _recent_assignments(assignment_column, entity_id)
+        ],
+        "exit_permissions": [
+            _exit_permission(item)
+            for item in _recent_exit_permissions(
+                getattr(DriverExitPermission, owner_column), entity_id
+            )
+        ],
+        "incidents": [
+            _incident(item)
+            for item in _recent_incidents(
+                getattr(TransportIncident, owner_column), entity_id
+            )
+        ],
+        "attachments": [
+            _attachment(item)
+            for item in _recent_attachments(
+                getattr(TransportAttachment, owner_column), entity_id
+            )
+        ],
+        "document_changes": [
+            _change(item) for item in _recent_changes(entity_type, entity_id)
+        ],
+        "compliance": _compliance(
+            db.session.get(TransportCompliance, (entity_type, entity_id))
+        ),
+    }
+
+
+def _build_driver_detail(driver_id: int) -> dict | None:
+    stmt = (
+        select(Driver)
+        .options(
+            selectinload(Driver.documents),
+            selectinload(Driver.apm_record),
+            noload(Driver.assignments),
+            noload(Driver.exit_permissions),
+            noload(Driver.incidents),
+        )
+        .where(Driver.id == driver_id)
+    )
+
+    driver = db.session.scalar(stmt)
+
+    if driver is None:
+        return None
+
+    return {
+        "entity_type": "DRIVER",
+        "driver": {
+            "id": driver.id,
+            "name": driver.name,
+            "identification": driver.identification,
+            "status": driver.status,
+            "residence": driver.residence,
+            "phone_1": driver.phone_1,
+            "phone_2": driver.phone_2,
+            "notes": driver.notes,
+            "habitual_site": _site(driver.habitual_site),
+            "created_at": driver.created_at,
+            "updated_at": driver.updated_at,
+            "created_by": _user(driver.created_by),
+            "updated_by": _user(driver.updated_by),
+            "documents": [
+                _document(document)
+                for document in sorted(
+                    driver.documents,
+                    key=lambda item: item.document_type,
+                )
+            ],
+            "apm_record": _apm(driver.apm_record),
+        },
+        **_history_payload("DRIVER", driver.id, "driver_id"),
+        "built_at": datetime.utcnow(),
+    }
+
+
+def _build_truck_detail(truck_id: int) -> dict | None:
+    stmt = (
+        select(Truck)
+        .options(
+            selectinload(Truck.documents),
+            noload(Truck.assignments),
+            noload(Truck.exit_permissions),
+            noload(Truck.incidents),
+        )
+        .where(Truck.id == truck_id)
+    )
+
+    truck = db.session.scalar(stmt)
+
+    if truck is None:
+        return None
+
+    return {
+        "entity_type": "TRUCK",
+        "truck": {
+            "id": truck.id,
+            "plate": truck.plate,
+            "status": truck.status,
+            "bonded_status": truck.bonded_status,
+            "registration_date": truck.registration_date,
+            "registered_site": _site(truck.registered_site),
+            "owner": _owner(truck.owner),
+            "dock_permit_number": truck.dock_permit_number,
+            "dock_permit_expiry_date": truck.dock_permit_expiry_date,
+            "circulation_card": truck.circulation_card,
+            "dekra_month": truck.dekra_month,
+            "dekra_year": truck.dekra_year,
+            "insurance_name": truck.insurance_name,
+            "insurance_expiry_date": truck.insurance_expiry_date,
+            "is_payroll": truck.is_payroll,
+            "rt_name": truck.rt_name,
+            "rt_expiry_date": truck.rt_expiry_date,
+            "weights_dimensions": truck.weights_dimensions,
+            "policy_number": truck.policy_number,
+            "notes": truck.notes,
+            "created_at": truck.created_at,
+            "updated_at": truck.updated_at,
+            "created_by": _user(truck.created_by),
+            "updated_by": _user(truck.updated_by),
+            "documents": [
+                _document(document)
+                for document in sorted(
+                    truck.documents,
+                    key=lambda item: item.document_type,
+                )
+            ],
+        },
+        **_history_payload("TRUCK", truck.id, "truck_id"),
+        "built_at": datetime.utcnow(),
+    }
+
+
+_BUILDERS = {
+    "DRIVER": _build_driver_detail,
+    "TRUCK": _build_truck_detail,
+}
+
+
+def _get_detail(entity_type: str, entity_id: int) -> dict | None:
+    key = (entity_type, int(entity_id))
+
+    # La versión se lee antes de armar: si alguien confirma un cambio
+    # mientras tanto, la ficha queda guardada con la versión anterior
+    # y la próxima lectura la rearma.
+    version = _current_version(*key)
+    payload = _cache_get(key, version)
+
+    if payload is not None:
+        return payload
+
+    payload = _BUILDERS[entity_type](key[1])
+
+    if payload is not None:
+        _cache_put(key, version, payload)
+
+    return payload
+
+
+def get_driver_detail(driver_id: int) -> dict | None:
+    """
+    Ficha 360° del chofer (None si no existe). No modificar el dict:
+    es compartido por la caché.
+    """
+    return _get_detail("DRIVER", driver_id)
+
+
+def get_truck_detail(truck_id: int) -> dict | None:
+    """
+    Ficha 360° del cabezal (None si no existe). No modificar el dict:
+    es compartido por la caché.
+    """
+    return _get_detail("TRUCK", truck_id)
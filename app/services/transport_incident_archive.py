@@ -0,0 +1,534 @@
+# app/services/transport_incident_archive.py
+"""
+Archivo de incidentes de transporte y línea de tiempo.
+
+transport_incidents / transport_incident_follow_ups guardan lo
+operativo: incidentes abiertos, en seguimiento y los cerrados
+recientes. Los cerrados (RESOLVED / CANCELLED) de más de
+TRANSPORT_INCIDENT_ARCHIVE_MONTHS meses pasan a
+transport_incidents_archive / transport_incident_follow_ups_archive,
+particionadas por mes de occurred_at:
+
+- transport_incident_archive (cada noche) crea las particiones del
+  mes que haga falta y mueve los incidentes por tandas con un solo
+  INSERT ... DELETE por tanda. Los adjuntos se copian como metadatos
+  (los archivos no se tocan).
+- detach_archive_month() separa un mes de ambas tablas
+  (ALTER TABLE ... DETACH PARTITION) y lo renombra: queda como tabla
+  suelta para respaldarla (pg_dump) y borrarla. Ver
+  archive_incidents.py.
+- incident_timeline() lee la tabla operativa y, solo si el rango llega
+  a meses archivados, las particiones de ese rango (occurred_at en el
+  WHERE, PostgreSQL descarta las demás).
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import select, text
+from sqlalchemy.orm import noload, selectinload
+
+from app.extensions import db
+from app.models.transport import Driver, TransportIncident, Truck
+from app.models.transport_incident_archive import (
+    TransportIncidentArchive,
+    TransportIncidentFollowUpArchive,
+)
+from app.services.scheduler import scheduled_job
+from app.services.write_hooks import mark_transport_counters_stale, mark_transport_detail_touched
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 500
+
+DEFAULT_ARCHIVE_MONTHS = 12
+
+CLOSED_INCIDENT_STATUSES = ("RESOLVED", "CANCELLED")
+
+TIMELINE_MAX_DAYS = 366
+TIMELINE_LIMIT = 200
+
+_SCHEMA = "yard_gate_alamo"
+
+_ARCHIVE_TABLES = (
+    "transport_incidents_archive",
+    "transport_incident_follow_ups_archive",
+)
+
+
+def archive_months_default() -> int:
+    try:
+        months = int(current_app.config.get("TRANSPORT_INCIDENT_ARCHIVE_MONTHS", DEFAULT_ARCHIVE_MONTHS))
+    except (TypeError, ValueError):
+        months = DEFAULT_ARCHIVE_MONTHS
+
+    return max(months, 1)
+
+
+# =========================================================
+# Meses y particiones
+# =========================================================
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_cutoff(today: date | None = None) -> datetime:
+    """
+    Los cerrados con occurred_at anterior a esta fecha van al archivo.
+    Siempre es inicio de mes: cada partición recibe meses completos.
+    """
+    month = _add_months(_month_start(today or date.today()), -archive_months_default())
+    return datetime.combine(month, time.min)
+
+
+def _partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def ensure_archive_partitions(months) -> int:
+    """
+    Crea (si faltan) las particiones mensuales de ambas tablas.
+    """
+    created = 0
+
+    for month in sorted({_month_start(m) for m in months}):
+        next_month = _add_months(month, 1)
+
+        for table in _ARCHIVE_TABLES:
+            db.session.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {_SCHEMA}.{_partition_name(table, month)}
+                PARTITION OF {_SCHEMA}.{table}
+                FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')
+            """))
+            created += 1
+
+    return created
+
+
+def _attached_partitions(table: str) -> set[str]:
+    rows = db.session.execute(
+        text("""
+            SELECT child.relname
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            JOIN pg_namespace n ON n.oid = parent.relnamespace
+            WHERE n.nspname = :schema
+              AND parent.relname = :table
+        """),
+        {"schema": _SCHEMA, "table": table},
+    ).scalars()
+
+    return set(rows)
+
+
+def detach_archive_month(month: date) -> list[str]:
+    """
+    Separa el mes de ambas tablas del archivo y lo renombra
+    (..._pAAAAMM_cAAAAMMDDHHMM). Los datos dejan de verse en la
+    aplicación; la tabla suelta se respalda y se borra aparte.
+    Hace COMMIT.
+    """
+    month = _month_start(month)
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M")
+    detached = []
+
+    for table in _ARCHIVE_TABLES:
+        name = _partition_name(table, month)
+
+        if name not in _attached_partitions(table):
+            continue
+
+        cold_name = f"{name}_c{stamp}"
+
+        db.session.execute(text(f"ALTER TABLE {_SCHEMA}.{table} DETACH PARTITION {_SCHEMA}.{name}"))
+        db.session.execute(text(f"ALTER TABLE {_SCHEMA}.{name} RENAME TO {cold_name}"))
+
+        detached.append(f"{_SCHEMA}.{cold_name}")
+
+    db.session.commit()
+
+    if detached:
+        logger.info("TRANSPORT_INCIDENT_ARCHIVE_DETACHED month=%s tables=%s", month, detached)
+
+    return detached
+
+
+# =========================================================
+# Archivado
+# =========================================================
+
+_ARCHIVE_MONTHS_SQL = text("""
+    SELECT DISTINCT date_trunc('month', i.occurred_at)::date
+    FROM yard_gate_alamo.transport_incidents i
+    WHERE i.status = ANY(CAST(:statuses AS text[]))
+      AND i.occurred_at < :cutoff
+""")
+
+# Una tanda: copia incidentes, seguimientos y metadatos de adjuntos y
+# borra los originales (seguimientos y adjuntos caen por la FK ON
+# DELETE CASCADE). Todas las partes leen la misma foto, así que los
+# INSERT ven las filas que el DELETE quita.
+_ARCHIVE_BATCH_SQL = text("""
+    WITH picked AS (
+        SELECT i.id
+        FROM yard_gate_alamo.transport_incidents i
+        WHERE i.status = ANY(CAST(:statuses AS text[]))
+          AND i.occurred_at < :cutoff
+          -- Solo meses con partición ya creada: lo que se cierre
+          -- durante el archivado espera a la siguiente corrida.
+          AND date_trunc('month', i.occurred_at)::date = ANY(CAST(:months AS date[]))
+        ORDER BY i.occurred_at, i.id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    archived AS (
+        INSERT INTO yard_gate_alamo.transport_incidents_archive (
+            id, occurred_at, driver_id, truck_id, incident_type,
+            location, description, status, last_follow_up_at,
+            next_follow_up_at, resolution, resolved_at,
+            reported_by_user_id, resolved_by_user_id,
+            created_at, updated_at, attachments, archived_at
+        )
+        SELECT
+            i.id, i.occurred_at, i.driver_id, i.truck_id, i.incident_type,
+            i.location, i.description, i.status, i.last_follow_up_at,
+            i.next_follow_up_at, i.resolution, i.resolved_at,
+            i.reported_by_user_id, i.resolved_by_user_id,
+            i.created_at, i.updated_at,
+            coalesce(att.items, '[]'::jsonb),
+            :now
+        FROM yard_gate_alamo.transport_incidents i
+        JOIN picked p
+          ON p.id = i.id
+        LEFT JOIN LATERAL (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'id', a.id,
+                    'original_filename', a.original_filename,
+                    'stored_filename', a.stored_filename,
+                    'storage_path', a.storage_path,
+                    'mime_type', a.mime_type,
+                    'size_bytes', a.size_bytes,
+                    'content_sha256', a.content_sha256,
+                    'description', a.description,
+                    'uploaded_by_user_id', a.uploaded_by_user_id,
+                    'uploaded_at', a.uploaded_at
+                )
+                ORDER BY a.id
+            ) AS items
+            FROM yard_gate_alamo.transport_attachments a
+            WHERE a.incident_id = i.id
+        ) att ON true
+        RETURNING id, occurred_at, driver_id, truck_id
+    ),
+    follow_ups AS (
+        INSERT INTO yard_gate_alamo.transport_incident_follow_ups_archive (
+            id, occurred_at, incident_id, contacted_at, contact_name,
+            current_situation, repair_estimate, notes,
+            next_follow_up_at, resolved, created_by_user_id, created_at
+        )
+        SELECT
+            f.id, a.occurred_at, f.incident_id, f.contacted_at, f.contact_name,
+            f.current_situation, f.repair_estimate, f.notes,
+            f.next_follow_up_at, f.resolved, f.created_by_user_id, f.created_at
+        FROM yard_gate_alamo.transport_incident_follow_ups f
+        JOIN archived a
+          ON a.id = f.incident_id
+    ),
+    deleted AS (
+        DELETE FROM yard_gate_alamo.transport_incidents i
+        USING archived a
+        WHERE i.id = a.id
+    )
+    SELECT driver_id, truck_id
+    FROM archived
+""")
+
+
+def archive_closed_incidents(
+    *,
+    cutoff: datetime | None = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> dict[str, int]:
+    """
+    Mueve al archivo los incidentes cerrados anteriores a cutoff.
+    Hace COMMIT por tanda.
+    """
+    cutoff = cutoff or archive_cutoff()
+    params = {
+        "statuses": list(CLOSED_INCIDENT_STATUSES),
+        "cutoff": cutoff,
+    }
+
+    months = db.session.execute(_ARCHIVE_MONTHS_SQL, params).scalars().all()
+
+    result = {"archived": 0, "batches": 0, "months": len(months)}
+
+    if not months:
+        return result
+
+    ensure_archive_partitions(months)
+    db.session.commit()
+
+    while True:
+        rows = db.session.execute(
+            _ARCHIVE_BATCH_SQL,
+            {
+                **params,
+                "months": list(months),
+                "batch_size": batch_size,
+                "now": datetime.utcnow(),
+            },
+        ).all()
+
+        if not rows:
+            db.session.rollback()
+            break
+
+        # SQL directo: contadores y fichas 360° se actualizan al
+        # hacer COMMIT (write_hooks.py).
+        mark_transport_counters_stale("incidents")
+        mark_transport_detail_touched(
+            driver_ids=[row.driver_id for row in rows],
+            truck_ids=[row.truck_id for row in rows],
+        )
+
+        db.session.commit()
+
+        result["archived"] += len(rows)
+        result["batches"] += 1
+
+        if len(rows) < batch_size:
+            break
+
+    logger.info(
+        "TRANSPORT_INCIDENT_ARCHIVE cutoff=%s archived=%s",
+        cutoff,
+        result["archived"],
+    )
+
+    return result
+
+
+@scheduled_job(
+    "transport_incident_archive",
+    every_seconds=86400,
+    config_key="TRANSPORT_INCIDENT_ARCHIVE_SECONDS",
+    minimum_seconds=3600,
+)
+def nightly_transport_incident_archive() -> dict[str, int]:
+    return archive_closed_incidents()
+
+
+# =========================================================
+# Consultas
+# =========================================================
+
+def get_archived_incident(incident_id: int):
+    """
+    (incidente, seguimientos) del archivo, o None. Busca por id en
+    todas las particiones (ix_transport_incidents_archive_id).
+    """
+    incident = db.session.scalar(
+        select(TransportIncidentArchive)
+        .where(TransportIncidentArchive.id == incident_id)
+        .limit(1)
+    )
+
+    if incident is None:
+        return None
+
+    follow_ups = db.session.scalars(
+        select(TransportIncidentFollowUpArchive)
+        .where(
+            TransportIncidentFollowUpArchive.incident_id == incident.id,
+            TransportIncidentFollowUpArchive.occurred_at == incident.occurred_at,
+        )
+        .order_by(TransportIncidentFollowUpArchive.contacted_at.desc())
+    ).all()
+
+    return incident, follow_ups
+
+
+def _range_filter(model, start: datetime, end: datetime, driver_id, truck_id):
+    conditions = [
+        model.occurred_at >= start,
+        model.occurred_at < end,
+    ]
+
+    if driver_id:
+        conditions.append(model.driver_id == driver_id)
+
+    if truck_id:
+        conditions.append(model.truck_id == truck_id)
+
+    return conditions
+
+
+def _events(incident, follow_ups, *, archived: bool, names: dict) -> list[dict]:
+    base = {
+        "incident_id": incident.id,
+        "incident_type": incident.incident_type,
+        "status": incident.status,
+        "archived": archived,
+        "driver_id": incident.driver_id,
+        "driver_name": names["drivers"].get(incident.driver_id),
+        "truck_id": incident.truck_id,
+        "plate": names["trucks"].get(incident.truck_id),
+    }
+
+    events = [{
+        **base,
+        "kind": "INCIDENT",
+        "at": incident.occurred_at,
+        "text": incident.description,
+        "location": incident.location,
+    }]
+
+    for follow_up in follow_ups:
+        events.append({
+            **base,
+            "kind": "FOLLOW_UP",
+            "at": follow_up.contacted_at,
+            "text": follow_up.current_situation,
+            "contact_name": follow_up.contact_name,
+            "resolved": follow_up.resolved,
+        })
+
+    if incident.resolved_at:
+        events.append({
+            **base,
+            "kind": incident.status,
+            "at": incident.resolved_at,
+            "text": incident.resolution,
+        })
+
+    return events
+
+
+def incident_timeline(
+    *,
+    since: date,
+    until: date,
+    driver_id: int | None = None,
+    truck_id: int | None = None,
+    limit: int = TIMELINE_LIMIT,
+) -> dict:
+    """
+    Eventos (reporte, seguimientos, cierre) de los incidentes con
+    occurred_at entre since y until (ambos incluidos), del más reciente
+    al más antiguo. Como máximo limit incidentes.
+
+    Cantidad fija de consultas: operativos + sus seguimientos y, si el
+    rango llega al archivo, archivados + sus seguimientos, más los
+    nombres de choferes y placas.
+    """
+    if until < since:
+        since, until = until, since
+
+    if (until - since).days > TIMELINE_MAX_DAYS:
+        raise ValueError(
+            f"El rango no puede superar {TIMELINE_MAX_DAYS} días."
+        )
+
+    limit = min(max(int(limit or TIMELINE_LIMIT), 1), TIMELINE_LIMIT)
+
+    start = datetime.combine(since, time.min)
+    end = datetime.combine(until + timedelta(days=1), time.min)
+
+    hot = db.session.scalars(
+        select(TransportIncident)
+        .options(
+            noload(TransportIncident.driver),
+            noload(TransportIncident.truck),
+            noload(TransportIncident.reported_by),
+            noload(TransportIncident.resolved_by),
+            selectinload(TransportIncident.follow_ups).noload("*"),
+        )
+        .where(*_range_filter(TransportIncident, start, end, driver_id, truck_id))
+        .order_by(
+            TransportIncident.occurred_at.desc(),
+            TransportIncident.id.desc(),
+        )
+        .limit(limit)
+    ).all()
+
+    items = [(incident, list(incident.follow_ups), False) for incident in hot]
+
+    # Solo si el rango llega a meses que pueden estar archivados.
+    if start < archive_cutoff():
+        archived = db.session.scalars(
+            select(TransportIncidentArchive)
+            .where(*_range_filter(TransportIncidentArchive, start, end, driver_id, truck_id))
+            .order_by(
+                TransportIncidentArchive.occurred_at.desc(),
+                TransportIncidentArchive.id.desc(),
+            )
+            .limit(limit)
+        ).all()
+
+        follow_ups_by_incident = {}
+
+        if archived:
+            for follow_up in db.session.scalars(
+                select(TransportIncidentFollowUpArchive).where(
+                    TransportIncidentFollowUpArchive.incident_id.in_(
+                        [incident.id for incident in archived]
+                    ),
+                    TransportIncidentFollowUpArchive.occurred_at >= start,
+                    TransportIncidentFollowUpArchive.occurred_at < end,
+                )
+            ):
+                follow_ups_by_incident.setdefault(follow_up.incident_id, []).append(follow_up)
+
+        items.extend(
+            (incident, follow_ups_by_incident.get(incident.id, []), True)
+            for incident in archived
+        )
+
+    items.sort(key=lambda item: (item[0].occurred_at, item[0].id), reverse=True)
+
+    truncated = len(items) > limit
+    items = items[:limit]
+
+    driver_ids = {incident.driver_id for incident, _, _ in items if incident.driver_id}
+    truck_ids = {incident.truck_id for incident, _, _ in items if incident.truck_id}
+
+    names = {"drivers": {}, "trucks": {}}
+
+    if driver_ids:
+        names["drivers"] = dict(
+            db.session.execute(
+                select(Driver.id, Driver.name).where(Driver.id.in_(driver_ids))
+            ).all()
+        )
+
+    if truck_ids:
+        names["trucks"] = dict(
+            db.session.execute(
+                select(Truck.id, Truck.plate).where(Truck.id.in_(truck_ids))
+            ).all()
+        )
+
+    events = []
+
+    for incident, follow_ups, is_archived in items:
+        events.extend(_events(incident, follow_ups, archived=is_archived, names=names))
+
+    events.sort(key=lambda event: (event["at"], event["incident_id"]), reverse=True)
+
+    return {
+        "since": since,
+        "until": until,
+        "incidents": len(items),
+        "truncated": truncated,
+        "events": events,
+    }
@@ -0,0 +1,402 @@
+# app/services/write_hooks.py
+"""
+Datos derivados que se mantienen al escribir.
+
+Un listener de la sesión anota en session.info lo que cambió en la
+transacción (en cada flush) y, antes del COMMIT, actualiza con SQL por
+conjuntos lo que depende de ello, dentro de la misma transacción:
+
+- movements.chassis_id / previous_eir_id y
+  chassis.last_confirmed_eir_id (app/services/movement_links.py)
+- container_current_state (app/services/container_state.py)
+- transport_compliance (app/services/transport_compliance.py)
+- transport_detail_versions (app/services/transport_detail.py)
+- transport_counters (app/services/transport_counters.py)
+
+Después del COMMIT se encola el refresco de movement_facts
+(app/services/movement_facts.py), que corre fuera de la petición.
+
+Las escrituras por SQL directo no pasan por el ORM: quien las hace
+debe llamar a mark_movements_touched() / mark_containers_touched() /
+mark_transport_compliance_touched() / mark_transport_detail_touched() /
+mark_transport_counters_stale().
+"""
+
+import logging
+
+from sqlalchemy import event, inspect
+
+from app.extensions import db
+from app.models.container_classification import ContainerClassification
+from app.models.eir import EIR
+from app.models.movement import Movement
+from app.models.tire import TireReading
+from app.models.transport import (
+    Driver,
+    DriverApmRecord,
+    DriverDocument,
+    DriverExitPermission,
+    DriverTruckAssignment,
+    TransportAttachment,
+    TransportIncident,
+    TransportIncidentFollowUp,
+    Truck,
+    TruckDocument,
+    TruckOwner,
+)
+from app.services.container_state import refresh_container_state
+from app.services.movement_facts import FACT_MOVEMENT_TYPES, enqueue_movement_facts_refresh
+from app.services.movement_links import link_movements, refresh_chassis_last_eir
+from app.services.transport_compliance import refresh_driver_compliance, refresh_truck_compliance
+from app.services.transport_counters import COUNTED_MODELS, apply_transport_counter_changes
+from app.services.transport_detail import bump_transport_detail_versions
+
+logger = logging.getLogger(__name__)
+
+# Ids tocados en la transacción actual (session.info)
+_MOVEMENT_IDS_KEY = "touched_movement_ids"
+_CHASSIS_IDS_KEY = "touched_chassis_ids"
+_CONTAINER_IDS_KEY = "touched_container_ids"
+_DRIVER_IDS_KEY = "touched_compliance_driver_ids"
+_TRUCK_IDS_KEY = "touched_compliance_truck_ids"
+_DETAIL_DRIVER_IDS_KEY = "touched_detail_driver_ids"
+_DETAIL_TRUCK_IDS_KEY = "touched_detail_truck_ids"
+_DETAIL_INCIDENT_IDS_KEY = "touched_detail_incident_ids"
+# Choferes / cabezales / propietarios cuyos datos aparecen en la ficha
+# de la contraparte (nombre, cédula, placa, propietario)
+_RENAMED_DRIVER_IDS_KEY = "touched_detail_renamed_driver_ids"
+_RENAMED_TRUCK_IDS_KEY = "touched_detail_renamed_truck_ids"
+_RENAMED_OWNER_IDS_KEY = "touched_detail_renamed_owner_ids"
+# {(counter_key, status): diferencia} y tablas a recontar
+_COUNTER_DELTAS_KEY = "transport_counter_deltas"
+_COUNTER_STALE_KEY = "transport_counter_stale"
+
+_ALL_KEYS = (
+    _MOVEMENT_IDS_KEY,
+    _CHASSIS_IDS_KEY,
+    _CONTAINER_IDS_KEY,
+    _DRIVER_IDS_KEY,
+    _TRUCK_IDS_KEY,
+    _DETAIL_DRIVER_IDS_KEY,
+    _DETAIL_TRUCK_IDS_KEY,
+    _DETAIL_INCIDENT_IDS_KEY,
+    _RENAMED_DRIVER_IDS_KEY,
+    _RENAMED_TRUCK_IDS_KEY,
+    _RENAMED_OWNER_IDS_KEY,
+    _COUNTER_DELTAS_KEY,
+    _COUNTER_STALE_KEY,
+)
+
+
+def _touched(session, key: str) -> set:
+    return session.info.setdefault(key, set())
+
+
+def _clean_ids(ids):
+    return (int(i) for i in ids or [] if i)
+
+
+def mark_movements_touched(movement_ids) -> None:
+    """
+    Para escrituras por SQL directo (p. ej. tire_readings): el
+    movimiento se vuelve a enlazar y refrescar al hacer COMMIT.
+    """
+    _touched(db.session, _MOVEMENT_IDS_KEY).update(_clean_ids(movement_ids))
+
+
+def mark_containers_touched(container_ids) -> None:
+    """
+    Para escrituras por SQL directo (p. ej. container_classifications):
+    el estado actual del contenedor se recalcula al hacer COMMIT.
+    """
+    _touched(db.session, _CONTAINER_IDS_KEY).update(_clean_ids(container_ids))
+
+
+def mark_transport_compliance_touched(*, driver_ids=(), truck_ids=()) -> None:
+    """
+    Para escrituras por SQL directo de documentos de transporte (carga
+    masiva): el índice de cumplimiento se recalcula al hacer COMMIT.
+    """
+    _touched(db.session, _DRIVER_IDS_KEY).update(_clean_ids(driver_ids))
+    _touched(db.session, _TRUCK_IDS_KEY).update(_clean_ids(truck_ids))
+
+
+def mark_transport_detail_touched(
+    *,
+    driver_ids=(),
+    truck_ids=(),
+    incident_ids=(),
+    renamed_driver_ids=(),
+    renamed_truck_ids=(),
+) -> None:
+    """
+    Para escrituras por SQL directo que cambian la ficha de un chofer
+    o cabezal (historial documental, vencimientos por lote): la ficha
+    en caché se invalida al hacer COMMIT. Lo marcado con
+    mark_transport_compliance_touched() ya la invalida.
+
+    renamed_*: choferes/cabezales cuyo nombre, cédula, placa o
+    propietario pudo cambiar; también se invalidan sus contrapartes.
+    """
+    _touched(db.session, _DETAIL_DRIVER_IDS_KEY).update(_clean_ids(driver_ids))
+    _touched(db.session, _DETAIL_TRUCK_IDS_KEY).update(_clean_ids(truck_ids))
+    _touched(db.session, _DETAIL_INCIDENT_IDS_KEY).update(_clean_ids(incident_ids))
+    _touched(db.session, _RENAMED_DRIVER_IDS_KEY).update(_clean_ids(renamed_driver_ids))
+    _touched(db.session, _RENAMED_TRUCK_IDS_KEY).update(_clean_ids(renamed_truck_ids))
+
+
+def mark_transport_counters_stale(*counter_keys: str) -> None:
+    """
+    Para escrituras por SQL directo sobre tablas con contador
+    (transport_counters.COUNTER_SOURCES): la tabla se recuenta al
+    hacer COMMIT.
+    """
+    _touched(db.session, _COUNTER_STALE_KEY).update(counter_keys)
+
+
+# =========================================================
+# Listener de la sesión
+# =========================================================
+
+def _collect_counter_deltas(session) -> None:
+    deltas = session.info.setdefault(_COUNTER_DELTAS_KEY, {})
+    stale = _touched(session, _COUNTER_STALE_KEY)
+
+    def add(counter_key, status, delta):
+        if status is None:
+            # Sin el valor no se puede restar/sumar: recontar.
+            stale.add(counter_key)
+            return
+
+        key = (counter_key, status)
+        deltas[key] = deltas.get(key, 0) + delta
+
+    for obj in session.new:
+        counter_key = COUNTED_MODELS.get(type(obj))
+        if counter_key:
+            add(counter_key, obj.status, 1)
+
+    for obj in session.deleted:
+        counter_key = COUNTED_MODELS.get(type(obj))
+        if counter_key:
+            history = inspect(obj).attrs.status.history
+            add(counter_key, (history.deleted or history.unchanged or [None])[0], -1)
+
+    for obj in session.dirty:
+        counter_key = COUNTED_MODELS.get(type(obj))
+        if not counter_key:
+            continue
+
+        history = inspect(obj).attrs.status.history
+        if not history.added:
+            continue
+
+        # Valor anterior no cargado: history.deleted viene vacío.
+        add(counter_key, (history.deleted or [None])[0], -1)
+        add(counter_key, history.added[0], 1)
+
+
+# Campos que _driver_ref / _truck_ref / _owner copian en la ficha de
+# la contraparte (app/services/transport_detail.py).
+_DRIVER_REF_FIELDS = ("name", "identification")
+_TRUCK_REF_FIELDS = ("plate", "owner_id")
+_OWNER_REF_FIELDS = ("name", "phone")
+
+
+def _changed(obj, fields) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _collect_touched_ids(session, flush_context) -> None:
+    movement_ids = _touched(session, _MOVEMENT_IDS_KEY)
+    chassis_ids = _touched(session, _CHASSIS_IDS_KEY)
+    container_ids = _touched(session, _CONTAINER_IDS_KEY)
+    driver_ids = _touched(session, _DRIVER_IDS_KEY)
+    truck_ids = _touched(session, _TRUCK_IDS_KEY)
+    detail_driver_ids = _touched(session, _DETAIL_DRIVER_IDS_KEY)
+    detail_truck_ids = _touched(session, _DETAIL_TRUCK_IDS_KEY)
+    detail_incident_ids = _touched(session, _DETAIL_INCIDENT_IDS_KEY)
+    renamed_driver_ids = _touched(session, _RENAMED_DRIVER_IDS_KEY)
+    renamed_truck_ids = _touched(session, _RENAMED_TRUCK_IDS_KEY)
+    renamed_owner_ids = _touched(session, _RENAMED_OWNER_IDS_KEY)
+
+    _collect_counter_deltas(session)
+
+    for obj in session.dirty:
+        if isinstance(obj, Driver) and _changed(obj, _DRIVER_REF_FIELDS):
+            renamed_driver_ids.add(obj.id)
+
+        elif isinstance(obj, Truck) and _changed(obj, _TRUCK_REF_FIELDS):
+            renamed_truck_ids.add(obj.id)
+
+        elif isinstance(obj, TruckOwner) and _changed(obj, _OWNER_REF_FIELDS):
+            renamed_owner_ids.add(obj.id)
+
+    # Documentos de transporte: también los borrados.
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (DriverDocument, DriverApmRecord)):
+            if obj.driver_id:
+                driver_ids.add(obj.driver_id)
+
+        elif isinstance(obj, TruckDocument):
+            if obj.truck_id:
+                truck_ids.add(obj.truck_id)
+
+        # Ficha 360°: la propia fila y todo lo que cuelga de ella.
+        if isinstance(obj, Driver):
+            detail_driver_ids.add(obj.id)
+
+        elif isinstance(obj, Truck):
+            detail_truck_ids.add(obj.id)
+
+        elif isinstance(
+            obj,
+            (
+                DriverTruckAssignment,
+                DriverExitPermission,
+                TransportIncident,
+                TransportAttachment,
+            ),
+        ):
+            detail_driver_ids.add(obj.driver_id)
+            detail_truck_ids.add(obj.truck_id)
+
+        elif isinstance(obj, TransportIncidentFollowUp):
+            detail_incident_ids.add(obj.incident_id)
+
+    # Chofer nuevo: todos sus documentos quedan pendientes. Cabezal:
+    # los vencimientos están en la propia fila.
+    for obj in session.new:
+        if isinstance(obj, Driver) and obj.id:
+            driver_ids.add(obj.id)
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Truck) and obj.id:
+            truck_ids.add(obj.id)
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Movement):
+            if obj.id and obj.movement_type in FACT_MOVEMENT_TYPES:
+                movement_ids.add(obj.id)
+
+                if obj.movement_type == "GATE_IN" and obj.container_id:
+                    container_ids.add(obj.container_id)
+
+        elif isinstance(obj, ContainerClassification):
+            if obj.container_id:
+                container_ids.add(obj.container_id)
+
+        elif isinstance(obj, EIR):
+            if obj.gate_out_movement_id:
+                movement_ids.add(obj.gate_out_movement_id)
+
+            # Chasis actual y anterior (si el EIR cambió de chasis)
+            history = inspect(obj).attrs.chassis_id.history
+            chassis_ids.update(cid for cid in history.sum() if cid)
+            if obj.chassis_id:
+                chassis_ids.add(obj.chassis_id)
+
+        elif isinstance(obj, TireReading):
+            if obj.event_type == "GATE_IN" and obj.event_id:
+                movement_ids.add(obj.event_id)
+
+
+def _before_commit(session) -> None:
+    # Flush primero para que after_flush anote lo pendiente y las
+    # filas estén visibles para los UPDATE por conjuntos.
+    session.flush()
+
+    movement_ids = session.info.get(_MOVEMENT_IDS_KEY)
+    chassis_ids = session.info.get(_CHASSIS_IDS_KEY)
+    container_ids = session.info.get(_CONTAINER_IDS_KEY)
+    driver_ids = session.info.get(_DRIVER_IDS_KEY)
+    truck_ids = session.info.get(_TRUCK_IDS_KEY)
+    detail_driver_ids = session.info.get(_DETAIL_DRIVER_IDS_KEY)
+    detail_truck_ids = session.info.get(_DETAIL_TRUCK_IDS_KEY)
+    detail_incident_ids = session.info.get(_DETAIL_INCIDENT_IDS_KEY)
+    renamed_driver_ids = session.info.get(_RENAMED_DRIVER_IDS_KEY)
+    renamed_truck_ids = session.info.get(_RENAMED_TRUCK_IDS_KEY)
+    renamed_owner_ids = session.info.get(_RENAMED_OWNER_IDS_KEY)
+    counter_deltas = session.info.get(_COUNTER_DELTAS_KEY)
+    counter_stale = session.info.get(_COUNTER_STALE_KEY)
+
+    # Misma transacción: el derivado nunca queda desfasado del dato.
+    if movement_ids:
+        link_movements(movement_ids)
+
+    if chassis_ids:
+        refresh_chassis_last_eir(chassis_ids)
+
+    if container_ids:
+        refresh_container_state(container_ids)
+
+    if driver_ids:
+        refresh_driver_compliance(driver_ids)
+
+    if truck_ids:
+        refresh_truck_compliance(truck_ids)
+
+    # Un documento que cambia el cumplimiento también cambia la ficha.
+    if any((
+        driver_ids,
+        truck_ids,
+        detail_driver_ids,
+        detail_truck_ids,
+        detail_incident_ids,
+        renamed_driver_ids,
+        renamed_truck_ids,
+        renamed_owner_ids,
+    )):
+        bump_transport_detail_versions(
+            driver_ids=(driver_ids or set()) | (detail_driver_ids or set()),
+            truck_ids=(truck_ids or set()) | (detail_truck_ids or set()),
+            incident_ids=detail_incident_ids,
+            renamed_driver_ids=renamed_driver_ids,
+            renamed_truck_ids=renamed_truck_ids,
+            owner_ids=renamed_owner_ids,
+        )
+
+    if counter_deltas or counter_stale:
+        apply_transport_counter_changes(counter_deltas, counter_stale)
+
+
+def _after_commit(session) -> None:
+    movement_ids = session.info.pop(_MOVEMENT_IDS_KEY, None)
+
+    for key in _ALL_KEYS:
+        session.info.pop(key, None)
+
+    if not movement_ids:
+        return
+
+    try:
+        enqueue_movement_facts_refresh(movement_ids)
+    except Exception:
+        # Nunca interrumpe la petición: el barrido los recoge.
+        logger.exception("MOVEMENT_FACTS_ENQUEUE_FAILED")
+
+
+def _after_rollback(session, previous_transaction) -> None:
+    for key in _ALL_KEYS:
+        session.info.pop(key, None)
+
+
+_listeners_registered = False
+
+
+def init_write_hooks() -> None:
+    """
+    Registra los listeners de la sesión (una vez por proceso).
+    """
+    global _listeners_registered
+
+    if _listeners_registered:
+        return
+
+    event.listen(db.session, "after_flush", _collect_touched_ids)
+    event.listen(db.session, "before_commit", _before_commit)
+    event.listen(db.session, "after_commit", _after_commit)
+    event.listen(db.session, "after_soft_rollback", _after_rollback)
+
+    _listeners_registered = True
@@ -0,0 +1,370 @@
+# app/services/xlsx_export.py
+"""
+Exportación XLSX en streaming.
+
+openpyxl arma el libro completo en memoria (un objeto por celda) y las
+exportaciones grandes (reportes de un año, inventario completo) llegaban
+a cientos de MB dentro de un worker.
+
+XlsxStreamWriter escribe cada fila como XML directamente a un archivo
+temporal y calcula el ancho de las columnas mientras las filas pasan.
+Al cerrar arma el .xlsx (zip) en disco y xlsx_response lo envía por
+bloques. La memoria queda constante sin importar el número de filas.
+
+Uso:
+
+    writer = XlsxStreamWriter("Reportes", headers, max_width=40)
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        writer.append([...])
+    return xlsx_response(writer, "reporte.xlsx")
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from flask import Response
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+CHUNK_SIZE = 64 * 1024
+
+# Filas leídas por bloque (yield_per) en las exportaciones.
+EXPORT_BATCH_SIZE = 1000
+
+# Caracteres de control que XML 1.0 no admite (openpyxl los rechaza
+# con IllegalCharacterError).
+_ILLEGAL_XML_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_SHEET_TITLE_RE = re.compile(r"[\[\]\*\?/\\:]")
+
+# Estilos: 0 = normal, 1 = encabezado (negrita, centrado).
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '</fonts>'
+    '<fills count="2">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '</fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+
+def column_letter(idx: int) -> str:
+    """
+    1 -> A, 27 -> AA.
+    """
+    letters = ""
+
+    while idx > 0:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+
+    return letters
+
+
+def _cell_text(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+
+    return _ILLEGAL_XML_CHARS_RE.sub("", str(value))
+
+
+class XlsxStreamWriter:
+    """
+    Escribe una hoja XLSX fila por fila sin mantenerla en memoria.
+
+    - headers: primera fila (en negrita si bold_header=True).
+    - max_width: tope del ancho calculado por columna.
+    - widths: anchos fijos {letra: ancho}; esas columnas no se calculan.
+    - freeze_header: congela la primera fila (equivale a freeze_panes="A2").
+
+    Las filas se escriben a un temporal; close() arma el .xlsx. El
+    temporal se elimina al terminar de enviar la respuesta o con
+    discard().
+    """
+
+    def __init__(
+        self,
+        title: str,
+        headers: list,
+        *,
+        max_width: int = 40,
+        widths: dict | None = None,
+        bold_header: bool = False,
+        freeze_header: bool = False,
+    ):
+        self.title = (_SHEET_TITLE_RE.sub("", title or "") or "Hoja1")[:31]
+        self.max_width = max_width
+        self.fixed_widths = dict(widths or {})
+        self.freeze_header = freeze_header
+
+        self.row_count = 0
+        self._row_idx = 0
+        self._max_len: dict[int, int] = {}
+        self._max_col = 0
+
+        fd, self._rows_path = tempfile.mkstemp(prefix="xlsx_rows_", suffix=".xml")
+        self._rows = os.fdopen(fd, "w", encoding="utf-8")
+        self.path: str | None = None
+
+        self._write_row(headers, style=1 if bold_header else 0)
+
+    # -----------------------------------------------------
+    # Filas
+    # -----------------------------------------------------
+
+    def append(self, values) -> None:
+        self._write_row(values)
+        self.row_count += 1
+
+    def _write_row(self, values, style: int = 0) -> None:
+        self._row_idx += 1
+        r = self._row_idx
+        style_attr = f' s="{style}"' if style else ""
+
+        cells = []
+
+        for col_idx, value in enumerate(values, start=1):
+            if value is None or value == "":
+                continue
+
+            ref = f"{column_letter(col_idx)}{r}"
+
+            if isinstance(value, bool):
+                text = "TRUE" if value else "FALSE"
+                cells.append(f'<c r="{ref}" t="b"{style_attr}><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float, Decimal)):
+                text = str(value)
+                cells.append(f'<c r="{ref}"{style_attr}><v>{text}</v></c>')
+            else:
+                text = _cell_text(value)
+                cells.append(
+                    f'<c r="{ref}" t="inlineStr"{style_attr}>'
+                    f'<is><t xml:space="preserve">{escape(text)}</t></is></c>'
+                )
+
+            # Ancho calculado en la misma pasada.
+            if len(text) > self._max_len.get(col_idx, 0):
+                self._max_len[col_idx] = len(text)
+
+            if col_idx > self._max_col:
+                self._max_col = col_idx
+
+        self._rows.write(f'<row r="{r}">{"".join(cells)}</row>')
+
+    # -----------------------------------------------------
+    # Archivo final
+    # -----------------------------------------------------
+
+    def _cols_xml(self) -> str:
+        cols = []
+
+        for col_idx in range(1, self._max_col + 1):
+            letter = column_letter(col_idx)
+
+            if letter in self.fixed_widths:
+                width = self.fixed_widths[letter]
+            else:
+                width = min(self._max_len.get(col_idx, 0) + 2, self.max_width)
+
+            cols.append(f'<col min="{col_idx}" max="{col_idx}" width="{width}" customWidth="1"/>')
+
+        return f"<cols>{''.join(cols)}</cols>" if cols else ""
+
+    def _sheet_views_xml(self) -> str:
+        if not self.freeze_header:
+            return '<sheetViews><sheetView workbookViewId="0"/></sheetViews>'
+
+        return (
+            '<sheetViews><sheetView workbookViewId="0">'
+            '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+            '<selection pane="bottomLeft" activeCell="A2" sqref="A2"/>'
+            '</sheetView></sheetViews>'
+        )
+
+    def _workbook_xml(self) -> str:
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(self.title, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        )
+
+    def close(self) -> str:
+        """
+        Arma el .xlsx y retorna su ruta.
+        """
+        if self.path:
+            return self.path
+
+        self._rows.close()
+
+        fd, path = tempfile.mkstemp(prefix="export_", suffix=".xlsx")
+        os.close(fd)
+
+        try:
+            with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr("[Content_Types].xml", _CONTENT_TYPES_XML)
+                zf.writestr("_rels/.rels", _ROOT_RELS_XML)
+                zf.writestr("xl/workbook.xml", self._workbook_xml())
+                zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS_XML)
+                zf.writestr("xl/styles.xml", _STYLES_XML)
+
+                # <cols> va antes de <sheetData>; por eso las filas se
+                # escriben primero a un temporal y se copian aquí.
+                with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as dst:
+                    dst.write((
+                        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        f"{self._sheet_views_xml()}{self._cols_xml()}<sheetData>"
+                    ).encode("utf-8"))
+
+                    with open(self._rows_path, "rb") as src:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+                    dst.write(b"</sheetData></worksheet>")
+        except Exception:
+            _remove_quietly(path)
+            raise
+        finally:
+            _remove_quietly(self._rows_path)
+
+        self.path = path
+        return path
+
+    def discard(self) -> None:
+        """
+        Elimina los temporales (exportación cancelada por error).
+        """
+        if not self._rows.closed:
+            self._rows.close()
+
+        _remove_quietly(self._rows_path)
+
+        if self.path:
+            _remove_quietly(self.path)
+
+
+def _remove_quietly(path: str | None) -> None:
+    if not path:
+        return
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _content_disposition(filename: str, inline: bool = False) -> str:
+    disposition = "inline" if inline else "attachment"
+    ascii_name = filename.encode("ascii", "ignore").decode("ascii").replace('"', "") or "export.xlsx"
+
+    if ascii_name == filename:
+        return f'{disposition}; filename="{filename}"'
+
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def stream_file_response(
+    path: str,
+    filename: str,
+    mimetype: str,
+    *,
+    inline: bool = False,
+    delete: bool = True,
+) -> Response:
+    """
+    Envía un archivo de disco por bloques.
+
+    delete=True: el archivo es temporal y se elimina al cerrar la
+    respuesta (también si el cliente corta la descarga a medias).
+    """
+    size = os.path.getsize(path)
+
+    def generate():
+        with open(path, "rb") as fh:
+            while True:
+                chunk = fh.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    resp = Response(
+        generate(),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": _content_disposition(filename, inline=inline),
+            "Content-Length": str(size),
+        },
+        direct_passthrough=True,
+    )
+
+    if delete:
+        resp.call_on_close(lambda: _remove_quietly(path))
+
+    return resp
+
+
+def xlsx_response(writer: XlsxStreamWriter, filename: str) -> Response:
+    """
+    Envía el .xlsx por bloques y elimina el temporal al terminar.
+    """
+    return stream_file_response(writer.close(), filename, XLSX_MIMETYPE)
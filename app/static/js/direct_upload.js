@@ -0,0 +1,143 @@
+// Subida directa de fotos a R2 con URL prefirmada.
+//
+// Se activa en formularios con data-direct-upload="1".
+// 1. Envía el formulario sin las fotos (fetch + X-Direct-Upload).
+// 2. Si el servidor responde JSON, sube cada foto directo a R2
+//    (presign -> PUT -> confirm) y luego redirige.
+// 3. Si responde HTML (validación fallida, redirect con flash),
+//    simplemente navega a esa página.
+(function () {
+  async function postJson(url, payload) {
+    const res = await fetch(url, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      credentials: "same-origin",
+      body: JSON.stringify(payload),
+    });
+
+    const data = await res.json().catch(() => ({}));
+
+    if (!res.ok || !data.ok) {
+      throw new Error(data.error || `HTTP ${res.status}`);
+    }
+
+    return data;
+  }
+
+  async function uploadOne(file, presignUrl, confirmUrl, photoType) {
+    const contentType = file.type || "image/jpeg";
+
+    const upload = await postJson(presignUrl, {
+      filename: file.name,
+      content_type: contentType,
+      size: file.size,
+      photo_type: photoType,
+    });
+
+    const put = await fetch(upload.url, {
+      method: upload.method || "PUT",
+      headers: upload.headers || {},
+      body: file,
+    });
+
+    if (!put.ok) {
+      throw new Error(`R2 ${put.status}`);
+    }
+
+    return postJson(confirmUrl, {
+      key: upload.key,
+      photo_type: photoType,
+    });
+  }
+
+  async function uploadFiles(files, presignUrl, confirmUrl, photoType) {
+    const failed = [];
+
+    // Secuencial: la conexión del predio suele ser lenta y así cada
+    // foto llega completa antes de empezar la siguiente.
+    for (const file of files) {
+      try {
+        await uploadOne(file, presignUrl, confirmUrl, photoType);
+      } catch (err) {
+        console.error("DIRECT_UPLOAD_FAILED", file.name, err);
+        failed.push(file.name);
+      }
+    }
+
+    return failed;
+  }
+
+  function attach(form) {
+    const input = form.querySelector('input[type="file"][name="photos"]');
+    const submitBtn = form.querySelector('[type="submit"]');
+
+    form.addEventListener("submit", async (e) => {
+      // Otra validación del formulario ya canceló el envío.
+      if (e.defaultPrevented) return;
+
+      const files = input ? Array.from(input.files || []) : [];
+      if (!files.length || !window.fetch) return;
+
+      e.preventDefault();
+
+      if (submitBtn) {
+        submitBtn.disabled = true;
+      }
+
+      const body = new FormData(form);
+      body.delete("photos");
+
+      let res;
+
+      try {
+        res = await fetch(form.action || window.location.href, {
+          method: "POST",
+          body,
+          credentials: "same-origin",
+          headers: { "X-Direct-Upload": "1", Accept: "application/json" },
+        });
+      } catch (err) {
+        if (submitBtn) submitBtn.disabled = false;
+        alert("No fue posible enviar el formulario. Revisa la conexión.");
+        return;
+      }
+
+      const isJson = (res.headers.get("Content-Type") || "").includes("application/json");
+
+      if (!isJson) {
+        window.location.href = res.url;
+        return;
+      }
+
+      const data = await res.json();
+
+      if (data.presign_url && data.confirm_url) {
+        if (submitBtn) submitBtn.textContent = `Subiendo ${files.length} foto(s)...`;
+
+        const failed = await uploadFiles(
+          files,
+          data.presign_url,
+          data.confirm_url,
+          data.photo_type || "CONTAINER"
+        );
+
+        if (failed.length) {
+          alert(
+            "El movimiento se registró, pero no se pudieron subir estas fotos:\n" +
+              failed.join("\n")
+          );
+        }
+      }
+
+      window.location.href = data.redirect_url || window.location.href;
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", () => {
+    document
+      .querySelectorAll('form[data-direct-upload="1"]')
+      .forEach(attach);
+  });
+
+  window.YardDirectUpload = { uploadFiles };
+})();
@@ -0,0 +1,30 @@
+# Mueve al archivo particionado los incidentes cerrados más antiguos
+# que TRANSPORT_INCIDENT_ARCHIVE_MONTHS (lo mismo que hace cada noche
+# transport_incident_archive) y separa meses para almacenamiento frío.
+#
+#   python archive_incidents.py
+#   python archive_incidents.py --detach 2023-01   # DETACH del mes
+#
+# El mes separado queda como tabla suelta (..._pAAAAMM_cAAAAMMDDHHMM):
+# respaldarla con pg_dump y luego DROP TABLE.
+import sys
+from datetime import date
+
+from app import create_app
+from app.services.transport_incident_archive import archive_closed_incidents, detach_archive_month
+
+app = create_app()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    with app.app_context():
+        if "--detach" in args:
+            value = args[args.index("--detach") + 1]
+            month = date.fromisoformat(f"{value}-01")
+
+            tables = detach_archive_month(month)
+            print(f"particiones separadas: {', '.join(tables) or 'ninguna'}")
+        else:
+            result = archive_closed_incidents()
+            print(f"incidentes archivados: {result['archived']} ({result['batches']} tandas)")
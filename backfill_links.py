@@ -0,0 +1,31 @@
+# Completa una sola vez los enlaces desnormalizados del histórico:
+#   movements.chassis_id / movements.previous_eir_id
+#   chassis.last_confirmed_eir_id
+#   container_current_state
+# y recalcula movement_facts con esos enlaces.
+#
+#   python backfill_links.py
+#   python backfill_links.py --skip-facts   # solo enlaces
+import sys
+
+from app import create_app
+from app.services.container_state import backfill_container_state
+from app.services.movement_facts import backfill_movement_facts
+from app.services.movement_links import backfill_chassis_last_eir, backfill_movement_links
+
+app = create_app()
+
+if __name__ == "__main__":
+    with app.app_context():
+        movements = backfill_movement_links()
+        print(f"movements enlazados: {movements}")
+
+        chassis = backfill_chassis_last_eir()
+        print(f"chassis enlazados: {chassis}")
+
+        containers = backfill_container_state()
+        print(f"container_current_state: {containers}")
+
+        if "--skip-facts" not in sys.argv[1:]:
+            facts = backfill_movement_facts()
+            print(f"movement_facts recalculados: {facts}")
@@ -0,0 +1,18 @@
+# Proceso que genera las exportaciones encoladas y las cargas masivas
+# (simulación y confirmación) cuando EXPORT_ASYNC=true.
+#
+#   python export_worker.py          # bucle continuo
+#   python export_worker.py --once   # procesa lo pendiente y termina
+import sys
+
+from app import create_app
+from app.services.export_jobs import run_export_worker
+
+if __name__ == "__main__":
+    # La app se crea solo aquí: el pool de procesos de
+    # app/services/excel_ingest.py vuelve a importar este módulo en
+    # cada proceso hijo.
+    app = create_app()
+
+    with app.app_context():
+        run_export_worker(once="--once" in sys.argv[1:])